@@ -8,13 +8,39 @@
 - Одноразовый код = max_activations: 1
 - Многоразовый код = max_activations: N
 - Единая система подсчёта через current_activations
+
+Изменения в v2.2:
+- Запросы к access.db в отдельном потоке, обработчики не блокируют event loop
+- Одно долгоживущее соединение: WAL, busy_timeout, кэш подготовленных запросов
+- Обновления обрабатываются параллельно (concurrent_updates)
+- Права админов кэшируются в памяти: проверка - поиск в множестве,
+  изменения из других процессов подхватываются по PRAGMA data_version
+- Пакетная генерация кодов (/bulk, кнопка "Пакет кодов") одной
+  транзакцией, коды отправляются файлом CSV/TXT
+- Статистика из счетчиков access_code_counters (scripts/tools/access_stats.py)
+  и индекса активных сессий, кэш на STATS_CACHE_TTL сек
+- Очистка access.db (scripts/tools/access_sweeper.py) в job queue,
+  если задан ACCESS_SWEEP_HOURS
+- /activity - отчет по сводкам activity_logs (scripts/tools/activity_rollup.py)
+- Режим webhook (BOT_WEBHOOK_URL): встроенный HTTP-сервер, проверка
+  секретного токена, только нужные типы обновлений; TELEGRAM_API_URL -
+  свой Bot API сервер (нагрузочный тест: scripts/tools/bot_load_test.py)
+- Метрики (scripts/tools/bot_metrics.py): задержки обработчиков, методов БД
+  и вызовов Bot API, ошибки, вызовы в работе; /perf и GET /metrics
+  (формат Prometheus) на BOT_METRICS_PORT
 """
 
 import os
 import sys
+import asyncio
+import functools
+import time
 import sqlite3
 import secrets
 import string
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -26,8 +52,15 @@ from telegram.ext import (
     ContextTypes,
     filters
 )
+from telegram.request import HTTPXRequest
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'tools'))
+import access_stats
+import access_sweeper
+import activity_rollup
+import bot_metrics
+
 # Исправление кодировки для Windows
 if sys.platform == 'win32':
     try:
@@ -61,182 +94,373 @@ BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 ACCESS_DB = os.getenv('ACCESS_DB_PATH', 'access.db')
 SUPER_ADMIN_ID = os.getenv('SUPER_ADMIN_ID', '1530115915')
 
+# Ожидание блокировки access.db (Node-сервер пишет в ту же базу), сек
+DB_BUSY_TIMEOUT = float(os.getenv('ACCESS_DB_BUSY_TIMEOUT', '5'))
+# Кэш подготовленных запросов долгоживущего соединения
+DB_STATEMENT_CACHE = 64
+# Как часто сверять кэш админов с базой (PRAGMA data_version), сек
+ADMIN_CACHE_CHECK = float(os.getenv('ADMIN_CACHE_CHECK', '2'))
+# Сколько держать готовую статистику (активации с сайта видны с этой задержкой), сек
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '15'))
+# Очистка access.db из бота раз в N часов (0 - выключено, работает PM2-приложение)
+ACCESS_SWEEP_HOURS = float(os.getenv('ACCESS_SWEEP_HOURS', '0'))
+
+# Webhook вместо long polling: публичный адрес (https://example.com), пусто - polling
+BOT_WEBHOOK_URL = os.getenv('BOT_WEBHOOK_URL', '').rstrip('/')
+# Где слушает встроенный HTTP-сервер (обычно за nginx)
+BOT_WEBHOOK_LISTEN = os.getenv('BOT_WEBHOOK_LISTEN', '127.0.0.1')
+BOT_WEBHOOK_PORT = int(os.getenv('BOT_WEBHOOK_PORT', '8443'))
+BOT_WEBHOOK_PATH = os.getenv('BOT_WEBHOOK_PATH', 'telegram-webhook').strip('/')
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token (пусто - новый при каждом запуске)
+BOT_WEBHOOK_SECRET = os.getenv('BOT_WEBHOOK_SECRET', '')
+# Адрес Bot API (self-hosted telegram-bot-api или фейковый сервер нагрузочного теста)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '').rstrip('/')
+# Порт HTTP-метрик Prometheus (GET /metrics), 0 - выключено
+BOT_METRICS_PORT = int(os.getenv('BOT_METRICS_PORT', '0'))
+BOT_METRICS_LISTEN = os.getenv('BOT_METRICS_LISTEN', '127.0.0.1')
+# Типы обновлений, которые бот обрабатывает (остальные Telegram не присылает)
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
 CODE_TYPES = {
     '1day': {'hours': 24, 'name': '📅 1 День', 'emoji': '⚡'},
     '7days': {'hours': 168, 'name': '📅 7 Дней', 'emoji': '🔥'},
     '30days': {'hours': 720, 'name': '📅 30 Дней', 'emoji': '👑'}
 }
 
+CODE_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+
+# Пакетная генерация (промо-акции)
+BULK_COUNTS = [100, 1000, 10000]
+BULK_MAX_CODES = 50000
+
 WAITING_ADMIN_ID = 1
 WAITING_ADMIN_NAME = 2
 
 # База данных
+#
+# Все обращения к access.db идут через один поток с одним долгоживущим
+# соединением: event loop не ждет sqlite3, а запросы не открывают
+# соединение заново. WAL дает читать, пока Node-сервер пишет,
+# busy_timeout ждет его блокировку в потоке БД, а не в обработчике.
+
+# Уникальность кода проверяет UNIQUE-индекс: коллизия = 0 вставленных строк
+SQL_CODE_INSERT = '''
+    INSERT OR IGNORE INTO access_codes
+    (code, code_type, duration_hours, generated_by, expires_at, max_activations, current_activations)
+    VALUES (?, ?, ?, ?, ?, ?, 0)
+'''
+
+SQL_ADMIN_CODES_INC = '''
+    UPDATE admin_users
+    SET codes_generated_total = codes_generated_total + ?,
+        last_seen = CURRENT_TIMESTAMP
+    WHERE telegram_id = ?
+'''
+
+SQL_ACTIVE_ADMIN_IDS = 'SELECT telegram_id FROM admin_users WHERE is_active = 1'
+
+SQL_ADMIN_INSERT = '''
+    INSERT INTO admin_users (telegram_id, username, full_name)
+    VALUES (?, ?, ?)
+'''
+
+SQL_ADMIN_DEACTIVATE = '''
+    UPDATE admin_users
+    SET is_active = 0
+    WHERE telegram_id = ?
+'''
+
+SQL_ADMINS = '''
+    SELECT telegram_id, username, full_name, is_active,
+           codes_generated_total, last_seen
+    FROM admin_users
+    ORDER BY is_active DESC, codes_generated_total DESC
+'''
+
+# Задержки обработчиков, БД и Bot API (/perf, /metrics)
+metrics = bot_metrics.BotMetrics()
+
+class TimedRequest(HTTPXRequest):
+    """HTTP-клиент Bot API с замером каждого вызова (имя - метод API)"""
+    
+    async def do_request(self, url, method, *args, **kwargs):
+        name = url.rsplit('/', 1)[-1]
+        metrics.api.begin(name)
+        started = time.perf_counter()
+        code = 0
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            return code, payload
+        finally:
+            metrics.api.end(name, time.perf_counter() - started, error=not 200 <= code < 300)
+
 class Database:
     def __init__(self, db_path=ACCESS_DB):
         self.db_path = db_path
+        self.conn = None
+        # Один поток - одно соединение, запросы выполняются по очереди
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='access-db')
+        # Кэш активных админов: множество заменяется целиком, не изменяется на месте
+        self.admin_ids = None
+        self.data_version = None
+        self.admins_checked_at = 0.0
+        # Кэш статистики, сбрасывается при записи из бота
+        self.stats_cache = None
+        self.stats_cached_at = 0.0
+    
+    # ---------- поток БД ----------
+    
+    def _connect(self):
+        """Соединение создается в потоке БД и живет до close()"""
+        if self.conn is None:
+            self.conn = sqlite3.connect(
+                self.db_path,
+                timeout=DB_BUSY_TIMEOUT,
+                cached_statements=DB_STATEMENT_CACHE
+            )
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT * 1000)}')
+            access_stats.ensure_installed(self.conn)
+        return self.conn
     
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
+    def _disconnect(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
     
-    def generate_code(self, code_type, generated_by, max_activations=1):
+    async def _run(self, func, *args, **kwargs):
+        """Выполнить func в потоке БД, не блокируя event loop"""
+        loop = asyncio.get_running_loop()
+        name = func.__name__
+        metrics.db_wait.begin(name)
+        queued_at = time.perf_counter()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(self._timed, func, name, queued_at, *args, **kwargs)
+        )
+    
+    @staticmethod
+    def _timed(func, name, queued_at, *args, **kwargs):
+        """В потоке БД: ожидание в очереди и время самого метода - отдельно"""
+        metrics.db_wait.end(name, time.perf_counter() - queued_at)
+        with metrics.db.track(name):
+            return func(*args, **kwargs)
+    
+    # ---------- жизненный цикл ----------
+    
+    async def open(self):
+        await self._run(self._connect)
+        await self._run(self._sync_admins)
+    
+    async def close(self):
+        await self._run(self._disconnect)
+        self.executor.shutdown(wait=True)
+    
+    # ---------- синхронные запросы (только из потока БД) ----------
+    
+    def _generate_codes(self, code_type, generated_by, count, max_activations=1):
         """
-        Генерация кода с ЕДИНОЙ логикой
+        Генерация count кодов одной транзакцией с ЕДИНОЙ логикой
         max_activations = 1 для одноразового
         max_activations = N для многоразового
-        """
-        alphabet = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
-        
-        conn = self.get_connection()
-        cursor = conn.cursor()
         
-        while True:
-            code = ''.join(secrets.choice(alphabet) for _ in range(8))
-            code = f"{code[:4]}-{code[4:]}"
-            
-            cursor.execute('SELECT id FROM access_codes WHERE code = ?', (code,))
-            if not cursor.fetchone():
-                break
+        Без SELECT-проверки: INSERT OR IGNORE, а коды, совпавшие
+        с существующими, генерируются заново следующей порцией.
+        """
+        if code_type not in CODE_TYPES:
+            raise ValueError(f"Неверный тип кода: {code_type}")
         
         duration_hours = CODE_TYPES[code_type]['hours']
         expires_at = datetime.now() + timedelta(hours=duration_hours)
         
-        # ВАЖНО: max_activations теперь ВСЕГДА число (никогда не NULL)
-        cursor.execute('''
-            INSERT INTO access_codes 
-            (code, code_type, duration_hours, generated_by, expires_at, max_activations, current_activations)
-            VALUES (?, ?, ?, ?, ?, ?, 0)
-        ''', (code, code_type, duration_hours, generated_by, expires_at, max_activations))
-        
-        code_id = cursor.lastrowid
-        
-        cursor.execute('''
-            UPDATE admin_users 
-            SET codes_generated_total = codes_generated_total + 1,
-                last_seen = CURRENT_TIMESTAMP
-            WHERE telegram_id = ?
-        ''', (str(generated_by),))
+        conn = self._connect()
+        cursor = conn.cursor()
+        created = []
         
-        conn.commit()
-        conn.close()
+        # ВАЖНО: max_activations теперь ВСЕГДА число (никогда не NULL)
+        with conn:
+            while len(created) < count:
+                batch = {generate_code_value() for _ in range(count - len(created))}
+                before = len(created)
+                for code in batch:
+                    cursor.execute(SQL_CODE_INSERT,
+                                   (code, code_type, duration_hours, generated_by, expires_at, max_activations))
+                    if cursor.rowcount:
+                        created.append((cursor.lastrowid, code))
+                if len(created) == before:
+                    raise sqlite3.IntegrityError("Не удалось вставить ни одного кода")
+            
+            cursor.execute(SQL_ADMIN_CODES_INC, (count, str(generated_by)))
         
+        self.stats_cache = None
         return {
-            'id': code_id,
-            'code': code,
+            'ids': [code_id for code_id, _ in created],
+            'codes': [code for _, code in created],
             'type': code_type,
             'duration': duration_hours,
             'expires_at': expires_at,
             'max_activations': max_activations
         }
     
-    def get_stats(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Используем current_activations для подсчёта использованных
-# Используем COALESCE для обработки пустых значений (NULL)
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN current_activations >= COALESCE(max_activations, 1) THEN 1 ELSE 0 END) as used,
-                SUM(CASE WHEN current_activations < COALESCE(max_activations, 1) THEN 1 ELSE 0 END) as unused
-            FROM access_codes
-        ''')
-        total_stats = cursor.fetchone()
-        
-        cursor.execute('''
-            SELECT 
-                code_type,
-                COUNT(*) as total,
-                SUM(CASE WHEN current_activations >= max_activations THEN 1 ELSE 0 END) as used
-            FROM access_codes
-            GROUP BY code_type
-        ''')
-        type_stats = cursor.fetchall()
-        
-        cursor.execute('''
-            SELECT COUNT(*) 
-            FROM user_sessions 
-            WHERE is_active = 1 AND expires_at > datetime('now')
-        ''')
-        active_sessions = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM admin_users WHERE is_active = 1')
-        admin_count = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return {
-            'total': total_stats[0] or 0,
-            'used': total_stats[1] or 0,
-            'unused': total_stats[2] or 0,
-            'by_type': {row[0]: {'total': row[1], 'used': row[2] or 0} for row in type_stats},
-            'active_sessions': active_sessions,
-            'admin_count': admin_count
-        }
+    def _generate_code(self, code_type, generated_by, max_activations=1):
+        result = self._generate_codes(code_type, generated_by, 1, max_activations)
+        result['id'] = result.pop('ids')[0]
+        result['code'] = result.pop('codes')[0]
+        return result
     
-    def is_admin(self, telegram_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT is_active FROM admin_users 
-            WHERE telegram_id = ? AND is_active = 1
-        ''', (str(telegram_id),))
-        result = cursor.fetchone()
-        conn.close()
-        return result is not None
+    def _get_stats(self):
+        """Счетчики по типам + индекс активных сессий (access_stats.py)"""
+        stats = access_stats.get_stats(self._connect().cursor())
+        self.stats_cache = stats
+        self.stats_cached_at = time.monotonic()
+        return stats
     
-    def is_super_admin(self, telegram_id):
-        return str(telegram_id) == str(SUPER_ADMIN_ID)
+    def _sync_admins(self):
+        """
+        Перечитать админов, если базу меняло другое соединение.
+        data_version растет только от чужих коммитов - свои
+        изменения add/remove вносят в кэш сами.
+        """
+        conn = self._connect()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if self.admin_ids is None or version != self.data_version:
+            # telegram_id может храниться и числом - сравниваем строки, как is_admin
+            self.admin_ids = frozenset(str(row[0]) for row in conn.execute(SQL_ACTIVE_ADMIN_IDS))
+            self.data_version = version
+        self.admins_checked_at = time.monotonic()
+        return self.admin_ids
     
-    def add_admin(self, telegram_id, username=None, full_name=None, added_by=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _add_admin(self, telegram_id, username=None, full_name=None, added_by=None):
+        conn = self._connect()
         try:
-            cursor.execute('''
-                INSERT INTO admin_users (telegram_id, username, full_name)
-                VALUES (?, ?, ?)
-            ''', (str(telegram_id), username, full_name))
-            conn.commit()
-            conn.close()
-            return True, "Администратор успешно добавлен"
+            with conn:
+                conn.execute(SQL_ADMIN_INSERT, (str(telegram_id), username, full_name))
         except sqlite3.IntegrityError:
-            conn.close()
             return False, "Этот пользователь уже является администратором"
+        if self.admin_ids is not None:
+            self.admin_ids = self.admin_ids | {str(telegram_id)}
+        self.stats_cache = None
+        return True, "Администратор успешно добавлен"
     
-    def remove_admin(self, telegram_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE admin_users 
-            SET is_active = 0 
-            WHERE telegram_id = ?
-        ''', (str(telegram_id),))
-        affected = cursor.rowcount
-        conn.commit()
-        conn.close()
+    def _remove_admin(self, telegram_id):
+        conn = self._connect()
+        with conn:
+            affected = conn.execute(SQL_ADMIN_DEACTIVATE, (str(telegram_id),)).rowcount
+        if self.admin_ids is not None:
+            self.admin_ids = self.admin_ids - {str(telegram_id)}
+        self.stats_cache = None
         return affected > 0
     
-    def get_admins(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT telegram_id, username, full_name, is_active, 
-                   codes_generated_total, last_seen
-            FROM admin_users
-            ORDER BY is_active DESC, codes_generated_total DESC
-        ''')
-        admins = cursor.fetchall()
-        conn.close()
-        return admins
+    def _get_activity(self, days):
+        """Отчет из почасовых/посуточных сводок (None - сводок еще нет)"""
+        cursor = self._connect().cursor()
+        if not activity_rollup.is_installed(cursor):
+            return None
+        return activity_rollup.get_report(cursor, days)
+    
+    def _get_admins(self):
+        cursor = self._connect().cursor()
+        cursor.execute(SQL_ADMINS)
+        return cursor.fetchall()
+    
+    # ---------- async API для обработчиков ----------
+    
+    async def generate_code(self, code_type, generated_by, max_activations=1):
+        return await self._run(self._generate_code, code_type, generated_by, max_activations)
+    
+    async def generate_codes(self, code_type, generated_by, count, max_activations=1):
+        return await self._run(self._generate_codes, code_type, generated_by, count, max_activations)
+    
+    async def get_stats(self):
+        stats = self.stats_cache
+        if stats is not None and time.monotonic() - self.stats_cached_at < STATS_CACHE_TTL:
+            return stats
+        return await self._run(self._get_stats)
+    
+    async def is_admin(self, telegram_id):
+        """Поиск в кэше; сверка с базой не чаще раза в ADMIN_CACHE_CHECK сек"""
+        admin_ids = self.admin_ids
+        if admin_ids is None or time.monotonic() - self.admins_checked_at > ADMIN_CACHE_CHECK:
+            admin_ids = await self._run(self._sync_admins)
+        return str(telegram_id) in admin_ids
+    
+    def is_super_admin(self, telegram_id):
+        return str(telegram_id) == str(SUPER_ADMIN_ID)
+    
+    async def add_admin(self, telegram_id, username=None, full_name=None, added_by=None):
+        return await self._run(self._add_admin, telegram_id, username, full_name, added_by)
+    
+    async def remove_admin(self, telegram_id):
+        return await self._run(self._remove_admin, telegram_id)
+    
+    async def get_activity(self, days=7):
+        return await self._run(self._get_activity, days)
+    
+    async def get_admins(self):
+        return await self._run(self._get_admins)
+
+def generate_code_value():
+    """Код вида XXXX-XXXX без похожих символов (0/O, 1/I/L)"""
+    code = ''.join(secrets.choice(CODE_ALPHABET) for _ in range(8))
+    return f"{code[:4]}-{code[4:]}"
+
+def codes_document(result, fmt='csv'):
+    """Файл с пакетом кодов: CSV с параметрами или TXT по коду на строку"""
+    stamp = datetime.now().strftime('%Y%m%d_%H%M')
+    filename = f"codes_{result['type']}_{len(result['codes'])}_{stamp}.{fmt}"
+    
+    if fmt == 'txt':
+        content = '\n'.join(result['codes']) + '\n'
+    else:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['code', 'code_type', 'duration_hours', 'max_activations', 'expires_at'])
+        expires_at = result['expires_at'].strftime('%Y-%m-%d %H:%M')
+        writer.writerows(
+            [code, result['type'], result['duration'], result['max_activations'], expires_at]
+            for code in result['codes']
+        )
+        content = buffer.getvalue()
+    
+    document = io.BytesIO(content.encode('utf-8'))
+    document.name = filename
+    return document, filename
 
 db = Database()
 
+async def on_startup(application):
+    await db.open()
+    safe_print(f"🗄️ access.db открыта (WAL, поток БД), админов в кэше: {len(db.admin_ids)}")
+    if BOT_METRICS_PORT:
+        application.bot_data['metrics_server'] = await bot_metrics.serve_metrics(
+            metrics, BOT_METRICS_LISTEN, BOT_METRICS_PORT
+        )
+        safe_print(f"📈 Метрики: http://{BOT_METRICS_LISTEN}:{BOT_METRICS_PORT}/metrics")
+
+async def on_shutdown(application):
+    server = application.bot_data.pop('metrics_server', None)
+    if server:
+        server.close()
+        await server.wait_closed()
+    await db.close()
+
+async def sweep_job(context: ContextTypes.DEFAULT_TYPE):
+    """Архивация и очистка access.db в отдельном потоке со своим соединением"""
+    try:
+        report = await asyncio.to_thread(access_sweeper.sweep, ACCESS_DB)
+    except sqlite3.Error as e:
+        safe_print(f"❌ Очистка access.db: {e}")
+        return
+    db.stats_cache = None
+    safe_print(access_sweeper.format_report(report))
+
 # Обработчики команд
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     user_name = update.effective_user.first_name
     
-    if not db.is_admin(user_id) and not db.is_super_admin(user_id):
+    if not db.is_super_admin(user_id) and not await db.is_admin(user_id):
         await update.message.reply_text(
             "❌ *Доступ запрещён*\n\n"
             "Этот бот предназначен только для администраторов Coffee Books AI.\n\n"
@@ -251,6 +475,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             InlineKeyboardButton("🔥 7 Дней", callback_data="gen_7days")
         ],
         [InlineKeyboardButton("👑 30 Дней", callback_data="gen_30days")],
+        [InlineKeyboardButton("📦 Пакет кодов", callback_data="bulk_menu")],
         [InlineKeyboardButton("📊 Статистика", callback_data="stats")]
     ]
     
@@ -279,7 +504,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
     action = query.data
     
-    if not db.is_admin(user_id) and not db.is_super_admin(user_id):
+    if not db.is_super_admin(user_id) and not await db.is_admin(user_id):
         await query.edit_message_text("❌ У вас нет доступа к этой функции.")
         return
     
@@ -333,7 +558,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             max_activations = int(activation_count)
         
         try:
-            result = db.generate_code(code_type, user_id, max_activations)
+            result = await db.generate_code(code_type, user_id, max_activations)
             type_info = CODE_TYPES[code_type]
             
             message = (
@@ -360,9 +585,58 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception as e:
             await query.edit_message_text(f"❌ Ошибка: {str(e)}")
     
+    # ПАКЕТНАЯ ГЕНЕРАЦИЯ
+    elif action == 'bulk_menu':
+        keyboard = [
+            [InlineKeyboardButton(info['name'], callback_data=f"bulk_type_{code_type}")]
+            for code_type, info in CODE_TYPES.items()
+        ]
+        keyboard.append([InlineKeyboardButton("« Назад", callback_data="menu")])
+        
+        await query.edit_message_text(
+            "📦 *Пакет кодов*\n\n"
+            "Одноразовые коды для промо-акций, файлом CSV.\n"
+            "Выберите тип кода:\n\n"
+            "💡 Другое количество: /bulk <тип> <N>",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    
+    elif action.startswith('bulk_type_'):
+        code_type = action.replace('bulk_type_', '')
+        
+        if code_type not in CODE_TYPES:
+            await query.edit_message_text("❌ Неверный тип кода")
+            return
+        
+        keyboard = [
+            [InlineKeyboardButton(f"{count:,} кодов".replace(',', ' '), callback_data=f"bulk_{count}_{code_type}")]
+            for count in BULK_COUNTS
+        ]
+        keyboard.append([InlineKeyboardButton("« Назад", callback_data="bulk_menu")])
+        
+        type_info = CODE_TYPES[code_type]
+        await query.edit_message_text(
+            f"📦 {type_info['emoji']} *{type_info['name']}*\n\n"
+            f"Сколько кодов создать?",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    
+    elif action.startswith('bulk_'):
+        _, count, code_type = action.split('_', 2)
+        count = int(count)
+        
+        if code_type not in CODE_TYPES or count not in BULK_COUNTS:
+            await query.edit_message_text("❌ Неверные параметры пакета")
+            return
+        
+        await query.edit_message_text(f"⏳ Создаю {count} кодов...")
+        await send_bulk_codes(query.message, user_id, code_type, count)
+    
     # СТАТИСТИКА
     elif action == 'stats':
-        stats = db.get_stats()
+        stats = await db.get_stats()
         
         message = (
             "📊 *Статистика системы*\n\n"
@@ -391,7 +665,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("❌ Эта функция доступна только супер-админу.")
             return
         
-        admins = db.get_admins()
+        admins = await db.get_admins()
         
         message = "👥 *Управление администраторами*\n\n"
         
@@ -438,7 +712,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         context.user_data['waiting_for'] = 'admin_remove_id'
         
-        admins = db.get_admins()
+        admins = await db.get_admins()
         message = "➖ *Удаление администратора*\n\n"
         message += "Отправьте Telegram ID админа для удаления:\n\n"
         
@@ -460,6 +734,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 InlineKeyboardButton("🔥 7 Дней", callback_data="gen_7days")
             ],
             [InlineKeyboardButton("👑 30 Дней", callback_data="gen_30days")],
+            [InlineKeyboardButton("📦 Пакет кодов", callback_data="bulk_menu")],
             [InlineKeyboardButton("📊 Статистика", callback_data="stats")]
         ]
         
@@ -505,7 +780,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         new_admin_id = context.user_data.get('new_admin_id')
         name = text if text != '/skip' else None
         
-        success, message = db.add_admin(new_admin_id, full_name=name)
+        success, message = await db.add_admin(new_admin_id, full_name=name)
         
         context.user_data.clear()
         
@@ -529,7 +804,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 context.user_data.clear()
                 return
             
-            success = db.remove_admin(remove_id)
+            success = await db.remove_admin(remove_id)
             context.user_data.clear()
             
             if success:
@@ -545,6 +820,62 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "❌ Неверный формат. Telegram ID должен быть числом."
             )
 
+async def send_bulk_codes(message, user_id, code_type, count, max_activations=1, fmt='csv'):
+    """Создать пакет кодов и отправить его документом в чат message"""
+    try:
+        started = time.perf_counter()
+        result = await db.generate_codes(code_type, user_id, count, max_activations)
+        elapsed = time.perf_counter() - started
+    except (sqlite3.Error, ValueError) as e:
+        await message.reply_text(f"❌ Ошибка: {str(e)}")
+        return
+    
+    safe_print(f"✅ [{user_id}] создал пакет {count} кодов ({code_type}, {max_activations} акт.) за {elapsed:.2f}с")
+    
+    type_info = CODE_TYPES[code_type]
+    document, filename = codes_document(result, fmt)
+    await message.reply_document(
+        document=document,
+        filename=filename,
+        caption=(
+            f"✅ Создано кодов: {count}\n"
+            f"{type_info['emoji']} Тип: {type_info['name']}\n"
+            f"🔐 Активаций на код: {max_activations}\n"
+            f"📅 Действительны до: {result['expires_at'].strftime('%d.%m.%Y %H:%M')}"
+        )
+    )
+
+async def bulk_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/bulk <тип> <N> [активаций] [csv|txt]"""
+    user_id = update.effective_user.id
+    
+    if not db.is_super_admin(user_id) and not await db.is_admin(user_id):
+        await update.message.reply_text("❌ Нет доступа.")
+        return
+    
+    args = list(context.args or [])
+    fmt = 'csv'
+    if args and args[-1].lower() in ('csv', 'txt'):
+        fmt = args.pop().lower()
+    
+    try:
+        code_type = args[0]
+        count = int(args[1])
+        max_activations = int(args[2]) if len(args) > 2 else 1
+    except (IndexError, ValueError):
+        code_type, count, max_activations = None, 0, 0
+    
+    if code_type not in CODE_TYPES or not 1 <= count <= BULK_MAX_CODES or max_activations < 1:
+        await update.message.reply_text(
+            "📦 Использование: /bulk <тип> <N> [активаций] [csv|txt]\n\n"
+            f"Типы: {', '.join(CODE_TYPES)}\n"
+            f"N: от 1 до {BULK_MAX_CODES}\n"
+            "Пример: /bulk 7days 5000"
+        )
+        return
+    
+    await send_bulk_codes(update.message, user_id, code_type, count, max_activations, fmt)
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     await update.message.reply_text(
@@ -559,6 +890,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "*Команды:*\n"
         "/start - Главное меню\n"
         "/stats - Статистика\n"
+        "/bulk <тип> <N> - Пакет кодов файлом\n"
+        "/activity [дней] - Активность пользователей\n"
+        "/perf - Производительность бота\n"
         "/help - Эта справка\n"
         "/cancel - Отмена операции\n\n"
     )
@@ -576,11 +910,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
-    if not db.is_admin(user_id) and not db.is_super_admin(user_id):
+    if not db.is_super_admin(user_id) and not await db.is_admin(user_id):
         await update.message.reply_text("❌ Нет доступа.")
         return
     
-    stats = db.get_stats()
+    stats = await db.get_stats()
     
     message = (
         "📊 *Статистика Coffee Books AI*\n\n"
@@ -593,6 +927,67 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(message, parse_mode='Markdown')
 
+async def activity_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/activity [дней] - активность пользователей из сводок"""
+    user_id = update.effective_user.id
+    
+    if not db.is_super_admin(user_id) and not await db.is_admin(user_id):
+        await update.message.reply_text("❌ Нет доступа.")
+        return
+    
+    try:
+        days = int(context.args[0]) if context.args else 7
+    except ValueError:
+        days = 7
+    days = max(1, min(days, 365))
+    
+    report = await db.get_activity(days)
+    if report is None:
+        await update.message.reply_text(
+            "📈 Сводок активности еще нет.\n"
+            "Запустите: python scripts/tools/activity_rollup.py"
+        )
+        return
+    
+    message = f"📈 *Активность за {days} дн.*\n\n"
+    
+    if report['last_24h']:
+        message += "*Последние 24 часа:*\n"
+        for action, events in report['last_24h'].items():
+            message += f"• `{action}`: {events}\n"
+        message += "\n"
+    
+    message += "*По дням* (события / сессии):\n"
+    for row in report['daily'][:14]:
+        message += f"`{row['day']}` {row['events']} / {row['sessions']}\n"
+    if not report['daily']:
+        message += "_Нет данных_\n"
+    
+    if report['actions']:
+        message += "\n*По действиям и типам кодов:*\n"
+        for action, by_type in report['actions'].items():
+            parts = ', '.join(
+                f"{CODE_TYPES.get(code_type, {}).get('emoji', '❔')}{events}"
+                for code_type, events in sorted(by_type.items())
+            )
+            message += f"• `{action}`: {sum(by_type.values())} ({parts})\n"
+    
+    updated = report['state'].get('hourly', {}).get('updated_at')
+    if updated:
+        message += f"\n🕐 Сводка обновлена: {updated} UTC"
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/perf - задержки обработчиков, БД и Bot API с запуска бота"""
+    user_id = update.effective_user.id
+    
+    if not db.is_super_admin(user_id) and not await db.is_admin(user_id):
+        await update.message.reply_text("❌ Нет доступа.")
+        return
+    
+    await update.message.reply_text(metrics.format_report(), parse_mode='Markdown')
+
 async def admins_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
@@ -600,7 +995,7 @@ async def admins_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Эта команда доступна только супер-админу.")
         return
     
-    admins = db.get_admins()
+    admins = await db.get_admins()
     
     message = "👥 *Список администраторов:*\n\n"
     
@@ -621,26 +1016,73 @@ def main():
         return
     
     safe_print("🤖 ═══════════════════════════════════════════")
-    safe_print("🤖 Coffee Books AI - Admin Bot v2.1")
+    safe_print("🤖 Coffee Books AI - Admin Bot v2.2")
     safe_print("🤖 ═══════════════════════════════════════════")
     safe_print(f"👑 Super Admin ID: {SUPER_ADMIN_ID}")
     safe_print(f"📁 База данных: {ACCESS_DB}")
     safe_print("🤖 ═══════════════════════════════════════════\n")
     
-    application = Application.builder().token(BOT_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(True)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .request(TimedRequest())
+    )
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        safe_print(f"🔌 Bot API: {TELEGRAM_API_URL}")
+    application = builder.build()
+    
+    # Каждый обработчик замеряется (metrics.handler): /perf и /metrics
+    application.add_handler(CommandHandler("start", metrics.handler(start)))
+    application.add_handler(CommandHandler("help", metrics.handler(help_command)))
+    application.add_handler(CommandHandler("stats", metrics.handler(stats_command)))
+    application.add_handler(CommandHandler("bulk", metrics.handler(bulk_command)))
+    application.add_handler(CommandHandler("activity", metrics.handler(activity_command)))
+    application.add_handler(CommandHandler("perf", metrics.handler(perf_command)))
+    application.add_handler(CommandHandler("admins", metrics.handler(admins_command)))
+    application.add_handler(CommandHandler("cancel", metrics.handler(cancel)))
+    application.add_handler(CallbackQueryHandler(metrics.handler(button_callback)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, metrics.handler(handle_text)))
     
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("stats", stats_command))
-    application.add_handler(CommandHandler("admins", admins_command))
-    application.add_handler(CommandHandler("cancel", cancel))
-    application.add_handler(CallbackQueryHandler(button_callback))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    if ACCESS_SWEEP_HOURS > 0:
+        if application.job_queue is None:
+            safe_print("⚠️ Очистка по расписанию требует job queue:")
+            safe_print("   pip install \"python-telegram-bot[job-queue]\"")
+        else:
+            application.job_queue.run_repeating(metrics.handler(sweep_job), interval=ACCESS_SWEEP_HOURS * 3600, first=60)
+            safe_print(f"🧹 Очистка access.db каждые {ACCESS_SWEEP_HOURS:g} ч")
+    
+    if BOT_WEBHOOK_URL:
+        run_webhook(application)
+        return
     
     safe_print("✅ Бот запущен и готов к работе!")
     safe_print("📱 Отправьте /start боту для начала\n")
     
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(allowed_updates=ALLOWED_UPDATES)
+
+def run_webhook(application):
+    """Webhook: Telegram сам присылает обновления на встроенный HTTP-сервер"""
+    secret = BOT_WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    webhook_url = f"{BOT_WEBHOOK_URL}/{BOT_WEBHOOK_PATH}"
+    
+    safe_print(f"🌐 Webhook: {webhook_url}")
+    safe_print(f"   Слушаю {BOT_WEBHOOK_LISTEN}:{BOT_WEBHOOK_PORT}/{BOT_WEBHOOK_PATH}")
+    safe_print("✅ Бот запущен и готов к работе!\n")
+    
+    # Встроенный сервер: pip install "python-telegram-bot[webhooks]".
+    # Запросы без верного X-Telegram-Bot-Api-Secret-Token отклоняются (403)
+    application.run_webhook(
+        listen=BOT_WEBHOOK_LISTEN,
+        port=BOT_WEBHOOK_PORT,
+        url_path=BOT_WEBHOOK_PATH,
+        webhook_url=webhook_url,
+        secret_token=secret,
+        allowed_updates=ALLOWED_UPDATES,
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,6 @@
 // backend_routes_recommend_db.js - ИСПРАВЛЕННЫЙ роутер рекомендаций
-import { Router } from "express";
+import express, { Router } from "express";
 import sqlite3 from "sqlite3";
-import { promisify } from "util";
 import path from "path";
 import { fileURLToPath } from "url";
 import fs from "fs";
@@ -19,76 +18,183 @@ if (!fs.existsSync(DB_PATH)) {
     console.error(`❌ content.db не найден по пути: ${DB_PATH}`);
 }
 
-const db = new sqlite3.Database(DB_PATH, (err) => {
-    if (err) {
-        console.error('❌ Ошибка подключения к content.db:', err.message);
-    } else {
-        console.log('✅ Подключено к content.db');
-    }
+function openDatabase() {
+    return new sqlite3.Database(DB_PATH, (err) => {
+        if (err) {
+            console.error('❌ Ошибка подключения к content.db:', err.message);
+        } else {
+            console.log('✅ Подключено к content.db');
+        }
+    });
+}
+
+let db = openDatabase();
+
+// Запрос идет в текущее соединение - после публикации это уже новый файл
+const dbAll = (sql, params = []) => new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => (err ? reject(err) : resolve(rows)));
+});
+const dbGet = (sql, params = []) => new Promise((resolve, reject) => {
+    db.get(sql, params, (err, row) => (err ? reject(err) : resolve(row)));
 });
 
-const dbAll = promisify(db.all.bind(db));
-const dbGet = promisify(db.get.bind(db));
+// Миниатюры обложек - scripts/tools/image_cache.py (имя файла = sha256 содержимого)
+const THUMB_DIR = process.env.THUMB_CACHE_DIR || path.join(process.cwd(), "thumbs");
+const THUMB_SIZES = ["sm", "md", "lg"];
 
-// Маппинги фильтров (как в оригинале)
-const FILTER_MAPPING = {
-    "ЖАНР": "genre", "ЭПОХА": "epoch", "КРИТЕРИЙ": "criteria",
-    "АТМОСФЕРА": "mood", "НАСТРОЕНИЕ": "mood", "GENRE": "genre",
-    "ERA": "epoch", "EPOCH": "epoch", "CRITERIA": "criteria",
-    "VIBE": "mood", "MOOD": "mood", "ДӘУІР": "epoch", "КӨҢІЛ-КҮЙ": "mood"
-};
+router.use("/thumbs", express.static(THUMB_DIR, { immutable: true, maxAge: "365d" }));
 
-const VALUE_MAPPING = {
-    "Драма": "drama", "Комедия": "comedy", "Ужасы": "horror", 
-    "Фантастика": "sci-fi", "Боевик": "action", "Триллер": "thriller",
-    "Анимация": "animation", "Документальный": "documentary",
-    "Криминал": "crime", "Приключения": "adventure", "Семейный": "family",
-    "Фэнтези": "fantasy", "История": "history", "Музыкальный": "music",
-    "Детектив": "mystery", "Романтика": "romance", "Военный": "war",
-    "Вестерн": "western", "Научная фантастика": "sci-fi",
-    "Классика": "classics", "Нон-фикшн": "non-fiction", "Роман": "romance",
-    "Исторический": "historical", "Философия": "philosophy",
-    "Психология": "psychology", "Антиутопия": "dystopian",
-    "Поп": "pop", "Рок": "rock", "Джаз": "jazz", "Классическая": "classical",
-    "Хип-хоп": "hip-hop", "Техно": "electronic", "Электронная": "electronic",
-    "Инди": "indie", "Метал": "metal", "Блюз": "blues", "Кантри": "country",
-    "R&B": "r-n-b", "Латиноамериканская": "latin",
-    "Новинки": "new_releases", "2020-е": "2020s", "2010-е": "2010s",
-    "2000-е": "2000s", "90-е": "90s", "80-е": "80s", "Ретро": "retro",
-    "Золотая Классика": "golden_classics", "Бестселлеры 2025": "bestsellers_2025",
-    "Жаңалықтар": "new_releases", "2020-шы": "2020s", "2010-шы": "2010s",
-    "2000-шы": "2000s", "90-шы": "90s", "80-ші": "80s", 
-    "Алтын классика": "golden_classics",
-    "Оскар": "oscar", "Культовый": "cult", "Хит проката": "blockbuster",
-    "Скрытый шедевр": "hidden_gem", "Артхаус": "arthouse",
-    "Высокий рейтинг": "high_rated", "Популярный": "popular",
-    "Бестселлер": "bestseller", "Культовая": "cult",
-    "Интеллектуальная": "intellectual", "Современная": "modern",
-    "Хит": "hit", "Популярная": "popular", "Восходящая звезда": "rising",
-    "Андеграунд": "underground", "Энергия": "energetic",
-    "Энергичная": "energetic", "Чилл": "chill", "Вечеринка": "party",
-    "Фокус": "focus"
-};
+// Маппинги фильтров - общий конфиг с scripts/tools/recommend_pools.py
+const FILTERS_CONFIG = path.join(__dirname, "..", "config", "recommend_filters.json");
+const { FILTER_MAPPING, VALUE_MAPPING, EPOCH_YEAR_RANGES } = JSON.parse(fs.readFileSync(FILTERS_CONFIG, "utf8"));
 
-const EPOCH_YEAR_RANGES = {
-    "new_releases": { min: 2023, max: 2025 },
-    "bestsellers_2025": { min: 2024, max: 2025 },
-    "2020s": { min: 2020, max: 2029 },
-    "2010s": { min: 2010, max: 2019 },
-    "2000s": { min: 2000, max: 2009 },
-    "90s": { min: 1990, max: 1999 },
-    "80s": { min: 1980, max: 1989 },
-    "golden_classics": { min: 1900, max: 1979 },
-    "retro": { min: 1900, max: 1989 }
+// После scripts/migrations/encode_facets.py фасеты хранятся кодами в content_items,
+// content - view. Фильтр по коду идет по индексу (type, genre_id, ...) без LOWER()
+const FACET_TABLES = {
+    genre: "facet_genres",
+    epoch: "facet_epochs",
+    mood: "facet_moods",
+    criteria: "facet_criteria"
 };
 
+function detectFacetEncoding() {
+    return dbGet("SELECT 1 AS found FROM sqlite_master WHERE type = 'table' AND name = 'content_items'")
+        .then(row => Boolean(row))
+        .catch(() => false);
+}
+
+let facetsEncoded = detectFacetEncoding();
+
+// Условие "колонка = значение" без учета регистра (словари - COLLATE NOCASE)
+function facetCondition(column, encoded) {
+    if (encoded && FACET_TABLES[column]) {
+        return `${column}_id = (SELECT id FROM ${FACET_TABLES[column]} WHERE value = ?)`;
+    }
+    return `LOWER(${column}) = LOWER(?)`;
+}
+
 function normalizeValue(value) {
     if (!value) return null;
     const mapped = VALUE_MAPPING[value];
     return (mapped || value).toLowerCase().trim();
 }
 
+// Случайный ключ в диапазоне content.rand_key ([-2^63, 2^63))
+function randomKey() {
+    return (Math.random() * 2 - 1) * 2 ** 63;
+}
+
+function shuffle(items) {
+    for (let i = items.length - 1; i > 0; i--) {
+        const j = Math.floor(Math.random() * (i + 1));
+        [items[i], items[j]] = [items[j], items[i]];
+    }
+    return items;
+}
+
+// Колонка rand_key появляется после scripts/tools/rand_keys.py --install
+let randKeyAvailable = true;
+
+// scripts/tools/staging_db.py публикует каталог подменой файла (os.replace).
+// Открытое соединение продолжает читать старый inode - при смене inode
+// открываем новый файл, старое соединение закрываем после текущих запросов.
+const DB_WATCH_INTERVAL_MS = 2000;
+const DB_CLOSE_DELAY_MS = 10000;
+
+fs.watchFile(DB_PATH, { interval: DB_WATCH_INTERVAL_MS }, (curr, prev) => {
+    if (!curr.ino || curr.ino === prev.ino) return;
+
+    const previous = db;
+    db = openDatabase();
+    facetsEncoded = detectFacetEncoding();
+    randKeyAvailable = true;
+    console.log('🔄 content.db опубликован заново - соединение переоткрыто');
+
+    setTimeout(() => previous.close(), DB_CLOSE_DELAY_MS);
+}).unref();
+
+// limit случайных строк запроса (query - SELECT ... WHERE ... без ORDER BY).
+// Переход к случайному rand_key и чтение следующих по индексу вместо
+// ORDER BY RANDOM(), который сортирует все подходящие строки.
+async function randomSample(query, params, limit) {
+    if (randKeyAvailable) {
+        try {
+            const pivot = randomKey();
+            const head = await dbAll(`${query} AND rand_key >= ? ORDER BY rand_key LIMIT ?`, [...params, pivot, limit]);
+            if (head.length >= limit) return shuffle(head);
+
+            // Дошли до конца диапазона ключей - продолжаем с начала
+            const tail = await dbAll(`${query} AND rand_key < ? ORDER BY rand_key LIMIT ?`, [...params, pivot, limit - head.length]);
+            return shuffle(head.concat(tail));
+        } catch (err) {
+            if (!/no such column: rand_key/.test(err.message)) throw err;
+            console.warn('⚠️ rand_key не установлен, используем ORDER BY RANDOM()');
+            randKeyAvailable = false;
+        }
+    }
+    return await dbAll(`${query} ORDER BY RANDOM() LIMIT ?`, [...params, limit]);
+}
+
+// Предрассчитанные пулы кандидатов (scripts/tools/recommend_pools.py).
+// null - пула нет или он не подходит, нужен живой запрос.
+async function searchFromPools(dbType, filters, excludeIds) {
+    const combo = { epoch: "", genre: "", criteria: "", mood: "" };
+
+    for (const [filterKey, filterValue] of Object.entries(filters)) {
+        const dbColumn = FILTER_MAPPING[filterKey];
+        const normalizedValue = normalizeValue(filterValue);
+        if (!dbColumn || !normalizedValue) continue;
+
+        // Эпоха вне EPOCH_YEAR_RANGES и повтор колонки - только живой запрос
+        if (dbColumn === 'epoch' && !EPOCH_YEAR_RANGES[normalizedValue]) return null;
+        if (combo[dbColumn]) return null;
+        combo[dbColumn] = normalizedValue;
+    }
+
+    let pool;
+    try {
+        pool = await dbGet(`
+            SELECT c.tier, p.ids FROM recommend_candidates c
+            JOIN recommend_pools p ON p.pool_key = c.pool_key
+            WHERE c.type = ? AND c.epoch = ? AND c.genre = ? AND c.criteria = ? AND c.mood = ?
+        `, [dbType, combo.epoch, combo.genre, combo.criteria, combo.mood]);
+    } catch (err) {
+        return null;  // Пулы еще не собраны
+    }
+    if (!pool || !pool.ids) return null;
+
+    const excluded = new Set(excludeIds.map(Number));
+    const ids = [];
+    for (let offset = 0; offset + 4 <= pool.ids.length; offset += 4) {
+        const id = pool.ids.readUInt32LE(offset);
+        if (!excluded.has(id)) ids.push(id);
+    }
+
+    // Та же ступень, что дал бы searchWithFallback без пулов
+    const needed = pool.tier === 'and' ? 10 : 1;
+    if (ids.length < needed) return null;
+
+    for (let i = 0; i < Math.min(10, ids.length); i++) {
+        const j = i + Math.floor(Math.random() * (ids.length - i));
+        [ids[i], ids[j]] = [ids[j], ids[i]];
+    }
+    const picked = ids.slice(0, 10);
+
+    const rows = await dbAll(
+        `SELECT * FROM content WHERE id IN (${picked.map(() => "?").join(",")})`,
+        picked
+    );
+    // Пул устарел (записи удалены harvest-ом) - живой запрос
+    if (rows.length < Math.min(needed, picked.length)) return null;
+
+    const order = new Map(picked.map((id, index) => [id, index]));
+    return rows.sort((a, b) => order.get(a.id) - order.get(b.id));
+}
+
 async function searchWithFallback(dbType, filters, excludeIds = []) {
+    const pooled = await searchFromPools(dbType, filters, excludeIds);
+    if (pooled) return pooled;
+
     const appliedFilters = [];
     let yearRange = null;
     
@@ -112,6 +218,8 @@ async function searchWithFallback(dbType, filters, excludeIds = []) {
         excludeParams = excludeIds;
     }
     
+    const encoded = await facetsEncoded;
+
     // Стратегия 1: AND все фильтры
     if (appliedFilters.length > 0) {
         let query = `SELECT * FROM content WHERE type = ?`;
@@ -124,13 +232,13 @@ async function searchWithFallback(dbType, filters, excludeIds = []) {
         
         appliedFilters.forEach(f => {
             if (f.column !== 'epoch') {
-                query += ` AND LOWER(${f.column}) = LOWER(?)`;
+                query += ` AND ${facetCondition(f.column, encoded)}`;
                 params.push(f.value);
             }
         });
         
-        query += excludeClause + ` ORDER BY RANDOM() LIMIT 50`;
-        const results = await dbAll(query, [...params, ...excludeParams]);
+        query += excludeClause;
+        const results = await randomSample(query, [...params, ...excludeParams], 50);
         
         if (results.length >= 10) return results.slice(0, 10);
     }
@@ -152,12 +260,12 @@ async function searchWithFallback(dbType, filters, excludeIds = []) {
             .filter(f => f.column !== 'epoch')
             .map(f => {
                 params.push(f.value);
-                return `LOWER(${f.column}) = LOWER(?)`;
+                return facetCondition(f.column, encoded);
             });
         
         if (conditions.length > 0) {
-            query += ` AND (${conditions.join(" OR ")}) ORDER BY RANDOM() LIMIT 50`;
-            const results = await dbAll(query, params);
+            query += ` AND (${conditions.join(" OR ")})`;
+            const results = await randomSample(query, params, 50);
             if (results.length > 0) return results.slice(0, 10);
         }
     }
@@ -171,8 +279,8 @@ async function searchWithFallback(dbType, filters, excludeIds = []) {
         params.push(yearRange.min, yearRange.max);
     }
     
-    query += excludeClause + ` ORDER BY RANDOM() LIMIT 10`;
-    return await dbAll(query, [...params, ...excludeParams]);
+    query += excludeClause;
+    return await randomSample(query, [...params, ...excludeParams], 10);
 }
 
 function getDescriptionByLang(item, lang) {
@@ -182,6 +290,53 @@ function getDescriptionByLang(item, lang) {
     return item.description || "Great choice!";
 }
 
+// Статус обложек из image_cache: битые ссылки скрываются, рабочие
+// получают локальные миниатюры. Без таблицы - image_url как есть.
+async function attachImages(items, baseUrl) {
+    const urls = [...new Set(items.map(item => item.image_url).filter(Boolean))];
+    if (urls.length === 0) return items;
+
+    let cached;
+    try {
+        cached = await dbAll(
+            `SELECT url, status, thumb_path FROM image_cache WHERE url IN (${urls.map(() => "?").join(",")})`,
+            urls
+        );
+    } catch (err) {
+        return items;  // image_cache.py еще не запускался
+    }
+
+    const byUrl = new Map(cached.map(row => [row.url, row]));
+    for (const item of items) {
+        const image = byUrl.get(item.image_url);
+        if (!image) continue;
+        if (image.status === "broken") {
+            item.image_url = null;
+        } else if (image.thumb_path) {
+            item.thumbnails = Object.fromEntries(
+                THUMB_SIZES.map(size => [size, `${baseUrl}/thumbs/${size}/${image.thumb_path}`])
+            );
+        }
+    }
+    return items;
+}
+
+function formatRecommendation(item, lang) {
+    return {
+        id: item.id,
+        source_id: item.source_id,
+        title: item.title,
+        image: item.thumbnails ? item.thumbnails.md : item.image_url,
+        ...(item.thumbnails && { thumbnails: item.thumbnails, image_original: item.image_url }),
+        year: item.year,
+        rating: item.rating,
+        why: getDescriptionByLang(item, lang),
+        ...(item.type === "movie" && { genre: item.genre }),
+        ...(item.type === "book" && { author: item.creator }),
+        ...(item.type === "music" && { artist: item.creator })
+    };
+}
+
 router.post("/:type", async (req, res) => {
     try {
         const { type } = req.params;
@@ -200,18 +355,8 @@ router.post("/:type", async (req, res) => {
             return res.json({ recommendations: [], message: "No content found" });
         }
         
-        const recommendations = results.map(item => ({
-            id: item.id,
-            source_id: item.source_id,
-            title: item.title,
-            image: item.image_url,
-            year: item.year,
-            rating: item.rating,
-            why: getDescriptionByLang(item, lang),
-            ...(type === "movies" && { genre: item.genre }),
-            ...(type === "books" && { author: item.creator }),
-            ...(type === "music" && { artist: item.creator })
-        }));
+        await attachImages(results, req.baseUrl);
+        const recommendations = results.map(item => formatRecommendation(item, lang));
         
         res.json({ recommendations, count: recommendations.length, lang });
         
@@ -221,11 +366,65 @@ router.post("/:type", async (req, res) => {
     }
 });
 
+// "Еще как это": соседи из similar_items (scripts/tools/similarity_index.py)
+router.get("/similar/:id", async (req, res) => {
+    try {
+        const itemId = Number(req.params.id);
+        const limit = Math.min(Math.max(Number(req.query.limit) || 10, 1), 50);
+        const lang = req.query.lang || 'ru';
+
+        if (!Number.isInteger(itemId)) {
+            return res.status(400).json({ error: "Invalid id" });
+        }
+
+        let row;
+        try {
+            row = await dbGet("SELECT neighbor_ids FROM similar_items WHERE item_id = ?", [itemId]);
+        } catch (err) {
+            row = null;  // Индекс еще не собран
+        }
+        if (!row || !row.neighbor_ids) {
+            return res.json({ recommendations: [], message: "No similar content" });
+        }
+
+        const ids = [];
+        for (let offset = 0; offset + 4 <= row.neighbor_ids.length && ids.length < limit; offset += 4) {
+            ids.push(row.neighbor_ids.readUInt32LE(offset));
+        }
+
+        const rows = await dbAll(
+            `SELECT * FROM content WHERE id IN (${ids.map(() => "?").join(",")})`,
+            ids
+        );
+        const order = new Map(ids.map((id, index) => [id, index]));
+        await attachImages(rows, req.baseUrl);
+        const recommendations = rows
+            .sort((a, b) => order.get(a.id) - order.get(b.id))
+            .map(item => formatRecommendation(item, lang));
+
+        res.json({ recommendations, count: recommendations.length, lang });
+    } catch (err) {
+        console.error(`❌ [similar ${req.params.id}] Error:`, err);
+        res.status(500).json({ error: "Server error" });
+    }
+});
+
 router.get("/stats", async (req, res) => {
     try {
+        // Сводная таблица content_stats (scripts/tools/content_stats.py) - O(число корзин)
+        try {
+            const byType = await dbAll("SELECT type, count FROM content_stats WHERE dimension = 'total' AND count > 0");
+            return res.json({
+                total: byType.reduce((sum, row) => sum + row.count, 0),
+                byType: byType.reduce((acc, row) => { acc[row.type] = row.count; return acc; }, {})
+            });
+        } catch (statsErr) {
+            // Таблица еще не установлена - считаем по content
+        }
+
         const total = await dbGet("SELECT COUNT(*) as count FROM content");
         const byType = await dbAll("SELECT type, COUNT(*) as count FROM content GROUP BY type");
-        
+
         res.json({
             total: total.count,
             byType: byType.reduce((acc, row) => { acc[row.type] = row.count; return acc; }, {})
@@ -1,10 +1,21 @@
 #!/usr/bin/env python3
 # check_stats.py - Быстрая статистика БД
 
+import os
+import sys
 import sqlite3
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'tools'))
+import content_stats
+
 DB_PATH = 'content.db'
 
+TYPE_NAMES = {
+    'book': '📖 Книги',
+    'movie': '🎬 Фильмы',
+    'music': '🎵 Музыка'
+}
+
 def show_stats():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
@@ -13,56 +24,32 @@ def show_stats():
     print("📊 СТАТИСТИКА БАЗЫ ДАННЫХ")
     print("=" * 50)
     
+    # Счетчики читаем из content_stats (см. scripts/tools/content_stats.py)
+    if not content_stats.open_stats(conn):
+        conn.close()
+        return
+    
     # Общее количество
-    cursor.execute("SELECT COUNT(*) FROM content")
-    total = cursor.fetchone()[0]
+    total = content_stats.get_total(cursor)
     print(f"\n📚 ВСЕГО ЭЛЕМЕНТОВ: {total:,}")
     
     # По типам
     print("\n📋 По типам:")
-    cursor.execute("""
-        SELECT 
-            CASE type
-                WHEN 'book' THEN '📖 Книги'
-                WHEN 'movie' THEN '🎬 Фильмы'
-                WHEN 'music' THEN '🎵 Музыка'
-                ELSE type
-            END as type_name,
-            COUNT(*) as count
-        FROM content 
-        GROUP BY type
-        ORDER BY count DESC
-    """)
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]:,}")
+    for content_type, count in content_stats.get_by_type(cursor).items():
+        print(f"  {TYPE_NAMES.get(content_type, content_type)}: {count:,}")
     
     # Топ жанров
     print("\n🎭 Топ-5 жанров:")
-    cursor.execute("""
-        SELECT genre, COUNT(*) as count 
-        FROM content 
-        GROUP BY genre 
-        ORDER BY count DESC 
-        LIMIT 5
-    """)
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]:,}")
+    for genre, count in content_stats.get_bucket_counts(cursor, 'genre', limit=5):
+        print(f"  {genre}: {count:,}")
     
     # По эпохам
     print("\n📅 По эпохам:")
-    cursor.execute("""
-        SELECT epoch, COUNT(*) as count 
-        FROM content 
-        GROUP BY epoch 
-        ORDER BY count DESC
-        LIMIT 5
-    """)
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]:,}")
+    for epoch, count in content_stats.get_bucket_counts(cursor, 'epoch', limit=5):
+        print(f"  {epoch}: {count:,}")
     
     # Нужен AI
-    cursor.execute("SELECT COUNT(*) FROM content WHERE needs_ai = 1")
-    needs_ai = cursor.fetchone()[0]
+    needs_ai = content_stats.get_flag_count(cursor, 'needs_ai')
     print(f"\n⚡ Нужно AI-описаний: {needs_ai:,}")
     
     print("\n" + "=" * 50)
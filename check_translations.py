@@ -14,9 +14,13 @@
 
 import sqlite3
 import os
+import sys
 import argparse
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'tools'))
+import content_stats
+
 DB_PATH = 'content.db'
 
 class TranslationChecker:
@@ -35,7 +39,8 @@ class TranslationChecker:
             self.conn = sqlite3.connect(self.db_path)
             self.conn.row_factory = sqlite3.Row
             self.cursor = self.conn.cursor()
-            return True
+            # Покрытие переводами берем из content_stats
+            return content_stats.open_stats(self.conn)
         except Exception as e:
             print(f"❌ Ошибка подключения: {e}")
             return False
@@ -52,21 +57,16 @@ class TranslationChecker:
         print("="*70)
         
         # Общее количество
-        self.cursor.execute("SELECT COUNT(*) FROM content")
-        total = self.cursor.fetchone()[0]
+        total = content_stats.get_total(self.cursor)
         
         # Переводы по языкам
-        self.cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN description IS NOT NULL AND description != '' THEN 1 ELSE 0 END) as has_base,
-                SUM(CASE WHEN description_ru IS NOT NULL AND description_ru != '' THEN 1 ELSE 0 END) as has_ru,
-                SUM(CASE WHEN description_en IS NOT NULL AND description_en != '' THEN 1 ELSE 0 END) as has_en,
-                SUM(CASE WHEN description_kk IS NOT NULL AND description_kk != '' THEN 1 ELSE 0 END) as has_kk
-            FROM content
-        """)
-        
-        stats = self.cursor.fetchone()
+        stats = {
+            'total': total,
+            'has_base': content_stats.get_flag_count(self.cursor, 'has_description'),
+            'has_ru': content_stats.get_flag_count(self.cursor, 'has_ru'),
+            'has_en': content_stats.get_flag_count(self.cursor, 'has_en'),
+            'has_kk': content_stats.get_flag_count(self.cursor, 'has_kk')
+        }
         
         print(f"\n📊 Общая статистика:")
         print(f"  Всего записей: {total:,}")
@@ -102,30 +102,21 @@ class TranslationChecker:
         print("📚 СТАТИСТИКА ПО ТИПАМ КОНТЕНТА")
         print("="*70)
         
-        self.cursor.execute("""
-            SELECT 
-                type,
-                COUNT(*) as total,
-                SUM(CASE WHEN description_ru IS NOT NULL AND description_ru != '' THEN 1 ELSE 0 END) as has_ru,
-                SUM(CASE WHEN description_en IS NOT NULL AND description_en != '' THEN 1 ELSE 0 END) as has_en,
-                SUM(CASE WHEN description_kk IS NOT NULL AND description_kk != '' THEN 1 ELSE 0 END) as has_kk
-            FROM content
-            GROUP BY type
-        """)
+        has_ru = content_stats.get_flag_counts_by_type(self.cursor, 'has_ru')
+        has_en = content_stats.get_flag_counts_by_type(self.cursor, 'has_en')
+        has_kk = content_stats.get_flag_counts_by_type(self.cursor, 'has_kk')
         
         type_icons = {'book': '📖', 'movie': '🎬', 'music': '🎵'}
         
-        for row in self.cursor.fetchall():
-            type_name = row['type']
+        for type_name, total in sorted(content_stats.get_by_type(self.cursor).items()):
             icon = type_icons.get(type_name, '📄')
-            total = row['total']
             
             print(f"\n{icon} {type_name.upper()} (всего: {total:,})")
             
             langs = [
-                ('Русский', row['has_ru']),
-                ('Английский', row['has_en']),
-                ('Казахский', row['has_kk'])
+                ('Русский', has_ru.get(type_name, 0)),
+                ('Английский', has_en.get(type_name, 0)),
+                ('Казахский', has_kk.get(type_name, 0))
             ]
             
             for lang_name, count in langs:
@@ -230,23 +221,8 @@ class TranslationChecker:
         print("📈 ПРОГРЕСС ПЕРЕВОДОВ")
         print("="*70)
         
-        self.cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN description_ru IS NOT NULL AND description_ru != '' THEN 1 ELSE 0 END) as has_ru,
-                SUM(CASE WHEN description_en IS NOT NULL AND description_en != '' THEN 1 ELSE 0 END) as has_en,
-                SUM(CASE WHEN description_kk IS NOT NULL AND description_kk != '' THEN 1 ELSE 0 END) as has_kk,
-                SUM(CASE WHEN 
-                    (description_ru IS NOT NULL AND description_ru != '') AND
-                    (description_en IS NOT NULL AND description_en != '') AND
-                    (description_kk IS NOT NULL AND description_kk != '')
-                THEN 1 ELSE 0 END) as has_all
-            FROM content
-        """)
-        
-        stats = self.cursor.fetchone()
-        total = stats[0]
-        has_all = stats[4]
+        total = content_stats.get_total(self.cursor)
+        has_all = content_stats.get_flag_count(self.cursor, 'has_all_translations')
         
         percent_all = (has_all / total * 100) if total > 0 else 0
         
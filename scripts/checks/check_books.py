@@ -1,8 +1,14 @@
 # check_books.py
+import os
+import sys
 import sqlite3
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import content_stats
+
 conn = sqlite3.connect('content.db')
 cursor = conn.cursor()
+content_stats.open_stats(conn)
 
 cursor.execute('''
     SELECT title, creator, genre, year, criteria 
@@ -17,13 +23,7 @@ for row in cursor.fetchall():
     print(f"  {row[0][:50]} - {row[1][:30]} ({row[3]}) - [{row[4]}]")
 
 print("\n📊 Статистика по критериям:")
-cursor.execute('''
-    SELECT criteria, COUNT(*) 
-    FROM content 
-    WHERE type='book' 
-    GROUP BY criteria
-''')
-for row in cursor.fetchall():
-    print(f"  {row[0]}: {row[1]} книг")
+for criteria, count in content_stats.get_bucket_counts(cursor, 'criteria', 'book'):
+    print(f"  {criteria}: {count} книг")
 
 conn.close()
\ No newline at end of file
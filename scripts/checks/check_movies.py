@@ -1,8 +1,14 @@
 # check_movies.py (ОБНОВЛЁННАЯ ВЕРСИЯ)
+import os
+import sys
 import sqlite3
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import content_stats
+
 conn = sqlite3.connect('content.db')
 cursor = conn.cursor()
+content_stats.open_stats(conn)
 
 # Случайные фильмы
 cursor.execute('''
@@ -19,28 +25,12 @@ for row in cursor.fetchall():
 
 # Статистика по критериям
 print("\n📊 Статистика по критериям:")
-cursor.execute('''
-    SELECT criteria, COUNT(*) 
-    FROM content 
-    WHERE type='movie' 
-    GROUP BY criteria
-    ORDER BY COUNT(*) DESC
-''')
-
-for row in cursor.fetchall():
-    print(f"  {row[0]}: {row[1]} фильмов")
+for criteria, count in content_stats.get_bucket_counts(cursor, 'criteria', 'movie'):
+    print(f"  {criteria}: {count} фильмов")
 
 # Статистика по эпохам
 print("\n📅 Статистика по эпохам:")
-cursor.execute('''
-    SELECT epoch, COUNT(*) 
-    FROM content 
-    WHERE type='movie' 
-    GROUP BY epoch
-    ORDER BY epoch DESC
-''')
-
-for row in cursor.fetchall():
-    print(f"  {row[0]}: {row[1]} фильмов")
+for epoch, count in sorted(content_stats.get_bucket_counts(cursor, 'epoch', 'movie'), reverse=True):
+    print(f"  {epoch}: {count} фильмов")
 
 conn.close()
\ No newline at end of file
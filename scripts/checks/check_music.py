@@ -1,8 +1,14 @@
 # check_music.py
+import os
+import sys
 import sqlite3
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import content_stats
+
 conn = sqlite3.connect('content.db')
 cursor = conn.cursor()
+content_stats.open_stats(conn)
 
 # Случайные 10 треков
 cursor.execute('''
@@ -19,68 +25,34 @@ for row in cursor.fetchall():
 
 # По жанрам
 print("\n🎸 По жанрам:")
-cursor.execute('''
-    SELECT genre, COUNT(*) 
-    FROM content 
-    WHERE type='music' 
-    GROUP BY genre
-    ORDER BY COUNT(*) DESC
-''')
-for row in cursor.fetchall():
-    print(f"  {row[0]}: {row[1]} треков")
+for genre, count in content_stats.get_bucket_counts(cursor, 'genre', 'music'):
+    print(f"  {genre}: {count} треков")
 
 # По mood
 print("\n🎭 По настроениям:")
-cursor.execute('''
-    SELECT mood, COUNT(*) 
-    FROM content 
-    WHERE type='music' 
-    GROUP BY mood
-    ORDER BY COUNT(*) DESC
-''')
-for row in cursor.fetchall():
-    print(f"  {row[0]}: {row[1]} треков")
+for mood, count in content_stats.get_bucket_counts(cursor, 'mood', 'music'):
+    print(f"  {mood}: {count} треков")
 
 # По критериям
 print("\n📊 По критериям:")
-cursor.execute('''
-    SELECT criteria, COUNT(*) 
-    FROM content 
-    WHERE type='music' 
-    GROUP BY criteria
-    ORDER BY COUNT(*) DESC
-''')
-for row in cursor.fetchall():
-    print(f"  {row[0]}: {row[1]} треков")
+for criteria, count in content_stats.get_bucket_counts(cursor, 'criteria', 'music'):
+    print(f"  {criteria}: {count} треков")
 
 # По эпохам
 print("\n📅 По эпохам:")
-cursor.execute('''
-    SELECT epoch, COUNT(*) 
-    FROM content 
-    WHERE type='music' 
-    GROUP BY epoch
-    ORDER BY epoch DESC
-''')
-for row in cursor.fetchall():
-    print(f"  {row[0]}: {row[1]} треков")
+for epoch, count in sorted(content_stats.get_bucket_counts(cursor, 'epoch', 'music'), reverse=True):
+    print(f"  {epoch}: {count} треков")
 
 # Итоговая статистика по всему контенту
 print("\n" + "="*50)
 print("📊 ИТОГОВАЯ СТАТИСТИКА БАЗЫ ДАННЫХ")
 print("="*50)
 
-cursor.execute('''
-    SELECT type, COUNT(*) 
-    FROM content 
-    GROUP BY type
-''')
 print("\n📦 По типам контента:")
-for row in cursor.fetchall():
-    print(f"  {row[0]}: {row[1]} элементов")
+for content_type, count in content_stats.get_by_type(cursor).items():
+    print(f"  {content_type}: {count} элементов")
 
-cursor.execute('SELECT COUNT(*) FROM content')
-total = cursor.fetchone()[0]
+total = content_stats.get_total(cursor)
 print(f"\n🎉 ВСЕГО В БАЗЕ: {total} элементов контента!")
 
 conn.close()
\ No newline at end of file
@@ -1,10 +1,18 @@
 # harvest_books.py (УПРОЩЁННАЯ ВЕРСИЯ v1.0)
 import sqlite3
+import argparse
 import requests
 from time import sleep
 from dotenv import load_dotenv
 import os
 import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import facet_dictionary
+import fts_index
+import harvest_profiler
+import staging_db
 
 load_dotenv()
 
@@ -89,6 +97,10 @@ def is_duplicate(cursor, title, authors):
     if not first_author:
         return False
     
+    # С полнотекстовым индексом - поиск фраз вместо сканирования LIKE
+    if fts_index.is_installed(cursor):
+        return fts_index.has_match(cursor, 'book', title, first_author)
+    
     cursor.execute('''
         SELECT COUNT(*) FROM content 
         WHERE type='book' 
@@ -177,24 +189,21 @@ def save_book(cursor, item, genre_name):
     needs_ai = 1
     
     try:
-        cursor.execute('''
-            INSERT INTO content 
-            (type, title, creator, description, image_url, year, rating, genre, epoch, criteria, source_id, needs_ai)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            "book",
-            title,
-            authors,
-            description[:500],  # Обрезаем длинные описания
-            image_url,
-            year,
-            rating,
-            genre_name,
-            get_book_epoch(year),
-            criteria,
-            f"gb_{item['id']}",
-            needs_ai
-        ))
+        # Фасеты (genre, epoch, criteria) - через словари, если БД на кодах
+        facet_dictionary.insert_content(cursor, {
+            "type": "book",
+            "title": title,
+            "creator": authors,
+            "description": description[:500],  # Обрезаем длинные описания
+            "image_url": image_url,
+            "year": year,
+            "rating": rating,
+            "genre": genre_name,
+            "epoch": get_book_epoch(year),
+            "criteria": criteria,
+            "source_id": f"gb_{item['id']}",
+            "needs_ai": needs_ai
+        })
         return True
     except Exception as e:
         return False
@@ -202,86 +211,115 @@ def save_book(cursor, item, genre_name):
 def harvest():
     print("📚 Начинаю сбор книг (упрощённые критерии)...\n")
     
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # Сборка в копии content.db - API читает прежний каталог до публикации
+    build = staging_db.StagingBuild(DB_PATH, 'book')
+    conn = build.open()
+    try:
+        cursor = conn.cursor()
     
-    # Очищаем старые книги
-    cursor.execute("DELETE FROM content WHERE type='book'")
-    conn.commit()
-    print("🗑️ Старые книги удалены\n")
+        # Очищаем старые книги
+        cursor.execute(f"DELETE FROM {facet_dictionary.content_table(cursor)} WHERE type='book'")
+        conn.commit()
+        print("🗑️ Старые книги удалены\n")
     
-    total_saved = 0
+        total_saved = 0
     
-    for genre_name, api_query in BOOK_GENRES.items():
-        print(f"📖 Жанр: {genre_name}")
-        genre_count = 0
+        for genre_name, api_query in BOOK_GENRES.items():
+            print(f"📖 Жанр: {genre_name}")
+            genre_count = 0
         
-        for page in range(5):
-            books = fetch_books(api_query, max_results=40, start_index=page*40)
+            for page in range(5):
+                books = fetch_books(api_query, max_results=40, start_index=page*40)
             
-            if not books:
-                break
+                if not books:
+                    break
             
-            saved_count = 0
-            for book in books:
-                if save_book(cursor, book, genre_name):
-                    saved_count += 1
+                saved_count = 0
+                for book in books:
+                    if save_book(cursor, book, genre_name):
+                        saved_count += 1
             
-            conn.commit()
-            total_saved += saved_count
-            genre_count += saved_count
+                conn.commit()
+                total_saved += saved_count
+                genre_count += saved_count
             
-            print(f"  Страница {page+1}: +{saved_count} книг")
+                print(f"  Страница {page+1}: +{saved_count} книг")
             
-            sleep(1)
+                sleep(1)
             
-            # Лимит 100 на жанр
-            if genre_count >= 100:
-                break
+                # Лимит 100 на жанр
+                if genre_count >= 100:
+                    break
         
-        print(f"  ✅ Итого: {genre_count} книг\n")
-    
-    conn.close()
-    print(f"\n🎉 Готово! Сохранено: {total_saved} книг")
-    
-    # Статистика
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    print("\n📚 По жанрам:")
-    cursor.execute('''
-        SELECT genre, COUNT(*) 
-        FROM content 
-        WHERE type='book' 
-        GROUP BY genre
-        ORDER BY COUNT(*) DESC
-    ''')
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]} книг")
+            print(f"  ✅ Итого: {genre_count} книг\n")
     
-    print("\n📊 По критериям:")
-    cursor.execute('''
-        SELECT criteria, COUNT(*) 
-        FROM content 
-        WHERE type='book' 
-        GROUP BY criteria
-        ORDER BY COUNT(*) DESC
-    ''')
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]} книг")
+        print(f"\n🎉 Готово! Сохранено: {total_saved} книг")
     
-    print("\n📅 По эпохам:")
-    cursor.execute('''
-        SELECT epoch, COUNT(*) 
-        FROM content 
-        WHERE type='book' 
-        GROUP BY epoch
-        ORDER BY epoch DESC
-    ''')
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]} книг")
+        # Статистика
     
-    conn.close()
+        print("\n📚 По жанрам:")
+        cursor.execute('''
+            SELECT genre, COUNT(*) 
+            FROM content 
+            WHERE type='book' 
+            GROUP BY genre
+            ORDER BY COUNT(*) DESC
+        ''')
+        for row in cursor.fetchall():
+            print(f"  {row[0]}: {row[1]} книг")
+    
+        print("\n📊 По критериям:")
+        cursor.execute('''
+            SELECT criteria, COUNT(*) 
+            FROM content 
+            WHERE type='book' 
+            GROUP BY criteria
+            ORDER BY COUNT(*) DESC
+        ''')
+        for row in cursor.fetchall():
+            print(f"  {row[0]}: {row[1]} книг")
+    
+        print("\n📅 По эпохам:")
+        cursor.execute('''
+            SELECT epoch, COUNT(*) 
+            FROM content 
+            WHERE type='book' 
+            GROUP BY epoch
+            ORDER BY epoch DESC
+        ''')
+        for row in cursor.fetchall():
+            print(f"  {row[0]}: {row[1]} книг")
+    except BaseException:
+        # Сбой API, Ctrl-C: без копии - иначе build_in_progress() до --discard
+        # останавливает rand_keys, recommend_pools, similarity_index и image_cache
+        build.discard()
+        raise
+    
+    # Дубликаты, проверки и атомарная публикация
+    if not build.finish():
+        print("⚠️ Каталог не опубликован - рабочая база не изменилась")
 
 if __name__ == "__main__":
-    harvest()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description='📚 Сбор книг из Google Books',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python harvest_books.py
+  python harvest_books.py --profile
+  python harvest_books.py --profile --profile-cprofile books.prof --profile-sample books.folded
+        """
+    )
+    harvest_profiler.add_arguments(parser)
+    args = parser.parse_args()
+    
+    profiler = harvest_profiler.from_args('harvest_books', args)
+    if profiler:
+        profiler.instrument(sys.modules[__name__], {
+            'get_book_criteria': 'classify',
+            'get_book_epoch': 'classify',
+            'is_duplicate': 'duplicate_check',
+        })
+        profiler.run(harvest)
+    else:
+        harvest()
\ No newline at end of file
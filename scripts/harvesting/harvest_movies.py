@@ -1,15 +1,27 @@
 # harvest_movies.py (ФИНАЛЬНАЯ ВЕРСИЯ С ДЕТАЛЯМИ)
 import sqlite3
+import argparse
 import requests
 from time import sleep
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import batch_metrics
+import facet_dictionary
+import harvest_profiler
+import staging_db
 
 load_dotenv()
 
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
 DB_PATH = 'content.db'
 
+# Страниц discover на жанр (по 20 фильмов) - больше слишком долго
+PAGES_PER_GENRE = 3
+MOVIES_PER_PAGE = 20
+
 GENRE_MAP = {
     28: "action",
     12: "adventure",
@@ -152,69 +164,114 @@ def save_movie(cursor, movie):
     criteria = get_criteria(rating, vote_count, popularity, year, genre_ids)
     
     try:
-        cursor.execute('''
-            INSERT OR IGNORE INTO content 
-            (type, title, description, image_url, year, rating, genre, epoch, criteria, source_id, needs_ai, creator)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            "movie",
-            details["title"],
-            description,
-            image_url,
-            year,
-            rating,
-            genre,
-            get_epoch(year),
-            criteria,
-            f"tmdb_{details['id']}",
-            needs_ai,
-            "TMDb"
-        ))
+        # Фасеты (genre, epoch, criteria) - через словари, если БД на кодах
+        facet_dictionary.insert_content(cursor, {
+            "type": "movie",
+            "title": details["title"],
+            "description": description,
+            "image_url": image_url,
+            "year": year,
+            "rating": rating,
+            "genre": genre,
+            "epoch": get_epoch(year),
+            "criteria": criteria,
+            "source_id": f"tmdb_{details['id']}",
+            "needs_ai": needs_ai,
+            "creator": "TMDb"
+        }, or_ignore=True)
         return True
     except Exception as e:
         print(f"  ⚠️ Ошибка БД: {e}")
         return False
 
-def harvest():
+def harvest(metrics=None):
+    """metrics - batch_metrics.BatchMetrics (--quiet, --metrics); по умолчанию подробный вывод"""
+    if metrics is None:
+        metrics = batch_metrics.BatchMetrics('harvest_movies')
+    # Оценка сверху: страниц может оказаться меньше
+    metrics.total = len(GENRE_MAP) * PAGES_PER_GENRE * MOVIES_PER_PAGE
+    
     print("🎬 Начинаю сбор фильмов (с детальной информацией)...\n")
     print("⚠️ ВНИМАНИЕ: Это займёт больше времени из-за запроса деталей каждого фильма\n")
     
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # Сборка в копии content.db - API читает прежний каталог до публикации
+    build = staging_db.StagingBuild(DB_PATH, 'movie')
+    conn = build.open()
+    try:
+        cursor = conn.cursor()
     
-    total_saved = 0
+        total_saved = 0
     
-    for genre_id, genre_name in GENRE_MAP.items():
-        print(f"📂 Жанр: {genre_name}")
+        for genre_id, genre_name in GENRE_MAP.items():
+            metrics.log(f"📂 Жанр: {genre_name}")
         
-        # Уменьшаем до 3 страниц, чтобы не было слишком долго
-        for page in range(1, 4):
-            movies = fetch_movies(genre_id, page)
-            if not movies:
-                break
+            for page in range(1, PAGES_PER_GENRE + 1):
+                with metrics.stage('discover'):
+                    movies = fetch_movies(genre_id, page)
+                if not movies:
+                    break
             
-            saved_count = 0
-            for i, movie in enumerate(movies, 1):
-                print(f"  [{i}/{len(movies)}] {movie['title'][:40]}...", end=" ")
+                saved_count = 0
+                for i, movie in enumerate(movies, 1):
+                    metrics.log(f"  [{i}/{len(movies)}] {movie['title'][:40]}...", end=" ")
                 
-                if save_movie(cursor, movie):
-                    saved_count += 1
-                    print("✅")
-                else:
-                    print("⏭️")
+                    with metrics.stage('save_movie'):
+                        saved = save_movie(cursor, movie)
+                    if saved:
+                        saved_count += 1
+                        metrics.item('saved')
+                        metrics.log("✅")
+                    else:
+                        metrics.item('skipped')
+                        metrics.log("⏭️")
             
-            conn.commit()
-            total_saved += saved_count
-            print(f"  Страница {page}: сохранено {saved_count}/{len(movies)}")
-            sleep(0.5)
+                with metrics.stage('commit'):
+                    conn.commit()
+                total_saved += saved_count
+                metrics.log(f"  Страница {page}: сохранено {saved_count}/{len(movies)}")
+                sleep(0.5)
         
-        print()
+            metrics.log()
+    
+        print(f"\n🎉 Сбор окончен! Всего сохранено: {total_saved}")
+    except BaseException:
+        # Сбой API, Ctrl-C: без копии - иначе build_in_progress() до --discard
+        # останавливает rand_keys, recommend_pools, similarity_index и image_cache
+        build.discard()
+        raise
     
-    conn.close()
-    print(f"\n🎉 Сбор окончен! Всего сохранено: {total_saved}")
+    # Дубликаты, проверки и атомарная публикация
+    with metrics.stage('publish'):
+        published = build.finish()
+    if not published:
+        print("⚠️ Каталог не опубликован - рабочая база не изменилась")
+    metrics.close(published=published)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='🎬 Сбор фильмов из TMDb',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python harvest_movies.py
+  python harvest_movies.py --quiet --metrics harvest_movies.jsonl
+  python harvest_movies.py --quiet --profile --profile-sample movies.folded
+        """
+    )
+    batch_metrics.add_arguments(parser)
+    harvest_profiler.add_arguments(parser)
+    args = parser.parse_args()
+    
     if not TMDB_API_KEY:
         print("❌ Нет ключа TMDB_API_KEY в .env")
     else:
-        harvest()
\ No newline at end of file
+        metrics = batch_metrics.from_args('harvest_movies', args)
+        profiler = harvest_profiler.from_args('harvest_movies', args)
+        if profiler:
+            profiler.instrument(sys.modules[__name__], {
+                'get_criteria': 'classify',
+                'get_epoch': 'classify',
+            })
+            profiler.run(harvest, metrics)
+        else:
+            harvest(metrics)
\ No newline at end of file
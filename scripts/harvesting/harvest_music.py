@@ -1,11 +1,18 @@
 # harvest_music.py
 import sqlite3
+import argparse
 import requests
 from time import sleep
 from dotenv import load_dotenv
 import os
+import sys
 import base64
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import facet_dictionary
+import harvest_profiler
+import staging_db
+
 load_dotenv()
 
 DB_PATH = 'content.db'
@@ -202,25 +209,22 @@ def save_track(cursor, track, genre_name, token):
         criteria = "underground"
     
     try:
-        cursor.execute('''
-            INSERT OR IGNORE INTO content 
-            (type, title, creator, description, image_url, year, rating, genre, epoch, mood, criteria, source_id, needs_ai)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            "music",
-            title,
-            artists,
-            duration,
-            image_url,
-            year,
-            popularity / 10,
-            genre_name,
-            get_track_epoch(year),
-            mood,
-            criteria,
-            f"spotify_{track_id}",
-            0
-        ))
+        # Фасеты (genre, epoch, mood, criteria) - через словари, если БД на кодах
+        facet_dictionary.insert_content(cursor, {
+            "type": "music",
+            "title": title,
+            "creator": artists,
+            "description": duration,
+            "image_url": image_url,
+            "year": year,
+            "rating": popularity / 10,
+            "genre": genre_name,
+            "epoch": get_track_epoch(year),
+            "mood": mood,
+            "criteria": criteria,
+            "source_id": f"spotify_{track_id}",
+            "needs_ai": 0
+        }, or_ignore=True)
         return True
     except Exception as e:
         return False
@@ -236,97 +240,126 @@ def harvest():
     
     print("✅ Токен получен\n")
     
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # Сборка в копии content.db - API читает прежний каталог до публикации
+    build = staging_db.StagingBuild(DB_PATH, 'music')
+    conn = build.open()
+    try:
+        cursor = conn.cursor()
     
-    # Очищаем старую музыку
-    cursor.execute("DELETE FROM content WHERE type='music'")
-    conn.commit()
-    print("🗑️ Старая музыка удалена\n")
+        # Очищаем старую музыку
+        cursor.execute(f"DELETE FROM {facet_dictionary.content_table(cursor)} WHERE type='music'")
+        conn.commit()
+        print("🗑️ Старая музыка удалена\n")
     
-    total_saved = 0
+        total_saved = 0
     
-    for genre in MUSIC_GENRES:
-        print(f"🎸 Жанр: {genre}")
-        genre_count = 0
+        for genre in MUSIC_GENRES:
+            print(f"🎸 Жанр: {genre}")
+            genre_count = 0
         
-        # 3 пачки по 50 треков = 150 на жанр
-        for batch in range(3):
-            tracks = fetch_tracks(token, genre, limit=50, offset=batch*50)
+            # 3 пачки по 50 треков = 150 на жанр
+            for batch in range(3):
+                tracks = fetch_tracks(token, genre, limit=50, offset=batch*50)
             
-            if not tracks:
-                break
+                if not tracks:
+                    break
             
-            saved_count = 0
-            for track in tracks:
-                if save_track(cursor, track, genre, token):
-                    saved_count += 1
+                saved_count = 0
+                for track in tracks:
+                    if save_track(cursor, track, genre, token):
+                        saved_count += 1
                 
-                sleep(0.05)  # Небольшая пауза (audio features запрос)
+                    sleep(0.05)  # Небольшая пауза (audio features запрос)
             
-            conn.commit()
-            total_saved += saved_count
-            genre_count += saved_count
+                conn.commit()
+                total_saved += saved_count
+                genre_count += saved_count
             
-            print(f"  Пачка {batch+1}: +{saved_count} треков")
+                print(f"  Пачка {batch+1}: +{saved_count} треков")
             
-            sleep(1)
+                sleep(1)
             
-            # Лимит 100 на жанр
-            if genre_count >= 100:
-                break
+                # Лимит 100 на жанр
+                if genre_count >= 100:
+                    break
         
-        print(f"  ✅ Итого: {genre_count} треков\n")
-    
-    conn.close()
-    print(f"\n🎉 Готово! Сохранено: {total_saved} треков")
-    
-    # Статистика
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    print("\n🎸 По жанрам:")
-    cursor.execute('''
-        SELECT genre, COUNT(*) 
-        FROM content 
-        WHERE type='music' 
-        GROUP BY genre
-        ORDER BY COUNT(*) DESC
-    ''')
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]} треков")
-    
-    print("\n🎭 По настроениям (MOOD):")
-    cursor.execute('''
-        SELECT mood, COUNT(*) 
-        FROM content 
-        WHERE type='music' 
-        GROUP BY mood
-        ORDER BY COUNT(*) DESC
-    ''')
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]} треков")
-    
-    print("\n📊 По критериям:")
-    cursor.execute('''
-        SELECT criteria, COUNT(*) 
-        FROM content 
-        WHERE type='music' 
-        GROUP BY criteria
-        ORDER BY COUNT(*) DESC
-    ''')
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]} треков")
-    
-    conn.close()
+            print(f"  ✅ Итого: {genre_count} треков\n")
+    
+        print(f"\n🎉 Готово! Сохранено: {total_saved} треков")
+    
+        # Статистика
+    
+        print("\n🎸 По жанрам:")
+        cursor.execute('''
+            SELECT genre, COUNT(*) 
+            FROM content 
+            WHERE type='music' 
+            GROUP BY genre
+            ORDER BY COUNT(*) DESC
+        ''')
+        for row in cursor.fetchall():
+            print(f"  {row[0]}: {row[1]} треков")
+    
+        print("\n🎭 По настроениям (MOOD):")
+        cursor.execute('''
+            SELECT mood, COUNT(*) 
+            FROM content 
+            WHERE type='music' 
+            GROUP BY mood
+            ORDER BY COUNT(*) DESC
+        ''')
+        for row in cursor.fetchall():
+            print(f"  {row[0]}: {row[1]} треков")
+    
+        print("\n📊 По критериям:")
+        cursor.execute('''
+            SELECT criteria, COUNT(*) 
+            FROM content 
+            WHERE type='music' 
+            GROUP BY criteria
+            ORDER BY COUNT(*) DESC
+        ''')
+        for row in cursor.fetchall():
+            print(f"  {row[0]}: {row[1]} треков")
+    except BaseException:
+        # Сбой API, Ctrl-C: без копии - иначе build_in_progress() до --discard
+        # останавливает rand_keys, recommend_pools, similarity_index и image_cache
+        build.discard()
+        raise
+    
+    # Дубликаты, проверки и атомарная публикация
+    if not build.finish():
+        print("⚠️ Каталог не опубликован - рабочая база не изменилась")
 
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='🎵 Сбор музыки из Spotify',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python harvest_music.py
+  python harvest_music.py --profile
+  python harvest_music.py --profile --profile-cprofile music.prof --profile-sample music.folded
+        """
+    )
+    harvest_profiler.add_arguments(parser)
+    args = parser.parse_args()
+    
     if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
         print("❌ Нет Spotify credentials в .env")
         print("Добавь:")
         print("SPOTIFY_CLIENT_ID=...")
         print("SPOTIFY_CLIENT_SECRET=...")
     else:
-        harvest()
+        profiler = harvest_profiler.from_args('harvest_music', args)
+        if profiler:
+            profiler.instrument(sys.modules[__name__], {
+                'get_mood_from_features': 'classify',
+                'get_mood_from_genre': 'classify',
+                'get_track_epoch': 'classify',
+            })
+            profiler.run(harvest)
+        else:
+            harvest()
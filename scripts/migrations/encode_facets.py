@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+🗂️ ENCODE FACETS - Миграция genre / epoch / mood / criteria на целые коды
+
+Назначение:
+- Значения фасетов переносятся в словари facet_* (частые значения
+  получают меньшие коды)
+- Записи копируются в content_items: те же колонки, но вместо текста
+  genre_id / epoch_id / mood_id / criteria_id
+- content заменяется представлением с расшифрованными значениями
+  и триггерами INSTEAD OF - старые читатели и писатели не меняются
+- Индексы по кодам, перенос прочих индексов content, переустановка
+  content_stats / fts_index / rand_keys, если они были установлены
+
+Все изменения схемы - одна транзакция: при ошибке база остается прежней.
+Перед запуском создается backup (как в остальных миграциях).
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import shutil
+import os
+import re
+import time
+import argparse
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import content_stats
+import facet_dictionary
+import fts_index
+import rand_keys
+import sql_trace
+from facet_dictionary import FACET_TABLES, ITEMS_TABLE, VIEW_NAME, code_column
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+BACKUP_DIR = 'backups'
+
+# ==================== МИГРАЦИЯ ====================
+
+class FacetEncoder:
+    """Перенос content в content_items со словарями"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+    def get_columns(self) -> List[tuple]:
+        """(имя, тип, not null, default, pk) колонок content"""
+        self.cursor.execute(f"PRAGMA table_info({VIEW_NAME})")
+        return [(row[1], row[2], row[3], row[4], row[5]) for row in self.cursor.fetchall()]
+
+    def get_unique_constraints(self) -> List[List[str]]:
+        """Колонки UNIQUE-ограничений (origin 'u'), например source_id"""
+        self.cursor.execute(f"PRAGMA index_list({VIEW_NAME})")
+        constraints = []
+        for row in self.cursor.fetchall():
+            if row[3] != 'u':
+                continue
+            self.cursor.execute(f"PRAGMA index_info('{row[1]}')")
+            constraints.append([info[2] for info in self.cursor.fetchall()])
+        return constraints
+
+    def get_user_indexes(self) -> List[tuple]:
+        """Индексы, созданные поверх content (index_advisor, rand_keys, ...)"""
+        self.cursor.execute("""
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+        """, (VIEW_NAME,))
+        return self.cursor.fetchall()
+
+    def preview(self) -> Dict:
+        """Размеры будущих словарей и число записей"""
+        self.cursor.execute(f"SELECT COUNT(*) FROM {VIEW_NAME}")
+        total = self.cursor.fetchone()[0]
+        columns = {row[0] for row in self.get_columns()}
+
+        values = {}
+        for facet in FACET_TABLES:
+            if facet not in columns:
+                values[facet] = 0
+                continue
+            self.cursor.execute(f"""
+                SELECT COUNT(DISTINCT LOWER({facet})) FROM {VIEW_NAME} WHERE {facet} IS NOT NULL
+            """)
+            values[facet] = self.cursor.fetchone()[0]
+        return {'total': total, 'values': values}
+
+    def build_items_table(self, columns: List[tuple], autoincrement: bool):
+        definitions = []
+        for name, col_type, notnull, default, pk in columns:
+            if name in FACET_TABLES:
+                definitions.append(
+                    f"{code_column(name)} INTEGER REFERENCES {FACET_TABLES[name]}(id)"
+                )
+                continue
+            definition = f"{name} {col_type}".strip()
+            if pk:
+                definition += " PRIMARY KEY" + (" AUTOINCREMENT" if autoincrement else "")
+            if notnull:
+                definition += " NOT NULL"
+            if default is not None:
+                definition += f" DEFAULT {default}"
+            definitions.append(definition)
+
+        for unique_columns in self.get_unique_constraints():
+            definitions.append(f"UNIQUE ({', '.join(unique_columns)})")
+
+        self.cursor.execute(f"""
+            CREATE TABLE {ITEMS_TABLE} (
+                {(',' + chr(10) + '                ').join(definitions)}
+            )
+        """)
+
+    def migrate(self) -> Dict:
+        """Схема целиком в одной транзакции"""
+        cursor = self.cursor
+        # DDL в sqlite3 не открывает транзакцию сам - открываем явно
+        cursor.execute("BEGIN")
+        content_stats.ensure_translation_columns(cursor)
+
+        columns = self.get_columns()
+        column_names = [row[0] for row in columns]
+        facets = [facet for facet in FACET_TABLES if facet in column_names]
+
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (VIEW_NAME,))
+        autoincrement = 'AUTOINCREMENT' in (cursor.fetchone()[0] or '').upper()
+        user_indexes = self.get_user_indexes()
+
+        # Словари: сначала самые частые значения - у них короткие коды
+        facet_dictionary.ensure_dictionaries(cursor)
+        for facet in facets:
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO {FACET_TABLES[facet]} (value)
+                SELECT {facet} FROM {VIEW_NAME}
+                WHERE {facet} IS NOT NULL
+                GROUP BY {facet}
+                ORDER BY COUNT(*) DESC
+            """)
+
+        self.build_items_table(columns, autoincrement)
+
+        target = [code_column(name) if name in FACET_TABLES else name for name in column_names]
+        source = [
+            f"(SELECT id FROM {FACET_TABLES[name]} WHERE value = {VIEW_NAME}.{name})"
+            if name in FACET_TABLES else name
+            for name in column_names
+        ]
+        cursor.execute(f"""
+            INSERT INTO {ITEMS_TABLE} ({', '.join(target)})
+            SELECT {', '.join(source)} FROM {VIEW_NAME}
+        """)
+        migrated = cursor.rowcount
+
+        if autoincrement:
+            # Удаленные id не должны выдаваться повторно
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (ITEMS_TABLE,))
+            cursor.execute("UPDATE sqlite_sequence SET name = ? WHERE name = ?", (ITEMS_TABLE, VIEW_NAME))
+
+        # Таблица уходит вместе со своими триггерами и индексами
+        cursor.execute(f"DROP TABLE {VIEW_NAME}")
+        facet_dictionary.create_view(cursor)
+
+        for name, definition in facet_dictionary.FACET_INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+
+        # Прочие индексы - на content_items; индексы по тексту фасетов заменены кодами
+        moved, skipped = [], []
+        facet_re = re.compile(r'\b(' + '|'.join(FACET_TABLES) + r')\b')
+        for name, sql in user_indexes:
+            definition = sql[sql.upper().index(' ON ') + 4:]
+            if facet_re.search(definition) or name in facet_dictionary.FACET_INDEXES:
+                skipped.append(name)
+                continue
+            definition = re.sub(rf'^\s*{VIEW_NAME}\s*\(', f'{ITEMS_TABLE}(', definition)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+            moved.append(name)
+
+        self.conn.commit()
+        return {'migrated': migrated, 'moved_indexes': moved, 'skipped_indexes': skipped}
+
+    def reinstall(self, installed: Dict[str, bool]) -> List[str]:
+        """Триггеры модулей жили на старой таблице - ставим их на content_items"""
+        reinstalled = []
+        if installed['content_stats'] and content_stats.install(self.conn):
+            reinstalled.append('content_stats')
+        if installed['fts_index'] and fts_index.install(self.conn):
+            reinstalled.append('fts_index')
+        if installed['rand_keys'] and rand_keys.install(self.conn):
+            reinstalled.append('rand_keys')
+        self.cursor.execute("ANALYZE")
+        self.conn.commit()
+        return reinstalled
+
+
+def create_backup(db_path: str) -> Optional[str]:
+    """Резервная копия базы (как в остальных миграциях)"""
+    try:
+        if not os.path.exists(BACKUP_DIR):
+            os.makedirs(BACKUP_DIR)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_path = os.path.join(BACKUP_DIR, f'content_backup_{timestamp}.db')
+        shutil.copy2(db_path, backup_path)
+        print(f"✅ Backup создан: {backup_path}")
+        return backup_path
+    except Exception as e:
+        print(f"❌ Ошибка создания backup: {e}")
+        return None
+
+
+def get_db_size(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🗂️ Миграция фасетов на словари и целые коды',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python encode_facets.py --dry-run             # Размеры словарей, без изменений
+  python encode_facets.py                       # Миграция с backup и подтверждением
+  python encode_facets.py --yes --vacuum        # Без вопросов, затем VACUUM
+
+После миграции перезапустите API (pm2 restart coffee-books-api),
+чтобы recommend_db.js перешел на фильтры по кодам.
+        """
+    )
+
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Только показать, что будет сделано')
+    parser.add_argument('--yes', action='store_true',
+                        help='Не спрашивать подтверждение')
+    parser.add_argument('--no-backup', action='store_true',
+                        help='Не создавать резервную копию')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='VACUUM после миграции (вернуть место старой таблицы)')
+    parser.add_argument('--db', default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        encoder = FacetEncoder(conn)
+        cursor = encoder.cursor
+
+        print("\n" + "=" * 70)
+        print("🗂️ ENCODE FACETS".center(70))
+        print("=" * 70)
+
+        if facet_dictionary.is_encoded(cursor):
+            print("\n✅ Миграция уже выполнена")
+            facet_dictionary.print_status(cursor)
+            return
+
+        preview = encoder.preview()
+        print(f"\n📚 Записей: {preview['total']:,}")
+        print("📂 Значений в словарях:")
+        for facet, count in preview['values'].items():
+            print(f"  {facet:10} {count:,} → {FACET_TABLES[facet]}")
+        user_indexes = encoder.get_user_indexes()
+        if user_indexes:
+            print(f"🧭 Индексов content для переноса: {len(user_indexes)}")
+
+        if args.dry_run:
+            print("\n⚠️ DRY RUN режим - изменения НЕ применены")
+            return
+
+        if not args.yes:
+            response = input("\n❓ Продолжить? (yes/no): ").strip().lower()
+            if response not in ['yes', 'y', 'да', 'д']:
+                print("\n❌ Операция отменена пользователем")
+                return
+
+        if not args.no_backup:
+            print("\n💾 Создание резервной копии...")
+            if not create_backup(args.db):
+                print("❌ Не удалось создать backup. Операция отменена.")
+                sys.exit(1)
+
+        installed = {
+            'content_stats': content_stats.is_installed(cursor),
+            'fts_index': fts_index.is_installed(cursor),
+            'rand_keys': rand_keys.is_installed(cursor),
+        }
+        size_before = get_db_size(conn)
+
+        print("\n🧹 Миграция...")
+        started = time.time()
+        try:
+            result = encoder.migrate()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"❌ Ошибка миграции, изменения отменены: {e}")
+            sys.exit(1)
+        print(f"✅ Перенесено записей: {result['migrated']:,} за {time.time() - started:.1f}с")
+        if result['moved_indexes']:
+            print(f"🧭 Индексы перенесены: {', '.join(result['moved_indexes'])}")
+        if result['skipped_indexes']:
+            print(f"🧭 Заменены индексами по кодам: {', '.join(result['skipped_indexes'])}")
+
+        reinstalled = encoder.reinstall(installed)
+        if reinstalled:
+            print(f"🔧 Переустановлено: {', '.join(reinstalled)}")
+
+        if args.vacuum:
+            print("\n🧽 VACUUM...")
+            conn.execute("VACUUM")
+            size_after = get_db_size(conn)
+            print(f"💾 Размер БД: {size_before / 1024 / 1024:.1f} MB → {size_after / 1024 / 1024:.1f} MB")
+
+        facet_dictionary.print_status(cursor)
+
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -15,11 +15,17 @@
 import sqlite3
 import shutil
 import os
+import sys
 import json
 from datetime import datetime
 from typing import List, Dict, Tuple
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+
+import facet_dictionary
+import sql_trace
+
 # ==================== КОНСТАНТЫ ====================
 
 DB_PATH = 'content.db'
@@ -48,6 +54,7 @@ class DuplicateFixer:
         self.report_path = None
         self.conn = None
         self.cursor = None
+        self.table = 'content'
         self.duplicates = []
         self.deleted_records = []
         self.stats = {
@@ -79,9 +86,12 @@ class DuplicateFixer:
     def connect(self) -> bool:
         """Подключение к базе данных"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sql_trace.connect(self.db_path)
             self.conn.row_factory = sqlite3.Row
             self.cursor = self.conn.cursor()
+            # Группировка и удаление - по физической таблице (после encode_facets.py
+            # content - view), полные записи читаем через view с текстом фасетов
+            self.table = facet_dictionary.content_table(self.cursor)
             return True
         except sqlite3.Error as e:
             print(f"❌ Ошибка подключения к БД: {e}")
@@ -126,14 +136,14 @@ class DuplicateFixer:
         print("=" * 70)
         
         # Находим группы дубликатов по normalized title + creator + type
-        self.cursor.execute("""
+        self.cursor.execute(f"""
             SELECT 
                 LOWER(TRIM(title)) as normalized_title,
                 LOWER(TRIM(COALESCE(creator, ''))) as normalized_creator,
                 type,
                 COUNT(*) as count,
                 GROUP_CONCAT(id) as ids
-            FROM content
+            FROM {self.table}
             GROUP BY normalized_title, normalized_creator, type
             HAVING count > 1
             ORDER BY count DESC, type, normalized_title
@@ -254,7 +264,7 @@ class DuplicateFixer:
                     })
                     
                     # Удаляем запись
-                    self.cursor.execute("DELETE FROM content WHERE id = ?", (record['id'],))
+                    self.cursor.execute(f"DELETE FROM {self.table} WHERE id = ?", (record['id'],))
                     deleted_count += 1
             
             # Сохраняем изменения
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+⚖️ NORMALIZE RATINGS - Нормализация рейтингов по декларативным правилам
+
+Назначение:
+- Правила по источникам: обнулить, масштабировать, ограничить диапазон, оставить
+- Обработка диапазонами id (chunk) с короткой транзакцией на каждый диапазон,
+  поэтому API продолжает читать базу во время миграции
+- Статистика ДО/ПОСЛЕ за один проход по таблице
+- Правила можно задать JSON-файлом (--rules)
+
+Заменяет одиночный UPDATE из remove_unreliable_ratings.py
+(тот теперь использует этот движок с набором правил 'remove_unreliable').
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import shutil
+import os
+import json
+import time
+import argparse
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+
+import facet_dictionary
+import sql_trace
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+BACKUP_DIR = 'backups'
+
+CHUNK_SIZE = 2000
+CHUNK_PAUSE = 0.0
+
+CONTENT_TYPES = ['book', 'movie', 'music']
+
+# Правило: name, match (type и/или source_prefix), action и параметры действия
+#   null  - rating = NULL
+#   scale - rating = rating * factor (только если rating > above, если задано)
+#   clamp - rating в диапазон [min, max]
+#   keep  - ничего не менять (фиксирует решение в отчете)
+RULE_PRESETS = {
+    # Поведение remove_unreliable_ratings.py
+    'remove_unreliable': [
+        {'name': 'Google Books', 'match': {'type': 'book'}, 'action': 'null'},
+        {'name': 'Spotify', 'match': {'type': 'music'}, 'action': 'null'},
+        {'name': 'TMDb', 'match': {'type': 'movie'}, 'action': 'keep'},
+    ],
+    # Привести все к шкале 0-10, не удаляя данные
+    'rescale': [
+        {'name': 'Google Books', 'match': {'type': 'book', 'source_prefix': 'gb_'}, 'action': 'null'},
+        {'name': 'Spotify popularity', 'match': {'type': 'music', 'source_prefix': 'spotify_'},
+         'action': 'scale', 'factor': 0.1, 'above': 10},
+        {'name': 'TMDb', 'match': {'type': 'movie', 'source_prefix': 'tmdb_'}, 'action': 'keep'},
+        {'name': 'Диапазон 0-10', 'match': {}, 'action': 'clamp', 'min': 0, 'max': 10},
+    ],
+}
+
+DEFAULT_PRESET = 'remove_unreliable'
+
+ACTIONS = ['null', 'scale', 'clamp', 'keep']
+
+# ==================== ПРАВИЛА ====================
+
+def validate_rules(rules: List[Dict]) -> Optional[str]:
+    """Проверка набора правил. Возвращает текст ошибки или None"""
+    for i, rule in enumerate(rules, 1):
+        action = rule.get('action')
+        if action not in ACTIONS:
+            return f"правило #{i}: неизвестное действие '{action}'"
+        match = rule.get('match', {})
+        unknown = set(match) - {'type', 'source_prefix'}
+        if unknown:
+            return f"правило #{i}: неизвестные условия {sorted(unknown)}"
+        if match.get('type') and match['type'] not in CONTENT_TYPES:
+            return f"правило #{i}: неизвестный тип '{match['type']}'"
+        if action == 'scale' and not isinstance(rule.get('factor'), (int, float)):
+            return f"правило #{i}: для scale нужен числовой factor"
+        if action == 'clamp' and ('min' not in rule or 'max' not in rule):
+            return f"правило #{i}: для clamp нужны min и max"
+    return None
+
+
+def compile_rule(rule: Dict) -> Optional[Tuple[str, List, str, List]]:
+    """
+    Правило -> (SET выражение, его параметры, WHERE условие, его параметры).
+    Условие выбирает только строки, которые реально изменятся,
+    поэтому повторный запуск ничего не пишет. keep -> None.
+    """
+    action = rule['action']
+    if action == 'keep':
+        return None
+
+    conditions = []
+    params = []
+    match = rule.get('match', {})
+
+    if match.get('type'):
+        conditions.append("type = ?")
+        params.append(match['type'])
+    if match.get('source_prefix'):
+        conditions.append("source_id LIKE ?")
+        params.append(match['source_prefix'] + '%')
+
+    if action == 'null':
+        set_sql, set_params = "rating = NULL", []
+        conditions.append("rating IS NOT NULL")
+    elif action == 'scale':
+        set_sql, set_params = "rating = ROUND(rating * ?, 2)", [rule['factor']]
+        conditions.append("rating IS NOT NULL")
+        if rule.get('above') is not None:
+            conditions.append("rating > ?")
+            params.append(rule['above'])
+    else:  # clamp
+        set_sql, set_params = "rating = MIN(MAX(rating, ?), ?)", [rule['min'], rule['max']]
+        conditions.append("rating IS NOT NULL AND (rating < ? OR rating > ?)")
+        params.extend([rule['min'], rule['max']])
+
+    return set_sql, set_params, ' AND '.join(conditions), params
+
+
+def describe_rule(rule: Dict) -> str:
+    """Человекочитаемое описание правила"""
+    match = rule.get('match', {})
+    scope = match.get('type', 'все типы')
+    if match.get('source_prefix'):
+        scope += f", source_id {match['source_prefix']}*"
+
+    action = rule['action']
+    if action == 'null':
+        what = "удалить рейтинг"
+    elif action == 'scale':
+        what = f"rating × {rule['factor']}"
+        if rule.get('above') is not None:
+            what += f" (если > {rule['above']})"
+    elif action == 'clamp':
+        what = f"ограничить {rule['min']}..{rule['max']}"
+    else:
+        what = "оставить без изменений"
+
+    return f"{rule.get('name', 'Правило')} [{scope}]: {what}"
+
+# ==================== СТАТИСТИКА ====================
+
+def collect_rating_stats(cursor: sqlite3.Cursor) -> Dict[str, Dict]:
+    """Статистика рейтингов по всем типам за один проход по таблице"""
+    cursor.execute("""
+        SELECT
+            type,
+            COUNT(*) as total,
+            SUM(CASE WHEN rating IS NOT NULL AND rating > 0 THEN 1 ELSE 0 END) as with_rating,
+            AVG(CASE WHEN rating > 0 THEN rating END) as avg_rating,
+            MIN(CASE WHEN rating > 0 THEN rating END) as min_rating,
+            MAX(CASE WHEN rating > 0 THEN rating END) as max_rating
+        FROM content
+        GROUP BY type
+    """)
+
+    stats = {
+        content_type: {
+            'total': 0, 'with_rating': 0, 'without_rating': 0,
+            'percentage_with_rating': 0, 'avg_rating': 0,
+            'min_rating': 0, 'max_rating': 0
+        }
+        for content_type in CONTENT_TYPES
+    }
+
+    for row in cursor.fetchall():
+        content_type, total, with_rating, avg, min_r, max_r = row
+        with_rating = with_rating or 0
+        stats[content_type] = {
+            'total': total,
+            'with_rating': with_rating,
+            'without_rating': total - with_rating,
+            'percentage_with_rating': (with_rating / total) * 100 if total > 0 else 0,
+            'avg_rating': round(avg, 2) if avg else 0,
+            'min_rating': min_r if min_r else 0,
+            'max_rating': max_r if max_r else 0
+        }
+
+    return stats
+
+
+def print_rating_stats(stats: Dict[str, Dict]):
+    for content_type in CONTENT_TYPES:
+        emoji = {'book': '📖', 'movie': '🎬', 'music': '🎵'}[content_type]
+        s = stats[content_type]
+
+        print(f"\n{emoji} {content_type.upper()}:")
+        print(f"  Всего записей: {s['total']:,}")
+        print(f"  С рейтингом: {s['with_rating']:,} ({s['percentage_with_rating']:.1f}%)")
+        print(f"  Без рейтинга: {s['without_rating']:,}")
+        if s['avg_rating'] > 0:
+            print(f"  Средний рейтинг: ⭐ {s['avg_rating']:.2f}")
+            print(f"  Диапазон: {s['min_rating']:.2f} - {s['max_rating']:.2f}")
+
+# ==================== ДВИЖОК ====================
+
+class RatingNormalizer:
+    """Применение правил к рейтингам диапазонами id"""
+
+    def __init__(self, conn: sqlite3.Connection, rules: List[Dict],
+                 chunk_size: int = CHUNK_SIZE, pause: float = CHUNK_PAUSE):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        # После encode_facets.py content - view: UPDATE через него не дает rowcount
+        self.table = facet_dictionary.content_table(self.cursor)
+        self.rules = rules
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.compiled = [(rule, compile_rule(rule)) for rule in rules]
+        self.stats = {
+            'chunks': 0,
+            'updated': {rule.get('name', f'#{i}'): 0 for i, rule in enumerate(rules, 1)}
+        }
+
+    def _rule_key(self, index: int) -> str:
+        return self.rules[index].get('name', f'#{index + 1}')
+
+    def count_affected(self) -> Dict[str, int]:
+        """Сколько строк затронет каждое правило (один проход, без изменений)"""
+        sums = []
+        params = []
+        for rule, compiled in self.compiled:
+            if compiled is None:
+                sums.append("0")
+                continue
+            _, _, where_sql, where_params = compiled
+            sums.append(f"SUM(CASE WHEN {where_sql} THEN 1 ELSE 0 END)")
+            params.extend(where_params)
+
+        self.cursor.execute(f"SELECT {', '.join(sums)} FROM {self.table}", params)
+        row = self.cursor.fetchone()
+        return {self._rule_key(i): (row[i] or 0) for i in range(len(self.rules))}
+
+    def id_bounds(self) -> Tuple[Optional[int], Optional[int]]:
+        self.cursor.execute(f"SELECT MIN(id), MAX(id) FROM {self.table}")
+        return self.cursor.fetchone()
+
+    def apply(self, show_progress: bool = True) -> bool:
+        """Применить правила. Каждый диапазон id - отдельная короткая транзакция"""
+        min_id, max_id = self.id_bounds()
+        if min_id is None:
+            return True
+
+        total_chunks = (max_id - min_id) // self.chunk_size + 1
+        start = min_id
+
+        while start <= max_id:
+            end = start + self.chunk_size - 1
+            try:
+                for i, (rule, compiled) in enumerate(self.compiled):
+                    if compiled is None:
+                        continue
+                    set_sql, set_params, where_sql, where_params = compiled
+                    self.cursor.execute(
+                        f"UPDATE {self.table} SET {set_sql} WHERE id BETWEEN ? AND ? AND {where_sql}",
+                        set_params + [start, end] + where_params
+                    )
+                    self.stats['updated'][self._rule_key(i)] += self.cursor.rowcount
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                print(f"\n❌ Ошибка в диапазоне id {start}-{end}: {e}")
+                return False
+
+            self.stats['chunks'] += 1
+            if show_progress and (self.stats['chunks'] % 50 == 0 or end >= max_id):
+                print(f"   ⏳ Диапазонов: {self.stats['chunks']}/{total_chunks}")
+
+            start = end + 1
+            if self.pause:
+                time.sleep(self.pause)
+
+        return True
+
+
+def load_rules(rules_file: Optional[str], preset: str) -> List[Dict]:
+    if rules_file:
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return RULE_PRESETS[preset]
+
+
+def create_backup(db_path: str) -> Optional[str]:
+    """Резервная копия базы (как в остальных миграциях)"""
+    try:
+        if not os.path.exists(BACKUP_DIR):
+            os.makedirs(BACKUP_DIR)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_path = os.path.join(BACKUP_DIR, f'content_backup_{timestamp}.db')
+        shutil.copy2(db_path, backup_path)
+        print(f"✅ Backup создан: {backup_path}")
+        return backup_path
+    except Exception as e:
+        print(f"❌ Ошибка создания backup: {e}")
+        return None
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='⚖️ Нормализация рейтингов по правилам',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python normalize_ratings.py --dry-run
+  python normalize_ratings.py --preset rescale
+  python normalize_ratings.py --rules my_rules.json --chunk-size 500 --pause 0.05
+  python normalize_ratings.py --yes --no-backup
+
+Формат файла правил (JSON):
+  [{"name": "Spotify", "match": {"type": "music", "source_prefix": "spotify_"},
+    "action": "scale", "factor": 0.1, "above": 10}]
+        """
+    )
+
+    parser.add_argument('--preset', choices=sorted(RULE_PRESETS), default=DEFAULT_PRESET,
+                        help=f'Встроенный набор правил (по умолчанию: {DEFAULT_PRESET})')
+    parser.add_argument('--rules', metavar='FILE',
+                        help='JSON-файл с правилами (вместо --preset)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Размер диапазона id на транзакцию (по умолчанию: {CHUNK_SIZE})')
+    parser.add_argument('--pause', type=float, default=CHUNK_PAUSE,
+                        help='Пауза между диапазонами, сек')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Только посчитать затрагиваемые строки')
+    parser.add_argument('--yes', action='store_true',
+                        help='Не спрашивать подтверждение')
+    parser.add_argument('--no-backup', action='store_true',
+                        help='Не создавать резервную копию')
+    parser.add_argument('--db', default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    try:
+        rules = load_rules(args.rules, args.preset)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Не удалось загрузить правила: {e}")
+        sys.exit(1)
+
+    error = validate_rules(rules)
+    if error:
+        print(f"❌ Ошибка в правилах: {error}")
+        sys.exit(1)
+
+    print("\n" + "=" * 70)
+    print("⚖️ NORMALIZE RATINGS".center(70))
+    print("=" * 70)
+    print("\n📜 Правила:")
+    for i, rule in enumerate(rules, 1):
+        print(f"  {i}. {describe_rule(rule)}")
+
+    if not args.dry_run and not args.no_backup:
+        print("\n💾 Создание резервной копии...")
+        if not create_backup(args.db):
+            print("❌ Не удалось создать backup. Операция отменена.")
+            sys.exit(1)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        normalizer = RatingNormalizer(conn, rules, args.chunk_size, args.pause)
+
+        print("\n📊 СТАТИСТИКА ДО")
+        print("=" * 70)
+        stats_before = collect_rating_stats(normalizer.cursor)
+        print_rating_stats(stats_before)
+
+        affected = normalizer.count_affected()
+        print("\n🎯 Будет изменено строк:")
+        for name, count in affected.items():
+            print(f"  {name}: {count:,}")
+
+        if args.dry_run:
+            print("\n⚠️ DRY RUN режим - изменения НЕ применены")
+            return
+
+        if not args.yes:
+            response = input("\n❓ Продолжить? (yes/no): ").strip().lower()
+            if response not in ['yes', 'y', 'да', 'д']:
+                print("\n❌ Операция отменена пользователем")
+                return
+
+        print(f"\n🧹 Применение правил (диапазоны по {args.chunk_size} id)...")
+        start_time = time.time()
+        if not normalizer.apply():
+            sys.exit(1)
+        elapsed = time.time() - start_time
+
+        print("\n📊 СТАТИСТИКА ПОСЛЕ")
+        print("=" * 70)
+        print_rating_stats(collect_rating_stats(normalizer.cursor))
+
+        print("\n📋 Изменено строк:")
+        for name, count in normalizer.stats['updated'].items():
+            print(f"  {name}: {count:,}")
+        print(f"\n⏱️ {normalizer.stats['chunks']} транзакций за {elapsed:.1f} сек")
+        print("=" * 70 + "\n")
+
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,11 @@
 - Удаляет рейтинги у музыки (Spotify popularity ≠ качество)
 - Сохраняет рейтинги фильмов (TMDB - надежные данные)
 
+Очистка выполняется движком normalize_ratings.py (набор правил
+'remove_unreliable'): диапазонами id с короткими транзакциями.
+
 Автор: Coffee Books AI Team
-Версия: 1.0
+Версия: 1.1
 """
 
 import sqlite3
@@ -17,6 +20,8 @@ import os
 from datetime import datetime
 from typing import Dict
 
+from normalize_ratings import RULE_PRESETS, RatingNormalizer, collect_rating_stats
+
 # ==================== КОНСТАНТЫ ====================
 
 DB_PATH = 'content.db'
@@ -74,59 +79,19 @@ class RatingCleaner:
     
     def get_rating_stats(self, content_type: str) -> Dict:
         """Получить статистику рейтингов для типа контента"""
-        stats = {}
-        
-        # Общее количество
-        self.cursor.execute(
-            "SELECT COUNT(*) FROM content WHERE type = ?", 
-            (content_type,)
-        )
-        stats['total'] = self.cursor.fetchone()[0]
-        
-        # С рейтингом
-        self.cursor.execute(
-            "SELECT COUNT(*) FROM content WHERE type = ? AND rating IS NOT NULL AND rating > 0",
-            (content_type,)
-        )
-        stats['with_rating'] = self.cursor.fetchone()[0]
-        
-        # Без рейтинга
-        stats['without_rating'] = stats['total'] - stats['with_rating']
-        
-        # Процент
-        if stats['total'] > 0:
-            stats['percentage_with_rating'] = (stats['with_rating'] / stats['total']) * 100
-        else:
-            stats['percentage_with_rating'] = 0
-        
-        # Средний рейтинг
-        self.cursor.execute(
-            "SELECT AVG(rating) FROM content WHERE type = ? AND rating IS NOT NULL AND rating > 0",
-            (content_type,)
-        )
-        avg = self.cursor.fetchone()[0]
-        stats['avg_rating'] = round(avg, 2) if avg else 0
-        
-        # Мин/Макс
-        self.cursor.execute(
-            "SELECT MIN(rating), MAX(rating) FROM content WHERE type = ? AND rating IS NOT NULL AND rating > 0",
-            (content_type,)
-        )
-        min_r, max_r = self.cursor.fetchone()
-        stats['min_rating'] = min_r if min_r else 0
-        stats['max_rating'] = max_r if max_r else 0
-        
-        return stats
+        return collect_rating_stats(self.cursor)[content_type]
     
     def collect_stats_before(self):
         """Собрать статистику ДО очистки"""
         print("\n📊 СТАТИСТИКА ДО ОЧИСТКИ")
         print("=" * 70)
         
+        # Один проход по таблице для всех типов
+        self.stats_before = collect_rating_stats(self.cursor)
+        
         for content_type in ['book', 'movie', 'music']:
             emoji = {'book': '📖', 'movie': '🎬', 'music': '🎵'}[content_type]
-            stats = self.get_rating_stats(content_type)
-            self.stats_before[content_type] = stats
+            stats = self.stats_before[content_type]
             
             print(f"\n{emoji} {content_type.upper()}:")
             print(f"  Всего записей: {stats['total']:,}")
@@ -143,52 +108,36 @@ class RatingCleaner:
         print("\n🧹 НАЧИНАЮ ОЧИСТКУ РЕЙТИНГОВ")
         print("=" * 70)
         
-        try:
-            # 1. Удаляем рейтинги у КНИГ
-            print("\n📖 Удаляю рейтинги у книг...")
-            self.cursor.execute("""
-                UPDATE content 
-                SET rating = NULL 
-                WHERE type = 'book'
-            """)
-            books_updated = self.cursor.rowcount
-            print(f"   ✅ Обновлено {books_updated:,} книг")
-            
-            # 2. Удаляем рейтинги у МУЗЫКИ
-            print("\n🎵 Удаляю рейтинги у музыки...")
-            self.cursor.execute("""
-                UPDATE content 
-                SET rating = NULL 
-                WHERE type = 'music'
-            """)
-            music_updated = self.cursor.rowcount
-            print(f"   ✅ Обновлено {music_updated:,} треков")
-            
-            # 3. ФИЛЬМЫ не трогаем
-            print("\n🎬 Фильмы - рейтинги сохранены (TMDB надежен)")
-            
-            # Сохраняем изменения
-            self.conn.commit()
-            
-            print("\n" + "=" * 70)
-            print("✅ ОЧИСТКА ЗАВЕРШЕНА УСПЕШНО!")
-            
-            return True
-            
-        except sqlite3.Error as e:
-            print(f"\n❌ Ошибка при очистке: {e}")
-            self.conn.rollback()
+        # Диапазоны id с короткими транзакциями - API не блокируется
+        normalizer = RatingNormalizer(self.conn, RULE_PRESETS['remove_unreliable'])
+        
+        print("\n📖 Удаляю рейтинги у книг...")
+        print("🎵 Удаляю рейтинги у музыки...")
+        if not normalizer.apply():
             return False
+        
+        updated = normalizer.stats['updated']
+        print(f"   ✅ Обновлено {updated['Google Books']:,} книг")
+        print(f"   ✅ Обновлено {updated['Spotify']:,} треков")
+        
+        # ФИЛЬМЫ не трогаем
+        print("\n🎬 Фильмы - рейтинги сохранены (TMDB надежен)")
+        
+        print("\n" + "=" * 70)
+        print("✅ ОЧИСТКА ЗАВЕРШЕНА УСПЕШНО!")
+        
+        return True
     
     def collect_stats_after(self):
         """Собрать статистику ПОСЛЕ очистки"""
         print("\n📊 СТАТИСТИКА ПОСЛЕ ОЧИСТКИ")
         print("=" * 70)
         
+        self.stats_after = collect_rating_stats(self.cursor)
+        
         for content_type in ['book', 'movie', 'music']:
             emoji = {'book': '📖', 'movie': '🎬', 'music': '🎵'}[content_type]
-            stats = self.get_rating_stats(content_type)
-            self.stats_after[content_type] = stats
+            stats = self.stats_after[content_type]
             
             print(f"\n{emoji} {content_type.upper()}:")
             print(f"  Всего записей: {stats['total']:,}")
@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+🎫 ACCESS BULK - Массовые операции с кодами доступа в access.db
+
+Назначение:
+- extend  - продлить срок кодов (и, по желанию, активных сессий)
+- reset   - сбросить активации (как fix_my_code.py, но для любого набора)
+- revoke  - отозвать коды (срок = сейчас), по желанию закрыть сессии
+- requota - задать или добавить лимит активаций
+- undo    - откатить операцию по журналу, history - список операций
+
+Коды выбираются фильтрами (вместе через AND): точные коды, шаблон,
+тип, кто создал, дата создания, состояние. Каждая операция - один
+UPDATE по набору, порциями по диапазону id: порция - короткая
+транзакция, в той же транзакции старые значения пишутся в журнал
+access_code_undo. --dry-run только считает и показывает примеры.
+
+Время: expires_at кодов - локальное (как пишет бот), сессий - ISO UTC
+(как пишет Node-сервер). Счетчики access_stats.py обновляются триггерами.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import sql_trace
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'access.db'
+
+BATCH_SIZE = 5000
+BUSY_TIMEOUT = 10.0
+SAMPLE_SIZE = 10
+
+CODE_TYPES = ['1day', '7days', '30days']
+STATES = ['active', 'exhausted', 'expired']
+
+# Столбцы кода, которые операции могут менять (их копия - в журнале)
+UNDO_COLUMNS = ['expires_at', 'max_activations', 'current_activations', 'is_used', 'used_at', 'notes']
+
+UNDO_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS access_code_batches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        operation TEXT NOT NULL,
+        params TEXT,
+        columns TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        codes INTEGER DEFAULT 0,
+        sessions INTEGER DEFAULT 0,
+        undone_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS access_code_undo (
+        batch_id INTEGER NOT NULL,
+        code_id INTEGER NOT NULL,
+        expires_at TIMESTAMP,
+        max_activations INTEGER,
+        current_activations INTEGER,
+        is_used INTEGER,
+        used_at TIMESTAMP,
+        notes TEXT,
+        PRIMARY KEY (batch_id, code_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS access_session_undo (
+        batch_id INTEGER NOT NULL,
+        session_id INTEGER NOT NULL,
+        expires_at TIMESTAMP,
+        is_active INTEGER,
+        PRIMARY KEY (batch_id, session_id)
+    ) WITHOUT ROWID
+    """,
+]
+
+# Индекс для выбора сессий по коду (тот же, что у access_sweeper.py)
+BULK_INDEXES = {
+    'idx_user_sessions_code': "ON user_sessions(access_code_id)",
+}
+
+# Сессии кода, которые трогают extend/revoke --sessions
+SESSION_SCOPE = "is_active = 1 AND expires_at > :now_iso"
+
+# ==================== ВЫБОРКА ====================
+
+def now_params() -> Dict[str, str]:
+    """Текущее время один раз на запуск: локальное для кодов, UTC ISO для сессий"""
+    return {
+        'now': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'now_iso': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+    }
+
+
+def build_filter(codes: Optional[List[str]] = None, pattern: Optional[str] = None,
+                 code_types: Optional[List[str]] = None, creators: Optional[List[str]] = None,
+                 created_from: Optional[str] = None, created_to: Optional[str] = None,
+                 state: Optional[str] = None) -> Tuple[str, Dict]:
+    """
+    WHERE-условие по access_codes и его параметры.
+    Пустой набор фильтров - '1' (все коды), вызывающий решает, можно ли так.
+    """
+    conditions = []
+    params: Dict = {}
+
+    if codes:
+        names = []
+        for i, code in enumerate(codes):
+            params[f'code{i}'] = code.strip().upper()
+            names.append(f':code{i}')
+        conditions.append(f"code IN ({', '.join(names)})")
+    if pattern:
+        # Шаблон как в shell: VF6S-* или ????-PA8E
+        params['pattern'] = pattern.strip().upper()
+        conditions.append("code GLOB :pattern")
+    if code_types:
+        names = []
+        for i, code_type in enumerate(code_types):
+            params[f'type{i}'] = code_type
+            names.append(f':type{i}')
+        conditions.append(f"code_type IN ({', '.join(names)})")
+    if creators:
+        names = []
+        for i, creator in enumerate(creators):
+            params[f'creator{i}'] = str(creator)
+            names.append(f':creator{i}')
+        conditions.append(f"generated_by IN ({', '.join(names)})")
+    if created_from:
+        # generated_at - CURRENT_TIMESTAMP (UTC)
+        params['created_from'] = created_from
+        conditions.append("generated_at >= :created_from")
+    if created_to:
+        params['created_to'] = created_to
+        conditions.append("generated_at < datetime(:created_to, '+1 day')")
+    if state == 'active':
+        conditions.append("IFNULL(current_activations, 0) < IFNULL(max_activations, 1) "
+                          "AND (expires_at IS NULL OR expires_at > :now)")
+    elif state == 'exhausted':
+        conditions.append("IFNULL(current_activations, 0) >= IFNULL(max_activations, 1)")
+    elif state == 'expired':
+        conditions.append("expires_at <= :now")
+
+    return (' AND '.join(conditions) or '1'), params
+
+
+def preview(cursor: sqlite3.Cursor, where: str, params: Dict, with_sessions: bool = False) -> Dict:
+    """Для --dry-run: сколько кодов по типам, примеры, затронутые сессии"""
+    cursor.execute(f"""
+        SELECT code_type, COUNT(*) FROM access_codes WHERE {where}
+        GROUP BY code_type ORDER BY code_type
+    """, params)
+    by_type = dict(cursor.fetchall())
+
+    cursor.execute(f"""
+        SELECT code, code_type, current_activations, max_activations, expires_at
+        FROM access_codes WHERE {where}
+        ORDER BY id LIMIT {SAMPLE_SIZE}
+    """, params)
+    sample = cursor.fetchall()
+
+    sessions = None
+    if with_sessions:
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM user_sessions
+            WHERE {SESSION_SCOPE}
+              AND access_code_id IN (SELECT id FROM access_codes WHERE {where})
+        """, params)
+        sessions = cursor.fetchone()[0]
+
+    return {'codes': sum(by_type.values()), 'by_type': by_type, 'sample': sample, 'sessions': sessions}
+
+# ==================== ОПЕРАЦИИ ====================
+
+def plan_operation(operation: str, hours: float = 0, max_activations: Optional[int] = None,
+                   add: Optional[int] = None, note: Optional[str] = None,
+                   sessions: bool = False) -> Dict:
+    """
+    SET-выражения для кодов и сессий.
+    columns - какие столбцы кода вернет undo.
+    """
+    params: Dict = {}
+    code_set: List[str] = []
+    columns: List[str] = []
+    session_set: Optional[str] = None
+
+    if operation == 'extend':
+        params['shift'] = f'{hours:+g} hours'
+        # Без срока (NULL) - так и остается; истекший продлевается от текущего момента
+        code_set.append("expires_at = CASE WHEN expires_at IS NULL THEN NULL "
+                        "ELSE datetime(MAX(expires_at, :now), :shift) END")
+        columns.append('expires_at')
+        if sessions:
+            session_set = ("expires_at = strftime('%Y-%m-%dT%H:%M:%fZ', "
+                           "MAX(datetime(expires_at), datetime(:now_iso)), :shift)")
+
+    elif operation == 'reset':
+        code_set.append("current_activations = 0, is_used = 0, used_at = NULL")
+        columns += ['current_activations', 'is_used', 'used_at']
+        if max_activations is not None:
+            params['max'] = max_activations
+            code_set.append("max_activations = :max")
+            columns.append('max_activations')
+
+    elif operation == 'revoke':
+        code_set.append("expires_at = :now")
+        columns.append('expires_at')
+        if sessions:
+            session_set = "is_active = 0"
+
+    elif operation == 'requota':
+        if max_activations is not None:
+            params['max'] = max_activations
+            new_max = ":max"
+        else:
+            params['add'] = add
+            new_max = "MAX(IFNULL(max_activations, 1) + :add, 1)"
+        # is_used - как считает Node-сервер: исчерпан, когда активаций >= лимита
+        code_set.append(f"is_used = IFNULL(current_activations, 0) >= {new_max}, "
+                        f"max_activations = {new_max}")
+        columns += ['max_activations', 'is_used']
+
+    else:
+        raise ValueError(f"Неизвестная операция: {operation}")
+
+    if note:
+        params['note'] = note
+        code_set.append("notes = :note")
+        columns.append('notes')
+
+    return {'operation': operation, 'code_set': ', '.join(code_set), 'columns': columns,
+            'session_set': session_set, 'params': params}
+
+
+def ensure_tables(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    for ddl in UNDO_TABLES:
+        cursor.execute(ddl)
+    for name, definition in BULK_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+    conn.commit()
+
+
+def apply_operation(conn: sqlite3.Connection, plan: Dict, where: str, params: Dict,
+                    description: Optional[Dict] = None, batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Выполнить операцию порциями id. В каждой порции: снимок в журнал,
+    затем UPDATE ровно тех кодов, что попали в снимок.
+    """
+    ensure_tables(conn)
+    cursor = conn.cursor()
+    params = dict(params, **plan['params'])
+
+    cursor.execute("""
+        INSERT INTO access_code_batches (operation, params, columns) VALUES (?, ?, ?)
+    """, (plan['operation'], json.dumps(description or {}, ensure_ascii=False),
+          ','.join(plan['columns'])))
+    batch_id = cursor.lastrowid
+    conn.commit()
+    params['batch'] = batch_id
+
+    cursor.execute(f"SELECT MIN(id), MAX(id) FROM access_codes WHERE {where}", params)
+    min_id, max_id = cursor.fetchone()
+
+    undo_columns = ', '.join(UNDO_COLUMNS)
+    chunk_codes = """
+        SELECT code_id FROM access_code_undo
+        WHERE batch_id = :batch AND code_id BETWEEN :start AND :end
+    """
+    codes = sessions = 0
+    start = min_id
+
+    while start is not None and start <= max_id:
+        params.update(start=start, end=start + batch_size - 1)
+        try:
+            cursor.execute(f"""
+                INSERT INTO access_code_undo (batch_id, code_id, {undo_columns})
+                SELECT :batch, id, {undo_columns} FROM access_codes
+                WHERE id BETWEEN :start AND :end AND ({where})
+            """, params)
+            codes += cursor.rowcount
+
+            if plan['session_set']:
+                cursor.execute(f"""
+                    INSERT INTO access_session_undo (batch_id, session_id, expires_at, is_active)
+                    SELECT :batch, id, expires_at, is_active FROM user_sessions
+                    WHERE {SESSION_SCOPE} AND access_code_id IN ({chunk_codes})
+                """, params)
+                sessions += cursor.rowcount
+                cursor.execute(f"""
+                    UPDATE user_sessions SET {plan['session_set']}
+                    WHERE id IN (
+                        SELECT session_id FROM access_session_undo WHERE batch_id = :batch
+                    ) AND access_code_id IN ({chunk_codes})
+                """, params)
+
+            cursor.execute(f"""
+                UPDATE access_codes SET {plan['code_set']}
+                WHERE id IN ({chunk_codes})
+            """, params)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        start += batch_size
+
+    cursor.execute("UPDATE access_code_batches SET codes = ?, sessions = ? WHERE id = ?",
+                   (codes, sessions, batch_id))
+    conn.commit()
+    return {'batch_id': batch_id, 'codes': codes, 'sessions': sessions}
+
+
+def undo_batch(conn: sqlite3.Connection, batch_id: int, batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Вернуть столбцы операции из журнала (только те, что она меняла).
+    Пересекающиеся операции отменять в обратном порядке (см. history).
+    """
+    ensure_tables(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT operation, columns, undone_at FROM access_code_batches WHERE id = ?",
+                   (batch_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Операция #{batch_id} не найдена")
+    operation, columns, undone_at = row
+    if undone_at:
+        raise ValueError(f"Операция #{batch_id} уже отменена ({undone_at})")
+
+    restore = ', '.join(
+        f"{column} = (SELECT u.{column} FROM access_code_undo u "
+        f"WHERE u.batch_id = :batch AND u.code_id = access_codes.id)"
+        for column in columns.split(',')
+    )
+    params = {'batch': batch_id}
+    cursor.execute("SELECT MIN(code_id), MAX(code_id) FROM access_code_undo WHERE batch_id = ?",
+                   (batch_id,))
+    min_id, max_id = cursor.fetchone()
+
+    codes = sessions = 0
+    start = min_id
+    while start is not None and start <= max_id:
+        params.update(start=start, end=start + batch_size - 1)
+        try:
+            cursor.execute(f"""
+                UPDATE access_codes SET {restore}
+                WHERE id IN (
+                    SELECT code_id FROM access_code_undo
+                    WHERE batch_id = :batch AND code_id BETWEEN :start AND :end
+                )
+            """, params)
+            codes += cursor.rowcount
+            cursor.execute("""
+                UPDATE user_sessions SET
+                    expires_at = (SELECT u.expires_at FROM access_session_undo u
+                                  WHERE u.batch_id = :batch AND u.session_id = user_sessions.id),
+                    is_active = (SELECT u.is_active FROM access_session_undo u
+                                 WHERE u.batch_id = :batch AND u.session_id = user_sessions.id)
+                WHERE id IN (
+                    SELECT session_id FROM access_session_undo WHERE batch_id = :batch
+                ) AND access_code_id BETWEEN :start AND :end
+            """, params)
+            sessions += cursor.rowcount
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        start += batch_size
+
+    cursor.execute("UPDATE access_code_batches SET undone_at = CURRENT_TIMESTAMP WHERE id = ?",
+                   (batch_id,))
+    conn.commit()
+    return {'batch_id': batch_id, 'operation': operation, 'codes': codes, 'sessions': sessions}
+
+
+def get_history(cursor: sqlite3.Cursor, limit: int = 20) -> List[Tuple]:
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'access_code_batches'")
+    if not cursor.fetchone():
+        return []
+    cursor.execute("""
+        SELECT id, operation, created_at, codes, sessions, undone_at, params
+        FROM access_code_batches ORDER BY id DESC LIMIT ?
+    """, (limit,))
+    return cursor.fetchall()
+
+# ==================== ВЫВОД ====================
+
+def print_preview(operation: str, result: Dict):
+    print(f"\n🔍 {operation}: подходит кодов {result['codes']:,}")
+    for code_type, count in result['by_type'].items():
+        print(f"  {code_type}: {count:,}")
+    if result['sessions'] is not None:
+        print(f"  активных сессий: {result['sessions']:,}")
+    if result['sample']:
+        print(f"\nПримеры (до {SAMPLE_SIZE}):")
+        for code, code_type, current, maximum, expires_at in result['sample']:
+            print(f"  {code}  {code_type:<6}  {current or 0}/{maximum or 1}  до {expires_at or '-'}")
+    print("\n(--dry-run: изменений нет)")
+
+
+def print_history(rows: List[Tuple]):
+    if not rows:
+        print("📜 Операций еще не было")
+        return
+    print("📜 Последние операции:")
+    for batch_id, operation, created_at, codes, sessions, undone_at, params in rows:
+        status = f"  ↩️ отменена {undone_at}" if undone_at else ""
+        extra = f", сессий {sessions}" if sessions else ""
+        print(f"  #{batch_id:<5} {created_at}  {operation:<8} кодов {codes}{extra}{status}")
+        if params and params != '{}':
+            print(f"         {params}")
+
+# ==================== CLI ====================
+
+def add_filter_args(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group('выбор кодов (вместе через AND)')
+    group.add_argument('--code', nargs='+', dest='codes',
+                       help='Точные коды')
+    group.add_argument('--pattern',
+                       help='Шаблон кода: VF6S-* или ????-PA8E')
+    group.add_argument('--type', nargs='+', dest='code_types', choices=CODE_TYPES,
+                       help='Тип кода')
+    group.add_argument('--creator', nargs='+', dest='creators',
+                       help='Telegram ID создавшего админа')
+    group.add_argument('--created-from',
+                       help='Созданы с даты (YYYY-MM-DD, UTC)')
+    group.add_argument('--created-to',
+                       help='Созданы по дату включительно (YYYY-MM-DD, UTC)')
+    group.add_argument('--state', choices=STATES,
+                       help='Состояние: active, exhausted (лимит исчерпан), expired')
+    group.add_argument('--all', action='store_true',
+                       help='Разрешить операцию без фильтров (все коды)')
+
+    parser.add_argument('--note',
+                        help='Записать в notes кодов (причина операции)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Только посчитать и показать примеры')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'id кодов на транзакцию (по умолчанию: {BATCH_SIZE})')
+
+
+def main():
+    # ACCESS_DB_PATH из .env - как у бота и Node-сервера
+    if load_dotenv:
+        load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description='🎫 Access Bulk - массовые операции с кодами доступа',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  # Сбросить активации кода и дать 100 (бывший fix_my_code.py)
+  python access_bulk.py reset --code VF6S-PA8E --max 100
+
+  # Продлить на 2 дня все активные 7-дневные коды и их сессии (сбой сервиса)
+  python access_bulk.py extend --days 2 --type 7days --state active --sessions
+
+  # Сколько кодов админа создано за октябрь - без изменений
+  python access_bulk.py revoke --creator 123456789 --created-from 2026-10-01 \\
+      --created-to 2026-10-31 --dry-run
+
+  # +5 активаций по шаблону, откат
+  python access_bulk.py requota --add 5 --pattern "PROMO-*" --note "акция"
+  python access_bulk.py history
+  python access_bulk.py undo 12
+        """
+    )
+    parser.add_argument('--db',
+                        default=os.getenv('ACCESS_DB_PATH', DB_PATH),
+                        help=f'Путь к access.db (по умолчанию: $ACCESS_DB_PATH или {DB_PATH})')
+
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    extend = commands.add_parser('extend', help='Продлить срок кодов')
+    extend.add_argument('--days', type=float, default=0, help='На сколько дней')
+    extend.add_argument('--hours', type=float, default=0, help='На сколько часов')
+    extend.add_argument('--sessions', action='store_true',
+                        help='Продлить и активные сессии этих кодов')
+    add_filter_args(extend)
+
+    reset = commands.add_parser('reset', help='Сбросить активации')
+    reset.add_argument('--max', type=int, dest='max_activations',
+                       help='Заодно задать лимит активаций')
+    add_filter_args(reset)
+
+    revoke = commands.add_parser('revoke', help='Отозвать коды')
+    revoke.add_argument('--sessions', action='store_true',
+                        help='Закрыть и активные сессии этих кодов')
+    add_filter_args(revoke)
+
+    requota = commands.add_parser('requota', help='Изменить лимит активаций')
+    quota = requota.add_mutually_exclusive_group(required=True)
+    quota.add_argument('--max', type=int, dest='max_activations', help='Новый лимит')
+    quota.add_argument('--add', type=int, help='Добавить к лимиту (можно отрицательное)')
+    add_filter_args(requota)
+
+    undo = commands.add_parser('undo', help='Откатить операцию по номеру')
+    undo.add_argument('batch_id', type=int, help='Номер операции (см. history)')
+    undo.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    history = commands.add_parser('history', help='Последние операции')
+    history.add_argument('--limit', type=int, default=20)
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    conn = sql_trace.connect(args.db, timeout=BUSY_TIMEOUT)
+    try:
+        cursor = conn.cursor()
+
+        if args.command == 'history':
+            print_history(get_history(cursor, args.limit))
+            return
+
+        if args.command == 'undo':
+            started = time.time()
+            result = undo_batch(conn, args.batch_id, args.batch_size)
+            print(f"↩️ Операция #{result['batch_id']} ({result['operation']}) отменена: "
+                  f"кодов {result['codes']:,}, сессий {result['sessions']:,} "
+                  f"за {time.time() - started:.2f}с")
+            return
+
+        filters = {
+            key: getattr(args, key)
+            for key in ('codes', 'pattern', 'code_types', 'creators',
+                        'created_from', 'created_to', 'state')
+            if getattr(args, key)
+        }
+        if not filters and not args.all:
+            print("❌ Не задан ни один фильтр. Для операции над всеми кодами добавьте --all")
+            sys.exit(1)
+
+        hours = getattr(args, 'days', 0) * 24 + getattr(args, 'hours', 0)
+        if args.command == 'extend' and not hours:
+            print("❌ Укажите --days или --hours")
+            sys.exit(1)
+
+        where, params = build_filter(**filters)
+        params.update(now_params())
+        with_sessions = getattr(args, 'sessions', False)
+        plan = plan_operation(
+            args.command, hours=hours,
+            max_activations=getattr(args, 'max_activations', None),
+            add=getattr(args, 'add', None), note=args.note, sessions=with_sessions
+        )
+
+        if args.dry_run:
+            print_preview(args.command, preview(cursor, where, params, with_sessions))
+            return
+
+        started = time.time()
+        description = dict(filters, **{k: v for k, v in plan['params'].items()})
+        if with_sessions:
+            description['sessions'] = True
+        result = apply_operation(conn, plan, where, params, description, args.batch_size)
+        print(f"✅ {args.command}: кодов {result['codes']:,}"
+              + (f", сессий {result['sessions']:,}" if with_sessions else "")
+              + f" за {time.time() - started:.2f}с")
+        print(f"↩️ Откат: python access_bulk.py undo {result['batch_id']}")
+    except (sqlite3.Error, ValueError) as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
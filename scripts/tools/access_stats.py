@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+📊 ACCESS STATS - Счетчики и индексы статистики access.db
+
+Назначение:
+- Таблица access_code_counters: коды, исчерпанные и доступные коды по типу
+- Триггеры INSERT/UPDATE/DELETE на access_codes держат счетчики
+  актуальными - и для бота (генерация), и для Node-сервера (активация)
+- Индексы user_sessions(is_active, expires_at) и access_codes(code_type)
+- Чтение статистики для admin_telegram_bot.py (/stats, кнопка "Статистика")
+- Проверка согласованности и полная пересборка
+
+/stats стоит O(число типов) + диапазон индекса активных сессий
+вместо четырех полных проходов по access_codes и user_sessions.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import os
+import sys
+from typing import Dict, List
+
+import sql_trace
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'access.db'
+COUNTERS_TABLE = 'access_code_counters'
+
+TRIGGER_INSERT = 'access_counters_after_insert'
+TRIGGER_UPDATE = 'access_counters_after_update'
+TRIGGER_DELETE = 'access_counters_after_delete'
+
+ACCESS_INDEXES = {
+    'idx_user_sessions_active_expires': "ON user_sessions(is_active, expires_at)",
+    'idx_access_codes_type': "ON access_codes(code_type)",
+}
+
+# Код исчерпан - та же формула, что в access.js (max_activations NULL = 1)
+EXHAUSTED_EXPR = "(IFNULL({r}.current_activations, 0) >= IFNULL({r}.max_activations, 1))"
+
+# Код доступен - считается сам, а не как total - used: код без
+# current_activations (NULL) не исчерпан, но и доступным не считается
+UNUSED_EXPR = "IFNULL({r}.current_activations < IFNULL({r}.max_activations, 1), 0)"
+
+# Колонки, изменение которых влияет на счетчики
+TRACKED_COLUMNS = ['code_type', 'current_activations', 'max_activations']
+
+
+def _upsert(row_alias: str, sign: int) -> str:
+    exhausted = EXHAUSTED_EXPR.format(r=row_alias)
+    unused = UNUSED_EXPR.format(r=row_alias)
+    return f"""
+        INSERT INTO {COUNTERS_TABLE} (code_type, total, used, unused)
+        VALUES ({row_alias}.code_type, {sign}, {sign} * {exhausted}, {sign} * {unused})
+        ON CONFLICT(code_type) DO UPDATE SET
+            total = total + excluded.total,
+            used = used + excluded.used,
+            unused = unused + excluded.unused;"""
+
+
+def _trigger_sql() -> List[str]:
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {TRIGGER_INSERT} AFTER INSERT ON access_codes "
+        f"BEGIN{_upsert('NEW', 1)}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {TRIGGER_UPDATE} AFTER UPDATE OF {', '.join(TRACKED_COLUMNS)} "
+        f"ON access_codes BEGIN{_upsert('OLD', -1)}{_upsert('NEW', 1)}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {TRIGGER_DELETE} AFTER DELETE ON access_codes "
+        f"BEGIN{_upsert('OLD', -1)}\nEND",
+    ]
+
+
+AGGREGATE_SQL = f"""
+    SELECT code_type, COUNT(*), IFNULL(SUM({EXHAUSTED_EXPR.format(r='c')}), 0),
+           IFNULL(SUM({UNUSED_EXPR.format(r='c')}), 0)
+    FROM access_codes c
+    GROUP BY code_type
+"""
+
+ACTIVE_SESSIONS_SQL = """
+    SELECT COUNT(*)
+    FROM user_sessions
+    WHERE is_active = 1 AND expires_at > datetime('now')
+"""
+
+# ==================== УСТАНОВКА И ОБСЛУЖИВАНИЕ ====================
+
+def is_installed(cursor: sqlite3.Cursor) -> bool:
+    """Установлены ли таблица (с колонкой unused), триггеры и индексы"""
+    names = [COUNTERS_TABLE, TRIGGER_INSERT, TRIGGER_UPDATE, TRIGGER_DELETE] + list(ACCESS_INDEXES)
+    cursor.execute(f"""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE name IN ({', '.join(['?'] * len(names))})
+    """, names)
+    if cursor.fetchone()[0] != len(names):
+        return False
+    return 'unused' in _counter_columns(cursor)
+
+
+def _counter_columns(cursor: sqlite3.Cursor) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({COUNTERS_TABLE})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def install(conn: sqlite3.Connection) -> bool:
+    """Создать индексы, таблицу и триггеры и заполнить счетчики"""
+    cursor = conn.cursor()
+    try:
+        for name, definition in ACCESS_INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {COUNTERS_TABLE} (
+                code_type TEXT PRIMARY KEY,
+                total INTEGER NOT NULL DEFAULT 0,
+                used INTEGER NOT NULL DEFAULT 0,
+                unused INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        # Таблица из прежней версии - без unused
+        if 'unused' not in _counter_columns(cursor):
+            cursor.execute(f"ALTER TABLE {COUNTERS_TABLE} ADD COLUMN unused INTEGER NOT NULL DEFAULT 0")
+        # Пересоздаем триггеры, чтобы подхватить изменения формул
+        drop_triggers(cursor)
+        for sql in _trigger_sql():
+            cursor.execute(sql)
+        _rebuild(cursor)
+        cursor.execute("ANALYZE user_sessions")
+        cursor.execute("ANALYZE access_codes")
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Ошибка установки {COUNTERS_TABLE}: {e}")
+        return False
+
+
+def ensure_installed(conn: sqlite3.Connection) -> bool:
+    """Установить, если еще не установлено (при запуске бота)"""
+    if is_installed(conn.cursor()):
+        return True
+    return install(conn)
+
+
+def drop_triggers(cursor: sqlite3.Cursor):
+    for name in (TRIGGER_INSERT, TRIGGER_UPDATE, TRIGGER_DELETE):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def uninstall(conn: sqlite3.Connection):
+    """Удалить триггеры, таблицу и индексы"""
+    cursor = conn.cursor()
+    drop_triggers(cursor)
+    cursor.execute(f"DROP TABLE IF EXISTS {COUNTERS_TABLE}")
+    for name in ACCESS_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+
+def _rebuild(cursor: sqlite3.Cursor):
+    cursor.execute(f"DELETE FROM {COUNTERS_TABLE}")
+    cursor.execute(f"INSERT INTO {COUNTERS_TABLE} (code_type, total, used, unused) {AGGREGATE_SQL}")
+
+
+def rebuild(conn: sqlite3.Connection) -> bool:
+    """Пересчитать счетчики с нуля (в одной транзакции)"""
+    cursor = conn.cursor()
+    try:
+        _rebuild(cursor)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Ошибка пересборки {COUNTERS_TABLE}: {e}")
+        return False
+
+
+def verify(conn: sqlite3.Connection) -> List[Dict]:
+    """Сравнить счетчики с access_codes, вернуть расхождения"""
+    cursor = conn.cursor()
+
+    cursor.execute(AGGREGATE_SQL)
+    expected = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+
+    cursor.execute(f"SELECT code_type, total, used, unused FROM {COUNTERS_TABLE}")
+    actual = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+
+    mismatches = []
+    for code_type in sorted(set(expected) | set(actual), key=str):
+        if expected.get(code_type, (0, 0, 0)) != actual.get(code_type, (0, 0, 0)):
+            mismatches.append({
+                'code_type': code_type,
+                'expected': expected.get(code_type, (0, 0, 0)),
+                'actual': actual.get(code_type, (0, 0, 0))
+            })
+    return mismatches
+
+# ==================== ЧТЕНИЕ СТАТИСТИКИ ====================
+
+def get_stats(cursor: sqlite3.Cursor) -> Dict:
+    """Статистика для бота: из счетчиков, без прохода по access_codes"""
+    cursor.execute(f"SELECT code_type, total, used, unused FROM {COUNTERS_TABLE} WHERE total > 0")
+    by_type = {row[0]: {'total': row[1], 'used': row[2], 'unused': row[3]} for row in cursor.fetchall()}
+
+    cursor.execute(ACTIVE_SESSIONS_SQL)
+    active_sessions = cursor.fetchone()[0]
+
+    cursor.execute("SELECT COUNT(*) FROM admin_users WHERE is_active = 1")
+    admin_count = cursor.fetchone()[0]
+
+    total = sum(data['total'] for data in by_type.values())
+    used = sum(data['used'] for data in by_type.values())
+    unused = sum(data['unused'] for data in by_type.values())
+
+    return {
+        'total': total,
+        'used': used,
+        'unused': unused,
+        'by_type': by_type,
+        'active_sessions': active_sessions,
+        'admin_count': admin_count
+    }
+
+
+def print_summary(cursor: sqlite3.Cursor):
+    stats = get_stats(cursor)
+    print("\n" + "=" * 70)
+    print("📊 ACCESS STATS".center(70))
+    print("=" * 70)
+    print(f"\n📝 Всего кодов: {stats['total']:,}")
+    print(f"✅ Исчерпано: {stats['used']:,}")
+    print(f"⏳ Доступно: {stats['unused']:,}")
+    print(f"🔥 Активных сессий: {stats['active_sessions']:,}")
+    print(f"👥 Администраторов: {stats['admin_count']}")
+    for code_type, data in stats['by_type'].items():
+        print(f"  {code_type:8} {data['used']:,}/{data['total']:,}")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    # ACCESS_DB_PATH из .env - как у бота и Node-сервера
+    if load_dotenv:
+        load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description='📊 Access Stats - счетчики и индексы статистики access.db',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python access_stats.py --install     # Индексы, таблица счетчиков, триггеры
+  python access_stats.py --verify      # Сверить счетчики с access_codes
+  python access_stats.py --rebuild     # Пересчитать счетчики с нуля
+  python access_stats.py               # Сводка
+        """
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--install', action='store_true',
+                       help='Создать индексы, таблицу счетчиков и триггеры')
+    group.add_argument('--rebuild', action='store_true',
+                       help='Полностью пересчитать счетчики')
+    group.add_argument('--verify', action='store_true',
+                       help='Проверить согласованность счетчиков с access_codes')
+    group.add_argument('--uninstall', action='store_true',
+                       help='Удалить триггеры, таблицу и индексы')
+
+    parser.add_argument('--db',
+                        default=os.getenv('ACCESS_DB_PATH', DB_PATH),
+                        help=f'Путь к access.db (по умолчанию: $ACCESS_DB_PATH или {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+
+        if args.install:
+            if not install(conn):
+                sys.exit(1)
+            print(f"✅ {COUNTERS_TABLE}, триггеры и индексы установлены")
+            print_summary(cursor)
+
+        elif args.uninstall:
+            uninstall(conn)
+            print(f"✅ {COUNTERS_TABLE}, триггеры и индексы удалены")
+
+        elif args.rebuild:
+            if not is_installed(cursor):
+                print(f"❌ {COUNTERS_TABLE} не установлена. Запустите: --install")
+                sys.exit(1)
+            if not rebuild(conn):
+                sys.exit(1)
+            print(f"✅ {COUNTERS_TABLE} пересобрана")
+            print_summary(cursor)
+
+        elif args.verify:
+            if not is_installed(cursor):
+                print(f"❌ {COUNTERS_TABLE} не установлена. Запустите: --install")
+                sys.exit(1)
+            mismatches = verify(conn)
+            if not mismatches:
+                print(f"✅ {COUNTERS_TABLE} согласована с access_codes")
+            else:
+                print(f"❌ Расхождений: {len(mismatches)}")
+                for m in mismatches:
+                    print(f"  - {m['code_type']}: ожидалось {m['expected']}, в таблице {m['actual']}")
+                print("\nИсправить: python scripts/tools/access_stats.py --rebuild")
+                sys.exit(2)
+
+        else:
+            if not is_installed(cursor):
+                print(f"❌ {COUNTERS_TABLE} не установлена. Запустите: --install")
+                sys.exit(1)
+            print_summary(cursor)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
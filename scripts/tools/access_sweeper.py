@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+🧹 ACCESS SWEEPER - Архивация и очистка access.db
+
+Назначение:
+- Истекшие и закрытые user_sessions (после SESSION_GRACE_DAYS)
+- Исчерпанные и истекшие access_codes без оставшихся сессий
+  (после CODE_GRACE_DAYS)
+- activity_logs старше LOG_RETENTION_DAYS и уже свернутые activity_rollup.py
+  (единственное место, где удаляются сырые события)
+- Перед удалением строки копируются в архив access_archive.db
+  (ATTACH, те же колонки + archived_at)
+- Порции по диапазону rowid: каждая порция - короткая транзакция,
+  Node-сервер и бот пишут между ними
+- Возврат места: PRAGMA incremental_vacuum порциями страниц,
+  checkpoint WAL в конце
+
+Запуск: отдельным PM2-приложением по расписанию или из бота
+(ACCESS_SWEEP_HOURS > 0 - задача в job queue).
+
+Счетчики access_stats.py считают коды, которые остались в access.db:
+архивные коды уходят и из статистики бота.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import sql_trace
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'access.db'
+
+SESSION_GRACE_DAYS = 7
+CODE_GRACE_DAYS = 30
+LOG_RETENTION_DAYS = 90
+
+BATCH_SIZE = 2000
+BATCH_PAUSE = 0.0
+VACUUM_PAGES = 1000
+BUSY_TIMEOUT = 10.0
+
+# Индекс для проверки "у кода не осталось сессий"
+SWEEP_INDEXES = {
+    'idx_user_sessions_code': "ON user_sessions(access_code_id)",
+}
+
+# Сессии кода; правило кодов идет после правила сессий и видит
+# только сессии, которые этот же проход оставил
+CODE_SESSIONS = "SELECT 1 FROM main.user_sessions s WHERE s.access_code_id = access_codes.id"
+
+# Условия очистки; :cutoff_* считаются один раз на запуск,
+# чтобы копия в архив и удаление видели одну и ту же границу
+SWEEP_RULES = [
+    ('user_sessions', """
+        datetime(expires_at) < :cutoff_sessions
+        OR (is_active = 0 AND datetime(IFNULL(last_activity, created_at)) < :cutoff_sessions)
+    """),
+    ('access_codes', f"""
+        NOT EXISTS ({CODE_SESSIONS})
+        AND (
+            datetime(expires_at) < :cutoff_codes
+            OR (IFNULL(current_activations, 0) >= IFNULL(max_activations, 1)
+                AND datetime(IFNULL(used_at, generated_at)) < :cutoff_codes)
+        )
+    """),
+    ('activity_logs', """
+        datetime(timestamp) < :cutoff_logs
+    """),
+]
+
+# Не удалять события, которые activity_rollup.py еще не свернул
+ROLLUP_STATE_TABLE = 'activity_rollup_state'
+ROLLUP_GUARD = f"id <= (SELECT IFNULL(MIN(last_id), 0) FROM main.{ROLLUP_STATE_TABLE})"
+
+
+def default_archive_path(db_path: str) -> str:
+    """access.db -> access_archive.db рядом"""
+    base, ext = os.path.splitext(db_path)
+    return f"{base}_archive{ext or '.db'}"
+
+# ==================== АРХИВ ====================
+
+def _columns(cursor: sqlite3.Cursor, schema: str, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA {schema}.table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def attach_archive(conn: sqlite3.Connection, archive_path: str):
+    """
+    Подключить архив и догнать его схему: таблица без ограничений
+    (UNIQUE не мешает повторной архивации), новые колонки - через ALTER.
+    """
+    cursor = conn.cursor()
+    cursor.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    for table, _ in SWEEP_RULES:
+        columns = _columns(cursor, 'main', table)
+        if not columns:
+            continue
+        existing = _columns(cursor, 'archive', table)
+        if not existing:
+            cursor.execute(f"""
+                CREATE TABLE archive.{table} ({', '.join(columns)}, archived_at TIMESTAMP)
+            """)
+            continue
+        for column in columns:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+    conn.commit()
+
+
+def detach_archive(conn: sqlite3.Connection):
+    conn.execute("DETACH DATABASE archive")
+
+# ==================== ОЧИСТКА ====================
+
+def ensure_indexes(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    for name, definition in SWEEP_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+    conn.commit()
+
+
+def get_cutoffs(cursor: sqlite3.Cursor, session_days: int, code_days: int,
+                log_days: int) -> Dict[str, str]:
+    """Границы в UTC, в формате datetime() SQLite"""
+    cursor.execute("""
+        SELECT datetime('now', :sessions), datetime('now', :codes), datetime('now', :logs)
+    """, {
+        'sessions': f'-{session_days} days',
+        'codes': f'-{code_days} days',
+        'logs': f'-{log_days} days'
+    })
+    sessions, codes, logs = cursor.fetchone()
+    return {'cutoff_sessions': sessions, 'cutoff_codes': codes, 'cutoff_logs': logs}
+
+
+def dry_run_rules(rules: List) -> List:
+    """
+    Условия для --dry-run: сессии еще не удалены, поэтому коды считаются
+    так, будто сессии под правилом user_sessions уже ушли - как в реальном проходе.
+    """
+    session_condition = dict(rules).get('user_sessions')
+    if not session_condition:
+        return rules
+    remaining = f"{CODE_SESSIONS} AND NOT IFNULL(({session_condition}), 0)"
+    return [
+        (table, condition.replace(CODE_SESSIONS, remaining) if table == 'access_codes' else condition)
+        for table, condition in rules
+    ]
+
+
+def count_candidates(cursor: sqlite3.Cursor, table: str, condition: str, cutoffs: Dict) -> int:
+    cursor.execute(f"SELECT COUNT(*) FROM main.{table} WHERE {condition}", cutoffs)
+    return cursor.fetchone()[0]
+
+
+def sweep_table(conn: sqlite3.Connection, table: str, condition: str, cutoffs: Dict,
+                archive: bool = True, batch_size: int = BATCH_SIZE,
+                pause: float = BATCH_PAUSE) -> int:
+    """
+    Архивировать и удалить строки table по condition порциями rowid.
+    Каждая порция - отдельная транзакция.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM main.{table}")
+    min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        return 0
+
+    columns = ', '.join(_columns(cursor, 'main', table))
+    removed = 0
+    start = min_id
+
+    while start <= max_id:
+        params = dict(cutoffs, start=start, end=start + batch_size - 1)
+        where_sql = f"rowid BETWEEN :start AND :end AND ({condition})"
+        try:
+            if archive:
+                cursor.execute(f"""
+                    INSERT INTO archive.{table} ({columns}, archived_at)
+                    SELECT {columns}, CURRENT_TIMESTAMP FROM main.{table} WHERE {where_sql}
+                """, params)
+            cursor.execute(f"DELETE FROM main.{table} WHERE {where_sql}", params)
+            removed += cursor.rowcount
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+        start += batch_size
+        if pause:
+            time.sleep(pause)
+
+    return removed
+
+
+def reclaim_space(conn: sqlite3.Connection, pages: int = VACUUM_PAGES) -> Dict:
+    """
+    Вернуть свободные страницы файлу. incremental_vacuum работает,
+    только если auto_vacuum = INCREMENTAL (см. --enable-incremental).
+    """
+    cursor = conn.cursor()
+    auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+    page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    free_before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+
+    result = {'incremental': auto_vacuum == 2, 'freed_bytes': 0, 'free_bytes': free_before * page_size}
+    if auto_vacuum != 2:
+        return result
+
+    while True:
+        free = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            break
+        cursor.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+        conn.commit()
+        if cursor.execute("PRAGMA freelist_count").fetchone()[0] >= free:
+            break
+
+    free_after = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+    result['freed_bytes'] = (free_before - free_after) * page_size
+    result['free_bytes'] = free_after * page_size
+
+    if cursor.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return result
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection):
+    """
+    Одноразово: auto_vacuum = INCREMENTAL вступает в силу только после
+    полного VACUUM (база блокируется на время перестройки).
+    """
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def sweep(db_path: str = DB_PATH, archive_path: Optional[str] = None, archive: bool = True,
+          session_days: int = SESSION_GRACE_DAYS, code_days: int = CODE_GRACE_DAYS,
+          log_days: int = LOG_RETENTION_DAYS, batch_size: int = BATCH_SIZE,
+          pause: float = BATCH_PAUSE, dry_run: bool = False) -> Dict:
+    """
+    Полный проход: сессии, коды, логи, возврат места.
+    Отдельное соединение - можно звать из потока бота.
+    """
+    started = time.time()
+    conn = sql_trace.connect(db_path, timeout=BUSY_TIMEOUT)
+    report = {'dry_run': dry_run, 'removed': {}, 'archive': None}
+
+    try:
+        cursor = conn.cursor()
+        tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        rules = [(table, condition) for table, condition in SWEEP_RULES if table in tables]
+        if ROLLUP_STATE_TABLE in tables:
+            rules = [
+                (table, f"({condition}) AND {ROLLUP_GUARD}" if table == 'activity_logs' else condition)
+                for table, condition in rules
+            ]
+
+        cutoffs = get_cutoffs(cursor, session_days, code_days, log_days)
+        report['cutoffs'] = cutoffs
+
+        if dry_run:
+            # Без DDL: --dry-run ничего не пишет, без индекса подсчет просто медленнее
+            for table, condition in dry_run_rules(rules):
+                report['removed'][table] = count_candidates(cursor, table, condition, cutoffs)
+        else:
+            # Без индекса NOT EXISTS - полный проход user_sessions на каждый код
+            ensure_indexes(conn)
+            if archive:
+                report['archive'] = archive_path or default_archive_path(db_path)
+                attach_archive(conn, report['archive'])
+            try:
+                for table, condition in rules:
+                    report['removed'][table] = sweep_table(
+                        conn, table, condition, cutoffs, archive, batch_size, pause
+                    )
+            finally:
+                if archive:
+                    detach_archive(conn)
+            report['space'] = reclaim_space(conn)
+    finally:
+        conn.close()
+
+    report['seconds'] = round(time.time() - started, 2)
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """Короткий текст для лога и бота"""
+    verb = "К удалению" if report['dry_run'] else "Удалено"
+    lines = [f"🧹 {verb}:"]
+    for table, count in report['removed'].items():
+        lines.append(f"  {table}: {count:,}")
+    if report.get('archive'):
+        lines.append(f"📦 Архив: {report['archive']}")
+    space = report.get('space')
+    if space:
+        if space['incremental']:
+            lines.append(f"💾 Освобождено: {space['freed_bytes'] / 1024 / 1024:.1f} MB")
+        elif space['free_bytes']:
+            lines.append(f"💾 Свободных страниц: {space['free_bytes'] / 1024 / 1024:.1f} MB "
+                         f"(auto_vacuum выключен, см. --enable-incremental)")
+    lines.append(f"⏱ {report['seconds']}с")
+    return '\n'.join(lines)
+
+# ==================== CLI ====================
+
+def main():
+    # ACCESS_DB_PATH из .env - как у бота и Node-сервера
+    if load_dotenv:
+        load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description='🧹 Access Sweeper - архивация и очистка access.db',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python access_sweeper.py                        # Архивировать и удалить устаревшее
+  python access_sweeper.py --dry-run              # Только посчитать
+  python access_sweeper.py --log-days 30 --no-archive
+  python access_sweeper.py --enable-incremental   # Один раз: auto_vacuum + VACUUM
+        """
+    )
+
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Посчитать кандидатов без изменений')
+    parser.add_argument('--no-archive', action='store_true',
+                        help='Удалять без копии в архив')
+    parser.add_argument('--archive',
+                        help='Файл архива (по умолчанию: <db>_archive.db)')
+    parser.add_argument('--enable-incremental', action='store_true',
+                        help='Включить auto_vacuum = INCREMENTAL (полный VACUUM)')
+
+    parser.add_argument('--session-days', type=int, default=SESSION_GRACE_DAYS,
+                        help=f'Хранить истекшие сессии, дней (по умолчанию: {SESSION_GRACE_DAYS})')
+    parser.add_argument('--code-days', type=int, default=CODE_GRACE_DAYS,
+                        help=f'Хранить исчерпанные/истекшие коды, дней (по умолчанию: {CODE_GRACE_DAYS})')
+    parser.add_argument('--log-days', type=int, default=LOG_RETENTION_DAYS,
+                        help=f'Хранить activity_logs, дней (по умолчанию: {LOG_RETENTION_DAYS})')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'rowid на транзакцию (по умолчанию: {BATCH_SIZE})')
+    parser.add_argument('--pause', type=float, default=BATCH_PAUSE,
+                        help='Пауза между порциями, сек')
+
+    parser.add_argument('--db',
+                        default=os.getenv('ACCESS_DB_PATH', DB_PATH),
+                        help=f'Путь к access.db (по умолчанию: $ACCESS_DB_PATH или {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        if args.enable_incremental:
+            conn = sql_trace.connect(args.db, timeout=BUSY_TIMEOUT)
+            try:
+                enable_incremental_vacuum(conn)
+            finally:
+                conn.close()
+            print("✅ auto_vacuum = INCREMENTAL включен")
+            return
+
+        report = sweep(
+            args.db, args.archive, not args.no_archive,
+            args.session_days, args.code_days, args.log_days,
+            args.batch_size, args.pause, args.dry_run
+        )
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+
+    print(format_report(report))
+
+if __name__ == "__main__":
+    main()
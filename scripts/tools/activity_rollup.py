@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+📈 ACTIVITY ROLLUP - Почасовые и посуточные сводки activity_logs
+
+Назначение:
+- Таблицы activity_hourly и activity_daily: события и уникальные сессии
+  по (корзина времени, action, тип кода); action = '*' - все действия
+  (уникальные сессии не складываются по действиям)
+- Инкрементально: high-water mark (последний учтенный id) на каждую
+  сводку в activity_rollup_state, сворачиваются только закрытые
+  корзины - прошедший час / прошедшие сутки
+- Сводка и сдвиг отметки - в одной транзакции, порциями id по границам
+  корзин: повторный запуск после сбоя не учитывает события дважды,
+  уникальные сессии корзины считаются одним COUNT(DISTINCT)
+- Почасовые сводки хранятся HOURLY_RETENTION_DAYS, посуточные - всегда.
+  Сырые события здесь не удаляются: их хранение, архив и удаление - только
+  access_sweeper.py (LOG_RETENTION_DAYS, и только уже свернутые события)
+- Отчеты для /activity в admin_telegram_bot.py
+
+Тип кода берется через user_sessions -> access_codes на момент сворачивания,
+поэтому сводку стоит запускать чаще, чем access_sweeper.py удаляет сессии.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
+import access_sweeper
+import sql_trace
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'access.db'
+
+STATE_TABLE = 'activity_rollup_state'
+HOURLY_TABLE = 'activity_hourly'
+DAILY_TABLE = 'activity_daily'
+
+HOURLY_RETENTION_DAYS = 90
+CHUNK_IDS = 50000
+
+ALL_ACTIONS = '*'
+
+# Сводка: (таблица, формат корзины strftime, граница закрытых корзин)
+ROLLUPS = {
+    'hourly': (HOURLY_TABLE, '%Y-%m-%d %H:00', "strftime('%Y-%m-%d %H:00:00', 'now')"),
+    'daily': (DAILY_TABLE, '%Y-%m-%d', "date('now')"),
+}
+
+# ==================== УСТАНОВКА ====================
+
+def ensure_tables(cursor: sqlite3.Cursor):
+    for table in (HOURLY_TABLE, DAILY_TABLE):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket TEXT NOT NULL,
+                action TEXT NOT NULL,
+                code_type TEXT NOT NULL,
+                events INTEGER NOT NULL DEFAULT 0,
+                sessions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, action, code_type)
+            ) WITHOUT ROWID
+        """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP
+        )
+    """)
+    for name in ROLLUPS:
+        cursor.execute(f"INSERT OR IGNORE INTO {STATE_TABLE} (name, last_id) VALUES (?, 0)", (name,))
+
+
+def is_installed(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?)",
+                   (STATE_TABLE, HOURLY_TABLE, DAILY_TABLE))
+    return cursor.fetchone()[0] == 3
+
+# ==================== СВОРАЧИВАНИЕ ====================
+
+def _rollup_sql(table: str, bucket_format: str, all_actions: bool = False) -> str:
+    action_sql = f"'{ALL_ACTIONS}'" if all_actions else 'l.action'
+    # ON CONFLICT после JOIN ... ON разбирается однозначно только при WHERE/GROUP BY
+    return f"""
+        INSERT INTO {table} (bucket, action, code_type, events, sessions)
+        SELECT strftime('{bucket_format}', l.timestamp), {action_sql}, IFNULL(c.code_type, ''),
+               COUNT(*), COUNT(DISTINCT l.session_token)
+        FROM activity_logs l
+        LEFT JOIN user_sessions s ON s.session_token = l.session_token
+        LEFT JOIN access_codes c ON c.id = s.access_code_id
+        WHERE l.id > :from_id AND l.id <= :to_id AND l.timestamp IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT(bucket, action, code_type) DO UPDATE SET
+            events = events + excluded.events,
+            sessions = sessions + excluded.sessions
+    """
+
+
+def _chunk_end(cursor: sqlite3.Cursor, bucket_format: str, last_id: int, to_id: int,
+               target_id: int) -> int:
+    """
+    Конец порции на границе корзины. Уникальные сессии двух порций
+    не складываются, поэтому корзину, которую режет to_id, порция либо
+    не берет совсем, либо (корзина больше порции) берет целиком.
+    """
+    if to_id >= target_id:
+        return target_id
+
+    cursor.execute("""
+        SELECT strftime(?, timestamp) FROM activity_logs
+        WHERE id > ? AND id <= ? AND timestamp IS NOT NULL
+        ORDER BY id LIMIT 1
+    """, (bucket_format, to_id, target_id))
+    row = cursor.fetchone()
+    if row is None:
+        return target_id
+    bucket = row[0]
+
+    cursor.execute("""
+        SELECT MIN(id) FROM activity_logs
+        WHERE id > ? AND id <= ? AND strftime(?, timestamp) = ?
+    """, (last_id, to_id, bucket_format, bucket))
+    first_id = cursor.fetchone()[0]
+    if first_id is None:
+        return to_id
+    if first_id - 1 > last_id:
+        return first_id - 1
+
+    cursor.execute("""
+        SELECT MAX(id) FROM activity_logs
+        WHERE id > ? AND id <= ? AND strftime(?, timestamp) = ?
+    """, (to_id, target_id, bucket_format, bucket))
+    return cursor.fetchone()[0]
+
+
+def roll_up(conn: sqlite3.Connection, name: str, chunk_ids: int = CHUNK_IDS) -> int:
+    """
+    Свернуть новые события одной сводки, вернуть их количество.
+    Уникальные сессии корзины точны, пока события корзины не делятся
+    между запусками и порциями - поэтому сворачиваются только закрытые
+    корзины, а порции режутся по границам корзин (id растет со временем).
+    """
+    table, bucket_format, boundary_sql = ROLLUPS[name]
+    cursor = conn.cursor()
+
+    cursor.execute(f"SELECT last_id FROM {STATE_TABLE} WHERE name = ?", (name,))
+    last_id = cursor.fetchone()[0]
+    cursor.execute(f"""
+        SELECT MAX(id) FROM activity_logs
+        WHERE id > ? AND timestamp < {boundary_sql}
+    """, (last_id,))
+    target_id = cursor.fetchone()[0]
+    if target_id is None:
+        return 0
+
+    statements = [_rollup_sql(table, bucket_format), _rollup_sql(table, bucket_format, all_actions=True)]
+    processed = 0
+    while last_id < target_id:
+        to_id = _chunk_end(cursor, bucket_format, last_id, min(last_id + chunk_ids, target_id), target_id)
+        try:
+            for sql in statements:
+                cursor.execute(sql, {'from_id': last_id, 'to_id': to_id})
+            cursor.execute("SELECT COUNT(*) FROM activity_logs WHERE id > ? AND id <= ?", (last_id, to_id))
+            processed += cursor.fetchone()[0]
+            cursor.execute(f"""
+                UPDATE {STATE_TABLE} SET last_id = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE name = ?
+            """, (to_id, name))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        last_id = to_id
+
+    return processed
+
+
+def prune(conn: sqlite3.Connection, hourly_days: int = HOURLY_RETENTION_DAYS) -> Dict[str, int]:
+    """
+    Удалить почасовые сводки старше hourly_days.
+
+    Сырые activity_logs не трогаем: их архивирует и удаляет access_sweeper.py
+    (ROLLUP_GUARD не даст удалить еще не свернутые события).
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT strftime('%Y-%m-%d %H:00', 'now', ?)", (f'-{hourly_days} days',))
+    hourly_cutoff = cursor.fetchone()[0]
+
+    removed = {}
+    cursor.execute(f"DELETE FROM {HOURLY_TABLE} WHERE bucket < ?", (hourly_cutoff,))
+    removed[HOURLY_TABLE] = cursor.rowcount
+    conn.commit()
+    return removed
+
+
+def run(db_path: str = DB_PATH, hourly_days: int = HOURLY_RETENTION_DAYS, chunk_ids: int = CHUNK_IDS,
+        do_prune: bool = True) -> Dict:
+    """Полный проход: обе сводки и очистка. Отдельное соединение."""
+    started = time.time()
+    conn = sql_trace.connect(db_path, timeout=access_sweeper.BUSY_TIMEOUT)
+    try:
+        cursor = conn.cursor()
+        ensure_tables(cursor)
+        conn.commit()
+
+        report = {'rolled_up': {name: roll_up(conn, name, chunk_ids) for name in ROLLUPS}}
+        if do_prune:
+            report['removed'] = prune(conn, hourly_days)
+    finally:
+        conn.close()
+
+    report['seconds'] = round(time.time() - started, 2)
+    return report
+
+# ==================== ОТЧЕТЫ ====================
+
+def get_daily_totals(cursor: sqlite3.Cursor, days: int = 7) -> List[Dict]:
+    """События и сессии по дням (все действия), новые дни первыми"""
+    cursor.execute(f"""
+        SELECT bucket, SUM(events), SUM(sessions) FROM {DAILY_TABLE}
+        WHERE bucket >= date('now', ?) AND action = ?
+        GROUP BY bucket ORDER BY bucket DESC
+    """, (f'-{days} days', ALL_ACTIONS))
+    return [{'day': row[0], 'events': row[1], 'sessions': row[2]} for row in cursor.fetchall()]
+
+
+def get_action_totals(cursor: sqlite3.Cursor, days: int = 7) -> Dict[str, Dict[str, int]]:
+    """action -> {тип кода: событий} за days дней"""
+    cursor.execute(f"""
+        SELECT action, code_type, SUM(events) FROM {DAILY_TABLE}
+        WHERE bucket >= date('now', ?) AND action != ?
+        GROUP BY action, code_type
+    """, (f'-{days} days', ALL_ACTIONS))
+    totals = {}
+    for action, code_type, events in cursor.fetchall():
+        totals.setdefault(action, {})[code_type] = events
+    return dict(sorted(totals.items(), key=lambda item: -sum(item[1].values())))
+
+
+def get_last_hours(cursor: sqlite3.Cursor, hours: int = 24) -> Dict[str, int]:
+    """Событий по действиям за последние hours закрытых часов"""
+    cursor.execute(f"""
+        SELECT action, SUM(events) FROM {HOURLY_TABLE}
+        WHERE bucket >= strftime('%Y-%m-%d %H:00', 'now', ?) AND action != ?
+        GROUP BY action ORDER BY SUM(events) DESC
+    """, (f'-{hours} hours', ALL_ACTIONS))
+    return dict(cursor.fetchall())
+
+
+def get_report(cursor: sqlite3.Cursor, days: int = 7) -> Dict:
+    cursor.execute(f"SELECT name, last_id, updated_at FROM {STATE_TABLE}")
+    state = {row[0]: {'last_id': row[1], 'updated_at': row[2]} for row in cursor.fetchall()}
+    return {
+        'days': days,
+        'daily': get_daily_totals(cursor, days),
+        'actions': get_action_totals(cursor, days),
+        'last_24h': get_last_hours(cursor, 24),
+        'state': state
+    }
+
+
+def print_report(cursor: sqlite3.Cursor, days: int = 7):
+    report = get_report(cursor, days)
+    print("\n" + "=" * 70)
+    print("📈 ACTIVITY ROLLUP".center(70))
+    print("=" * 70)
+    for name, state in report['state'].items():
+        print(f"🔖 {name}: до id {state['last_id']:,} (обновлено {state['updated_at'] or '—'})")
+
+    print(f"\n📅 По дням ({days} дн.):")
+    for row in report['daily']:
+        print(f"  {row['day']}  событий {row['events']:>9,}  сессий {row['sessions']:>7,}")
+
+    print("\n🏷️ По действиям:")
+    for action, by_type in report['actions'].items():
+        parts = ', '.join(f"{code_type or '—'}: {events:,}" for code_type, events in sorted(by_type.items()))
+        print(f"  {action:20} {sum(by_type.values()):>9,}  ({parts})")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    # ACCESS_DB_PATH из .env - как у бота и Node-сервера
+    if load_dotenv:
+        load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description='📈 Activity Rollup - сводки activity_logs по часам и дням',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python activity_rollup.py                     # Свернуть новые события, удалить старые почасовые сводки
+  python activity_rollup.py --no-prune          # Только свернуть
+  python activity_rollup.py --report --days 30  # Отчет из сводок
+        """
+    )
+
+    parser.add_argument('--report', action='store_true',
+                        help='Показать отчет вместо сворачивания')
+    parser.add_argument('--days', type=int, default=7,
+                        help='Период отчета, дней (по умолчанию: 7)')
+    parser.add_argument('--no-prune', action='store_true',
+                        help='Не удалять старые почасовые сводки')
+    parser.add_argument('--hourly-days', type=int, default=HOURLY_RETENTION_DAYS,
+                        help=f'Хранить почасовые сводки, дней (по умолчанию: {HOURLY_RETENTION_DAYS})')
+
+    parser.add_argument('--db',
+                        default=os.getenv('ACCESS_DB_PATH', DB_PATH),
+                        help=f'Путь к access.db (по умолчанию: $ACCESS_DB_PATH или {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        if args.report:
+            conn = sql_trace.connect(args.db)
+            try:
+                if not is_installed(conn.cursor()):
+                    print("❌ Сводок еще нет. Запустите без --report")
+                    sys.exit(1)
+                print_report(conn.cursor(), args.days)
+            finally:
+                conn.close()
+            return
+
+        report = run(args.db, args.hourly_days, do_prune=not args.no_prune)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+
+    for name, count in report['rolled_up'].items():
+        print(f"📈 {name}: свернуто событий {count:,}")
+    for table, count in report.get('removed', {}).items():
+        print(f"🧹 {table}: удалено {count:,}")
+    print(f"⏱ {report['seconds']}с")
+
+if __name__ == "__main__":
+    main()
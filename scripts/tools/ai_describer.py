@@ -21,6 +21,9 @@ from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
+import batch_metrics
+import sql_trace
+
 load_dotenv()
 
 try:
@@ -119,7 +122,7 @@ class AIDescriberFinal:
     def connect_db(self) -> bool:
         """Подключение к базе данных"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sql_trace.connect(self.db_path)
             self.conn.row_factory = sqlite3.Row
             self.cursor = self.conn.cursor()
             return True
@@ -440,10 +443,14 @@ class AIDescriberFinal:
             print(f"❌ Ошибка обновления БД для ID {item_id}: {e}")
             return False
     
-    def process_items(self, items: List[Dict], show_progress: bool = True):
-        """Обработка списка элементов"""
+    def process_items(self, items: List[Dict], show_progress: bool = True,
+                      metrics: Optional[batch_metrics.BatchMetrics] = None):
+        """Обработка списка элементов (metrics - прогресс, этапы, JSON-события)"""
         
         total = len(items)
+        if metrics is None:
+            metrics = batch_metrics.BatchMetrics('ai_describer', quiet=not show_progress)
+        metrics.total = total
         print(f"\n🤖 ФИНАЛЬНАЯ ГЕНЕРАЦИЯ AI-ОПИСАНИЙ")
         print("=" * 70)
         print(f"Элементов для обработки: {total}")
@@ -455,45 +462,54 @@ class AIDescriberFinal:
         for i, item in enumerate(items, 1):
             emoji = {'book': '📖', 'movie': '🎬', 'music': '🎵'}[item['type']]
             
-            if show_progress:
-                print(f"\n[{i}/{total}] {emoji} {item['title']}")
-                if item['creator']:
-                    print(f"        by {item['creator']}")
+            metrics.log(f"\n[{i}/{total}] {emoji} {item['title']}")
+            if item['creator']:
+                metrics.log(f"        by {item['creator']}")
             
             # Создаем умный промпт
             prompt, prompt_type = self.create_smart_prompt(item)
             
             # Показываем тип промпта
-            if show_progress:
-                prompt_icon = "⚡" if prompt_type == 'short' else "📝"
-                print(f"        {prompt_icon} Промпт: {'популярный' if prompt_type == 'short' else 'детальный'}")
+            prompt_icon = "⚡" if prompt_type == 'short' else "📝"
+            metrics.log(f"        {prompt_icon} Промпт: {'популярный' if prompt_type == 'short' else 'детальный'}")
             
             # Генерируем описание
-            description = self.call_groq_api(prompt, prompt_type)
+            with metrics.stage('groq_api'):
+                description = self.call_groq_api(prompt, prompt_type)
             
             if description:
                 # Обновляем в БД
-                if self.update_description(item['id'], description):
+                with metrics.stage('db'):
+                    updated = self.update_description(item['id'], description)
+                if updated:
                     self.stats['successful'] += 1
-                    if show_progress:
-                        preview = description[:70] + '...' if len(description) > 70 else description
-                        print(f"        ✅ {preview}")
+                    metrics.item('saved')
+                    preview = description[:70] + '...' if len(description) > 70 else description
+                    metrics.log(f"        ✅ {preview}")
                 else:
                     self.stats['failed'] += 1
-                    if show_progress:
-                        print(f"        ❌ Ошибка сохранения")
+                    metrics.item('db_error')
+                    metrics.log(f"        ❌ Ошибка сохранения")
             else:
                 self.stats['failed'] += 1
-                if show_progress:
-                    print(f"        ❌ Ошибка генерации")
+                metrics.item('api_error')
+                metrics.log(f"        ❌ Ошибка генерации")
             
             self.stats['total_processed'] += 1
             
             # Задержка между запросами
             if i < total:
-                time.sleep(RATE_LIMIT_DELAY)
+                with metrics.stage('rate_limit'):
+                    time.sleep(RATE_LIMIT_DELAY)
         
         print("\n" + "=" * 70)
+        metrics.close(
+            api_calls=self.stats['api_calls'],
+            total_tokens=self.stats['total_tokens'],
+            short_prompts=self.stats['short_prompts'],
+            long_prompts=self.stats['long_prompts'],
+            cleaned=self.stats['cleaned']
+        )
     
     def show_summary(self):
         """Показать итоговую статистику"""
@@ -548,7 +564,8 @@ class AIDescriberFinal:
         self,
         content_type: Optional[str] = None,
         limit: int = 100,
-        dry_run: bool = False
+        dry_run: bool = False,
+        metrics: Optional[batch_metrics.BatchMetrics] = None
     ):
         """Запуск процесса генерации описаний"""
         
@@ -622,7 +639,7 @@ class AIDescriberFinal:
                 return False
             
             start_time = time.time()
-            self.process_items(items)
+            self.process_items(items, metrics=metrics)
             elapsed_time = time.time() - start_time
             
             self.show_summary()
@@ -649,6 +666,8 @@ def main():
   python ai_describer.py --limit=50
   python ai_describer.py --type books --limit=100
   python ai_describer.py --dry-run
+  python ai_describer.py --limit=1000 --quiet --metrics describer.jsonl
+  python ai_describer.py --dry-run --sql-trace
         """
     )
     
@@ -677,7 +696,11 @@ def main():
         help=f'Путь к базе данных'
     )
     
+    batch_metrics.add_arguments(parser)
+    sql_trace.add_arguments(parser)
+    
     args = parser.parse_args()
+    sql_trace.from_args(args)
     
     content_type = None
     if args.type:
@@ -688,7 +711,8 @@ def main():
     describer.run(
         content_type=content_type,
         limit=args.limit,
-        dry_run=args.dry_run
+        dry_run=args.dry_run,
+        metrics=batch_metrics.from_args('ai_describer', args)
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+📊 BATCH METRICS - Прогресс и метрики пакетных инструментов
+
+Назначение:
+- Счетчики элементов по исходу (saved, skipped, failed...) и произвольные
+- Скорость и ETA по скользящему окну
+- Таймеры этапов (сеть, БД, API...) - сумма, число вызовов, максимум
+- События JSON-lines в файл (--metrics): start, progress, summary
+- Тихий режим (--quiet): вместо строки на каждый элемент - строка
+  прогресса не чаще раза в --progress-interval секунд
+
+Используется харвестерами, ai_describer.py и translate_descriptions.py:
+    metrics = batch_metrics.from_args('harvest_movies', args, total=1080)
+    with metrics.stage('api'):
+        ...
+    metrics.item('saved')
+    metrics.close()
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# ==================== КОНСТАНТЫ ====================
+
+PROGRESS_INTERVAL = 10.0
+# Окно для скорости: последние N элементов (скорость "сейчас", а не средняя)
+RATE_WINDOW = 50
+
+# ==================== МЕТРИКИ ====================
+
+class BatchMetrics:
+    """Счетчики, этапы и прогресс одного запуска инструмента"""
+
+    def __init__(self, tool: str, total: Optional[int] = None, quiet: bool = False,
+                 events_path: Optional[str] = None, interval: float = PROGRESS_INTERVAL,
+                 stream=None):
+        self.tool = tool
+        self.total = total
+        self.quiet = quiet
+        self.interval = interval
+        self.stream = stream or sys.stdout
+
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.done = 0
+        self.outcomes: Dict[str, int] = {}
+        self.counters: Dict[str, float] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.window = deque(maxlen=RATE_WINDOW)
+        self.closed = False
+
+        self.events = open(events_path, 'a', encoding='utf-8') if events_path else None
+        self.event('start', total=total)
+
+    # ---------- счетчики ----------
+
+    def item(self, outcome: str = 'done', count: int = 1):
+        """Элемент обработан (исход - saved, skipped, failed...)"""
+        self.done += count
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+        now = time.perf_counter()
+        self.window.append((now, self.done))
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report_progress()
+
+    def count(self, name: str, value: float = 1):
+        """Произвольный счетчик: API-вызовы, токены, ошибки сети..."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name: str):
+        """with metrics.stage('api'): ... - время этапа копится по имени"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = {'seconds': 0.0, 'calls': 0, 'max': 0.0}
+            stats['seconds'] += elapsed
+            stats['calls'] += 1
+            if elapsed > stats['max']:
+                stats['max'] = elapsed
+
+    # ---------- скорость ----------
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def rate(self) -> float:
+        """Элементов в секунду по окну последних RATE_WINDOW"""
+        if len(self.window) >= 2:
+            (first_time, first_done), (last_time, last_done) = self.window[0], self.window[-1]
+            if last_time > first_time:
+                return (last_done - first_done) / (last_time - first_time)
+        elapsed = self.elapsed()
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        if not self.total:
+            return None
+        rate = self.rate()
+        if rate <= 0:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    # ---------- вывод ----------
+
+    def log(self, *args, **kwargs):
+        """Подробная строка на элемент - только без --quiet"""
+        if not self.quiet:
+            print(*args, file=self.stream, **kwargs)
+
+    def event(self, kind: str, **fields):
+        """Событие JSON-lines (если задан --metrics)"""
+        if not self.events:
+            return
+        record = {
+            'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'tool': self.tool,
+            'event': kind,
+        }
+        record.update(fields)
+        self.events.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.events.flush()
+
+    def progress_line(self) -> str:
+        done = f"{self.done}/{self.total} ({self.done / self.total * 100:.1f}%)" if self.total else str(self.done)
+        parts = [f"⏳ {done}", f"{self.rate():.2f}/с"]
+        eta = self.eta()
+        if eta is not None:
+            parts.append(f"ETA {format_duration(eta)}")
+        if self.outcomes:
+            parts.append(', '.join(f"{name} {count}" for name, count in self.outcomes.items()))
+        return ' · '.join(parts)
+
+    def report_progress(self):
+        """Строка прогресса (в тихом режиме) и событие progress"""
+        if self.quiet:
+            print(self.progress_line(), file=self.stream, flush=True)
+        self.event('progress', done=self.done, total=self.total, rate=round(self.rate(), 3),
+                   eta=round(self.eta(), 1) if self.eta() is not None else None,
+                   outcomes=dict(self.outcomes))
+
+    def summary(self) -> Dict:
+        elapsed = self.elapsed()
+        return {
+            'done': self.done,
+            'total': self.total,
+            'seconds': round(elapsed, 3),
+            'rate': round(self.done / elapsed, 3) if elapsed > 0 else 0.0,
+            'outcomes': dict(self.outcomes),
+            'counters': dict(self.counters),
+            'stages': {
+                name: {'seconds': round(stats['seconds'], 3), 'calls': stats['calls'],
+                       'max': round(stats['max'], 3)}
+                for name, stats in self.stages.items()
+            },
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"\n📊 {self.tool}: {summary['done']} за {format_duration(summary['seconds'])} "
+              f"({summary['rate']:.2f}/с)", file=self.stream)
+        if summary['outcomes']:
+            print("   " + ', '.join(f"{name}: {count}" for name, count in summary['outcomes'].items()),
+                  file=self.stream)
+        if summary['stages']:
+            print("   Этапы:", file=self.stream)
+            for name, stats in sorted(summary['stages'].items(), key=lambda kv: -kv[1]['seconds']):
+                share = stats['seconds'] / summary['seconds'] * 100 if summary['seconds'] else 0
+                print(f"     {name:<14} {stats['seconds']:>9.2f}с {share:>5.1f}%  "
+                      f"вызовов {stats['calls']}, макс {stats['max']:.2f}с", file=self.stream)
+
+    def close(self, **extra):
+        """Итог: сводка с этапами на экран и событие summary (+ extra)"""
+        if self.closed:
+            return
+        self.closed = True
+        self.print_summary()
+        self.event('summary', **self.summary(), **extra)
+        if self.events:
+            self.events.close()
+            self.events = None
+
+
+def timed(metrics: Optional[BatchMetrics], name: str):
+    """stage() для кода, который работает и без метрик (metrics=None)"""
+    return metrics.stage(name) if metrics else nullcontext()
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f}с"
+    seconds = int(seconds)
+    if seconds < 3600:
+        return f"{seconds // 60}м{seconds % 60:02d}с"
+    return f"{seconds // 3600}ч{seconds % 3600 // 60:02d}м"
+
+# ==================== CLI ====================
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """--quiet, --metrics, --progress-interval (умолчания из BATCH_* в .env)"""
+    group = parser.add_argument_group('вывод и метрики')
+    group.add_argument('--quiet', action='store_true',
+                       default=os.getenv('BATCH_QUIET', '') not in ('', '0'),
+                       help='Без строки на каждый элемент, только прогресс (BATCH_QUIET=1)')
+    group.add_argument('--metrics', default=os.getenv('BATCH_METRICS') or None,
+                       help='Дописывать события JSON-lines в файл (BATCH_METRICS)')
+    group.add_argument('--progress-interval', type=float,
+                       default=float(os.getenv('BATCH_PROGRESS_INTERVAL', PROGRESS_INTERVAL)),
+                       help=f'Прогресс не чаще раза в N сек (по умолчанию: {PROGRESS_INTERVAL:g})')
+
+
+def from_args(tool: str, args: argparse.Namespace, total: Optional[int] = None) -> BatchMetrics:
+    return BatchMetrics(tool, total=total, quiet=args.quiet,
+                        events_path=args.metrics, interval=args.progress_interval)
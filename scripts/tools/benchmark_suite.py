@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+⏱️ BENCHMARK SUITE - Замеры производительности Python-инструментов
+
+Назначение:
+- Прогон горячих путей на синтетическом каталоге (synthetic_catalog.py):
+  сохранение в harvest_*, is_duplicate, fix_duplicates, отчеты db_inspector,
+  выборка translate_descriptions и ai_describer
+- Результаты в JSON (коммит, версии, размер фикстуры, время по каждому замеру)
+- Сравнение с прошлым прогоном: регрессии выше порога
+
+Сетевые вызовы харвестеров (fetch_*) подменяются готовыми ответами API,
+изменения в БД откатываются - фикстура остается нетронутой.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import synthetic_catalog
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'harvesting'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'migrations'))
+
+# ==================== КОНСТАНТЫ ====================
+
+FIXTURE_DIR = 'fixtures'
+REPORT_DIR = 'reports'
+DEFAULT_ROWS = '100k'
+DEFAULT_REPEAT = 3
+REGRESSION_THRESHOLD = 0.2  # +20% ко времени - регрессия
+
+SAVE_OPS = 300          # Сохранений за один прогон save-бенчмарка
+DUPLICATE_CHECKS = 200  # Проверок за один прогон is_duplicate
+SELECT_LIMIT = 100      # Как в ai_describer / translate_descriptions
+
+# ==================== КОНТЕКСТ ====================
+
+class SkipBenchmark(Exception):
+    """Замер невозможен в текущем окружении (нет зависимости и т.п.)"""
+
+
+class BenchContext:
+    """Фикстура и общие параметры для всех замеров"""
+
+    def __init__(self, db_path: str, repeat: int = DEFAULT_REPEAT):
+        self.db_path = db_path
+        self.repeat = repeat
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    def sample_titles(self, content_type: str, count: int) -> List[tuple]:
+        """Случайные (title, creator) из фикстуры - для проверок дублей"""
+        conn = self.connect()
+        try:
+            rows = conn.execute("""
+                SELECT title, creator FROM content
+                WHERE type = ? AND id % 97 = 0
+                LIMIT ?
+            """, (content_type, count)).fetchall()
+        finally:
+            conn.close()
+        return rows
+
+
+def import_tool(name: str):
+    """
+    Импорт модуля проекта. Модули с groq завершают процесс при отсутствии
+    библиотеки (exit(1)) - превращаем это в пропуск замера.
+    """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return __import__(name)
+    except (ImportError, SystemExit) as e:
+        raise SkipBenchmark(f"не импортируется {name}: {e or 'зависимость не установлена'}")
+
+
+def measure(fn: Callable[[], None], repeat: int) -> List[float]:
+    """Время (мс) каждого из repeat прогонов, вывод fn подавляется"""
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+# ==================== ЗАМЕРЫ: ХАРВЕСТЕРЫ ====================
+
+def bench_save_book(ctx: BenchContext) -> Dict:
+    """harvest_books.save_book: is_duplicate + INSERT"""
+    harvest_books = import_tool('harvest_books')
+    conn = ctx.connect()
+    counter = [0]
+
+    def run():
+        cursor = conn.cursor()
+        for _ in range(SAVE_OPS):
+            counter[0] += 1
+            n = counter[0]
+            item = {
+                'id': f"bench{n}",
+                'volumeInfo': {
+                    'title': f"Benchmark Volume {n}",
+                    'authors': [f"Bench Author {n % 97}"],
+                    'description': "A long enough synthetic description for the benchmark run. " * 2,
+                    'publishedDate': f"{1990 + n % 30}-01-01",
+                    'imageLinks': {'thumbnail': f"http://books.example/{n}.jpg&edge=curl"},
+                    'averageRating': 4.0
+                }
+            }
+            harvest_books.save_book(cursor, item, 'fantasy')
+        conn.rollback()
+
+    try:
+        return {'timings': measure(run, ctx.repeat), 'ops': SAVE_OPS}
+    finally:
+        conn.close()
+
+
+def bench_save_movie(ctx: BenchContext) -> Dict:
+    """harvest_movies.save_movie с готовым ответом TMDb вместо сети"""
+    harvest_movies = import_tool('harvest_movies')
+    conn = ctx.connect()
+    counter = [0]
+
+    def fake_details(movie_id):
+        return {
+            'id': movie_id,
+            'title': f"Benchmark Movie {movie_id}",
+            'release_date': f"{1980 + movie_id % 45}-05-01",
+            'genres': [{'id': 18}, {'id': 35}],
+            'poster_path': f"/bench{movie_id}.jpg",
+            'overview': "Synthetic overview long enough to skip the AI description step.",
+            'vote_average': 7.1,
+            'vote_count': 1500,
+            'popularity': 42.0
+        }
+
+    original = (harvest_movies.fetch_movie_details, harvest_movies.sleep)
+    harvest_movies.fetch_movie_details = fake_details
+    harvest_movies.sleep = lambda seconds: None
+
+    def run():
+        cursor = conn.cursor()
+        for _ in range(SAVE_OPS):
+            counter[0] += 1
+            harvest_movies.save_movie(cursor, {'id': 900000000 + counter[0]})
+        conn.rollback()
+
+    try:
+        return {'timings': measure(run, ctx.repeat), 'ops': SAVE_OPS}
+    finally:
+        harvest_movies.fetch_movie_details, harvest_movies.sleep = original
+        conn.close()
+
+
+def bench_save_track(ctx: BenchContext) -> Dict:
+    """harvest_music.save_track с готовыми audio features вместо сети"""
+    harvest_music = import_tool('harvest_music')
+    conn = ctx.connect()
+    counter = [0]
+
+    original = harvest_music.fetch_audio_features
+    harvest_music.fetch_audio_features = lambda token, track_id: {
+        'energy': 0.8, 'valence': 0.7, 'danceability': 0.6,
+        'acousticness': 0.1, 'tempo': 124
+    }
+
+    def run():
+        cursor = conn.cursor()
+        for _ in range(SAVE_OPS):
+            counter[0] += 1
+            n = counter[0]
+            track = {
+                'id': f"bench{n}",
+                'name': f"Benchmark Track {n}",
+                'artists': [{'name': f"Bench Artist {n % 97}"}],
+                'album': {'release_date': f"{2000 + n % 25}-03-01",
+                          'images': [{'url': f"https://i.example/{n}.jpg"}]},
+                'popularity': n % 100,
+                'duration_ms': 215000
+            }
+            harvest_music.save_track(cursor, track, 'rock', 'token')
+        conn.rollback()
+
+    try:
+        return {'timings': measure(run, ctx.repeat), 'ops': SAVE_OPS}
+    finally:
+        harvest_music.fetch_audio_features = original
+        conn.close()
+
+
+def bench_is_duplicate(ctx: BenchContext) -> Dict:
+    """harvest_books.is_duplicate по существующим книгам фикстуры"""
+    harvest_books = import_tool('harvest_books')
+    samples = ctx.sample_titles('book', DUPLICATE_CHECKS)
+    if not samples:
+        raise SkipBenchmark("в фикстуре нет книг")
+
+    conn = ctx.connect()
+
+    def run():
+        cursor = conn.cursor()
+        for title, creator in samples:
+            harvest_books.is_duplicate(cursor, title, creator or "Unknown")
+
+    try:
+        return {'timings': measure(run, ctx.repeat), 'ops': len(samples)}
+    finally:
+        conn.close()
+
+# ==================== ЗАМЕРЫ: ИНСТРУМЕНТЫ ====================
+
+def bench_fix_duplicates(ctx: BenchContext) -> Dict:
+    """DuplicateFixer.find_duplicates (только поиск, без удаления)"""
+    fix_duplicates = import_tool('fix_duplicates')
+    fixer = fix_duplicates.DuplicateFixer(ctx.db_path)
+    if not fixer.connect():
+        raise SkipBenchmark("нет подключения к фикстуре")
+
+    groups = [0]
+
+    def run():
+        groups[0] = len(fixer.find_duplicates())
+
+    try:
+        result = {'timings': measure(run, ctx.repeat), 'ops': 1}
+        result['groups'] = groups[0]
+        return result
+    finally:
+        fixer.close()
+
+
+def bench_inspector_full(ctx: BenchContext) -> Dict:
+    """DatabaseInspector.print_full_report"""
+    db_inspector = import_tool('db_inspector')
+    inspector = db_inspector.DatabaseInspector(ctx.db_path)
+    if not inspector.connect():
+        raise SkipBenchmark("нет подключения к фикстуре")
+    try:
+        return {'timings': measure(inspector.print_full_report, ctx.repeat), 'ops': 1}
+    finally:
+        inspector.close()
+
+
+def bench_inspector_type(ctx: BenchContext) -> Dict:
+    """DatabaseInspector.print_type_report('movie')"""
+    db_inspector = import_tool('db_inspector')
+    inspector = db_inspector.DatabaseInspector(ctx.db_path)
+    if not inspector.connect():
+        raise SkipBenchmark("нет подключения к фикстуре")
+    try:
+        return {'timings': measure(lambda: inspector.print_type_report('movie'), ctx.repeat), 'ops': 1}
+    finally:
+        inspector.close()
+
+
+def bench_translator_select(ctx: BenchContext) -> Dict:
+    """UniversalTranslator.get_items_to_translate (выборка без API)"""
+    translate_descriptions = import_tool('translate_descriptions')
+    translator = translate_descriptions.UniversalTranslator(ctx.db_path, api_key=None)
+    if not translator.connect_db():
+        raise SkipBenchmark("нет подключения к фикстуре")
+    try:
+        return {
+            'timings': measure(lambda: translator.get_items_to_translate(SELECT_LIMIT), ctx.repeat),
+            'ops': 1
+        }
+    finally:
+        translator.close_db()
+
+
+def bench_describer_select(ctx: BenchContext) -> Dict:
+    """AIDescriberFinal.get_items_needing_descriptions (выборка без API)"""
+    ai_describer = import_tool('ai_describer')
+    describer = ai_describer.AIDescriberFinal(ctx.db_path, api_key=None)
+    if not describer.connect_db():
+        raise SkipBenchmark("нет подключения к фикстуре")
+    try:
+        return {
+            'timings': measure(
+                lambda: describer.get_items_needing_descriptions(limit=SELECT_LIMIT), ctx.repeat
+            ),
+            'ops': 1
+        }
+    finally:
+        describer.close_db()
+
+
+BENCHMARKS = [
+    ('harvest_save_book', bench_save_book),
+    ('harvest_save_movie', bench_save_movie),
+    ('harvest_save_track', bench_save_track),
+    ('is_duplicate', bench_is_duplicate),
+    ('fix_duplicates_find', bench_fix_duplicates),
+    ('inspector_full_report', bench_inspector_full),
+    ('inspector_type_report', bench_inspector_type),
+    ('translator_select', bench_translator_select),
+    ('describer_select', bench_describer_select),
+]
+
+# ==================== ПРОГОН ====================
+
+def get_git_commit() -> Optional[str]:
+    """Короткий хеш текущего коммита (None вне git)"""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, timeout=10, cwd=SCRIPTS_DIR
+        )
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(ctx: BenchContext, only: Optional[List[str]] = None) -> Dict:
+    """Прогнать замеры, вернуть словарь результатов по имени"""
+    results = {}
+    for name, bench in BENCHMARKS:
+        if only and name not in only:
+            continue
+
+        print(f"  ⏱️ {name}...", end=' ', flush=True)
+        try:
+            outcome = bench(ctx)
+        except SkipBenchmark as e:
+            results[name] = {'status': 'skipped', 'reason': str(e)}
+            print(f"⏭️ пропущен ({e})")
+            continue
+        except Exception as e:
+            results[name] = {'status': 'error', 'reason': str(e)}
+            print(f"❌ {e}")
+            continue
+
+        timings = outcome.pop('timings')
+        ops = outcome.pop('ops')
+        best = min(timings)
+        results[name] = {
+            'status': 'ok',
+            'best_ms': round(best, 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'repeat': len(timings),
+            'ops': ops,
+            'per_op_ms': round(best / ops, 4),
+            **outcome
+        }
+        print(f"{best:.1f} мс")
+    return results
+
+
+def compare_results(current: Dict, previous: Dict, threshold: float) -> List[str]:
+    """Печать сравнения, возвращает имена регрессий"""
+    regressions = []
+    print("\n" + "=" * 70)
+    print(f"📈 СРАВНЕНИЕ С {previous.get('git_commit') or '?'} ({previous.get('created_at', '?')[:19]})")
+    print("=" * 70)
+
+    for name, result in current['results'].items():
+        old = previous.get('results', {}).get(name)
+        if result['status'] != 'ok' or not old or old.get('status') != 'ok':
+            print(f"  ⚪ {name:25} нет данных для сравнения")
+            continue
+
+        change = (result['per_op_ms'] - old['per_op_ms']) / old['per_op_ms'] if old['per_op_ms'] else 0
+        if change > threshold:
+            icon = '🔴'
+            regressions.append(name)
+        elif change < -threshold:
+            icon = '🟢'
+        else:
+            icon = '⚪'
+        print(f"  {icon} {name:25} {old['per_op_ms']:>10.3f} → {result['per_op_ms']:>10.3f} мс/оп "
+              f"({change:+.0%})")
+
+    print("=" * 70)
+    return regressions
+
+
+def prepare_fixture(rows_label: str, seed: int, path: Optional[str], regenerate: bool) -> Dict:
+    """Путь к фикстуре content.db, при необходимости генерирует ее"""
+    rows = synthetic_catalog.parse_size(rows_label)
+    fixture_path = path or os.path.join(FIXTURE_DIR, f"content_{rows_label.lower()}_s{seed}.db")
+
+    if regenerate or not os.path.exists(fixture_path):
+        os.makedirs(os.path.dirname(fixture_path) or '.', exist_ok=True)
+        print(f"🧪 Генерация фикстуры {fixture_path} ({rows:,} записей)")
+        synthetic_catalog.build_content_db(fixture_path, rows, seed)
+    else:
+        print(f"🧪 Фикстура: {fixture_path}")
+
+    conn = sqlite3.connect(fixture_path)
+    actual_rows = conn.execute("SELECT COUNT(*) FROM content").fetchone()[0]
+    conn.close()
+
+    return {'path': fixture_path, 'rows': actual_rows, 'seed': seed}
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='⏱️ Benchmark Suite - замеры производительности',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python benchmark_suite.py                          # 100k записей, отчет в reports/
+  python benchmark_suite.py --rows 1m --repeat 5
+  python benchmark_suite.py --only is_duplicate fix_duplicates_find
+  python benchmark_suite.py --compare reports/benchmark_20250101_120000.json
+  python benchmark_suite.py --fixture content.db     # На копии боевой БД
+        """
+    )
+
+    parser.add_argument('--rows',
+                        default=DEFAULT_ROWS,
+                        help=f'Размер синтетического каталога (по умолчанию: {DEFAULT_ROWS})')
+
+    parser.add_argument('--seed',
+                        type=int,
+                        default=synthetic_catalog.DEFAULT_SEED,
+                        help='Seed генератора фикстуры')
+
+    parser.add_argument('--fixture',
+                        help='Готовая content.db вместо генерации')
+
+    parser.add_argument('--regenerate', action='store_true',
+                        help='Пересоздать фикстуру даже если она есть')
+
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=DEFAULT_REPEAT,
+                        help=f'Прогонов на замер (по умолчанию: {DEFAULT_REPEAT})')
+
+    parser.add_argument('--only', nargs='+',
+                        choices=[name for name, _ in BENCHMARKS],
+                        help='Запустить только указанные замеры')
+
+    parser.add_argument('--output',
+                        help='JSON с результатами (по умолчанию: reports/benchmark_<время>.json)')
+
+    parser.add_argument('--compare',
+                        help='JSON прошлого прогона для сравнения')
+
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=REGRESSION_THRESHOLD,
+                        help=f'Порог регрессии (по умолчанию: {REGRESSION_THRESHOLD})')
+
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Код выхода 1 при регрессиях (для CI)')
+
+    args = parser.parse_args()
+
+    try:
+        fixture = prepare_fixture(args.rows, args.seed, args.fixture, args.regenerate)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"❌ Ошибка подготовки фикстуры: {e}")
+        sys.exit(1)
+
+    print(f"\n⏱️ Замеры ({fixture['rows']:,} записей, повторов: {args.repeat}):")
+    ctx = BenchContext(fixture['path'], args.repeat)
+    results = run_benchmarks(ctx, args.only)
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'git_commit': get_git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'fixture': fixture,
+        'results': results
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        output = os.path.join(REPORT_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Результаты: {output}")
+
+    if args.compare:
+        try:
+            with open(args.compare, encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ Не удалось прочитать {args.compare}: {e}")
+            sys.exit(1)
+
+        regressions = compare_results(report, previous, args.threshold)
+        if regressions:
+            print(f"\n🔴 Регрессии: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+📨 BOT LOAD TEST - Нагрузочный тест админ-бота без Telegram
+
+Назначение:
+- Фейковый Bot API сервер: бот (TELEGRAM_API_URL) ходит в него вместо
+  api.telegram.org, ответы бота записываются с временем прихода
+- Инжектор фейковых обновлений: POST на webhook бота с секретным токеном,
+  заданная смесь команд и кнопок, параллельно и/или с ограничением rate
+- Отчет: пропускная способность, задержка приема (ответ webhook) и полная
+  задержка (обновление -> первый вызов Bot API с ответом) по сценариям
+
+Запуск бота для теста (access.db лучше взять копию):
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_WEBHOOK_URL=http://127.0.0.1:8443 \\
+    BOT_WEBHOOK_SECRET=loadtest ACCESS_DB_PATH=/tmp/access_copy.db \\
+    python admin_telegram_bot.py
+
+Фейковый Bot API должен работать до старта бота (getMe, setWebhook) -
+поэтому сначала запускается этот скрипт, он ждет webhook бота.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
+# ==================== КОНСТАНТЫ ====================
+
+DEFAULT_API_PORT = 8081
+DEFAULT_WEBHOOK = 'http://127.0.0.1:8443/telegram-webhook'
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# chat_id фейковых обновлений: у каждого обновления свой чат,
+# так ответ бота однозначно сопоставляется с обновлением
+CHAT_ID_BASE = 7_000_000_000
+
+# Сценарии: команда (message) или кнопка (callback_query).
+# По умолчанию только чтение - генерация кодов пишет в access.db
+SCENARIOS = {
+    'start': ('command', '/start'),
+    'help': ('command', '/help'),
+    'stats': ('command', '/stats'),
+    'activity': ('command', '/activity 7'),
+    'admins': ('command', '/admins'),
+    'menu': ('callback', 'menu'),
+    'stats_button': ('callback', 'stats'),
+    'gen_menu': ('callback', 'gen_1day'),
+    'gen_code': ('callback', 'activation_single_1day'),
+}
+DEFAULT_MIX = ['start', 'stats', 'menu', 'stats_button', 'help']
+WRITE_SCENARIOS = {'gen_code'}
+
+FAKE_BOT_USER = {
+    'id': 100000001, 'is_bot': True, 'first_name': 'LoadTest',
+    'username': 'load_test_bot', 'can_join_groups': False,
+    'can_read_all_group_messages': False, 'supports_inline_queries': False,
+}
+
+# ==================== ФЕЙКОВЫЙ BOT API ====================
+
+class ReplyLog:
+    """Первый ответ бота по каждому чату / callback_query"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.first_reply: Dict[str, float] = {}
+        self.methods: Dict[str, int] = {}
+        self.new_reply = threading.Condition(self.lock)
+        self.webhook_set = threading.Event()
+
+    def record(self, method: str, params: dict):
+        now = time.perf_counter()
+        keys = []
+        if 'chat_id' in params:
+            keys.append(f"chat:{params['chat_id']}")
+        if 'callback_query_id' in params:
+            keys.append(f"cb:{params['callback_query_id']}")
+
+        with self.lock:
+            self.methods[method] = self.methods.get(method, 0) + 1
+            for key in keys:
+                self.first_reply.setdefault(key, now)
+            if keys:
+                self.new_reply.notify_all()
+
+        if method == 'setWebhook':
+            self.webhook_set.set()
+
+    def reply_time(self, key: str) -> Optional[float]:
+        with self.lock:
+            return self.first_reply.get(key)
+
+    def wait_for(self, keys: List[str], timeout: float) -> int:
+        """Ждать ответов по ключам, вернуть число оставшихся без ответа"""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                missing = sum(1 for key in keys if key not in self.first_reply)
+                left = deadline - time.monotonic()
+                if not missing or left <= 0:
+                    return missing
+                self.new_reply.wait(min(left, 0.5))
+
+
+def parse_params(content_type: str, body: bytes) -> dict:
+    """Параметры вызова Bot API: JSON, urlencoded или multipart (файлы)"""
+    if not body:
+        return {}
+
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+
+    if content_type.startswith('multipart/form-data'):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name and not part.get_filename():
+                params[name] = part.get_content().strip()
+        return params
+
+    return {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}
+
+
+class FakeBotAPI:
+    """Фейковый Bot API на asyncio в своем потоке
+
+    Бот держит до 256 keep-alive соединений - сервер с потоком на соединение
+    сам становится узким местом и искажает замеры.
+    """
+
+    def __init__(self, port: int, replies: ReplyLog):
+        self.port = port
+        self.replies = replies
+        self.message_ids = itertools.count(1)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.server = None
+        self.connections = set()
+
+    def start(self):
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, '127.0.0.1', self.port, backlog=1024), self.loop
+        ).result()
+
+    def stop(self):
+        """Закрыть сервер и соединения бота, затем остановить и закрыть цикл"""
+        if self.server is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    async def _shutdown(self):
+        self.server.close()
+        for task in self.connections:
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length') or 0))
+
+                # POST /bot<token>/<method>
+                method = request_line.decode('latin-1').split()[1].rstrip('/').rsplit('/', 1)[-1]
+                try:
+                    params = parse_params(headers.get('content-type', ''), body)
+                except Exception:
+                    params = {}
+                self.replies.record(method, params)
+
+                data = json.dumps({'ok': True, 'result': self._result(method, params)}).encode('utf-8')
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: %d\r\n\r\n' % len(data) + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, IndexError):
+            pass
+        except asyncio.CancelledError:
+            # stop(): соединение закрывается вместе с сервером
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return FAKE_BOT_USER
+        if method == 'getUpdates':
+            return []
+        if method.startswith(('send', 'edit')) and 'chat_id' in params:
+            result = {
+                'message_id': next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'},
+            }
+            if 'text' in params:
+                result['text'] = params['text']
+            return result
+        return True
+
+# ==================== ФЕЙКОВЫЕ ОБНОВЛЕНИЯ ====================
+
+def build_update(update_id: int, scenario: str, user_id: int) -> dict:
+    """Обновление Telegram в формате Bot API для сценария"""
+    kind, value = SCENARIOS[scenario]
+    chat_id = CHAT_ID_BASE + update_id
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Load', 'username': 'load_test'}
+    chat = {'id': chat_id, 'type': 'private', 'first_name': 'Load'}
+    now = int(time.time())
+
+    if kind == 'command':
+        command = value.split()[0]
+        return {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id, 'date': now, 'chat': chat, 'from': user,
+                'text': value,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+            },
+        }
+
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': str(chat_id),
+            'data': value,
+            'message': {
+                'message_id': 1, 'date': now, 'chat': chat, 'from': FAKE_BOT_USER,
+                'text': 'menu',
+            },
+        },
+    }
+
+
+def reply_key(update: dict) -> str:
+    if 'callback_query' in update:
+        return f"cb:{update['callback_query']['id']}"
+    return f"chat:{update['message']['chat']['id']}"
+
+
+def post_update(url: str, secret: str, update: dict, timeout: float = 10):
+    """POST обновления на webhook, вернуть HTTP-статус"""
+    request = urllib.request.Request(
+        url, data=json.dumps(update).encode('utf-8'), method='POST',
+        headers={'Content-Type': 'application/json', SECRET_HEADER: secret},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+# ==================== ПРОГОН ====================
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> dict:
+    """Задержки в мс"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': round(statistics.fmean(values) * 1000, 2),
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p95_ms': round(percentile(values, 95) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2),
+        'max_ms': round(max(values) * 1000, 2),
+    }
+
+
+def run_load(url: str, secret: str, replies: Optional[ReplyLog], total: int, mix: List[str],
+             user_id: int, concurrency: int = 8, rate: float = 0,
+             reply_timeout: float = 30) -> dict:
+    """Отправить total обновлений по кругу из mix и собрать задержки
+
+    replies=None - без фейкового Bot API, измеряется только прием.
+    """
+    start_id = int(time.time())
+    updates = [
+        (scenario, build_update(start_id + i, scenario, user_id))
+        for i, scenario in zip(range(total), itertools.cycle(mix))
+    ]
+    sent_at: Dict[str, float] = {}
+    ack: List[tuple] = []
+    ack_lock = threading.Lock()
+
+    def send(item):
+        index, (scenario, update) = item
+        if rate > 0:
+            # Равномерный поток: i-е обновление не раньше i / rate
+            delay = run_started + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        started = time.perf_counter()
+        sent_at[reply_key(update)] = started
+        status = post_update(url, secret, update)
+        with ack_lock:
+            ack.append((scenario, status, time.perf_counter() - started))
+
+    run_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, enumerate(updates)))
+    sent_elapsed = time.perf_counter() - run_started
+
+    missing = 0
+    if replies:
+        missing = replies.wait_for([reply_key(update) for _, update in updates], reply_timeout)
+
+    by_scenario = {scenario: {'ack': [], 'reply': [], 'errors': 0, 'missing': 0} for scenario in mix}
+    for scenario, status, elapsed in ack:
+        by_scenario[scenario]['ack'].append(elapsed)
+        if status != 200:
+            by_scenario[scenario]['errors'] += 1
+
+    last_reply = run_started
+    for scenario, update in updates:
+        if not replies:
+            break
+        key = reply_key(update)
+        replied = replies.reply_time(key)
+        if replied is None:
+            by_scenario[scenario]['missing'] += 1
+            continue
+        by_scenario[scenario]['reply'].append(replied - sent_at[key])
+        last_reply = max(last_reply, replied)
+
+    all_ack = [elapsed for _, _, elapsed in ack]
+    all_reply = [value for data in by_scenario.values() for value in data['reply']]
+    total_elapsed = max(last_reply, run_started + sent_elapsed) - run_started
+
+    return {
+        'updates': total,
+        'concurrency': concurrency,
+        'rate': rate,
+        'sent_seconds': round(sent_elapsed, 3),
+        'total_seconds': round(total_elapsed, 3),
+        'ingest_per_sec': round(total / sent_elapsed, 1) if sent_elapsed else 0,
+        'replied_per_sec': round(len(all_reply) / total_elapsed, 1) if total_elapsed else 0,
+        'errors': sum(data['errors'] for data in by_scenario.values()),
+        'missing': missing,
+        'ack': summarize(all_ack),
+        'reply': summarize(all_reply),
+        'scenarios': {
+            scenario: {
+                'ack': summarize(data['ack']),
+                'reply': summarize(data['reply']),
+                'errors': data['errors'],
+                'missing': data['missing'],
+            }
+            for scenario, data in by_scenario.items()
+        },
+        'api_calls': dict(replies.methods) if replies else {},
+    }
+
+
+def check_secret(url: str, user_id: int) -> int:
+    """Обновление с неверным секретом - webhook должен ответить 403"""
+    return post_update(url, 'wrong-secret', build_update(1, 'start', user_id))
+
+
+def print_report(result: dict):
+    def line(name, stats):
+        if not stats.get('count'):
+            return f"{name:<14} -"
+        return (f"{name:<14} p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f}  "
+                f"p99 {stats['p99_ms']:>8.1f}  max {stats['max_ms']:>8.1f} мс")
+
+    print("\n" + "=" * 70)
+    print("📨 НАГРУЗОЧНЫЙ ТЕСТ АДМИН-БОТА")
+    print("=" * 70)
+    print(f"Обновлений: {result['updates']}  (параллельно {result['concurrency']}"
+          f"{', rate ' + str(result['rate']) + '/с' if result['rate'] else ''})")
+    print(f"Отправка: {result['sent_seconds']}с ({result['ingest_per_sec']}/с)  "
+          f"Всего до последнего ответа: {result['total_seconds']}с ({result['replied_per_sec']}/с)")
+    print(f"Ошибок webhook: {result['errors']}  Без ответа: {result['missing']}")
+
+    print("\n⏱️ Прием (ответ webhook):")
+    print("  " + line('все', result['ack']))
+    print("\n⏱️ Обновление -> ответ бота:")
+    print("  " + line('все', result['reply']))
+    for scenario, data in result['scenarios'].items():
+        suffix = ''
+        if data['errors'] or data['missing']:
+            suffix = f"  ⚠️ ошибок {data['errors']}, без ответа {data['missing']}"
+        print("  " + line(scenario, data['reply']) + suffix)
+
+    if result['api_calls']:
+        calls = ', '.join(f"{method} {count}" for method, count in sorted(result['api_calls'].items()))
+        print(f"\n🔌 Вызовы Bot API: {calls}")
+    print("=" * 70)
+
+# ==================== MAIN ====================
+
+def main():
+    if load_dotenv:
+        load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description='Нагрузочный тест админ-бота: фейковый Bot API + инжектор обновлений',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  # 1. Фейковый Bot API + 2000 обновлений после старта бота
+  python bot_load_test.py --secret loadtest --updates 2000
+
+  # 2. Запуск бота в другом терминале
+  TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_WEBHOOK_URL=http://127.0.0.1:8443 \\
+  BOT_WEBHOOK_SECRET=loadtest python admin_telegram_bot.py
+
+  # Ровный поток 50 обновлений/с, только статистика
+  python bot_load_test.py --secret loadtest --rate 50 --mix stats stats_button
+
+  # Бот уже подключен к другому Bot API - только инжектор
+  python bot_load_test.py --no-api --secret loadtest --output load.json
+
+Сценарии: """ + ', '.join(SCENARIOS) + """
+gen_code создает коды в access.db - используйте копию базы.
+        """
+    )
+
+    parser.add_argument('--url', default=DEFAULT_WEBHOOK,
+                       help=f'Адрес webhook бота (по умолчанию {DEFAULT_WEBHOOK})')
+    parser.add_argument('--secret', default=os.getenv('BOT_WEBHOOK_SECRET', ''),
+                       help='Секретный токен webhook (по умолчанию BOT_WEBHOOK_SECRET)')
+    parser.add_argument('--api-port', type=int, default=DEFAULT_API_PORT,
+                       help=f'Порт фейкового Bot API (по умолчанию {DEFAULT_API_PORT})')
+    parser.add_argument('--no-api', action='store_true',
+                       help='Не запускать фейковый Bot API (полная задержка не измеряется)')
+    parser.add_argument('--updates', type=int, default=1000,
+                       help='Сколько обновлений отправить (по умолчанию 1000)')
+    parser.add_argument('--mix', nargs='+', choices=list(SCENARIOS), default=DEFAULT_MIX,
+                       help='Сценарии по кругу (по умолчанию: ' + ' '.join(DEFAULT_MIX) + ')')
+    parser.add_argument('--concurrency', type=int, default=8,
+                       help='Параллельных отправок (по умолчанию 8)')
+    parser.add_argument('--rate', type=float, default=0,
+                       help='Обновлений в секунду (0 - максимально быстро)')
+    parser.add_argument('--user-id', type=int, default=int(os.getenv('SUPER_ADMIN_ID', '1530115915')),
+                       help='Отправитель обновлений (по умолчанию SUPER_ADMIN_ID)')
+    parser.add_argument('--wait-webhook', type=float, default=120,
+                       help='Сколько ждать setWebhook от бота, сек (по умолчанию 120)')
+    parser.add_argument('--reply-timeout', type=float, default=30,
+                       help='Сколько ждать ответов после отправки, сек (по умолчанию 30)')
+    parser.add_argument('--output',
+                       help='Сохранить результат в JSON')
+
+    args = parser.parse_args()
+
+    if not args.secret:
+        print("❌ Нужен секрет webhook: --secret или BOT_WEBHOOK_SECRET")
+        sys.exit(1)
+
+    if WRITE_SCENARIOS & set(args.mix):
+        print("⚠️ Сценарии " + ', '.join(sorted(WRITE_SCENARIOS & set(args.mix))) +
+              " пишут в access.db")
+
+    replies = ReplyLog()
+    server = None
+    if not args.no_api:
+        server = FakeBotAPI(args.api_port, replies)
+        server.start()
+        print(f"🔌 Фейковый Bot API: http://127.0.0.1:{args.api_port}")
+        print(f"⏳ Жду setWebhook от бота (до {args.wait_webhook:g}с)...")
+        if not replies.webhook_set.wait(args.wait_webhook):
+            print("❌ Бот не вызвал setWebhook - проверьте TELEGRAM_API_URL и BOT_WEBHOOK_URL")
+            sys.exit(1)
+        # setWebhook приходит до старта HTTP-сервера бота
+        for _ in range(50):
+            if check_secret(args.url, args.user_id):
+                break
+            time.sleep(0.1)
+
+    status = check_secret(args.url, args.user_id)
+    if status != 403:
+        print(f"⚠️ Неверный секрет: webhook ответил {status}, ожидался 403")
+    else:
+        print("🔒 Неверный секрет отклоняется (403)")
+
+    print(f"🚀 Отправляю {args.updates} обновлений: {' '.join(args.mix)}")
+    result = run_load(
+        args.url, args.secret, None if args.no_api else replies, args.updates, args.mix,
+        args.user_id, concurrency=args.concurrency, rate=args.rate,
+        reply_timeout=args.reply_timeout,
+    )
+    result['secret_check'] = status
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результат: {args.output}")
+
+    if server:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
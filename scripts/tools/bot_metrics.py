@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+📈 BOT METRICS - Задержки и нагрузка админ-бота
+
+Назначение:
+- Гистограммы задержек, счетчики ошибок и число выполняемых сейчас
+  вызовов по обработчикам бота, методам БД и методам Bot API
+- Текст в формате Prometheus (GET /metrics на отдельном порту)
+- Короткая сводка для команды /perf
+
+Используется из admin_telegram_bot.py:
+    metrics = BotMetrics()
+    application.add_handler(CommandHandler("stats", metrics.handler(stats_command)))
+    with metrics.db.track('_get_stats'): ...
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# ==================== КОНСТАНТЫ ====================
+
+# Границы корзин гистограммы, сек: от запроса к SQLite до долгой генерации пакета
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ==================== ГИСТОГРАММА ====================
+
+class Histogram:
+    """Накопительная гистограмма с фиксированными корзинами (как в Prometheus)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # counts[i] - попадания в (buckets[i-1], buckets[i]], последняя - +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля: линейная интерполяция внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+# ==================== СЕМЕЙСТВО МЕТРИК ====================
+
+class LatencyMetric:
+    """Задержки, ошибки и текущие вызовы по имени (обработчик, метод БД...)
+
+    Пишется и из event loop, и из потока БД - изменения под блокировкой.
+    """
+
+    def __init__(self, family: str, description: str):
+        self.family = family
+        self.description = description
+        self.lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = {}
+
+    def begin(self, name: str):
+        with self.lock:
+            self.in_flight[name] = self.in_flight.get(name, 0) + 1
+
+    def end(self, name: str, elapsed: float, error: bool = False):
+        with self.lock:
+            self.in_flight[name] -= 1
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(elapsed)
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    @contextmanager
+    def track(self, name: str):
+        """with metric.track(name): ... - замер блока кода"""
+        self.begin(name)
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.end(name, time.perf_counter() - started, error)
+
+    def wrap(self, func, name: Optional[str] = None):
+        """Обертка корутины: каждый вызов замеряется под именем name"""
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with self.track(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    def snapshot(self) -> List[dict]:
+        """Сводка по именам, самые затратные (сумма времени) первыми"""
+        with self.lock:
+            rows = [
+                {
+                    'name': name,
+                    'count': h.count,
+                    'errors': self.errors.get(name, 0),
+                    'in_flight': self.in_flight.get(name, 0),
+                    'total': h.sum,
+                    'avg': h.sum / h.count if h.count else 0.0,
+                    'p50': h.quantile(0.5),
+                    'p95': h.quantile(0.95),
+                    'p99': h.quantile(0.99),
+                    'max': h.max,
+                }
+                for name, h in self.histograms.items()
+            ]
+            for name, count in self.in_flight.items():
+                if name not in self.histograms and count:
+                    rows.append({'name': name, 'count': 0, 'errors': 0, 'in_flight': count,
+                                 'total': 0.0, 'avg': 0.0, 'p50': 0.0, 'p95': 0.0,
+                                 'p99': 0.0, 'max': 0.0})
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    def prometheus(self, label: str = 'name') -> List[str]:
+        prefix = f"coffee_bot_{self.family}"
+        lines = [
+            f"# HELP {prefix}_seconds {self.description}",
+            f"# TYPE {prefix}_seconds histogram",
+        ]
+        with self.lock:
+            histograms = {name: (list(h.counts), h.sum, h.count) for name, h in self.histograms.items()}
+            errors = dict(self.errors)
+            in_flight = dict(self.in_flight)
+
+        for name in sorted(histograms):
+            counts, total, count = histograms[name]
+            cumulative = 0
+            for bucket, bucket_count in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_seconds_bucket{{{label}="{name}",le="{bucket}"}} {cumulative}')
+            lines.append(f'{prefix}_seconds_bucket{{{label}="{name}",le="+Inf"}} {count}')
+            lines.append(f'{prefix}_seconds_sum{{{label}="{name}"}} {total:.6f}')
+            lines.append(f'{prefix}_seconds_count{{{label}="{name}"}} {count}')
+
+        lines.append(f"# HELP {prefix}_errors_total Ошибки (исключения)")
+        lines.append(f"# TYPE {prefix}_errors_total counter")
+        for name in sorted(histograms):
+            lines.append(f'{prefix}_errors_total{{{label}="{name}"}} {errors.get(name, 0)}')
+
+        lines.append(f"# HELP {prefix}_in_flight Выполняется сейчас")
+        lines.append(f"# TYPE {prefix}_in_flight gauge")
+        for name in sorted(in_flight):
+            lines.append(f'{prefix}_in_flight{{{label}="{name}"}} {in_flight[name]}')
+        return lines
+
+# ==================== МЕТРИКИ БОТА ====================
+
+class BotMetrics:
+    """Все метрики бота: обработчики, запросы к access.db, вызовы Bot API"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.handlers = LatencyMetric('handler', 'Время обработчика обновления (вместе с БД и Bot API)')
+        self.db = LatencyMetric('db', 'Время метода Database в потоке БД')
+        self.db_wait = LatencyMetric('db_queue', 'Ожидание очереди потока БД')
+        self.api = LatencyMetric('telegram_api', 'Время вызова Bot API')
+
+    def handler(self, func, name: Optional[str] = None):
+        return self.handlers.wrap(func, name)
+
+    def prometheus(self) -> str:
+        lines = [
+            '# HELP coffee_bot_uptime_seconds Время работы бота',
+            '# TYPE coffee_bot_uptime_seconds gauge',
+            f'coffee_bot_uptime_seconds {time.time() - self.started_at:.0f}',
+        ]
+        lines += self.handlers.prometheus('handler')
+        lines += self.db.prometheus('method')
+        lines += self.db_wait.prometheus('method')
+        lines += self.api.prometheus('method')
+        return '\n'.join(lines) + '\n'
+
+    def format_report(self, top: int = 8) -> str:
+        """Сводка для /perf (Markdown): p50/p95/max в мс, ошибки, в работе"""
+        def section(title, metric):
+            rows = metric.snapshot()[:top]
+            if not rows:
+                return f"*{title}:* _нет вызовов_\n"
+            text = f"*{title}* (вызовов, p50/p95/max мс):\n"
+            for row in rows:
+                text += (f"`{row['name']}` {row['count']} · "
+                         f"{row['p50'] * 1000:.1f}/{row['p95'] * 1000:.1f}/{row['max'] * 1000:.0f}")
+                if row['errors']:
+                    text += f" · ❌{row['errors']}"
+                if row['in_flight']:
+                    text += f" · ⏳{row['in_flight']}"
+                text += "\n"
+            return text
+
+        uptime = int(time.time() - self.started_at)
+        message = f"⏱️ *Производительность бота* (аптайм {uptime // 3600}ч {uptime % 3600 // 60}м)\n\n"
+        message += section('Обработчики', self.handlers) + "\n"
+        message += section('БД', self.db) + "\n"
+        message += section('Bot API', self.api)
+        return message
+
+# ==================== HTTP /metrics ====================
+
+async def serve_metrics(metrics: BotMetrics, host: str, port: int):
+    """Маленький HTTP-сервер на event loop бота: GET /metrics"""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Заголовки не нужны - дочитываем до пустой строки
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, content_type, body = '200 OK', PROMETHEUS_CONTENT_TYPE, metrics.prometheus()
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', 'not found\n'
+            data = body.encode('utf-8')
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode('latin-1') + data
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
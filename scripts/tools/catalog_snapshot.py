@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+"""
+🗺️ CATALOG SNAPSHOT - Компактный снимок каталога для mmap
+
+Назначение:
+- Экспорт content в один бинарный файл с версией формата
+- Числовые колонки - массивы фиксированной ширины (тип по диапазону значений)
+- Строковые колонки - смещения (uint32/uint64) + общий UTF-8 пул
+- type/genre/epoch/mood/criteria - коды uint8 (0 = NULL) + словарь в заголовке
+- Чтение: mmap и NumPy-представления поверх него без копирования -
+  инспектор, дедупликация, similarity и прогрев API не создают
+  Python-объект на каждое поле каждой строки
+
+Формат (все числа little-endian):
+  [0:8)   MAGIC
+  [8:12)  версия формата (uint32)
+  [12:16) резерв
+  [16:24) смещение JSON-заголовка (uint64)
+  [24:32) длина JSON-заголовка (uint64)
+  далее   секции колонок, каждая выровнена на SECTION_ALIGN байт
+  в конце JSON-заголовок: строки, колонки, смещения секций, словари
+
+Запись идет порциями по id в файлы-секции рядом с целью, затем они
+склеиваются во временный файл и публикуются через os.replace -
+читатели со старым mmap продолжают видеть прежний снимок.
+
+Требует numpy (pip install numpy).
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import facet_dictionary
+import sql_trace
+from content_export import ContentExporter, FACET_COLUMNS, TYPE_ARGS
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+SNAPSHOT_PATH = 'catalog.cbsnap'
+CHUNK_SIZE = 5000
+
+MAGIC = b'CBSNAP\x00\x00'
+FORMAT_VERSION = 1
+PREFIX = struct.Struct('<8sIIQQ')
+SECTION_ALIGN = 64
+
+# Колонки-словари: type тоже повторяется на каждой строке
+SNAPSHOT_FACETS = ['type'] + FACET_COLUMNS
+
+# Целочисленные типы по возрастанию ширины
+INT_DTYPES = ['<i1', '<i2', '<i4', '<i8']
+
+
+def require_numpy() -> bool:
+    if np is None:
+        print("❌ Для снимка каталога нужна библиотека numpy")
+        print("Установите: pip install numpy")
+        return False
+    return True
+
+
+def _align(position: int) -> int:
+    return (position + SECTION_ALIGN - 1) // SECTION_ALIGN * SECTION_ALIGN
+
+
+def _int_dtype(min_value: Optional[int], max_value: Optional[int]) -> str:
+    """Самый узкий целочисленный тип, вмещающий [min, max]"""
+    if min_value is None:
+        return INT_DTYPES[0]
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= min_value and max_value <= info.max:
+            return dtype
+    return INT_DTYPES[-1]
+
+# ==================== ЗАПИСЬ ====================
+
+class SnapshotWriter:
+    """Потоковая запись снимка: порции по id -> секции -> один файл"""
+
+    def __init__(self, conn: sqlite3.Connection, content_type: Optional[str] = None,
+                 chunk_size: int = CHUNK_SIZE):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.content_type = content_type
+        self.exporter = ContentExporter(conn, content_type, chunk_size)
+        self.columns: List[Dict] = []
+
+    def _where(self) -> tuple:
+        if self.content_type:
+            return " WHERE type = ?", [self.content_type]
+        return "", []
+
+    def plan_columns(self) -> List[Dict]:
+        """
+        Вид каждой колонки: facet / int / float / string.
+        SQLite не проверяет типы - INTEGER-колонка с текстом пишется строкой.
+        """
+        codes = {facet_dictionary.code_column(name) for name in FACET_COLUMNS}
+        columns = [
+            (name, decl_type) for name, decl_type in self.exporter.get_columns()
+            if name not in codes
+        ]
+        where_sql, params = self._where()
+
+        probes = []
+        for name, decl_type in columns:
+            if name in SNAPSHOT_FACETS:
+                continue
+            if 'INT' in decl_type:
+                probes.append(f"MIN({name}), MAX({name}), "
+                              f"SUM(typeof({name}) NOT IN ('integer', 'null'))")
+            elif any(t in decl_type for t in ('REAL', 'FLOA', 'DOUB')):
+                probes.append(f"0, 0, SUM(typeof({name}) NOT IN ('real', 'integer', 'null'))")
+            else:
+                probes.append("0, 0, 0")
+        self.cursor.execute(f"SELECT {', '.join(probes)} FROM content{where_sql}", params)
+        stats = iter(self.cursor.fetchone())
+
+        plan = []
+        for name, decl_type in columns:
+            column = {'name': name}
+            if name in SNAPSHOT_FACETS:
+                self.cursor.execute(f"""
+                    SELECT DISTINCT {name} FROM content
+                    {where_sql + ' AND' if where_sql else 'WHERE'} {name} IS NOT NULL
+                    ORDER BY {name}
+                """, params)
+                values = sorted({str(row[0]) for row in self.cursor.fetchall()})
+                column.update(kind='facet', values=values,
+                              dtype='<u1' if len(values) < 256 else '<u2')
+                plan.append(column)
+                continue
+
+            min_value, max_value, foreign = next(stats), next(stats), next(stats)
+            if foreign:
+                column.update(kind='string')
+            elif 'INT' in decl_type:
+                column.update(kind='int', dtype=_int_dtype(min_value, max_value))
+            elif any(t in decl_type for t in ('REAL', 'FLOA', 'DOUB')):
+                column.update(kind='float', dtype='<f8')
+            else:
+                column.update(kind='string')
+            plan.append(column)
+
+        self.columns = plan
+        return plan
+
+    def _encode_chunk(self, column: Dict, values: list, files: Dict, state: Dict):
+        """Одна порция одной колонки - в ее файлы-секции"""
+        name = column['name']
+        kind = column['kind']
+
+        if kind == 'facet':
+            lookup = state['lookup'][name]
+            codes = np.fromiter(
+                (0 if v is None else lookup[str(v)] for v in values),
+                dtype=column['dtype'], count=len(values)
+            )
+            state['nulls'][name] += int(np.count_nonzero(codes == 0))
+            files[name, 'data'].write(codes.tobytes())
+            return
+
+        if kind == 'float':
+            data = np.array([np.nan if v is None else v for v in values], dtype=column['dtype'])
+            state['nulls'][name] += int(np.count_nonzero(np.isnan(data)))
+            files[name, 'data'].write(data.tobytes())
+            return
+
+        valid = np.fromiter((v is not None for v in values), dtype=np.uint8, count=len(values))
+        state['nulls'][name] += len(values) - int(valid.sum())
+        files[name, 'validity'].write(valid.tobytes())
+
+        if kind == 'int':
+            data = np.array([0 if v is None else v for v in values], dtype=column['dtype'])
+            files[name, 'data'].write(data.tobytes())
+            return
+
+        encoded = [b'' if v is None else str(v).encode('utf-8') for v in values]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.uint64, count=len(encoded))
+        ends = np.cumsum(lengths, dtype=np.uint64) + np.uint64(state['blob_size'][name])
+        state['blob_size'][name] = int(ends[-1])
+        files[name, 'offsets'].write(ends.astype('<u8').tobytes())
+        files[name, 'data'].write(b''.join(encoded))
+
+    def _finish_sections(self, column: Dict, spill_dir: str, rows: int,
+                         null_count: int, blob_size: int) -> Dict[str, str]:
+        """Упаковка секций колонки: битовая маска NULL, ширина смещений"""
+        name = column['name']
+        sections = {'data': os.path.join(spill_dir, f'{name}.data')}
+
+        if column['kind'] in ('int', 'string'):
+            raw_path = os.path.join(spill_dir, f'{name}.validity')
+            if null_count:
+                valid = np.fromfile(raw_path, dtype=np.uint8)
+                packed_path = raw_path + '.bits'
+                np.packbits(valid, bitorder='little').tofile(packed_path)
+                sections['validity'] = packed_path
+            os.remove(raw_path)
+
+        if column['kind'] == 'string':
+            raw_path = os.path.join(spill_dir, f'{name}.offsets')
+            offset_dtype = '<u4' if blob_size < 2 ** 32 else '<u8'
+            ends = np.fromfile(raw_path, dtype='<u8')
+            offsets = np.zeros(rows + 1, dtype=offset_dtype)
+            offsets[1:] = ends
+            final_path = raw_path + '.final'
+            offsets.tofile(final_path)
+            os.remove(raw_path)
+            column['offset_dtype'] = offset_dtype
+            sections['offsets'] = final_path
+
+        return sections
+
+    def write(self, filename: str) -> int:
+        """
+        Записать снимок, вернуть количество записей (-1 - ошибка).
+        Чтение идет в одной транзакции: снимок согласован целиком.
+        """
+        if not require_numpy():
+            return -1
+
+        target_dir = os.path.dirname(os.path.abspath(filename))
+        spill_dir = tempfile.mkdtemp(prefix='.cbsnap-', dir=target_dir)
+        tmp_path = filename + '.tmp'
+
+        try:
+            own_transaction = not self.conn.in_transaction
+            if own_transaction:
+                self.conn.execute("BEGIN")
+            try:
+                # iter_chunks листает по первой колонке - id
+                plan = sorted(self.plan_columns(), key=lambda column: column['name'] != 'id')
+                names = [column['name'] for column in plan]
+
+                state = {
+                    'lookup': {
+                        column['name']: {value: code for code, value in enumerate(column['values'], 1)}
+                        for column in plan if column['kind'] == 'facet'
+                    },
+                    'nulls': {name: 0 for name in names},
+                    'blob_size': {name: 0 for name in names},
+                }
+                files = {}
+                for column in plan:
+                    parts = ['data']
+                    if column['kind'] in ('int', 'string'):
+                        parts.append('validity')
+                    if column['kind'] == 'string':
+                        parts.append('offsets')
+                    for part in parts:
+                        files[column['name'], part] = open(
+                            os.path.join(spill_dir, f"{column['name']}.{part}"), 'wb'
+                        )
+
+                rows = 0
+                try:
+                    for chunk in self.exporter.iter_chunks(names):
+                        for col_idx, column in enumerate(plan):
+                            self._encode_chunk(column, [row[col_idx] for row in chunk], files, state)
+                        rows += len(chunk)
+                finally:
+                    for f in files.values():
+                        f.close()
+            finally:
+                if own_transaction:
+                    self.conn.rollback()
+
+            sections = {
+                column['name']: self._finish_sections(
+                    column, spill_dir, rows,
+                    state['nulls'][column['name']], state['blob_size'][column['name']]
+                )
+                for column in plan
+            }
+
+            header = {
+                'format_version': FORMAT_VERSION,
+                'rows': rows,
+                'content_type': self.content_type,
+                'order': 'id',
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'columns': []
+            }
+
+            with open(tmp_path, 'wb') as out:
+                out.write(b'\x00' * PREFIX.size)
+                for column in plan:
+                    entry = dict(column, null_count=state['nulls'][column['name']])
+                    for part, path in sections[column['name']].items():
+                        out.write(b'\x00' * (_align(out.tell()) - out.tell()))
+                        start = out.tell()
+                        with open(path, 'rb') as src:
+                            shutil.copyfileobj(src, out, 1024 * 1024)
+                        entry[part] = [start, out.tell() - start]
+                    header['columns'].append(entry)
+
+                header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+                header_offset = _align(out.tell())
+                out.write(b'\x00' * (header_offset - out.tell()))
+                out.write(header_bytes)
+                out.seek(0)
+                out.write(PREFIX.pack(MAGIC, FORMAT_VERSION, 0, header_offset, len(header_bytes)))
+                out.flush()
+                os.fsync(out.fileno())
+
+            os.replace(tmp_path, filename)
+            return rows
+        except (sqlite3.Error, OSError, KeyError, OverflowError) as e:
+            print(f"❌ Ошибка записи снимка: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return -1
+        finally:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def write_snapshot(conn: sqlite3.Connection, filename: str, content_type: Optional[str] = None,
+                   chunk_size: int = CHUNK_SIZE) -> int:
+    return SnapshotWriter(conn, content_type, chunk_size).write(filename)
+
+# ==================== ЧТЕНИЕ ====================
+
+class StringColumn:
+    """Строковая колонка: offsets[i]:offsets[i+1] в пуле blob"""
+
+    def __init__(self, offsets: 'np.ndarray', blob: 'np.ndarray', valid: Optional['np.ndarray']):
+        self.offsets = offsets
+        self.blob = blob
+        self.valid = valid
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if self.valid is not None and not self.valid[i]:
+            return None
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def lengths(self) -> 'np.ndarray':
+        """Длины в байтах без декодирования"""
+        return np.diff(self.offsets)
+
+    def raw(self, i: int) -> memoryview:
+        """Байты строки без копирования"""
+        return memoryview(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+
+class FacetColumn:
+    """Колонка-словарь: codes (0 = NULL) и values[code - 1]"""
+
+    def __init__(self, codes: 'np.ndarray', values: List[str]):
+        self.codes = codes
+        self.values = values
+        self._lookup: Dict[str, List[int]] = {}
+        for code, value in enumerate(values, 1):
+            self._lookup.setdefault(value.lower(), []).append(code)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        code = int(self.codes[i])
+        return self.values[code - 1] if code else None
+
+    def code(self, value: str) -> int:
+        """Код значения без учета регистра (0 - нет в словаре)"""
+        return self._lookup.get(value.lower(), [0])[0]
+
+    def mask(self, value: str) -> 'np.ndarray':
+        """Строки со значением без учета регистра, как LOWER(x) = LOWER(?)"""
+        codes = self._lookup.get(value.lower())
+        if not codes:
+            return np.zeros(len(self.codes), dtype=bool)
+        if len(codes) == 1:
+            return self.codes == codes[0]
+        return np.isin(self.codes, codes)
+
+    def counts(self) -> Dict[Optional[str], int]:
+        counted = np.bincount(self.codes, minlength=len(self.values) + 1)
+        result = {None: int(counted[0])} if counted[0] else {}
+        result.update({value: int(counted[code]) for code, value in enumerate(self.values, 1)})
+        return result
+
+
+class CatalogSnapshot:
+    """
+    Снимок, открытый через mmap. column() возвращает представления
+    NumPy поверх отображения - без копирования и без sqlite3.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file = None
+        self.map = None
+        self.header: Dict = {}
+        self.columns: Dict[str, Dict] = {}
+
+    def open(self) -> 'CatalogSnapshot':
+        if not require_numpy():
+            raise RuntimeError("numpy не установлен")
+
+        self.file = open(self.filename, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self.map) < PREFIX.size:
+                raise ValueError(f"Файл слишком короткий для снимка: {self.filename}")
+
+            magic, version, _, header_offset, header_len = PREFIX.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Не снимок каталога: {self.filename}")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Версия формата {version} не поддерживается "
+                                 f"(ожидается {FORMAT_VERSION}), пересоздайте снимок")
+
+            self.header = json.loads(self.map[header_offset:header_offset + header_len].decode('utf-8'))
+            self.columns = {column['name']: column for column in self.header['columns']}
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        """
+        Закрыть отображение. Пока живы выданные представления,
+        mmap закрыть нельзя - он освободится вместе с ними.
+        """
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    @property
+    def rows(self) -> int:
+        return self.header['rows']
+
+    def _view(self, section: List[int], dtype: str) -> 'np.ndarray':
+        start, length = section
+        return np.frombuffer(self.map, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                             offset=start)
+
+    def _column(self, name: str) -> Dict:
+        if name not in self.columns:
+            raise KeyError(f"Колонки нет в снимке: {name}")
+        return self.columns[name]
+
+    def valid(self, name: str) -> Optional['np.ndarray']:
+        """bool-маска заполненных значений (None - NULL в колонке нет)"""
+        column = self._column(name)
+        if column['kind'] == 'facet':
+            return self.column(name) != 0
+        if column['kind'] == 'float':
+            return ~np.isnan(self.column(name))
+        if 'validity' not in column:
+            return None
+        bits = self._view(column['validity'], np.uint8)
+        return np.unpackbits(bits, count=self.rows, bitorder='little').astype(bool)
+
+    def column(self, name: str) -> 'np.ndarray':
+        """Числовая колонка или коды facet-колонки (NULL: 0 / NaN, см. valid())"""
+        column = self._column(name)
+        if column['kind'] == 'string':
+            raise TypeError(f"{name} - строковая колонка, используйте strings()")
+        return self._view(column['data'], column['dtype'])
+
+    def strings(self, name: str) -> StringColumn:
+        column = self._column(name)
+        if column['kind'] != 'string':
+            raise TypeError(f"{name} - не строковая колонка")
+        return StringColumn(
+            self._view(column['offsets'], column['offset_dtype']),
+            self._view(column['data'], np.uint8),
+            self.valid(name)
+        )
+
+    def facet(self, name: str) -> FacetColumn:
+        column = self._column(name)
+        if column['kind'] != 'facet':
+            raise TypeError(f"{name} - не facet-колонка")
+        return FacetColumn(self.column(name), column['values'])
+
+    def facet_values(self, name: str) -> List[str]:
+        return list(self._column(name)['values'])
+
+    def index_of(self, item_id: int) -> int:
+        """Позиция записи по id (строки отсортированы по id), -1 - нет"""
+        ids = self.column('id')
+        position = int(np.searchsorted(ids, item_id))
+        if position < len(ids) and ids[position] == item_id:
+            return position
+        return -1
+
+    def row(self, i: int) -> Dict:
+        """Одна запись словарем (для отладки и точечного доступа)"""
+        result = {}
+        for name, column in self.columns.items():
+            if column['kind'] == 'string':
+                result[name] = self.strings(name)[i]
+            elif column['kind'] == 'facet':
+                result[name] = self.facet(name)[i]
+            else:
+                valid = self.valid(name)
+                value = self.column(name)[i]
+                result[name] = None if valid is not None and not valid[i] else value.item()
+        return result
+
+
+def open_snapshot(filename: str) -> CatalogSnapshot:
+    return CatalogSnapshot(filename).open()
+
+# ==================== ОТЧЕТ ====================
+
+def print_info(snapshot: CatalogSnapshot, open_seconds: float):
+    header = snapshot.header
+    size = os.path.getsize(snapshot.filename)
+
+    print("\n" + "=" * 70)
+    print("🗺️ CATALOG SNAPSHOT".center(70))
+    print("=" * 70)
+    print(f"\n📄 Файл: {snapshot.filename} ({size / 1024 / 1024:.1f} MB)")
+    print(f"🔢 Версия формата: {header['format_version']}")
+    print(f"📚 Записей: {snapshot.rows:,}")
+    print(f"🏷️ Тип: {header['content_type'] or 'все'}")
+    print(f"🕐 Создан: {header['created_at']}")
+    print(f"⚡ Открыт за {open_seconds * 1000:.2f} мс")
+
+    print(f"\n{'Колонка':<18} {'Вид':<8} {'Тип':<6} {'Байт':>12} {'NULL':>10}")
+    print("-" * 58)
+    for name, column in snapshot.columns.items():
+        stored = sum(column[part][1] for part in ('data', 'offsets', 'validity') if part in column)
+        dtype = column.get('dtype') or column.get('offset_dtype')
+        extra = f"  ({len(column['values'])} знач.)" if column['kind'] == 'facet' else ''
+        print(f"{name:<18} {column['kind']:<8} {dtype:<6} {stored:>12,} "
+              f"{column['null_count']:>10,}{extra}")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🗺️ Catalog Snapshot - компактный снимок каталога для mmap',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python catalog_snapshot.py catalog.cbsnap               # Записать снимок
+  python catalog_snapshot.py movies.cbsnap --type movies
+  python catalog_snapshot.py catalog.cbsnap --info        # Заголовок и колонки
+
+Чтение из Python:
+  snapshot = open_snapshot('catalog.cbsnap')
+  years = snapshot.column('year')                # np.ndarray поверх mmap
+  genre = snapshot.facet('genre')                # genre.mask('Fantasy')
+  titles = snapshot.strings('title')             # titles[i] -> str
+        """
+    )
+
+    parser.add_argument('output', nargs='?', default=SNAPSHOT_PATH,
+                        help=f'Файл снимка (по умолчанию: {SNAPSHOT_PATH})')
+
+    parser.add_argument('--info', action='store_true',
+                        help='Показать заголовок снимка вместо записи')
+
+    parser.add_argument('--type',
+                        choices=['books', 'movies', 'music'],
+                        help='Тип контента для снимка')
+
+    parser.add_argument('--chunk-size',
+                        type=int,
+                        default=CHUNK_SIZE,
+                        help=f'Размер порции (по умолчанию: {CHUNK_SIZE})')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not require_numpy():
+        sys.exit(1)
+
+    if args.info:
+        if not os.path.exists(args.output):
+            print(f"❌ Снимок не найден: {args.output}")
+            sys.exit(1)
+        started = time.perf_counter()
+        try:
+            snapshot = open_snapshot(args.output)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        try:
+            print_info(snapshot, time.perf_counter() - started)
+        finally:
+            snapshot.close()
+        return
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    content_type = TYPE_ARGS.get(args.type)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        started = time.time()
+        written = write_snapshot(conn, args.output, content_type, args.chunk_size)
+        if written < 0:
+            sys.exit(1)
+        size = os.path.getsize(args.output)
+        print(f"✅ Снимок записан: {args.output} ({written:,} записей, "
+              f"{size / 1024 / 1024:.1f} MB, {time.time() - started:.1f}с)")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
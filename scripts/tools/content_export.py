@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+📦 CONTENT EXPORT - Потоковый экспорт каталога
+
+Назначение:
+- Экспорт таблицы content в CSV, JSON Lines, Parquet и Arrow
+- Чтение порциями по id (keyset), без fetchall() - память не растет с размером БД
+- Между порциями блокировка чтения отпускается, harvest/API не ждут экспорт
+- Parquet/Arrow: колонки genre/epoch/mood/criteria кодируются словарем
+- Snapshot: компактный снимок для mmap (см. catalog_snapshot.py)
+
+Parquet/Arrow требуют pyarrow (pip install pyarrow), Snapshot - numpy,
+CSV/JSONL - ничего.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import csv
+import json
+import math
+import sys
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import sql_trace
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+CHUNK_SIZE = 5000
+
+# Повторяющиеся строковые значения - в словарь
+FACET_COLUMNS = ['genre', 'epoch', 'mood', 'criteria']
+
+FORMATS = ['csv', 'jsonl', 'parquet', 'arrow', 'snapshot']
+
+# --type (множественное число) -> значение колонки type
+TYPE_ARGS = {
+    'books': 'book',
+    'movies': 'movie',
+    'music': 'music'
+}
+
+
+def _as_int(value) -> Optional[int]:
+    """Целое для int64-колонки; текст и дробные значения (SQLite их допускает) -> NULL"""
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else None
+
+
+def _as_float(value) -> Optional[float]:
+    """Число для float64-колонки; нечисловой текст -> NULL"""
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+# ==================== ЭКСПОРТЕР ====================
+
+class ContentExporter:
+    """Потоковый экспорт content порциями по id"""
+
+    def __init__(self, conn: sqlite3.Connection, content_type: Optional[str] = None,
+                 chunk_size: int = CHUNK_SIZE):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.content_type = content_type
+        self.chunk_size = chunk_size
+
+    def get_columns(self) -> List[Tuple[str, str]]:
+        """Колонки content: (имя, объявленный тип)"""
+        self.cursor.execute("PRAGMA table_info(content)")
+        return [(row[1], (row[2] or '').upper()) for row in self.cursor.fetchall()]
+
+    def iter_chunks(self, select_list: List[str]) -> Iterator[List[tuple]]:
+        """
+        Порции строк по возрастанию id.
+        Первая колонка select_list должна быть id - по ней идет пагинация.
+        """
+        query = f"SELECT {', '.join(select_list)} FROM content WHERE id > ?"
+        params_tail = []
+
+        if self.content_type:
+            query += " AND type = ?"
+            params_tail.append(self.content_type)
+
+        query += " ORDER BY id LIMIT ?"
+
+        last_id = -1
+        while True:
+            self.cursor.execute(query, [last_id] + params_tail + [self.chunk_size])
+            rows = self.cursor.fetchall()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1][0]
+            if len(rows) < self.chunk_size:
+                break
+
+    # ==================== ТЕКСТОВЫЕ ФОРМАТЫ ====================
+
+    def export_csv(self, filename: str, columns: Optional[List[Tuple[str, str]]] = None) -> int:
+        """
+        CSV экспорт. columns - список (заголовок, SQL выражение),
+        по умолчанию все колонки content.
+        """
+        if columns is None:
+            columns = [(name, name) for name, _ in self.get_columns()]
+
+        written = 0
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([header for header, _ in columns])
+            for rows in self.iter_chunks([expr for _, expr in columns]):
+                writer.writerows(rows)
+                written += len(rows)
+        return written
+
+    def export_jsonl(self, filename: str) -> int:
+        """JSON Lines: одна запись content на строку"""
+        names = [name for name, _ in self.get_columns()]
+
+        written = 0
+        with open(filename, 'w', encoding='utf-8') as f:
+            for rows in self.iter_chunks(names):
+                f.writelines(
+                    json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n'
+                    for row in rows
+                )
+                written += len(rows)
+        return written
+
+    # ==================== КОЛОНОЧНЫЕ ФОРМАТЫ ====================
+
+    def get_facet_dictionaries(self, names: List[str]) -> Dict[str, List[str]]:
+        """
+        Общие словари для facet-колонок по всей выборке (одинаковые во всех порциях).
+        COLLATE BINARY: у фасетов после encode_facets.py сравнение NOCASE, и
+        DISTINCT схлопнул бы 'Drama' и 'drama' - второго значения не было бы в словаре.
+        """
+        dictionaries = {}
+        for name in FACET_COLUMNS:
+            if name not in names:
+                continue
+            query = f"SELECT DISTINCT {name} COLLATE BINARY FROM content WHERE {name} IS NOT NULL"
+            params = []
+            if self.content_type:
+                query += " AND type = ?"
+                params.append(self.content_type)
+            self.cursor.execute(query + " ORDER BY 1", params)
+            # 5 и '5' - разные значения SQLite, но одна строка словаря
+            dictionaries[name] = list(dict.fromkeys(str(row[0]) for row in self.cursor.fetchall()))
+        return dictionaries
+
+    @contextmanager
+    def read_snapshot(self):
+        """
+        Весь экспорт - в одной транзакции чтения: словари и порции видят одни
+        и те же данные, запись другого процесса между ними не добавит значение,
+        которого нет в словаре.
+        """
+        if self.conn.in_transaction:
+            yield
+            return
+        self.cursor.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self.conn.rollback()
+
+    def build_schema(self, columns: List[Tuple[str, str]]):
+        """Arrow-схема по объявленным типам SQLite"""
+        fields = []
+        for name, decl_type in columns:
+            if name in FACET_COLUMNS:
+                arrow_type = pa.dictionary(pa.int32(), pa.string())
+            elif 'INT' in decl_type:
+                arrow_type = pa.int64()
+            elif any(t in decl_type for t in ('REAL', 'FLOA', 'DOUB')):
+                arrow_type = pa.float64()
+            else:
+                arrow_type = pa.string()
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema(fields)
+
+    def iter_record_batches(self):
+        """
+        (schema, генератор RecordBatch) - по одной порции за раз.
+        Коды фасетов - по словарю всей выборки (вызывать внутри read_snapshot).
+        Текст в числовых колонках (year, rating) пишется как NULL.
+        """
+        columns = self.get_columns()
+        names = [name for name, _ in columns]
+        schema = self.build_schema(columns)
+        dictionaries = self.get_facet_dictionaries(names)
+
+        facet_index = {
+            name: {value: i for i, value in enumerate(values)}
+            for name, values in dictionaries.items()
+        }
+        facet_arrays = {
+            name: pa.array(values, type=pa.string())
+            for name, values in dictionaries.items()
+        }
+
+        def batches():
+            for rows in self.iter_chunks(names):
+                arrays = []
+                for col_idx, field in enumerate(schema):
+                    values = [row[col_idx] for row in rows]
+                    if field.name in facet_index:
+                        lookup = facet_index[field.name]
+                        indices = pa.array(
+                            [None if v is None else lookup[str(v)] for v in values],
+                            type=pa.int32()
+                        )
+                        arrays.append(pa.DictionaryArray.from_arrays(indices, facet_arrays[field.name]))
+                    elif pa.types.is_integer(field.type):
+                        arrays.append(pa.array([_as_int(v) for v in values], type=field.type))
+                    elif pa.types.is_floating(field.type):
+                        arrays.append(pa.array([_as_float(v) for v in values], type=field.type))
+                    elif pa.types.is_string(field.type):
+                        arrays.append(pa.array(
+                            [None if v is None else str(v) for v in values], type=pa.string()
+                        ))
+                    else:
+                        arrays.append(pa.array(values, type=field.type))
+                yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+        return schema, batches()
+
+    def require_pyarrow(self) -> bool:
+        if pa is None:
+            print("❌ Для Parquet/Arrow нужна библиотека pyarrow")
+            print("Установите: pip install pyarrow")
+            return False
+        return True
+
+    def export_parquet(self, filename: str, compression: str = 'zstd') -> int:
+        """Parquet: одна row group на порцию"""
+        if not self.require_pyarrow():
+            return -1
+
+        written = 0
+        with self.read_snapshot():
+            schema, batches = self.iter_record_batches()
+            with pq.ParquetWriter(filename, schema, compression=compression) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    written += batch.num_rows
+        return written
+
+    def export_arrow(self, filename: str) -> int:
+        """Arrow IPC (Feather v2) файл"""
+        if not self.require_pyarrow():
+            return -1
+
+        written = 0
+        with self.read_snapshot():
+            schema, batches = self.iter_record_batches()
+            with pa.OSFile(filename, 'wb') as sink:
+                with pa.ipc.new_file(sink, schema) as writer:
+                    for batch in batches:
+                        writer.write_batch(batch)
+                        written += batch.num_rows
+        return written
+
+    # ==================== СНИМОК ====================
+
+    def export_snapshot(self, filename: str) -> int:
+        """Бинарный снимок для чтения через mmap (catalog_snapshot.py)"""
+        import catalog_snapshot
+        return catalog_snapshot.write_snapshot(self.conn, filename, self.content_type,
+                                               self.chunk_size)
+
+    def export(self, filename: str, fmt: str) -> int:
+        """Экспорт в указанном формате, возвращает количество записей (-1 - ошибка)"""
+        exporters = {
+            'csv': self.export_csv,
+            'jsonl': self.export_jsonl,
+            'parquet': self.export_parquet,
+            'arrow': self.export_arrow,
+            'snapshot': self.export_snapshot
+        }
+        return exporters[fmt](filename)
+
+
+def guess_format(filename: str) -> Optional[str]:
+    """Формат по расширению файла"""
+    extension = filename.rsplit('.', 1)[-1].lower()
+    aliases = {'ndjson': 'jsonl', 'feather': 'arrow', 'pq': 'parquet', 'cbsnap': 'snapshot'}
+    extension = aliases.get(extension, extension)
+    return extension if extension in FORMATS else None
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='📦 Content Export - потоковый экспорт каталога',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python content_export.py catalog.parquet
+  python content_export.py movies.jsonl --type movies
+  python content_export.py catalog.arrow --chunk-size 20000
+  python content_export.py catalog.cbsnap
+  python content_export.py dump.txt --format csv
+        """
+    )
+
+    parser.add_argument('output', help='Файл для экспорта')
+
+    parser.add_argument('--format',
+                        choices=FORMATS,
+                        help='Формат (по умолчанию - по расширению файла)')
+
+    parser.add_argument('--type',
+                        choices=['books', 'movies', 'music'],
+                        help='Тип контента для экспорта')
+
+    parser.add_argument('--chunk-size',
+                        type=int,
+                        default=CHUNK_SIZE,
+                        help=f'Размер порции (по умолчанию: {CHUNK_SIZE})')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    fmt = args.format or guess_format(args.output)
+    if not fmt:
+        print(f"❌ Не удалось определить формат по имени файла: {args.output}")
+        print(f"   Укажите --format ({', '.join(FORMATS)})")
+        sys.exit(1)
+
+    content_type = TYPE_ARGS.get(args.type)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        exporter = ContentExporter(conn, content_type, args.chunk_size)
+        written = exporter.export(args.output, fmt)
+        if written < 0:
+            sys.exit(1)
+        print(f"✅ {fmt.upper()} экспортирован: {args.output} ({written:,} записей)")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+📊 CONTENT STATS - Сводная таблица статистики каталога
+
+Назначение:
+- Таблица content_stats с готовыми счетчиками по корзинам
+  (тип, жанр, эпоха, настроение, критерий, десятилетие, needs_ai, переводы)
+- Триггеры INSERT/UPDATE/DELETE на content держат счетчики актуальными
+- Команда полной пересборки и проверка согласованности с content
+- Функции чтения для отчетных инструментов (check_stats, db_inspector, ...):
+  open_stats() ничего не пишет в content.db - без таблицы считает по content
+
+Запрос статистики стоит O(число корзин) вместо полного GROUP BY по content.
+После encode_facets.py триггеры стоят на content_items и расшифровывают
+коды фасетов через словари (facet_dictionary.py).
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import facet_dictionary
+import sql_trace
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+STATS_TABLE = 'content_stats'
+
+TRIGGER_INSERT = 'content_stats_after_insert'
+TRIGGER_UPDATE = 'content_stats_after_update'
+TRIGGER_DELETE = 'content_stats_after_delete'
+
+TRANSLATION_COLUMNS = ['description_ru', 'description_en', 'description_kk']
+
+# Колонки, изменение которых влияет на счетчики (фасеты - до миграции на коды)
+TRACKED_COLUMNS = [
+    'type', 'genre', 'epoch', 'mood', 'criteria', 'year', 'needs_ai',
+    'rating', 'description', 'image_url'
+] + TRANSLATION_COLUMNS
+
+
+def _filled(column: str) -> str:
+    """Флаг '1'/'0' - заполнено ли текстовое поле"""
+    return f"CASE WHEN {{r}}.{column} IS NOT NULL AND {{r}}.{column} != '' THEN '1' ELSE '0' END"
+
+
+DECADE_EXPR = """CASE
+            WHEN {r}.year IS NULL THEN NULL
+            WHEN {r}.year >= 2020 THEN '2020s'
+            WHEN {r}.year >= 2010 THEN '2010s'
+            WHEN {r}.year >= 2000 THEN '2000s'
+            WHEN {r}.year >= 1990 THEN '90s'
+            WHEN {r}.year >= 1980 THEN '80s'
+            ELSE 'classics'
+        END"""
+
+ALL_TRANSLATIONS_EXPR = "CASE WHEN " + " AND ".join(
+    f"{{r}}.{col} IS NOT NULL AND {{r}}.{col} != ''" for col in TRANSLATION_COLUMNS
+) + " THEN '1' ELSE '0' END"
+
+# Корзины статистики: (измерение, выражение значения, выражение суммы)
+# {r} - алиас строки (NEW / OLD в триггерах, c при пересборке),
+# {genre} и другие фасеты - значение колонки или расшифровка кода.
+# Значение NULL означает, что строка в эту корзину не попадает.
+STAT_BUCKETS = [
+    ('total', "''", '0'),
+    ('genre', "IFNULL({genre}, '')", '0'),
+    ('epoch', "IFNULL({epoch}, '')", '0'),
+    ('mood', "IFNULL({mood}, '')", '0'),
+    ('criteria', "IFNULL({criteria}, '')", '0'),
+    ('decade', DECADE_EXPR, '0'),
+    ('needs_ai', "CASE WHEN {r}.needs_ai = 1 THEN '1' ELSE '0' END", '0'),
+    ('rating', "CASE WHEN {r}.rating IS NOT NULL THEN '' END", 'IFNULL({r}.rating, 0)'),
+    ('has_description', _filled('description'), '0'),
+    ('has_image', _filled('image_url'), '0'),
+    ('has_ru', _filled('description_ru'), '0'),
+    ('has_en', _filled('description_en'), '0'),
+    ('has_kk', _filled('description_kk'), '0'),
+    ('has_all_translations', ALL_TRANSLATIONS_EXPR, '0'),
+]
+
+# ==================== ГЕНЕРАЦИЯ SQL ====================
+
+def _facet_fields(row_alias: str, encoded: bool) -> Dict[str, str]:
+    """Выражения значений фасетов: колонка или код через словарь"""
+    return {
+        facet: facet_dictionary.decode_expr(facet, row_alias) if encoded else f"{row_alias}.{facet}"
+        for facet in facet_dictionary.FACET_TABLES
+    }
+
+
+def _tracked_columns(encoded: bool) -> List[str]:
+    return [
+        facet_dictionary.code_column(col) if encoded and col in facet_dictionary.FACET_TABLES else col
+        for col in TRACKED_COLUMNS
+    ]
+
+
+def _bucket_rows(row_alias: str, sign: int, from_clause: str = '', encoded: bool = False) -> str:
+    """SELECT всех корзин для одной строки content (UNION ALL)"""
+    fields = _facet_fields(row_alias, encoded)
+    parts = []
+    for dimension, value_expr, sum_expr in STAT_BUCKETS:
+        value_sql = value_expr.format(r=row_alias, **fields)
+        sum_sql = sum_expr.format(r=row_alias)
+        parts.append(
+            f"SELECT '{dimension}' AS dimension, IFNULL({row_alias}.type, '') AS type, "
+            f"{value_sql} AS value, {sign} AS delta, {sign} * ({sum_sql}) AS value_sum"
+            f"{from_clause}"
+        )
+    return "\n        UNION ALL ".join(parts)
+
+
+def _upsert(select_sql: str) -> str:
+    return f"""
+        INSERT INTO {STATS_TABLE} (dimension, type, value, count, value_sum)
+        {select_sql}
+        ON CONFLICT(dimension, type, value) DO UPDATE SET
+            count = count + excluded.count,
+            value_sum = value_sum + excluded.value_sum;"""
+
+
+def _trigger_sql(encoded: bool = False) -> List[str]:
+    table = facet_dictionary.ITEMS_TABLE if encoded else 'content'
+    insert_body = _upsert(f"""
+        SELECT dimension, type, value, delta, value_sum FROM (
+        {_bucket_rows('NEW', 1, encoded=encoded)}
+        ) WHERE value IS NOT NULL""")
+
+    delete_body = _upsert(f"""
+        SELECT dimension, type, value, delta, value_sum FROM (
+        {_bucket_rows('OLD', -1, encoded=encoded)}
+        ) WHERE value IS NOT NULL""")
+
+    # При UPDATE пишем только корзины, которые реально изменились
+    update_body = _upsert(f"""
+        SELECT dimension, type, value, SUM(delta), SUM(value_sum) FROM (
+        {_bucket_rows('OLD', -1, encoded=encoded)}
+        UNION ALL {_bucket_rows('NEW', 1, encoded=encoded)}
+        ) WHERE value IS NOT NULL
+        GROUP BY dimension, type, value
+        HAVING SUM(delta) != 0 OR SUM(value_sum) != 0""")
+
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {TRIGGER_INSERT} AFTER INSERT ON {table} BEGIN{insert_body}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {TRIGGER_UPDATE} AFTER UPDATE OF {', '.join(_tracked_columns(encoded))} "
+        f"ON {table} BEGIN{update_body}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {TRIGGER_DELETE} AFTER DELETE ON {table} BEGIN{delete_body}\nEND",
+    ]
+
+
+def _aggregate_sql(encoded: bool = False, source: Optional[str] = None) -> str:
+    """Полный пересчет корзин по таблице content (source - подзапрос вместо таблицы)"""
+    table = source or (facet_dictionary.ITEMS_TABLE if encoded else 'content')
+    return f"""
+        SELECT dimension, type, value, SUM(delta) AS count, SUM(value_sum) AS value_sum FROM (
+        {_bucket_rows('c', 1, f' FROM {table} c', encoded)}
+        ) WHERE value IS NOT NULL
+        GROUP BY dimension, type, value"""
+
+# ==================== УСТАНОВКА И ОБСЛУЖИВАНИЕ ====================
+
+def ensure_translation_columns(cursor: sqlite3.Cursor):
+    """Колонки переводов нужны триггерам (так же их создает translate_descriptions.py)"""
+    cursor.execute("PRAGMA table_info(content)")
+    columns = [row[1] for row in cursor.fetchall()]
+    for col in TRANSLATION_COLUMNS:
+        if col not in columns:
+            facet_dictionary.add_column(cursor, col, "TEXT")
+
+
+def is_installed(cursor: sqlite3.Cursor) -> bool:
+    """Установлены ли таблица и все триггеры"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE (type = 'table' AND name = ?)
+           OR (type = 'trigger' AND name IN (?, ?, ?))
+    """, (STATS_TABLE, TRIGGER_INSERT, TRIGGER_UPDATE, TRIGGER_DELETE))
+    return cursor.fetchone()[0] == 4
+
+
+def install(conn: sqlite3.Connection) -> bool:
+    """Создать таблицу и триггеры и заполнить счетчики"""
+    cursor = conn.cursor()
+    try:
+        ensure_translation_columns(cursor)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+                dimension TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                value_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, type, value)
+            ) WITHOUT ROWID
+        """)
+        # Пересоздаем триггеры, чтобы подхватить изменения в STAT_BUCKETS
+        drop_triggers(cursor)
+        for sql in _trigger_sql(facet_dictionary.is_encoded(cursor)):
+            cursor.execute(sql)
+        _rebuild(cursor)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Ошибка установки {STATS_TABLE}: {e}")
+        return False
+
+
+def drop_triggers(cursor: sqlite3.Cursor):
+    for name in (TRIGGER_INSERT, TRIGGER_UPDATE, TRIGGER_DELETE):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def uninstall(conn: sqlite3.Connection):
+    """Удалить триггеры и таблицу"""
+    cursor = conn.cursor()
+    drop_triggers(cursor)
+    cursor.execute(f"DROP TABLE IF EXISTS {STATS_TABLE}")
+    conn.commit()
+
+
+def _rebuild(cursor: sqlite3.Cursor):
+    cursor.execute(f"DELETE FROM {STATS_TABLE}")
+    cursor.execute(f"""
+        INSERT INTO {STATS_TABLE} (dimension, type, value, count, value_sum)
+        {_aggregate_sql(facet_dictionary.is_encoded(cursor))}
+    """)
+
+
+def rebuild(conn: sqlite3.Connection) -> bool:
+    """Пересчитать все счетчики с нуля (в одной транзакции)"""
+    cursor = conn.cursor()
+    try:
+        _rebuild(cursor)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Ошибка пересборки {STATS_TABLE}: {e}")
+        return False
+
+
+def verify(conn: sqlite3.Connection, tolerance: float = 1e-6) -> List[Dict]:
+    """
+    Сравнить счетчики с реальными данными content.
+    Возвращает список расхождений (пустой - все согласовано).
+    """
+    cursor = conn.cursor()
+
+    cursor.execute(_aggregate_sql(facet_dictionary.is_encoded(cursor)))
+    expected = {(row[0], row[1], row[2]): (row[3], row[4]) for row in cursor.fetchall()}
+
+    cursor.execute(f"SELECT dimension, type, value, count, value_sum FROM {STATS_TABLE}")
+    actual = {(row[0], row[1], row[2]): (row[3], row[4]) for row in cursor.fetchall()}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        exp_count, exp_sum = expected.get(key, (0, 0.0))
+        act_count, act_sum = actual.get(key, (0, 0.0))
+        if exp_count != act_count or abs((exp_sum or 0) - (act_sum or 0)) > tolerance * max(1.0, abs(exp_sum or 0)):
+            mismatches.append({
+                'dimension': key[0],
+                'type': key[1],
+                'value': key[2],
+                'expected_count': exp_count,
+                'actual_count': act_count,
+                'expected_sum': exp_sum,
+                'actual_sum': act_sum
+            })
+    return mismatches
+
+
+def ensure_stats(conn: sqlite3.Connection) -> bool:
+    """Установить статистику, если ее еще нет (для инструментов, которые и так пишут в content.db)"""
+    if is_installed(conn.cursor()):
+        return True
+    print(f"ℹ️ Таблица {STATS_TABLE} не найдена - создаю и заполняю...")
+    return install(conn)
+
+def open_stats(conn: sqlite3.Connection) -> bool:
+    """
+    Статистика только для чтения (check_*, db_inspector, check_translations).
+    Если content_stats не установлена - счетчики один раз считаются по content
+    во временную таблицу с тем же именем: content.db не меняется, установка -
+    дело миграций (encode_facets.py) и content_stats.py --install.
+    """
+    cursor = conn.cursor()
+    if is_installed(cursor):
+        return True
+
+    try:
+        encoded = facet_dictionary.is_encoded(cursor)
+        table = facet_dictionary.ITEMS_TABLE if encoded else 'content'
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cursor.fetchall()]
+        if not columns:
+            print(f"❌ Таблица {table} не найдена")
+            return False
+
+        # Колонок переводов еще нет - считаем их пустыми, без ALTER
+        missing = [col for col in TRANSLATION_COLUMNS if col not in columns]
+        source = None
+        if missing:
+            extra = ', '.join(f"NULL AS {col}" for col in missing)
+            source = f"(SELECT *, {extra} FROM {table})"
+
+        cursor.execute(f"DROP TABLE IF EXISTS temp.{STATS_TABLE}")
+        cursor.execute(f"CREATE TEMP TABLE {STATS_TABLE} AS {_aggregate_sql(encoded, source)}")
+        return True
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подсчета статистики: {e}")
+        return False
+
+# ==================== ЧТЕНИЕ СТАТИСТИКИ ====================
+
+def get_total(cursor: sqlite3.Cursor, content_type: Optional[str] = None) -> int:
+    """Количество записей (всего или по типу)"""
+    return get_flag_count(cursor, 'total', content_type, value='')
+
+
+def get_by_type(cursor: sqlite3.Cursor) -> Dict[str, int]:
+    """Количество записей по типам (по убыванию)"""
+    cursor.execute(f"""
+        SELECT type, count FROM {STATS_TABLE}
+        WHERE dimension = 'total' AND count > 0
+        ORDER BY count DESC
+    """)
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def get_bucket_counts(
+    cursor: sqlite3.Cursor,
+    dimension: str,
+    content_type: Optional[str] = None,
+    limit: Optional[int] = None
+) -> List[Tuple[str, int]]:
+    """
+    Счетчики по значениям измерения. Пустое значение ('' - пустая строка
+    или NULL) - своя корзина, как в GROUP BY по content: сумма по
+    значениям равна get_total().
+    """
+    query = f"""
+        SELECT value, SUM(count) AS count FROM {STATS_TABLE}
+        WHERE dimension = ?
+    """
+    params = [dimension]
+
+    if content_type:
+        query += " AND type = ?"
+        params.append(content_type)
+
+    query += " GROUP BY value HAVING SUM(count) > 0 ORDER BY count DESC, value"
+
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    cursor.execute(query, params)
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def get_flag_count(
+    cursor: sqlite3.Cursor,
+    dimension: str,
+    content_type: Optional[str] = None,
+    value: str = '1'
+) -> int:
+    """Количество записей в одной корзине (например, needs_ai = '1')"""
+    query = f"SELECT SUM(count) FROM {STATS_TABLE} WHERE dimension = ? AND value = ?"
+    params = [dimension, value]
+
+    if content_type:
+        query += " AND type = ?"
+        params.append(content_type)
+
+    cursor.execute(query, params)
+    return cursor.fetchone()[0] or 0
+
+
+def get_flag_counts_by_type(cursor: sqlite3.Cursor, dimension: str, value: str = '1') -> Dict[str, int]:
+    """Количество записей в корзине, разбитое по типам"""
+    cursor.execute(f"""
+        SELECT type, count FROM {STATS_TABLE}
+        WHERE dimension = ? AND value = ?
+    """, (dimension, value))
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def get_avg_rating(cursor: sqlite3.Cursor, content_type: Optional[str] = None) -> Dict[str, float]:
+    """Средний рейтинг по типам (только записи с rating IS NOT NULL)"""
+    query = f"""
+        SELECT type, ROUND(value_sum / count, 2) FROM {STATS_TABLE}
+        WHERE dimension = 'rating' AND count > 0
+    """
+    params = []
+
+    if content_type:
+        query += " AND type = ?"
+        params.append(content_type)
+
+    cursor.execute(query, params)
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+# ==================== CLI ====================
+
+def print_summary(cursor: sqlite3.Cursor):
+    """Краткая сводка из content_stats"""
+    print("\n" + "=" * 70)
+    print("📊 CONTENT STATS".center(70))
+    print("=" * 70)
+
+    print(f"\n📚 Всего записей: {get_total(cursor):,}")
+    for content_type, count in get_by_type(cursor).items():
+        print(f"  {content_type:10} {count:,}")
+
+    cursor.execute(f"SELECT COUNT(*) FROM {STATS_TABLE} WHERE count > 0")
+    print(f"\n🗂️ Непустых корзин: {cursor.fetchone()[0]:,}")
+    print(f"⚡ Нужно AI-описаний: {get_flag_count(cursor, 'needs_ai'):,}")
+    print("=" * 70 + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='📊 Content Stats - сводная таблица статистики каталога',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python content_stats.py --install     # Создать таблицу и триггеры
+  python content_stats.py --rebuild     # Пересчитать счетчики с нуля
+  python content_stats.py --verify      # Сверить счетчики с content
+  python content_stats.py               # Краткая сводка
+        """
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--install', action='store_true',
+                       help='Создать таблицу content_stats и триггеры')
+    group.add_argument('--rebuild', action='store_true',
+                       help='Полностью пересчитать счетчики')
+    group.add_argument('--verify', action='store_true',
+                       help='Проверить согласованность счетчиков с content')
+    group.add_argument('--uninstall', action='store_true',
+                       help='Удалить триггеры и таблицу')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+
+        if args.install:
+            if install(conn):
+                print(f"✅ {STATS_TABLE} установлена, триггеры созданы")
+                print_summary(cursor)
+            else:
+                sys.exit(1)
+
+        elif args.uninstall:
+            uninstall(conn)
+            print(f"✅ {STATS_TABLE} и триггеры удалены")
+
+        elif args.rebuild:
+            if not is_installed(cursor):
+                print(f"❌ {STATS_TABLE} не установлена. Запустите: --install")
+                sys.exit(1)
+            if rebuild(conn):
+                print(f"✅ {STATS_TABLE} пересобрана")
+                print_summary(cursor)
+            else:
+                sys.exit(1)
+
+        elif args.verify:
+            if not is_installed(cursor):
+                print(f"❌ {STATS_TABLE} не установлена. Запустите: --install")
+                sys.exit(1)
+            mismatches = verify(conn)
+            if not mismatches:
+                print(f"✅ {STATS_TABLE} согласована с content")
+            else:
+                print(f"❌ Расхождений: {len(mismatches)}")
+                for m in mismatches[:20]:
+                    print(f"  - {m['dimension']}/{m['type']}/{m['value'] or '∅'}: "
+                          f"ожидалось {m['expected_count']}, в таблице {m['actual_count']}")
+                print("\nИсправить: python scripts/tools/content_stats.py --rebuild")
+                sys.exit(2)
+
+        else:
+            if not is_installed(cursor):
+                print(f"ℹ️ {STATS_TABLE} не установлена - счетчики по content "
+                      f"(установить: --install)")
+            if not open_stats(conn):
+                sys.exit(1)
+            print_summary(cursor)
+
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -10,18 +10,23 @@
 - Проверка integrity (уникальность, валидация)
 - Экспорт отчетов в JSON/CSV
 - Поиск проблемных записей
+- Словари фасетов (после encode_facets.py)
 - Рекомендации по улучшению
 """
 
 import sqlite3
 import argparse
 import json
-import csv
 import sys
 from datetime import datetime
 from collections import defaultdict
 from typing import Dict, List, Tuple
 
+import content_stats
+import facet_dictionary
+import sql_trace
+from content_export import ContentExporter, TYPE_ARGS
+
 # ==================== КОНСТАНТЫ ====================
 
 DB_PATH = 'content.db'
@@ -48,15 +53,18 @@ class DatabaseInspector:
         self.db_path = db_path
         self.conn = None
         self.cursor = None
+        self.encoded = False
         self.stats = {}
         
     def connect(self):
         """Подключение к базе данных"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sql_trace.connect(self.db_path)
             self.conn.row_factory = sqlite3.Row
             self.cursor = self.conn.cursor()
-            return True
+            self.encoded = facet_dictionary.is_encoded(self.cursor)
+            # Счетчики по корзинам берем из content_stats
+            return content_stats.open_stats(self.conn)
         except sqlite3.Error as e:
             print(f"❌ Ошибка подключения к БД: {e}")
             return False
@@ -73,87 +81,47 @@ class DatabaseInspector:
         stats = {}
         
         # Общее количество
-        self.cursor.execute("SELECT COUNT(*) FROM content")
-        stats['total'] = self.cursor.fetchone()[0]
+        stats['total'] = content_stats.get_total(self.cursor)
         
         # По типам
-        self.cursor.execute("""
-            SELECT type, COUNT(*) as count
-            FROM content
-            GROUP BY type
-            ORDER BY count DESC
-        """)
-        stats['by_type'] = dict(self.cursor.fetchall())
+        stats['by_type'] = content_stats.get_by_type(self.cursor)
         
         # Средний рейтинг по типам
-        self.cursor.execute("""
-            SELECT type, ROUND(AVG(rating), 2) as avg_rating
-            FROM content
-            WHERE rating IS NOT NULL
-            GROUP BY type
-        """)
-        stats['avg_rating'] = dict(self.cursor.fetchall())
+        stats['avg_rating'] = content_stats.get_avg_rating(self.cursor)
         
         # Количество с needs_ai
-        self.cursor.execute("SELECT COUNT(*) FROM content WHERE needs_ai = 1")
-        stats['needs_ai'] = self.cursor.fetchone()[0]
+        stats['needs_ai'] = content_stats.get_flag_count(self.cursor, 'needs_ai')
         
         # Количество без описания
-        self.cursor.execute("SELECT COUNT(*) FROM content WHERE description IS NULL OR description = ''")
-        stats['no_description'] = self.cursor.fetchone()[0]
+        stats['no_description'] = content_stats.get_flag_count(self.cursor, 'has_description', value='0')
         
         # Количество без изображений
-        self.cursor.execute("SELECT COUNT(*) FROM content WHERE image_url IS NULL OR image_url = ''")
-        stats['no_image'] = self.cursor.fetchone()[0]
+        stats['no_image'] = content_stats.get_flag_count(self.cursor, 'has_image', value='0')
         
         return stats
     
     def get_genre_stats(self, limit: int = 10) -> List[Tuple]:
         """Топ жанров"""
-        self.cursor.execute("""
-            SELECT genre, COUNT(*) as count
-            FROM content
-            WHERE genre IS NOT NULL
-            GROUP BY genre
-            ORDER BY count DESC
-            LIMIT ?
-        """, (limit,))
-        return self.cursor.fetchall()
+        return content_stats.get_bucket_counts(self.cursor, 'genre', limit=limit)
     
     def get_epoch_stats(self, limit: int = 10) -> List[Tuple]:
         """Статистика по эпохам"""
-        self.cursor.execute("""
-            SELECT epoch, COUNT(*) as count
-            FROM content
-            WHERE epoch IS NOT NULL
-            GROUP BY epoch
-            ORDER BY count DESC
-            LIMIT ?
-        """, (limit,))
-        return self.cursor.fetchall()
+        return content_stats.get_bucket_counts(self.cursor, 'epoch', limit=limit)
     
     def get_year_distribution(self) -> List[Tuple]:
         """Распределение по годам"""
-        self.cursor.execute("""
-            SELECT 
-                CASE 
-                    WHEN year >= 2020 THEN '2020s'
-                    WHEN year >= 2010 THEN '2010s'
-                    WHEN year >= 2000 THEN '2000s'
-                    WHEN year >= 1990 THEN '90s'
-                    WHEN year >= 1980 THEN '80s'
-                    ELSE 'classics'
-                END as decade,
-                COUNT(*) as count
-            FROM content
-            WHERE year IS NOT NULL
-            GROUP BY decade
-            ORDER BY count DESC
-        """)
-        return self.cursor.fetchall()
+        return content_stats.get_bucket_counts(self.cursor, 'decade')
     
     # ==================== АНАЛИЗ КАЧЕСТВА ====================
     
+    def _missing_condition(self, field: str) -> str:
+        """Поле не заполнено; фасет после encode_facets.py проверяется по коду"""
+        if self.encoded and field in facet_dictionary.FACET_TABLES:
+            code = facet_dictionary.code_column(field)
+            table = facet_dictionary.FACET_TABLES[field]
+            return f"({code} IS NULL OR {code} IN (SELECT id FROM {table} WHERE value = ''))"
+        return f"({field} IS NULL OR {field} = '')"
+    
     def check_data_quality(self, content_type: str = None) -> Dict:
         """Проверка качества данных"""
         quality_report = {
@@ -163,15 +131,18 @@ class DatabaseInspector:
             'orphaned_records': 0
         }
         
-        type_filter = f"WHERE type = '{content_type}'" if content_type else ""
+        # Тип - параметром: без подстановки значения в SQL и одна форма запроса
+        # на все типы (колонки подставляются только из фиксированного списка)
+        type_filter = "WHERE type = ?" if content_type else "WHERE 1"
+        params = (content_type,) if content_type else ()
         
         # Проверка пропущенных полей
         for field in ['title', 'creator', 'description', 'image_url', 'year', 'rating', 'genre']:
             self.cursor.execute(f"""
                 SELECT COUNT(*) FROM content 
                 {type_filter}
-                {'AND' if content_type else 'WHERE'} ({field} IS NULL OR {field} = '')
-            """)
+                AND {self._missing_condition(field)}
+            """, params)
             count = self.cursor.fetchone()[0]
             if count > 0:
                 quality_report['missing_fields'][field] = count
@@ -180,8 +151,8 @@ class DatabaseInspector:
         self.cursor.execute(f"""
             SELECT COUNT(*) FROM content 
             {type_filter}
-            {'AND' if content_type else 'WHERE'} rating IS NULL
-        """)
+            AND rating IS NULL
+        """, params)
         quality_report['empty_ratings'] = self.cursor.fetchone()[0]
         
         # Дубликаты по source_id
@@ -191,7 +162,7 @@ class DatabaseInspector:
             {type_filter}
             GROUP BY source_id
             HAVING count > 1
-        """)
+        """, params)
         quality_report['duplicates'] = len(self.cursor.fetchall())
         
         return quality_report
@@ -225,7 +196,7 @@ class DatabaseInspector:
         
         conditions = []
         for field in REQUIRED_FIELDS[content_type]:
-            conditions.append(f"({field} IS NULL OR {field} = '')")
+            conditions.append(self._missing_condition(field))
         
         query = f"""
             SELECT id, title, creator, type, genre, year
@@ -256,32 +227,29 @@ class DatabaseInspector:
         values = {}
         
         # Жанры
-        self.cursor.execute("""
-            SELECT DISTINCT genre FROM content
-            WHERE type = ? AND genre IS NOT NULL
-            ORDER BY genre
-        """, (content_type,))
-        values['genres'] = [row[0] for row in self.cursor.fetchall()]
+        values['genres'] = sorted(
+            value for value, _ in content_stats.get_bucket_counts(self.cursor, 'genre', content_type)
+        )
         
         # Эпохи
-        self.cursor.execute("""
-            SELECT DISTINCT epoch FROM content
-            WHERE type = ? AND epoch IS NOT NULL
-            ORDER BY epoch
-        """, (content_type,))
-        values['epochs'] = [row[0] for row in self.cursor.fetchall()]
+        values['epochs'] = sorted(
+            value for value, _ in content_stats.get_bucket_counts(self.cursor, 'epoch', content_type)
+        )
         
         # Настроения (для музыки)
         if content_type == 'music':
-            self.cursor.execute("""
-                SELECT DISTINCT mood FROM content
-                WHERE type = 'music' AND mood IS NOT NULL
-                ORDER BY mood
-            """)
-            values['moods'] = [row[0] for row in self.cursor.fetchall()]
+            values['moods'] = sorted(
+                value for value, _ in content_stats.get_bucket_counts(self.cursor, 'mood', 'music')
+            )
         
         return values
     
+    def get_facet_dictionaries(self) -> List[Dict]:
+        """Словари фасетов (пусто, пока БД не переведена на коды)"""
+        if not self.encoded:
+            return []
+        return facet_dictionary.get_dictionary_stats(self.cursor)
+    
     # ==================== РЕКОМЕНДАЦИИ ====================
     
     def generate_recommendations(self) -> List[str]:
@@ -321,6 +289,14 @@ class DatabaseInspector:
                 f"Запустите: python scripts/migrations/fix_duplicates.py"
             )
         
+        # Словари фасетов
+        unused = sum(item['unused'] for item in self.get_facet_dictionaries())
+        if unused > 0:
+            recommendations.append(
+                f"🗂️ В словарях фасетов {unused} значений без записей. "
+                f"Запустите: python scripts/tools/facet_dictionary.py --prune"
+            )
+        
         # Проверка качества по типам
         for content_type in ['book', 'movie', 'music']:
             missing = self.find_missing_critical_data(content_type, limit=1)
@@ -364,6 +340,14 @@ class DatabaseInspector:
         for i, (genre, count) in enumerate(self.get_genre_stats(10), 1):
             print(f"  {i:2}. {genre:20} {count:,}")
         
+        # Словари фасетов
+        dictionaries = self.get_facet_dictionaries()
+        if dictionaries:
+            print(f"\n🗂️ СЛОВАРИ ФАСЕТОВ")
+            print(f"{'─' * 70}")
+            for item in dictionaries:
+                print(f"  {item['facet']:15} {item['values']:>8,} значений ({item['unused']:,} без записей)")
+        
         # Распределение по годам
         print(f"\n📅 РАСПРЕДЕЛЕНИЕ ПО ЭПОХАМ")
         print(f"{'─' * 70}")
@@ -409,16 +393,11 @@ class DatabaseInspector:
         print("=" * 70)
         
         # Общие цифры
-        self.cursor.execute("SELECT COUNT(*) FROM content WHERE type = ?", (content_type,))
-        total = self.cursor.fetchone()[0]
+        total = content_stats.get_total(self.cursor, content_type)
         print(f"Всего записей: {total:,}")
         
         # Средний рейтинг
-        self.cursor.execute("""
-            SELECT ROUND(AVG(rating), 2) FROM content 
-            WHERE type = ? AND rating IS NOT NULL
-        """, (content_type,))
-        avg_rating = self.cursor.fetchone()[0]
+        avg_rating = content_stats.get_avg_rating(self.cursor, content_type).get(content_type)
         print(f"Средний рейтинг: ⭐ {avg_rating or 0}")
         
         # Уникальные значения
@@ -448,43 +427,54 @@ class DatabaseInspector:
         print("=" * 70 + "\n")
     
     def export_json(self, filename: str):
-        """Экспорт отчета в JSON"""
-        report = {
-            'generated_at': datetime.now().isoformat(),
-            'database': self.db_path,
-            'stats': self.get_total_stats(),
-            'quality': self.check_data_quality(),
-            'duplicates': self.find_duplicates(50),
-            'recommendations': self.generate_recommendations()
-        }
+        """Экспорт отчета в JSON (секции пишутся по очереди, без общего словаря)"""
+        sections = [
+            ('generated_at', lambda: datetime.now().isoformat()),
+            ('database', lambda: self.db_path),
+            ('stats', self.get_total_stats),
+            ('quality', self.check_data_quality),
+            ('duplicates', lambda: self.find_duplicates(50)),
+            ('facet_dictionaries', self.get_facet_dictionaries),
+            ('recommendations', self.generate_recommendations)
+        ]
         
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write('{\n')
+            for i, (key, build) in enumerate(sections):
+                value = json.dumps(build(), indent=2, ensure_ascii=False).replace('\n', '\n  ')
+                separator = ',' if i < len(sections) - 1 else ''
+                f.write(f'  {json.dumps(key)}: {value}{separator}\n')
+            f.write('}\n')
         
         print(f"✅ Отчет сохранен: {filename}")
     
     def export_csv(self, filename: str, content_type: str = None):
-        """Экспорт проблемных записей в CSV"""
-        type_filter = f"WHERE type = '{content_type}'" if content_type else ""
-        
-        self.cursor.execute(f"""
-            SELECT id, type, title, creator, genre, year, rating,
-                   CASE WHEN description IS NULL OR description = '' THEN 'YES' ELSE 'NO' END as missing_desc,
-                   CASE WHEN image_url IS NULL OR image_url = '' THEN 'YES' ELSE 'NO' END as missing_image,
-                   needs_ai
-            FROM content
-            {type_filter}
-        """)
-        
-        rows = self.cursor.fetchall()
-        
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['ID', 'Type', 'Title', 'Creator', 'Genre', 'Year', 'Rating', 
-                           'Missing Desc', 'Missing Image', 'Needs AI'])
-            writer.writerows(rows)
+        """Экспорт проблемных записей в CSV (потоково, порциями)"""
+        columns = [
+            ('ID', 'id'),
+            ('Type', 'type'),
+            ('Title', 'title'),
+            ('Creator', 'creator'),
+            ('Genre', 'genre'),
+            ('Year', 'year'),
+            ('Rating', 'rating'),
+            ('Missing Desc', "CASE WHEN description IS NULL OR description = '' THEN 'YES' ELSE 'NO' END"),
+            ('Missing Image', "CASE WHEN image_url IS NULL OR image_url = '' THEN 'YES' ELSE 'NO' END"),
+            ('Needs AI', 'needs_ai')
+        ]
+        
+        exporter = ContentExporter(self.conn, content_type)
+        written = exporter.export_csv(filename, columns)
+        
+        print(f"✅ CSV экспортирован: {filename} ({written} записей)")
+    
+    def export_rows(self, filename: str, fmt: str, content_type: str = None):
+        """Потоковый экспорт всех полей content в JSONL / Parquet / Arrow / снимок"""
+        exporter = ContentExporter(self.conn, content_type)
+        written = exporter.export(filename, fmt)
         
-        print(f"✅ CSV экспортирован: {filename} ({len(rows)} записей)")
+        if written >= 0:
+            print(f"✅ {fmt.upper()} экспортирован: {filename} ({written:,} записей)")
 
 # ==================== CLI ====================
 
@@ -501,6 +491,10 @@ def main():
   python db_inspector.py --duplicates             # Найти дубликаты
   python db_inspector.py --export-json report.json
   python db_inspector.py --export-csv data.csv --type movies
+  python db_inspector.py --export-jsonl data.jsonl
+  python db_inspector.py --export-parquet catalog.parquet
+  python db_inspector.py --export-snapshot catalog.cbsnap
+  python db_inspector.py --sql-trace --sql-slow-ms 20
         """
     )
     
@@ -524,11 +518,30 @@ def main():
                        metavar='FILE',
                        help='Экспортировать данные в CSV')
     
+    parser.add_argument('--export-jsonl',
+                       metavar='FILE',
+                       help='Экспортировать все записи в JSON Lines')
+    
+    parser.add_argument('--export-parquet',
+                       metavar='FILE',
+                       help='Экспортировать все записи в Parquet (нужен pyarrow)')
+    
+    parser.add_argument('--export-arrow',
+                       metavar='FILE',
+                       help='Экспортировать все записи в Arrow IPC (нужен pyarrow)')
+    
+    parser.add_argument('--export-snapshot',
+                       metavar='FILE',
+                       help='Экспортировать снимок каталога для mmap (нужен numpy)')
+    
     parser.add_argument('--db',
                        default=DB_PATH,
                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
     
+    sql_trace.add_arguments(parser)
+    
     args = parser.parse_args()
+    sql_trace.from_args(args)
     
     # Создаем инспектор
     inspector = DatabaseInspector(args.db)
@@ -542,9 +555,20 @@ def main():
             inspector.export_json(args.export_json)
         
         elif args.export_csv:
-            content_type = args.type[:-1] if args.type else None  # books -> book
+            content_type = TYPE_ARGS.get(args.type)
             inspector.export_csv(args.export_csv, content_type)
         
+        elif args.export_jsonl or args.export_parquet or args.export_arrow or args.export_snapshot:
+            content_type = TYPE_ARGS.get(args.type)
+            if args.export_jsonl:
+                inspector.export_rows(args.export_jsonl, 'jsonl', content_type)
+            if args.export_parquet:
+                inspector.export_rows(args.export_parquet, 'parquet', content_type)
+            if args.export_arrow:
+                inspector.export_rows(args.export_arrow, 'arrow', content_type)
+            if args.export_snapshot:
+                inspector.export_rows(args.export_snapshot, 'snapshot', content_type)
+        
         elif args.duplicates:
             print("\n🔄 ПОИСК ДУБЛИКАТОВ")
             print("=" * 70)
@@ -568,7 +592,7 @@ def main():
                         print(f"  ID {item['id']:5} | {item['title'][:50]}")
         
         elif args.type:
-            content_type = args.type[:-1]  # books -> book
+            content_type = TYPE_ARGS[args.type]
             inspector.print_type_report(content_type)
         
         else:
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+🗂️ FACET DICTIONARY - Словари значений genre / epoch / mood / criteria
+
+Назначение:
+- Маленькие таблицы-словари facet_genres, facet_epochs, facet_moods,
+  facet_criteria: (id, value), value уникален без учета регистра
+- После миграции (scripts/migrations/encode_facets.py) записи хранятся
+  в content_items с целыми кодами genre_id / epoch_id / mood_id / criteria_id
+- content становится представлением: content_items + расшифрованные
+  значения. Старые читатели (API, check_*, ai_describer, ...) работают
+  без изменений, INSERT / UPDATE / DELETE через content переводятся
+  триггерами INSTEAD OF
+- FacetDictionary - кодирование с кэшем для harvest_* и других писателей
+
+Фильтр фасета = поиск по целочисленному индексу:
+  genre_id = (SELECT id FROM facet_genres WHERE value = ?)
+COLLATE NOCASE в словаре повторяет прежнее сравнение LOWER(col) = LOWER(?).
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import os
+import string
+import sys
+from typing import Dict, List, Optional
+
+import sql_trace
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+
+ITEMS_TABLE = 'content_items'
+VIEW_NAME = 'content'
+
+# Фасет -> таблица словаря
+FACET_TABLES = {
+    'genre': 'facet_genres',
+    'epoch': 'facet_epochs',
+    'mood': 'facet_moods',
+    'criteria': 'facet_criteria',
+}
+
+TRIGGER_INSERT = 'content_view_insert'
+TRIGGER_UPDATE = 'content_view_update'
+TRIGGER_DELETE = 'content_view_delete'
+
+# Индексы под фильтры recommend_db.js (имена совпадают с index_advisor.py)
+FACET_INDEXES = {
+    'idx_content_type_genre_year': f"ON {ITEMS_TABLE}(type, genre_id, year)",
+    'idx_content_type_epoch': f"ON {ITEMS_TABLE}(type, epoch_id)",
+    'idx_content_type_mood': f"ON {ITEMS_TABLE}(type, mood_id)",
+    'idx_content_type_criteria': f"ON {ITEMS_TABLE}(type, criteria_id)",
+}
+
+
+# COLLATE NOCASE сворачивает регистр только у ASCII - ключ кэша так же
+NOCASE_KEY = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def code_column(facet: str) -> str:
+    return f"{facet}_id"
+
+# ==================== СОСТОЯНИЕ СХЕМЫ ====================
+
+def is_encoded(cursor: sqlite3.Cursor) -> bool:
+    """Прошла ли БД миграцию на коды"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (ITEMS_TABLE,))
+    return cursor.fetchone() is not None
+
+
+def content_table(cursor: sqlite3.Cursor) -> str:
+    """
+    Физическая таблица записей: content_items после миграции, content до нее.
+    Нужна для ALTER TABLE, CREATE INDEX, AFTER-триггеров и cursor.rowcount
+    (изменения через INSTEAD OF-триггеры представления не считаются).
+    """
+    return ITEMS_TABLE if is_encoded(cursor) else VIEW_NAME
+
+
+def decode_expr(facet: str, row_alias: str) -> str:
+    """Значение фасета по коду строки (для триггеров на content_items)"""
+    return f"(SELECT value FROM {FACET_TABLES[facet]} WHERE id = {row_alias}.{code_column(facet)})"
+
+
+def facet_filter(facet: str) -> str:
+    """Условие фильтра по значению с одним параметром"""
+    return f"{code_column(facet)} = (SELECT id FROM {FACET_TABLES[facet]} WHERE value = ?)"
+
+
+def ensure_dictionaries(cursor: sqlite3.Cursor):
+    for table in FACET_TABLES.values():
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                value TEXT NOT NULL UNIQUE COLLATE NOCASE
+            )
+        """)
+
+# ==================== ПРЕДСТАВЛЕНИЕ content ====================
+
+def _item_columns(cursor: sqlite3.Cursor) -> List[tuple]:
+    """(имя, значение по умолчанию) колонок content_items"""
+    cursor.execute(f"PRAGMA table_info({ITEMS_TABLE})")
+    return [(row[1], row[4]) for row in cursor.fetchall()]
+
+
+def _dictionary_inserts() -> str:
+    """Новые значения из NEW.<фасет> в словари (без ON CONFLICT - его подменил бы внешний оператор)"""
+    statements = []
+    for facet, table in FACET_TABLES.items():
+        statements.append(f"""
+                INSERT INTO {table} (value)
+                SELECT NEW.{facet} WHERE NEW.{facet} IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM {table} WHERE value = NEW.{facet});""")
+    return ''.join(statements)
+
+
+def create_view(cursor: sqlite3.Cursor):
+    """
+    Представление content и триггеры INSTEAD OF.
+    Списки колонок в триггерах фиксируются при создании - после
+    ALTER TABLE content_items вызывать снова (см. add_column).
+    """
+    codes = {code_column(facet): facet for facet in FACET_TABLES}
+    columns = _item_columns(cursor)
+
+    joins = '\n            '.join(
+        f"LEFT JOIN {table} ON {table}.id = {ITEMS_TABLE}.{code_column(facet)}"
+        for facet, table in FACET_TABLES.items()
+    )
+    decoded = ', '.join(f"{table}.value AS {facet}" for facet, table in FACET_TABLES.items())
+
+    cursor.execute(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+    cursor.execute(f"""
+        CREATE VIEW {VIEW_NAME} AS
+            SELECT {ITEMS_TABLE}.*, {decoded}
+            FROM {ITEMS_TABLE}
+            {joins}
+    """)
+
+    # Код из NEW.<фасет>_id, если писатель передал его сам, иначе - по значению
+    def insert_expr(name, default):
+        if name in codes:
+            facet = codes[name]
+            return (f"COALESCE(NEW.{name}, "
+                    f"(SELECT id FROM {FACET_TABLES[facet]} WHERE value = NEW.{facet}))")
+        if default is not None:
+            return f"COALESCE(NEW.{name}, {default})"
+        return f"NEW.{name}"
+
+    def update_expr(name):
+        if name in codes:
+            facet = codes[name]
+            return (f"CASE WHEN NEW.{name} IS NOT OLD.{name} THEN NEW.{name} "
+                    f"ELSE (SELECT id FROM {FACET_TABLES[facet]} WHERE value = NEW.{facet}) END")
+        return f"NEW.{name}"
+
+    names = [name for name, _ in columns]
+    inserts = _dictionary_inserts()
+
+    for trigger in (TRIGGER_INSERT, TRIGGER_UPDATE, TRIGGER_DELETE):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    cursor.execute(f"""
+        CREATE TRIGGER {TRIGGER_INSERT}
+        INSTEAD OF INSERT ON {VIEW_NAME}
+        BEGIN{inserts}
+            INSERT INTO {ITEMS_TABLE} ({', '.join(names)})
+            VALUES ({', '.join(insert_expr(name, default) for name, default in columns)});
+        END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER {TRIGGER_UPDATE}
+        INSTEAD OF UPDATE ON {VIEW_NAME}
+        BEGIN{inserts}
+            UPDATE {ITEMS_TABLE} SET
+                {', '.join(f"{name} = {update_expr(name)}" for name in names)}
+            WHERE id = OLD.id;
+        END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER {TRIGGER_DELETE}
+        INSTEAD OF DELETE ON {VIEW_NAME}
+        BEGIN
+            DELETE FROM {ITEMS_TABLE} WHERE id = OLD.id;
+        END
+    """)
+
+
+def add_column(cursor: sqlite3.Cursor, column: str, declaration: str):
+    """ALTER TABLE на физической таблице; после миграции - пересоздать триггеры представления"""
+    table = content_table(cursor)
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    if table == ITEMS_TABLE:
+        create_view(cursor)
+
+# ==================== КОДИРОВАНИЕ ====================
+
+class FacetDictionary:
+    """Кодирование значений фасетов с кэшем (значения только добавляются - коды стабильны)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.encoded = is_encoded(self.cursor)
+        self.codes: Dict[str, Dict[str, int]] = {facet: {} for facet in FACET_TABLES}
+        self.values: Dict[str, Dict[int, str]] = {facet: {} for facet in FACET_TABLES}
+        if self.encoded:
+            self.load()
+
+    def load(self):
+        for facet, table in FACET_TABLES.items():
+            self.cursor.execute(f"SELECT id, value FROM {table}")
+            for code, value in self.cursor.fetchall():
+                self.codes[facet][value.translate(NOCASE_KEY)] = code
+                self.values[facet][code] = value
+
+    def lookup(self, facet: str, value: Optional[str]) -> Optional[int]:
+        """Код существующего значения (None - такого значения нет)"""
+        if value is None:
+            return None
+        code = self.codes[facet].get(value.translate(NOCASE_KEY))
+        if code is None:
+            self.cursor.execute(f"SELECT id FROM {FACET_TABLES[facet]} WHERE value = ?", (value,))
+            row = self.cursor.fetchone()
+            if row:
+                code = self._remember(facet, value, row[0])
+        return code
+
+    def encode(self, facet: str, value: Optional[str]) -> Optional[int]:
+        """Код значения; новое значение добавляется в словарь"""
+        if value is None:
+            return None
+        code = self.lookup(facet, value)
+        if code is None:
+            self.cursor.execute(f"INSERT INTO {FACET_TABLES[facet]} (value) VALUES (?)", (value,))
+            code = self._remember(facet, value, self.cursor.lastrowid)
+        return code
+
+    def decode(self, facet: str, code: Optional[int]) -> Optional[str]:
+        if code is None:
+            return None
+        if code not in self.values[facet]:
+            self.cursor.execute(f"SELECT value FROM {FACET_TABLES[facet]} WHERE id = ?", (code,))
+            row = self.cursor.fetchone()
+            if not row:
+                return None
+            self._remember(facet, row[0], code)
+        return self.values[facet][code]
+
+    def _remember(self, facet: str, value: str, code: int) -> int:
+        self.codes[facet].setdefault(value.translate(NOCASE_KEY), code)
+        self.values[facet].setdefault(code, value)
+        return code
+
+    def insert(self, cursor: sqlite3.Cursor, row: Dict, or_ignore: bool = False) -> bool:
+        """
+        INSERT записи: до миграции - как есть в content, после - в content_items
+        с кодами вместо значений фасетов. True - запись вставлена.
+        """
+        values = dict(row)
+        table = VIEW_NAME
+        if self.encoded:
+            table = ITEMS_TABLE
+            for facet in FACET_TABLES:
+                if facet in values:
+                    values[code_column(facet)] = self.encode(facet, values.pop(facet))
+
+        columns = list(values)
+        cursor.execute(f"""
+            INSERT {'OR IGNORE ' if or_ignore else ''}INTO {table}
+            ({', '.join(columns)})
+            VALUES ({', '.join(['?'] * len(columns))})
+        """, [values[col] for col in columns])
+        return cursor.rowcount > 0
+
+
+_dictionary: Optional[FacetDictionary] = None
+
+
+def for_connection(conn: sqlite3.Connection) -> FacetDictionary:
+    """Словарь последнего соединения (harvest_* вызывают save_* с одним и тем же)"""
+    global _dictionary
+    if _dictionary is None or _dictionary.conn is not conn:
+        _dictionary = FacetDictionary(conn)
+    return _dictionary
+
+
+def insert_content(cursor: sqlite3.Cursor, row: Dict, or_ignore: bool = False) -> bool:
+    """Вставить запись через словари (см. FacetDictionary.insert)"""
+    return for_connection(cursor.connection).insert(cursor, row, or_ignore)
+
+# ==================== ОБСЛУЖИВАНИЕ ====================
+
+def get_dictionary_stats(cursor: sqlite3.Cursor) -> List[Dict]:
+    """Размер словарей и число значений, на которые не ссылается ни одна запись"""
+    stats = []
+    for facet, table in FACET_TABLES.items():
+        cursor.execute(f"""
+            SELECT COUNT(*),
+                   SUM(NOT EXISTS (
+                       SELECT 1 FROM {ITEMS_TABLE} WHERE {code_column(facet)} = {table}.id
+                   ))
+            FROM {table}
+        """)
+        values, unused = cursor.fetchone()
+        stats.append({'facet': facet, 'table': table, 'values': values, 'unused': unused or 0})
+    return stats
+
+
+def prune(conn: sqlite3.Connection) -> int:
+    """
+    Удалить значения без записей (после harvest_*, который удаляет тип целиком).
+    Не запускать параллельно с harvest_*: их FacetDictionary кэширует коды.
+    """
+    cursor = conn.cursor()
+    removed = 0
+    for facet, table in FACET_TABLES.items():
+        cursor.execute(f"""
+            DELETE FROM {table} WHERE NOT EXISTS (
+                SELECT 1 FROM {ITEMS_TABLE} WHERE {code_column(facet)} = {table}.id
+            )
+        """)
+        removed += cursor.rowcount
+    conn.commit()
+    return removed
+
+
+def print_status(cursor: sqlite3.Cursor):
+    print("\n" + "=" * 70)
+    print("🗂️ FACET DICTIONARY".center(70))
+    print("=" * 70)
+    if not is_encoded(cursor):
+        print("\n⚪ Миграция не выполнена. Запустите: scripts/migrations/encode_facets.py")
+        print("=" * 70 + "\n")
+        return
+
+    print(f"\n{'Фасет':<10} {'Таблица':<16} {'Значений':>10} {'Без записей':>12}")
+    print("─" * 70)
+    for item in get_dictionary_stats(cursor):
+        print(f"{item['facet']:<10} {item['table']:<16} {item['values']:>10,} {item['unused']:>12,}")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🗂️ Facet Dictionary - словари genre / epoch / mood / criteria',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python facet_dictionary.py                    # Размеры словарей
+  python facet_dictionary.py --prune            # Удалить неиспользуемые значения
+  python facet_dictionary.py --refresh-view     # Пересоздать представление content
+
+Миграция: python scripts/migrations/encode_facets.py
+        """
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--prune', action='store_true',
+                       help='Удалить значения, на которые не ссылаются записи')
+    group.add_argument('--refresh-view', action='store_true',
+                       help='Пересоздать представление content и его триггеры')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+        if (args.prune or args.refresh_view) and not is_encoded(cursor):
+            print("❌ Миграция не выполнена. Запустите: scripts/migrations/encode_facets.py")
+            sys.exit(1)
+
+        if args.prune:
+            print(f"✅ Удалено значений: {prune(conn):,}")
+        elif args.refresh_view:
+            create_view(cursor)
+            conn.commit()
+            print(f"✅ Представление {VIEW_NAME} пересоздано")
+
+        print_status(cursor)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+🔎 FTS INDEX - Полнотекстовый индекс каталога (SQLite FTS5)
+
+Назначение:
+- Виртуальная таблица content_fts над title, creator, description
+  и переводами description_ru / description_en / description_kk
+- External content: текст хранится только в content, индекс держит
+  лишь токены; триггеры обновляют его при INSERT / UPDATE / DELETE
+- Команды rebuild / optimize / integrity-check
+- Поиск с ранжированием BM25 (название весит больше описания)
+
+Токенизатор unicode61 приводит к нижнему регистру кириллицу, включая
+казахские буквы (ә, ғ, қ, ң, ө, ұ, ү, һ, і), и не склеивает й/и, ё/е.
+remove_diacritics 2 снимает диакритику только с латиницы (café = cafe).
+Стемминга для русского нет: префиксный поиск (--prefix) покрывает
+окончания ("маргарит*").
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+
+import facet_dictionary
+import sql_trace
+from content_stats import ensure_translation_columns
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+FTS_TABLE = 'content_fts'
+
+FTS_COLUMNS = [
+    'title', 'creator', 'description',
+    'description_ru', 'description_en', 'description_kk'
+]
+
+# Веса BM25 в порядке FTS_COLUMNS
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 1.0, 1.0, 1.0)
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+PREFIX_LENGTHS = "2 3"
+
+TRIGGER_INSERT = 'content_fts_after_insert'
+TRIGGER_UPDATE = 'content_fts_after_update'
+TRIGGER_DELETE = 'content_fts_after_delete'
+
+# Символы токена для unicode61: буквы и цифры, "_" - разделитель
+TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+# ==================== УСТАНОВКА ====================
+
+def fts5_available(conn: sqlite3.Connection) -> bool:
+    """Собран ли SQLite с FTS5"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def is_installed(cursor: sqlite3.Cursor) -> bool:
+    """Таблица индекса и все триггеры на месте"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE (type = 'table' AND name = ?)
+           OR (type = 'trigger' AND name IN (?, ?, ?))
+    """, (FTS_TABLE, TRIGGER_INSERT, TRIGGER_UPDATE, TRIGGER_DELETE))
+    return cursor.fetchone()[0] == 4
+
+
+def _values(prefix: str) -> str:
+    return ', '.join(f"{prefix}.{col}" for col in FTS_COLUMNS)
+
+
+def install(conn: sqlite3.Connection) -> bool:
+    """Создать таблицу индекса, триггеры и проиндексировать каталог"""
+    if not fts5_available(conn):
+        print("❌ SQLite собран без FTS5")
+        return False
+
+    cursor = conn.cursor()
+    columns = ', '.join(FTS_COLUMNS)
+    # Триггеры - на физической таблице (после encode_facets.py content - это view)
+    table = facet_dictionary.content_table(cursor)
+    try:
+        ensure_translation_columns(cursor)
+
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                {columns},
+                content='content',
+                content_rowid='id',
+                tokenize='{TOKENIZER}',
+                prefix='{PREFIX_LENGTHS}'
+            )
+        """)
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TRIGGER_INSERT}
+            AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {FTS_TABLE}(rowid, {columns})
+                VALUES (NEW.id, {_values('NEW')});
+            END
+        """)
+
+        # External content: удаление требует старых значений колонок
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TRIGGER_UPDATE}
+            AFTER UPDATE OF {columns} ON {table}
+            BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns})
+                VALUES ('delete', OLD.id, {_values('OLD')});
+                INSERT INTO {FTS_TABLE}(rowid, {columns})
+                VALUES (NEW.id, {_values('NEW')});
+            END
+        """)
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TRIGGER_DELETE}
+            AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns})
+                VALUES ('delete', OLD.id, {_values('OLD')});
+            END
+        """)
+
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Ошибка установки {FTS_TABLE}: {e}")
+        return False
+
+
+def uninstall(conn: sqlite3.Connection):
+    """Удалить триггеры и таблицу индекса"""
+    cursor = conn.cursor()
+    for trigger in (TRIGGER_INSERT, TRIGGER_UPDATE, TRIGGER_DELETE):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    conn.commit()
+
+# ==================== ОБСЛУЖИВАНИЕ ====================
+
+def rebuild(conn: sqlite3.Connection):
+    """Переиндексировать каталог целиком (после массовых правок в обход триггеров)"""
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    conn.commit()
+
+
+def optimize(conn: sqlite3.Connection):
+    """Слить сегменты индекса в один (после harvest_* и переводов)"""
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    conn.commit()
+
+
+def integrity_check(conn: sqlite3.Connection) -> bool:
+    """Сверить индекс с таблицей content (rank = 1)"""
+    try:
+        conn.execute(f"""
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('integrity-check', 1)
+        """)
+        return True
+    except sqlite3.DatabaseError as e:
+        print(f"⚠️  {e}")
+        return False
+
+
+def get_status(cursor: sqlite3.Cursor) -> Dict:
+    """Записей в каталоге и в индексе, число страниц сегментов"""
+    cursor.execute("SELECT COUNT(*) FROM content")
+    total = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}_docsize")
+    indexed = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}_data")
+    pages = cursor.fetchone()[0]
+    return {'total': total, 'indexed': indexed, 'pages': pages}
+
+# ==================== ПОИСК ====================
+
+def tokenize(text: str) -> List[str]:
+    """Токены так, как их видит unicode61"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def build_match_query(text: str, prefix: bool = False,
+                      column: Optional[str] = None) -> Optional[str]:
+    """
+    Пользовательский текст -> выражение MATCH.
+    Каждый токен в кавычках (операторы AND/OR/NEAR и "-" не срабатывают),
+    токены через пробел = AND. prefix добавляет * к последнему токену.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+
+    terms = [f'"{token}"' for token in tokens]
+    if prefix:
+        terms[-1] += ' *'
+    query = ' '.join(terms)
+
+    if column:
+        query = f"{column} : ({query})"
+    return query
+
+
+def search(cursor: sqlite3.Cursor, text: str, content_type: Optional[str] = None,
+           limit: int = 20, prefix: bool = False) -> List[Dict]:
+    """Поиск по каталогу, лучшие совпадения первыми (меньший bm25 - лучше)"""
+    query = build_match_query(text, prefix)
+    if not query:
+        return []
+
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    sql = f"""
+        SELECT c.id, c.type, c.title, c.creator, c.year,
+               bm25({FTS_TABLE}, {weights}) AS score,
+               snippet({FTS_TABLE}, -1, '[', ']', '…', 12) AS snippet
+        FROM {FTS_TABLE}
+        JOIN content c ON c.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH ?
+    """
+    params: list = [query]
+    if content_type:
+        sql += " AND c.type = ?"
+        params.append(content_type)
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit)
+
+    cursor.execute(sql, params)
+    return [
+        {
+            'id': row[0], 'type': row[1], 'title': row[2], 'creator': row[3],
+            'year': row[4], 'score': row[5], 'snippet': row[6]
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+def has_match(cursor: sqlite3.Cursor, content_type: str, title: str, creator: str) -> bool:
+    """
+    Есть ли запись, где название содержит фразу title, а автор - фразу creator.
+    Замена LIKE '%...%' в проверках дубликатов.
+    """
+    title_tokens = tokenize(title)
+    creator_tokens = tokenize(creator)
+    if not title_tokens or not creator_tokens:
+        return False
+
+    query = (
+        f'title : "{" ".join(title_tokens)}" AND '
+        f'creator : "{" ".join(creator_tokens)}"'
+    )
+    cursor.execute(f"""
+        SELECT 1 FROM {FTS_TABLE}
+        JOIN content c ON c.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH ? AND c.type = ?
+        LIMIT 1
+    """, (query, content_type))
+    return cursor.fetchone() is not None
+
+# ==================== ОТЧЕТ ====================
+
+def print_status(cursor: sqlite3.Cursor):
+    installed = is_installed(cursor)
+    print("\n" + "=" * 70)
+    print("🔎 FTS INDEX".center(70))
+    print("=" * 70)
+    print(f"\n🔧 Установлено: {'да' if installed else 'нет'}")
+    if installed:
+        status = get_status(cursor)
+        print(f"📚 Записей в каталоге: {status['total']:,}")
+        print(f"🔎 В индексе: {status['indexed']:,}")
+        print(f"🧱 Страниц сегментов: {status['pages']:,}")
+        if status['indexed'] != status['total']:
+            print("⚠️  Индекс расходится с каталогом. Запустите: --rebuild")
+    print("=" * 70 + "\n")
+
+
+def print_results(results: List[Dict], elapsed_ms: float):
+    print(f"\n🔎 Найдено: {len(results)} ({elapsed_ms:.1f} мс)\n")
+    for item in results:
+        year = f" ({item['year']})" if item['year'] else ""
+        print(f"  [{item['id']}] {item['type']}: {item['title']}{year}")
+        print(f"      👤 {item['creator'] or '—'}   📈 bm25 {item['score']:.2f}")
+        if item['snippet']:
+            print(f"      💬 {item['snippet']}")
+    print()
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🔎 FTS Index - полнотекстовый поиск по каталогу',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python fts_index.py --install                 # Таблица, триггеры, индексация
+  python fts_index.py --optimize                # Слить сегменты
+  python fts_index.py --rebuild                 # Переиндексировать каталог
+  python fts_index.py --search "абай жолы"      # Поиск с BM25
+  python fts_index.py --search "маргар" --prefix --type book
+  python fts_index.py                           # Состояние индекса
+        """
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--install', action='store_true',
+                       help='Создать индекс и триггеры')
+    group.add_argument('--rebuild', action='store_true',
+                       help='Переиндексировать каталог')
+    group.add_argument('--optimize', action='store_true',
+                       help='Слить сегменты индекса')
+    group.add_argument('--check', action='store_true',
+                       help='Сверить индекс с таблицей content')
+    group.add_argument('--uninstall', action='store_true',
+                       help='Удалить индекс и триггеры')
+    group.add_argument('--search', metavar='TEXT',
+                       help='Найти записи по тексту')
+
+    parser.add_argument('--type', choices=['book', 'movie', 'music'],
+                        help='Тип контента для --search')
+    parser.add_argument('--limit', type=int, default=20,
+                        help='Результатов для --search (по умолчанию: 20)')
+    parser.add_argument('--prefix', action='store_true',
+                        help='Последнее слово как префикс')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+
+        if args.install:
+            started = time.time()
+            if not install(conn):
+                sys.exit(1)
+            print(f"✅ {FTS_TABLE} установлен за {time.time() - started:.1f}с")
+            print_status(cursor)
+            return
+
+        if args.uninstall:
+            uninstall(conn)
+            print(f"✅ {FTS_TABLE} и триггеры удалены")
+            return
+
+        if not is_installed(cursor):
+            print(f"❌ {FTS_TABLE} не установлен. Запустите: --install")
+            sys.exit(1)
+
+        if args.rebuild:
+            started = time.time()
+            rebuild(conn)
+            print(f"✅ Индекс перестроен за {time.time() - started:.1f}с")
+        elif args.optimize:
+            started = time.time()
+            optimize(conn)
+            print(f"✅ Сегменты слиты за {time.time() - started:.1f}с")
+        elif args.check:
+            if integrity_check(conn):
+                print("✅ Индекс совпадает с каталогом")
+            else:
+                print("❌ Индекс расходится с каталогом. Запустите: --rebuild")
+                sys.exit(1)
+        elif args.search is not None:
+            started = time.time()
+            results = search(cursor, args.search, args.type, args.limit, args.prefix)
+            print_results(results, (time.time() - started) * 1000)
+            return
+
+        print_status(cursor)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+🔬 HARVEST PROFILER - Куда уходит время харвестеров (--profile)
+
+Назначение:
+- Время по этапам: сеть, разбор JSON, классификация (get_criteria,
+  get_mood_from_features...), проверка дублей, запись, commit, паузы,
+  снимок и публикация копии. Вложенные этапы не считаются дважды:
+  у каждого этапа собственное время, остаток - "other"
+- Время по внешним эндпоинтам (id в пути свернуты: /3/movie/{id})
+- По желанию: cProfile (.prof для snakeviz/pstats) и сэмплирующий
+  профайлер (свернутые стеки для flamegraph.pl / speedscope)
+- Отчет на экран и в reports/profile_<инструмент>_<время>.json
+
+Код харвестеров не меняется: функции модуля, requests, sleep,
+facet_dictionary.insert_content и StagingBuild подменяются обертками
+на время прогона и возвращаются после.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+# ==================== КОНСТАНТЫ ====================
+
+REPORT_DIR = 'reports'
+SAMPLE_INTERVAL_MS = 5
+CPROFILE_TOP = 15
+
+# Сегменты пути, похожие на id: число или длинный токен с цифрами
+# (первый сегмент не трогаем - это версия API: /3/movie, /v1/tracks)
+ID_SEGMENT = re.compile(r'^(\d+|(?=[A-Za-z0-9_-]*\d)[A-Za-z0-9_-]{16,})$')
+
+# ==================== ОБЕРТКИ ====================
+
+class _TimedResponse:
+    """Ответ requests: .json() считается этапом json"""
+
+    def __init__(self, response, profiler):
+        self._response = response
+        self._profiler = profiler
+
+    def json(self, **kwargs):
+        with self._profiler.stage('json'):
+            return self._response.json(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class _TimedRequests:
+    """Замена модуля requests в харвестере: get/post с замером по эндпоинтам"""
+
+    def __init__(self, requests_module, profiler):
+        self._requests = requests_module
+        self._profiler = profiler
+
+    def _call(self, method, url, *args, **kwargs):
+        return self._profiler.request(getattr(self._requests, method.lower()), method, url,
+                                      *args, **kwargs)
+
+    def get(self, url, *args, **kwargs):
+        return self._call('GET', url, *args, **kwargs)
+
+    def post(self, url, *args, **kwargs):
+        return self._call('POST', url, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._requests, name)
+
+
+class _TimedConnection:
+    """Соединение с копией: commit - этап commit"""
+
+    def __init__(self, conn, profiler):
+        self._conn = conn
+        self._profiler = profiler
+
+    def commit(self):
+        with self._profiler.stage('commit'):
+            return self._conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def endpoint_key(method: str, url: str) -> str:
+    """GET api.themoviedb.org/3/movie/{id}"""
+    parts = urlsplit(url)
+    segments = parts.path.split('/')
+    path = '/'.join('{id}' if i > 1 and ID_SEGMENT.match(segment) else segment
+                    for i, segment in enumerate(segments))
+    return f"{method} {parts.netloc}{path}"
+
+# ==================== ПРОФАЙЛЕР ====================
+
+class HarvestProfiler:
+    """Этапы, эндпоинты, cProfile и сэмплы одного прогона харвестера"""
+
+    def __init__(self, tool: str, cprofile_path: Optional[str] = None,
+                 sample_path: Optional[str] = None, sample_interval_ms: float = SAMPLE_INTERVAL_MS,
+                 report_path: Optional[str] = None):
+        self.tool = tool
+        self.cprofile_path = cprofile_path
+        self.sample_path = sample_path
+        self.sample_interval = sample_interval_ms / 1000
+        self.report_path = report_path
+
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.endpoints: Dict[str, Dict[str, float]] = {}
+        self.stack: List[list] = []
+        self.patches: List[tuple] = []
+
+        self.profile = None
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.sampler = None
+        self.sampling = threading.Event()
+
+        self.started = None
+        self.wall = 0.0
+
+    # ---------- этапы ----------
+
+    def stage(self, name: str):
+        return _Stage(self, name)
+
+    def _enter(self, name: str):
+        self.stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self):
+        name, started, children = self.stack.pop()
+        elapsed = time.perf_counter() - started
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = {'seconds': 0.0, 'inclusive': 0.0, 'calls': 0, 'max': 0.0}
+        stats['seconds'] += elapsed - children
+        stats['inclusive'] += elapsed
+        stats['calls'] += 1
+        if elapsed > stats['max']:
+            stats['max'] = elapsed
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        return elapsed
+
+    def request(self, func, method: str, url: str, *args, **kwargs):
+        """HTTP-запрос: этап network + статистика эндпоинта"""
+        key = endpoint_key(method, url)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = {'calls': 0, 'seconds': 0.0, 'max': 0.0,
+                                           'errors': 0, 'bytes': 0}
+        response = None
+        self._enter('network')
+        try:
+            response = func(url, *args, **kwargs)
+            return _TimedResponse(response, self)
+        finally:
+            elapsed = self._exit()
+            stats['calls'] += 1
+            stats['seconds'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            if response is None or response.status_code >= 400:
+                stats['errors'] += 1
+            else:
+                stats['bytes'] += len(response.content or b'')
+
+    # ---------- подмена функций ----------
+
+    def _patch(self, owner, name: str, replacement):
+        self.patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def wrap(self, owner, name: str, stage: str):
+        """owner.name(...) - этап stage"""
+        original = getattr(owner, name)
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            with profiler.stage(stage):
+                return original(*args, **kwargs)
+
+        wrapper.__name__ = getattr(original, '__name__', name)
+        wrapper.__wrapped__ = original
+        self._patch(owner, name, wrapper)
+
+    def instrument(self, module, stages: Optional[Dict[str, str]] = None):
+        """
+        Обернуть харвестер: stages - {имя функции модуля: этап}, плюс общее:
+        requests, sleep, facet_dictionary.insert_content, StagingBuild.
+        """
+        for name, stage in (stages or {}).items():
+            self.wrap(module, name, stage)
+
+        if hasattr(module, 'requests'):
+            self._patch(module, 'requests', _TimedRequests(module.requests, self))
+        if hasattr(module, 'sleep'):
+            self.wrap(module, 'sleep', 'sleep')
+
+        facet_dictionary = getattr(module, 'facet_dictionary', None)
+        if facet_dictionary is not None:
+            self.wrap(facet_dictionary, 'insert_content', 'db_write')
+
+        staging_db = getattr(module, 'staging_db', None)
+        if staging_db is not None:
+            build_class = staging_db.StagingBuild
+            original_open = build_class.open
+            profiler = self
+
+            def timed_open(build, *args, **kwargs):
+                with profiler.stage('staging_open'):
+                    return _TimedConnection(original_open(build, *args, **kwargs), profiler)
+
+            self._patch(build_class, 'open', timed_open)
+            self.wrap(build_class, 'finish', 'publish')
+
+    def restore(self):
+        while self.patches:
+            owner, name, original = self.patches.pop()
+            setattr(owner, name, original)
+
+    # ---------- сэмплы ----------
+
+    def _sample_loop(self, thread_id: int):
+        while not self.sampling.wait(self.sample_interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+                self.sample_count += 1
+
+    def write_samples(self):
+        """Свернутые стеки: 'a;b;c N' - вход flamegraph.pl и speedscope"""
+        with open(self.sample_path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    # ---------- прогон ----------
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.sample_path:
+            self.sampling.clear()
+            self.sampler = threading.Thread(
+                target=self._sample_loop, args=(threading.get_ident(),), daemon=True
+            )
+            self.sampler.start()
+        if self.cprofile_path:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        if self.profile:
+            self.profile.disable()
+        if self.sampler:
+            self.sampling.set()
+            self.sampler.join()
+            self.sampler = None
+        self.wall = time.perf_counter() - self.started
+        self.restore()
+
+    def run(self, func, *args, **kwargs):
+        """Прогнать func под профайлером, в конце - отчет"""
+        self.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.stop()
+            self.print_report()
+            self.save_report()
+
+    # ---------- отчет ----------
+
+    def report(self) -> Dict:
+        attributed = sum(stats['seconds'] for stats in self.stages.values())
+        stages = {
+            name: {
+                'seconds': round(stats['seconds'], 4),
+                'inclusive': round(stats['inclusive'], 4),
+                'calls': stats['calls'],
+                'avg_ms': round(stats['inclusive'] / stats['calls'] * 1000, 3),
+                'max_ms': round(stats['max'] * 1000, 3),
+                'share': round(stats['seconds'] / self.wall, 4) if self.wall else 0,
+            }
+            for name, stats in sorted(self.stages.items(), key=lambda kv: -kv[1]['seconds'])
+        }
+        endpoints = {
+            key: {
+                'calls': stats['calls'],
+                'seconds': round(stats['seconds'], 4),
+                'avg_ms': round(stats['seconds'] / stats['calls'] * 1000, 3) if stats['calls'] else 0,
+                'max_ms': round(stats['max'] * 1000, 3),
+                'errors': stats['errors'],
+                'bytes': stats['bytes'],
+            }
+            for key, stats in sorted(self.endpoints.items(), key=lambda kv: -kv[1]['seconds'])
+        }
+        result = {
+            'tool': self.tool,
+            'created_at': datetime.now().isoformat(),
+            'wall_seconds': round(self.wall, 4),
+            'other_seconds': round(max(self.wall - attributed, 0), 4),
+            'stages': stages,
+            'endpoints': endpoints,
+        }
+        if self.profile:
+            result['cprofile'] = self.cprofile_path
+            result['cprofile_top'] = self.cprofile_top()
+        if self.sample_path:
+            result['samples'] = {'path': self.sample_path, 'count': self.sample_count,
+                                 'interval_ms': self.sample_interval * 1000}
+        return result
+
+    def cprofile_top(self, limit: int = CPROFILE_TOP) -> str:
+        buffer = io.StringIO()
+        pstats.Stats(self.profile, stream=buffer).sort_stats('cumulative').print_stats(limit)
+        return buffer.getvalue()
+
+    def print_report(self):
+        result = self.report()
+        wall = result['wall_seconds']
+        print("\n" + "=" * 70)
+        print(f"🔬 ПРОФИЛЬ: {self.tool} - {wall:.2f}с")
+        print("=" * 70)
+        print(f"{'Этап':<16} {'собств., с':>11} {'доля':>7} {'вызовов':>9} {'сред., мс':>10} {'макс, мс':>10}")
+        for name, stats in result['stages'].items():
+            print(f"{name:<16} {stats['seconds']:>11.3f} {stats['share'] * 100:>6.1f}% "
+                  f"{stats['calls']:>9} {stats['avg_ms']:>10.2f} {stats['max_ms']:>10.1f}")
+        other_share = result['other_seconds'] / wall * 100 if wall else 0
+        print(f"{'other':<16} {result['other_seconds']:>11.3f} {other_share:>6.1f}%")
+
+        if result['endpoints']:
+            print(f"\n🌐 Эндпоинты:")
+            for key, stats in result['endpoints'].items():
+                errors = f", ошибок {stats['errors']}" if stats['errors'] else ""
+                print(f"  {key}")
+                print(f"      {stats['calls']} вызовов, {stats['seconds']:.2f}с, "
+                      f"сред. {stats['avg_ms']:.0f} мс, макс {stats['max_ms']:.0f} мс, "
+                      f"{stats['bytes'] / 1024:.0f} KB{errors}")
+
+        if self.profile:
+            self.profile.dump_stats(self.cprofile_path)
+            print(f"\n🐍 cProfile: {self.cprofile_path} (python -m pstats / snakeviz)")
+        if self.sample_path:
+            self.write_samples()
+            print(f"🔥 Сэмплы: {self.sample_path} ({self.sample_count} шт., flamegraph.pl / speedscope)")
+        print("=" * 70)
+
+    def save_report(self) -> str:
+        path = self.report_path
+        if not path:
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            path = os.path.join(REPORT_DIR, f"profile_{self.tool}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        print(f"📄 Отчет профиля: {path}")
+        return path
+
+
+class _Stage:
+    """Контекст этапа (класс, а не генератор - меньше накладных на горячем пути)"""
+
+    __slots__ = ('profiler', 'name')
+
+    def __init__(self, profiler: HarvestProfiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+
+    def __exit__(self, *exc):
+        self.profiler._exit()
+        return False
+
+# ==================== CLI ====================
+
+def add_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group('профилирование')
+    group.add_argument('--profile', action='store_true',
+                       help='Время по этапам и эндпоинтам, отчет в reports/')
+    group.add_argument('--profile-cprofile', metavar='FILE',
+                       help='Заодно cProfile в FILE (.prof)')
+    group.add_argument('--profile-sample', metavar='FILE',
+                       help='Заодно сэмплы стеков в FILE (для flamegraph)')
+    group.add_argument('--profile-interval', type=float, default=SAMPLE_INTERVAL_MS,
+                       help=f'Интервал сэмплов, мс (по умолчанию: {SAMPLE_INTERVAL_MS})')
+    group.add_argument('--profile-report', metavar='FILE',
+                       help='JSON-отчет (по умолчанию: reports/profile_<инструмент>_<время>.json)')
+
+
+def from_args(tool: str, args: argparse.Namespace) -> Optional[HarvestProfiler]:
+    """Профайлер, если задан --profile или один из --profile-* файлов"""
+    if not (args.profile or args.profile_cprofile or args.profile_sample or args.profile_report):
+        return None
+    return HarvestProfiler(tool, cprofile_path=args.profile_cprofile,
+                           sample_path=args.profile_sample,
+                           sample_interval_ms=args.profile_interval,
+                           report_path=args.profile_report)
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+🖼️ IMAGE CACHE - Проверка image_url и локальные миниатюры
+
+Назначение:
+- Параллельная проверка ссылок на обложки (HEAD, ограниченный пул потоков)
+- Загрузка и уменьшение изображений в кэш, адресуемый по содержимому:
+  thumbs/<размер>/<sha256[:2]>/<sha256>.webp - одинаковые картинки
+  хранятся один раз, файл по имени никогда не меняется
+- Статус и путь миниатюры - в таблице image_cache (ключ - URL, поэтому
+  пересбор каталога harvest_* не сбрасывает кэш)
+- Инкрементальная перепроверка: рабочие ссылки раз в REVALIDATE_DAYS
+  с условным запросом (ETag / Last-Modified), битые - с нарастающей паузой
+- --status только читает; пока идет сборка каталога (content.db.staging,
+  см. staging_db.py), проверка и --gc пропускаются
+
+recommend_db.js отдает миниатюры из кэша (/recommend/thumbs/...)
+и не показывает битые ссылки.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import requests
+
+import sql_trace
+import staging_db
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+CACHE_DIR = 'thumbs'
+CACHE_TABLE = 'image_cache'
+
+WORKERS = 16
+BATCH_LIMIT = 2000
+TIMEOUT = 10
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+COMMIT_EVERY = 200
+
+# Ширина миниатюры; высота - не больше полутора ширин (постеры 2:3)
+THUMB_SIZES = {'sm': 92, 'md': 185, 'lg': 342}
+THUMB_FORMAT = 'WEBP'
+THUMB_EXT = 'webp'
+THUMB_QUALITY = 80
+
+REVALIDATE_DAYS = 14        # Рабочая ссылка
+BROKEN_RECHECK_DAYS = 7     # Битая ссылка: 7, 14, 28... дней
+ERROR_RECHECK_HOURS = 6     # Таймаут / 5xx: 6, 12, 24... часов
+MAX_BACKOFF_STEPS = 5
+
+STATUS_OK = 'ok'
+STATUS_BROKEN = 'broken'
+STATUS_ERROR = 'error'
+
+USER_AGENT = 'CoffeeBooksAI-ImageCache/1.0'
+
+# ==================== ТАБЛИЦА ====================
+
+def table_exists(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CACHE_TABLE,))
+    return cursor.fetchone() is not None
+
+
+def ensure_table(cursor: sqlite3.Cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+            url TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            http_status INTEGER,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            thumb_path TEXT,
+            fail_count INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            checked_at TEXT,
+            next_check_at TEXT
+        )
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE}_next_check
+        ON {CACHE_TABLE}(next_check_at)
+    """)
+
+
+def _utc(delta: timedelta = timedelta()) -> str:
+    """Время в формате datetime('now') SQLite (UTC)"""
+    return (datetime.now(timezone.utc) + delta).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def get_candidates(cursor: sqlite3.Cursor, limit: int, full: bool = False) -> List[Dict]:
+    """URL без проверки (первыми) и URL с наступившим сроком перепроверки"""
+    due = "" if full else "AND (i.url IS NULL OR i.next_check_at <= ?)"
+    params = [] if full else [_utc()]
+    cursor.execute(f"""
+        SELECT DISTINCT c.image_url, i.etag, i.last_modified, i.content_hash,
+               i.thumb_path, i.fail_count
+        FROM content c
+        LEFT JOIN {CACHE_TABLE} i ON i.url = c.image_url
+        WHERE c.image_url IS NOT NULL AND c.image_url != ''
+        {due}
+        ORDER BY i.url IS NOT NULL, i.next_check_at
+        LIMIT ?
+    """, params + [limit])
+    return [
+        {
+            'url': row[0], 'etag': row[1], 'last_modified': row[2],
+            'content_hash': row[3], 'thumb_path': row[4], 'fail_count': row[5] or 0
+        }
+        for row in cursor.fetchall()
+    ]
+
+# ==================== МИНИАТЮРЫ ====================
+
+def thumb_relpath(content_hash: str) -> str:
+    """Путь внутри каталога размера: ab/abcdef....webp"""
+    return f"{content_hash[:2]}/{content_hash}.{THUMB_EXT}"
+
+
+def thumbs_exist(cache_dir: str, thumb_path: Optional[str]) -> bool:
+    return bool(thumb_path) and all(
+        os.path.exists(os.path.join(cache_dir, size, thumb_path)) for size in THUMB_SIZES
+    )
+
+
+def write_thumbs(data: bytes, content_hash: str, cache_dir: str) -> str:
+    """Все размеры миниатюры; уже существующие файлы не пересоздаются"""
+    relpath = thumb_relpath(content_hash)
+    image = None
+    for size, width in THUMB_SIZES.items():
+        target = os.path.join(cache_dir, size, relpath)
+        if os.path.exists(target):
+            continue
+        if image is None:
+            image = Image.open(io.BytesIO(data))
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+        thumb = image.copy()
+        thumb.thumbnail((width, int(width * 1.5)), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Запись во временный файл и rename - API не увидит половину файла
+        tmp = f"{target}.{threading.get_ident()}.tmp"
+        thumb.save(tmp, THUMB_FORMAT, quality=THUMB_QUALITY)
+        os.replace(tmp, target)
+    return relpath
+
+# ==================== ПРОВЕРКА ====================
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    """Своя сессия на поток - keep-alive без общих соединений между потоками"""
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+        _local.session.headers['User-Agent'] = USER_AGENT
+    return _local.session
+
+
+def _backoff(base: timedelta, fail_count: int) -> timedelta:
+    return base * (2 ** min(fail_count, MAX_BACKOFF_STEPS))
+
+
+def _failure(url: str, status: str, fail_count: int, http_status: Optional[int] = None,
+             error: Optional[str] = None) -> Dict:
+    base = timedelta(days=BROKEN_RECHECK_DAYS) if status == STATUS_BROKEN else timedelta(hours=ERROR_RECHECK_HOURS)
+    return {
+        'url': url, 'status': status, 'http_status': http_status, 'error': error,
+        'fail_count': fail_count + 1, 'next_check_at': _utc(_backoff(base, fail_count))
+    }
+
+
+def check_image(candidate: Dict, cache_dir: str, make_thumbs: bool) -> Dict:
+    """
+    HEAD (условный, если картинка уже в кэше), при изменении - GET,
+    хэш содержимого и миниатюры. Выполняется в потоке пула.
+    """
+    url = candidate['url']
+    session = _session()
+    cached = thumbs_exist(cache_dir, candidate['thumb_path']) if make_thumbs else bool(candidate['content_hash'])
+
+    headers = {}
+    if cached and candidate['etag']:
+        headers['If-None-Match'] = candidate['etag']
+    if cached and candidate['last_modified']:
+        headers['If-Modified-Since'] = candidate['last_modified']
+
+    try:
+        response = session.head(url, headers=headers, timeout=TIMEOUT, allow_redirects=True)
+        # Часть CDN не поддерживает HEAD - проверяем загрузкой
+        if response.status_code in (403, 405, 501):
+            response = None
+
+        if response is not None:
+            if response.status_code == 304:
+                return {
+                    'url': url, 'status': STATUS_OK, 'http_status': 304, 'unchanged': True,
+                    'fail_count': 0, 'next_check_at': _utc(timedelta(days=REVALIDATE_DAYS))
+                }
+            if response.status_code in (404, 410):
+                return _failure(url, STATUS_BROKEN, candidate['fail_count'], response.status_code)
+            if response.status_code >= 400:
+                return _failure(url, STATUS_ERROR, candidate['fail_count'], response.status_code)
+
+            etag = response.headers.get('ETag')
+            if cached and etag and etag == candidate['etag']:
+                return {
+                    'url': url, 'status': STATUS_OK, 'http_status': response.status_code,
+                    'unchanged': True, 'fail_count': 0,
+                    'next_check_at': _utc(timedelta(days=REVALIDATE_DAYS))
+                }
+
+        with session.get(url, timeout=TIMEOUT, stream=True) as response:
+            if response.status_code in (404, 410):
+                return _failure(url, STATUS_BROKEN, candidate['fail_count'], response.status_code)
+            if response.status_code >= 400:
+                return _failure(url, STATUS_ERROR, candidate['fail_count'], response.status_code)
+
+            content_type = response.headers.get('Content-Type', '')
+            if not content_type.startswith('image/'):
+                return _failure(url, STATUS_BROKEN, candidate['fail_count'], response.status_code,
+                                f"Content-Type: {content_type or '—'}")
+
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    return _failure(url, STATUS_BROKEN, candidate['fail_count'], response.status_code,
+                                    f"больше {MAX_IMAGE_BYTES // 1024 // 1024} МБ")
+            data = b''.join(chunks)
+
+            content_hash = hashlib.sha256(data).hexdigest()
+            thumb_path = write_thumbs(data, content_hash, cache_dir) if make_thumbs else None
+
+            return {
+                'url': url, 'status': STATUS_OK, 'http_status': response.status_code,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': content_hash, 'thumb_path': thumb_path,
+                'fail_count': 0, 'next_check_at': _utc(timedelta(days=REVALIDATE_DAYS))
+            }
+    except requests.RequestException as e:
+        return _failure(url, STATUS_ERROR, candidate['fail_count'], error=type(e).__name__)
+    except (OSError, ValueError) as e:
+        # Pillow не смог прочитать картинку
+        return _failure(url, STATUS_BROKEN, candidate['fail_count'], error=str(e)[:200])
+
+
+def save_results(cursor: sqlite3.Cursor, results: List[Dict]):
+    """Записать результаты пачкой; для 304 сохраняются прежние хэш и ETag"""
+    now = _utc()
+    for result in results:
+        if result.get('unchanged'):
+            cursor.execute(f"""
+                UPDATE {CACHE_TABLE}
+                SET status = ?, http_status = ?, fail_count = 0, error = NULL,
+                    checked_at = ?, next_check_at = ?
+                WHERE url = ?
+            """, (result['status'], result['http_status'], now, result['next_check_at'], result['url']))
+        elif result['status'] == STATUS_OK:
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO {CACHE_TABLE}
+                (url, status, http_status, etag, last_modified, content_hash, thumb_path,
+                 fail_count, error, checked_at, next_check_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0, NULL, ?, ?)
+            """, (result['url'], result['status'], result['http_status'], result['etag'],
+                  result['last_modified'], result['content_hash'], result['thumb_path'],
+                  now, result['next_check_at']))
+        else:
+            # Прежняя миниатюра остается до успешной перепроверки
+            cursor.execute(f"""
+                INSERT INTO {CACHE_TABLE}
+                (url, status, http_status, fail_count, error, checked_at, next_check_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    status = excluded.status, http_status = excluded.http_status,
+                    fail_count = excluded.fail_count, error = excluded.error,
+                    checked_at = excluded.checked_at, next_check_at = excluded.next_check_at
+            """, (result['url'], result['status'], result['http_status'], result['fail_count'],
+                  result['error'], now, result['next_check_at']))
+
+
+def run(conn: sqlite3.Connection, cache_dir: str = CACHE_DIR, limit: int = BATCH_LIMIT,
+        workers: int = WORKERS, full: bool = False, show_progress: bool = True) -> Dict[str, int]:
+    """Проверить порцию URL пулом потоков; запись в БД - только из главного потока"""
+    cursor = conn.cursor()
+    ensure_table(cursor)
+    conn.commit()
+
+    candidates = get_candidates(cursor, limit, full)
+    make_thumbs = Image is not None
+    totals = {STATUS_OK: 0, STATUS_BROKEN: 0, STATUS_ERROR: 0, 'unchanged': 0}
+    if not candidates:
+        return totals
+
+    pending = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(check_image, candidate, cache_dir, make_thumbs) for candidate in candidates]
+        for future in as_completed(futures):
+            result = future.result()
+            pending.append(result)
+            totals[result['status']] += 1
+            if result.get('unchanged'):
+                totals['unchanged'] += 1
+
+            done += 1
+            if len(pending) >= COMMIT_EVERY:
+                save_results(cursor, pending)
+                conn.commit()
+                pending = []
+                if show_progress:
+                    print(f"   ⏳ Проверено: {done:,}/{len(candidates):,}")
+
+    save_results(cursor, pending)
+    conn.commit()
+    return totals
+
+# ==================== ОБСЛУЖИВАНИЕ ====================
+
+def collect_garbage(conn: sqlite3.Connection, cache_dir: str = CACHE_DIR) -> Dict[str, int]:
+    """Удалить строки URL, которых больше нет в content, и файлы без ссылок"""
+    cursor = conn.cursor()
+    ensure_table(cursor)
+    cursor.execute(f"""
+        DELETE FROM {CACHE_TABLE}
+        WHERE NOT EXISTS (SELECT 1 FROM content c WHERE c.image_url = {CACHE_TABLE}.url)
+    """)
+    rows = cursor.rowcount
+    conn.commit()
+
+    cursor.execute(f"SELECT DISTINCT thumb_path FROM {CACHE_TABLE} WHERE thumb_path IS NOT NULL")
+    referenced = {row[0] for row in cursor.fetchall()}
+
+    files = 0
+    for size in THUMB_SIZES:
+        size_dir = os.path.join(cache_dir, size)
+        if not os.path.isdir(size_dir):
+            continue
+        for prefix in os.listdir(size_dir):
+            for name in os.listdir(os.path.join(size_dir, prefix)):
+                if f"{prefix}/{name}" not in referenced:
+                    os.remove(os.path.join(size_dir, prefix, name))
+                    files += 1
+    return {'rows': rows, 'files': files}
+
+
+def get_status(cursor: sqlite3.Cursor) -> Dict:
+    """Только чтение: без таблицы кэша все URL считаются непроверенными"""
+    if not table_exists(cursor):
+        cursor.execute("""
+            SELECT COUNT(DISTINCT image_url) FROM content
+            WHERE image_url IS NOT NULL AND image_url != ''
+        """)
+        return {'by_status': {}, 'unchecked': cursor.fetchone()[0], 'due': 0, 'with_thumbs': 0}
+
+    cursor.execute(f"SELECT status, COUNT(*) FROM {CACHE_TABLE} GROUP BY status")
+    by_status = dict(cursor.fetchall())
+    cursor.execute(f"""
+        SELECT COUNT(DISTINCT c.image_url) FROM content c
+        LEFT JOIN {CACHE_TABLE} i ON i.url = c.image_url
+        WHERE c.image_url IS NOT NULL AND c.image_url != '' AND i.url IS NULL
+    """)
+    unchecked = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COUNT(*) FROM {CACHE_TABLE} WHERE next_check_at <= ?", (_utc(),))
+    due = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COUNT(*) FROM {CACHE_TABLE} WHERE thumb_path IS NOT NULL")
+    with_thumbs = cursor.fetchone()[0]
+    return {'by_status': by_status, 'unchecked': unchecked, 'due': due, 'with_thumbs': with_thumbs}
+
+
+def print_status(cursor: sqlite3.Cursor):
+    status = get_status(cursor)
+    print("\n" + "=" * 70)
+    print("🖼️ IMAGE CACHE".center(70))
+    print("=" * 70)
+    print(f"\n✅ Рабочих: {status['by_status'].get(STATUS_OK, 0):,}")
+    print(f"💔 Битых: {status['by_status'].get(STATUS_BROKEN, 0):,}")
+    print(f"⚠️  Временных ошибок: {status['by_status'].get(STATUS_ERROR, 0):,}")
+    print(f"🆕 Не проверено: {status['unchecked']:,}")
+    print(f"⏰ Пора перепроверить: {status['due']:,}")
+    print(f"🗂️ С миниатюрами: {status['with_thumbs']:,}")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🖼️ Image Cache - проверка image_url и миниатюры',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python image_cache.py                         # Проверить новые и просроченные URL
+  python image_cache.py --limit 500 --workers 8
+  python image_cache.py --full                  # Перепроверить все URL
+  python image_cache.py --gc                    # Удалить неиспользуемые строки и файлы
+  python image_cache.py --status                # Только состояние
+        """
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--full', action='store_true',
+                       help='Перепроверить все URL, не дожидаясь срока')
+    group.add_argument('--gc', action='store_true',
+                       help='Удалить строки без записей content и файлы без ссылок')
+    group.add_argument('--status', action='store_true',
+                       help='Показать состояние кэша')
+
+    parser.add_argument('--limit', type=int, default=BATCH_LIMIT,
+                        help=f'URL за запуск (по умолчанию: {BATCH_LIMIT})')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help=f'Параллельных запросов (по умолчанию: {WORKERS})')
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help=f'Каталог миниатюр (по умолчанию: {CACHE_DIR})')
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+
+        if not args.status and staging_db.build_in_progress(args.db):
+            # Проверку догонит следующий запуск по расписанию
+            print(f"⏸️ Идет сборка каталога ({staging_db.staging_path(args.db)}) - проверка пропущена:")
+            print("   запись в рабочую базу отменила бы публикацию копии")
+
+        elif args.gc:
+            removed = collect_garbage(conn, args.cache_dir)
+            print(f"✅ Удалено строк: {removed['rows']:,}, файлов: {removed['files']:,}")
+
+        elif not args.status:
+            if Image is None:
+                print("⚠️ Pillow не установлен - только проверка ссылок, без миниатюр")
+                print("Установите: pip install Pillow")
+            started = time.time()
+            totals = run(conn, args.cache_dir, args.limit, args.workers, args.full)
+            checked = totals[STATUS_OK] + totals[STATUS_BROKEN] + totals[STATUS_ERROR]
+            print(f"✅ Проверено: {checked:,} за {time.time() - started:.1f}с "
+                  f"(рабочих {totals[STATUS_OK]:,}, без изменений {totals['unchanged']:,}, "
+                  f"битых {totals[STATUS_BROKEN]:,}, ошибок {totals[STATUS_ERROR]:,})")
+
+        print_status(cursor)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+🧭 INDEX ADVISOR - Индексы под реальные запросы каталога
+
+Назначение:
+- Каталог известных форм запросов проекта (recommend_db.js, ai_describer,
+  translate_descriptions, check_translations, fix_duplicates, harvest_*)
+- EXPLAIN QUERY PLAN для каждой формы: полный скан или поиск по индексу
+- Предложение и создание покрывающих / частичных индексов на content
+- Замер времени до/после на копии БД или синтетическом каталоге (synthetic_catalog.py)
+
+Индексы повторяют выражения из запросов (LOWER(genre), LOWER(criteria), ...):
+SQLite использует индекс по выражению только при точном совпадении.
+После encode_facets.py формы и индексы переводятся на коды фасетов
+(genre_id = (SELECT id FROM facet_genres ...)) и таблицу content_items.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import facet_dictionary
+import synthetic_catalog
+from content_stats import ensure_translation_columns
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+BENCHMARK_REPEAT = 3
+
+# Формы запросов: name, source, sql, params.
+# expected_scan - скан заложен в саму форму запроса и индексом не лечится.
+QUERY_SHAPES = [
+    {
+        'name': 'recommend_and',
+        'source': 'backend/routes/recommend_db.js (стратегия 1)',
+        'sql': """
+            SELECT * FROM content WHERE type = ?
+            AND year >= ? AND year <= ?
+            AND LOWER(genre) = LOWER(?)
+            ORDER BY RANDOM() LIMIT 50
+        """,
+        'params': ('movie', 2010, 2019, 'drama')
+    },
+    {
+        'name': 'recommend_and_criteria',
+        'source': 'backend/routes/recommend_db.js (стратегия 1)',
+        'sql': """
+            SELECT * FROM content WHERE type = ?
+            AND LOWER(criteria) = LOWER(?)
+            ORDER BY RANDOM() LIMIT 50
+        """,
+        'params': ('book', 'bestseller')
+    },
+    {
+        'name': 'recommend_or',
+        'source': 'backend/routes/recommend_db.js (стратегия 2)',
+        'sql': """
+            SELECT * FROM content WHERE type = ?
+            AND (LOWER(genre) = LOWER(?) OR LOWER(mood) = LOWER(?))
+            ORDER BY RANDOM() LIMIT 50
+        """,
+        'params': ('music', 'rock', 'chill')
+    },
+    {
+        'name': 'recommend_fallback',
+        'source': 'backend/routes/recommend_db.js (стратегия 3)',
+        'sql': """
+            SELECT * FROM content WHERE type = ?
+            AND year >= ? AND year <= ?
+            ORDER BY RANDOM() LIMIT 10
+        """,
+        'params': ('movie', 1990, 1999)
+    },
+    {
+        'name': 'describer_select',
+        'source': 'scripts/tools/ai_describer.py',
+        'sql': """
+            SELECT id, type, title, creator, genre, year, rating, mood, epoch
+            FROM content
+            WHERE needs_ai = 1 AND type = ?
+            ORDER BY year DESC
+            LIMIT ?
+        """,
+        'params': ('movie', 100)
+    },
+    {
+        'name': 'describer_count',
+        'source': 'scripts/tools/ai_describer.py',
+        'sql': "SELECT COUNT(*) FROM content WHERE needs_ai = 1",
+        'params': ()
+    },
+    {
+        'name': 'translator_missing_kk',
+        'source': 'check_translations.py --missing',
+        'sql': """
+            SELECT id, type, title, creator, source_id
+            FROM content
+            WHERE (description_kk IS NULL OR description_kk = '')
+            ORDER BY type, title
+        """,
+        'params': ()
+    },
+    {
+        'name': 'translator_select',
+        'source': 'scripts/tools/translate_descriptions.py',
+        'sql': """
+            SELECT id, type, title, description,
+                   description_ru, description_en, description_kk
+            FROM content LIMIT ?
+        """,
+        'params': (100,),
+        'expected_scan': True
+    },
+    {
+        'name': 'dedup_groups',
+        'source': 'scripts/migrations/fix_duplicates.py',
+        'sql': """
+            SELECT
+                LOWER(TRIM(title)) as normalized_title,
+                LOWER(TRIM(COALESCE(creator, ''))) as normalized_creator,
+                type,
+                COUNT(*) as count,
+                GROUP_CONCAT(id) as ids
+            FROM content
+            GROUP BY normalized_title, normalized_creator, type
+            HAVING count > 1
+        """,
+        'params': (),
+        # Индекс по выражениям не покрывающий: проход по нему с чтением
+        # строк медленнее, чем скан + сортировка. Запуск разовый.
+        'expected_scan': True
+    },
+    {
+        'name': 'source_id_lookup',
+        'source': 'harvest_* (INSERT OR IGNORE по source_id)',
+        'sql': "SELECT id FROM content WHERE source_id = ?",
+        'params': ('tmdb_550',)
+    },
+    {
+        'name': 'book_is_duplicate',
+        'source': 'scripts/harvesting/harvest_books.py',
+        'sql': """
+            SELECT COUNT(*) FROM content
+            WHERE type='book'
+            AND LOWER(REPLACE(REPLACE(REPLACE(title, ':', ''), '.', ''), ',', '')) LIKE ?
+            AND creator LIKE ?
+        """,
+        'params': ('%dune%', '%herbert%')
+    },
+]
+
+# Рекомендуемые индексы и формы, которым они помогают
+RECOMMENDED_INDEXES = [
+    {
+        'name': 'idx_content_type_genre_year',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_type_genre_year "
+               "ON content(type, LOWER(genre), year)",
+        'shapes': ['recommend_and', 'recommend_or']
+    },
+    {
+        'name': 'idx_content_type_criteria',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_type_criteria "
+               "ON content(type, LOWER(criteria))",
+        'shapes': ['recommend_and_criteria']
+    },
+    {
+        'name': 'idx_content_type_mood',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_type_mood "
+               "ON content(type, LOWER(mood))",
+        'shapes': ['recommend_or']
+    },
+    {
+        'name': 'idx_content_type_year',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_type_year "
+               "ON content(type, year)",
+        'shapes': ['recommend_fallback', 'describer_select']
+    },
+    {
+        'name': 'idx_content_needs_ai',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_needs_ai "
+               "ON content(type) WHERE needs_ai = 1",
+        'shapes': ['describer_select', 'describer_count']
+    },
+    {
+        'name': 'idx_content_missing_kk',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_missing_kk "
+               "ON content(type, title, creator, source_id) WHERE description_kk IS NULL OR description_kk = ''",
+        'shapes': ['translator_missing_kk']
+    },
+    {
+        'name': 'idx_content_missing_ru',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_missing_ru "
+               "ON content(type, title, creator, source_id) WHERE description_ru IS NULL OR description_ru = ''",
+        'shapes': []
+    },
+    {
+        'name': 'idx_content_missing_en',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_missing_en "
+               "ON content(type, title, creator, source_id) WHERE description_en IS NULL OR description_en = ''",
+        'shapes': []
+    },
+    {
+        'name': 'idx_content_type_creator',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_type_creator "
+               "ON content(type, creator, title)",
+        'shapes': ['book_is_duplicate']
+    },
+    {
+        'name': 'idx_content_source_id',
+        'sql': "CREATE INDEX IF NOT EXISTS idx_content_source_id "
+               "ON content(source_id)",
+        'shapes': ['source_id_lookup']
+    },
+]
+
+# ==================== СХЕМА С КОДАМИ ФАСЕТОВ ====================
+
+FACET_LOWER_RE = re.compile(r"LOWER\((genre|epoch|mood|criteria)\) = LOWER\(\?\)")
+FACET_INDEX_RE = re.compile(r"LOWER\((genre|epoch|mood|criteria)\)")
+
+
+def _encode_sql(sql: str) -> str:
+    """Форма запроса / индекса для схемы content_items + словари"""
+    sql = FACET_LOWER_RE.sub(lambda m: facet_dictionary.facet_filter(m.group(1)), sql)
+    sql = sql.replace("ON content(", f"ON {facet_dictionary.ITEMS_TABLE}(")
+    return FACET_INDEX_RE.sub(lambda m: facet_dictionary.code_column(m.group(1)), sql)
+
+
+def get_query_shapes(cursor: sqlite3.Cursor) -> List[Dict]:
+    """QUERY_SHAPES под текущую схему"""
+    if not facet_dictionary.is_encoded(cursor):
+        return QUERY_SHAPES
+    return [dict(shape, sql=_encode_sql(shape['sql'])) for shape in QUERY_SHAPES]
+
+
+def get_recommended_indexes(cursor: sqlite3.Cursor) -> List[Dict]:
+    """RECOMMENDED_INDEXES под текущую схему"""
+    if not facet_dictionary.is_encoded(cursor):
+        return RECOMMENDED_INDEXES
+    return [dict(index, sql=_encode_sql(index['sql'])) for index in RECOMMENDED_INDEXES]
+
+# ==================== АНАЛИЗ ПЛАНОВ ====================
+
+def explain(cursor: sqlite3.Cursor, sql: str, params: tuple) -> List[str]:
+    """Строки EXPLAIN QUERY PLAN (колонка detail)"""
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    return [row[3] for row in cursor.fetchall()]
+
+
+def classify_plan(details: List[str]) -> str:
+    """
+    'scan'   - полный проход по таблице content
+    'index'  - проход по индексу (частичному или покрывающему)
+    'search' - поиск по индексу
+    """
+    if any(d.startswith('SCAN content') and 'INDEX' not in d for d in details):
+        return 'scan'
+    if any(d.startswith('SCAN') for d in details):
+        return 'index'
+    return 'search'
+
+
+def analyze_shapes(cursor: sqlite3.Cursor) -> List[Dict]:
+    """План для каждой известной формы запроса"""
+    results = []
+    for shape in get_query_shapes(cursor):
+        result = {
+            'name': shape['name'],
+            'source': shape['source'],
+            'expected_scan': shape.get('expected_scan', False)
+        }
+        try:
+            result['plan'] = explain(cursor, shape['sql'], shape['params'])
+            result['access'] = classify_plan(result['plan'])
+        except sqlite3.OperationalError as e:
+            # Например, нет колонок description_* до первого перевода
+            result['plan'] = [f"ошибка: {e}"]
+            result['access'] = 'error'
+        results.append(result)
+    return results
+
+
+def get_existing_indexes(cursor: sqlite3.Cursor) -> List[str]:
+    """Имена индексов на content (или content_items после encode_facets.py)"""
+    cursor.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = ?
+    """, (facet_dictionary.content_table(cursor),))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def propose_indexes(cursor: sqlite3.Cursor, analysis: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Индексы, которых нет и которые помогут формам с полным сканом.
+    Индексы без форм (missing_ru/en) предлагаются вместе с соседним missing_kk.
+    """
+    if analysis is None:
+        analysis = analyze_shapes(cursor)
+
+    existing = set(get_existing_indexes(cursor))
+    scanned = {r['name'] for r in analysis if r['access'] == 'scan' and not r['expected_scan']}
+
+    recommended = get_recommended_indexes(cursor)
+    proposals = []
+    for index in recommended:
+        if index['name'] in existing:
+            continue
+        if set(index['shapes']) & scanned:
+            proposals.append(index)
+
+    if any(p['name'] == 'idx_content_missing_kk' for p in proposals):
+        proposals += [
+            index for index in recommended
+            if index['name'] in ('idx_content_missing_ru', 'idx_content_missing_en')
+            and index['name'] not in existing
+        ]
+    return proposals
+
+
+def apply_indexes(conn: sqlite3.Connection, indexes: List[Dict]) -> List[str]:
+    """Создать индексы и обновить статистику планировщика (ANALYZE)"""
+    cursor = conn.cursor()
+    ensure_translation_columns(cursor)
+
+    created = []
+    for index in indexes:
+        cursor.execute(index['sql'])
+        created.append(index['name'])
+
+    if created:
+        cursor.execute("ANALYZE")
+    conn.commit()
+    return created
+
+# ==================== ЗАМЕРЫ ====================
+
+def time_shapes(cursor: sqlite3.Cursor, repeat: int = BENCHMARK_REPEAT) -> Dict[str, float]:
+    """Лучшее время (мс) из repeat прогонов для каждой формы"""
+    timings = {}
+    for shape in get_query_shapes(cursor):
+        best = None
+        try:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                cursor.execute(shape['sql'], shape['params'])
+                cursor.fetchall()
+                elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+        except sqlite3.OperationalError:
+            best = None
+        timings[shape['name']] = best
+    return timings
+
+
+def run_benchmark(db_path: Optional[str], rows: Optional[int]) -> bool:
+    """
+    Замер до/после создания индексов.
+    Работает на временной копии (db_path) или синтетическом каталоге (rows) -
+    исходная БД не меняется.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', prefix='index_advisor_')
+    os.close(fd)
+
+    try:
+        conn = sqlite3.connect(tmp_path)
+        if rows:
+            print(f"🧪 Синтетический каталог: {rows:,} записей...")
+            synthetic_catalog.populate_content(conn, rows)
+        else:
+            print(f"🧪 Копия БД: {db_path}...")
+            source = sqlite3.connect(db_path)
+            source.backup(conn)
+            source.close()
+
+        cursor = conn.cursor()
+        ensure_translation_columns(cursor)
+        conn.commit()
+
+        before_plans = {r['name']: r['access'] for r in analyze_shapes(cursor)}
+        before = time_shapes(cursor)
+
+        proposals = propose_indexes(cursor)
+        print(f"🔧 Создаем индексов: {len(proposals)}")
+        apply_indexes(conn, proposals)
+
+        after_plans = {r['name']: r['access'] for r in analyze_shapes(cursor)}
+        after = time_shapes(cursor)
+        conn.close()
+
+        print("\n" + "=" * 78)
+        print(f"{'Запрос':26} {'план до':>9} {'план после':>11} {'до, мс':>10} {'после, мс':>10} {'x':>6}")
+        print("=" * 78)
+        for shape in QUERY_SHAPES:
+            name = shape['name']
+            t_before, t_after = before.get(name), after.get(name)
+            if t_before is None or t_after is None:
+                print(f"{name:26} {before_plans[name]:>9} {after_plans[name]:>11} {'—':>10} {'—':>10}")
+                continue
+            speedup = t_before / t_after if t_after > 0 else 0
+            print(f"{name:26} {before_plans[name]:>9} {after_plans[name]:>11} "
+                  f"{t_before:>10.2f} {t_after:>10.2f} {speedup:>6.1f}")
+        print("=" * 78 + "\n")
+        return True
+
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка бенчмарка: {e}")
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# ==================== ОТЧЕТ ====================
+
+ACCESS_ICONS = {'scan': '🔴', 'index': '🟡', 'search': '🟢', 'error': '⚠️'}
+
+
+def print_report(cursor: sqlite3.Cursor, verbose: bool = False) -> List[Dict]:
+    """Отчет по планам и список предложенных индексов"""
+    analysis = analyze_shapes(cursor)
+
+    print("\n" + "=" * 70)
+    print("🧭 INDEX ADVISOR".center(70))
+    print("=" * 70)
+
+    existing = get_existing_indexes(cursor)
+    print(f"\n📇 Индексов на content: {len(existing)}")
+    for name in existing:
+        print(f"  • {name}")
+
+    print("\n🔍 ПЛАНЫ ЗАПРОСОВ:")
+    for result in analysis:
+        icon = ACCESS_ICONS[result['access']]
+        note = " (скан ожидаем)" if result['expected_scan'] and result['access'] == 'scan' else ""
+        print(f"  {icon} {result['name']:26} {result['access']}{note}")
+        print(f"      {result['source']}")
+        if verbose or result['access'] in ('scan', 'error'):
+            for line in result['plan']:
+                print(f"        {line}")
+
+    proposals = propose_indexes(cursor, analysis)
+    print("\n💡 ПРЕДЛАГАЕМЫЕ ИНДЕКСЫ:")
+    if proposals:
+        for index in proposals:
+            print(f"  {index['sql']};")
+        print("\n  Применить: python index_advisor.py --apply")
+    else:
+        print("  ✅ Все известные запросы уже используют индексы")
+
+    print("=" * 70 + "\n")
+    return proposals
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🧭 Index Advisor - индексы под запросы каталога',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python index_advisor.py                        # Планы запросов и предложения
+  python index_advisor.py --verbose              # Полные планы всех запросов
+  python index_advisor.py --apply                # Создать предложенные индексы
+  python index_advisor.py --benchmark            # До/после на копии content.db
+  python index_advisor.py --benchmark --rows 200000   # До/после на синтетике
+        """
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--apply', action='store_true',
+                       help='Создать предложенные индексы и выполнить ANALYZE')
+    group.add_argument('--benchmark', action='store_true',
+                       help='Замер времени до/после на временной копии')
+
+    parser.add_argument('--rows',
+                        type=int,
+                        help='Бенчмарк на синтетическом каталоге из N записей')
+
+    parser.add_argument('--verbose', action='store_true',
+                        help='Показывать планы всех запросов')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        if not args.rows and not os.path.exists(args.db):
+            print(f"❌ База данных не найдена: {args.db}")
+            sys.exit(1)
+        if not run_benchmark(args.db, args.rows):
+            sys.exit(1)
+        return
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        conn = sqlite3.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+        proposals = print_report(cursor, args.verbose)
+
+        if args.apply:
+            if not proposals:
+                return
+            created = apply_indexes(conn, proposals)
+            print(f"✅ Создано индексов: {len(created)}")
+            print_report(cursor, args.verbose)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
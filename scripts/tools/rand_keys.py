@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+🎲 RAND KEYS - Индексированная колонка для случайной выборки
+
+Назначение:
+- Колонка content.rand_key: равномерно распределенное 64-битное число
+- Триггер выдает ключ каждой новой записи (harvest_*, миграции)
+- Индексы (type, rand_key) и (type, LOWER(genre), rand_key) под запросы
+  recommend_db.js; после encode_facets.py - (type, genre_id, rand_key)
+- Периодическая перетасовка ключей порциями по id
+
+Выборка "N случайных" = переход к случайному ключу и чтение N следующих
+по индексу: O(log n) вместо ORDER BY RANDOM(), который читает и сортирует
+все подходящие строки. Перетасовка не дает одним и тем же соседям
+по ключу выпадать вместе слишком долго.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import os
+import sys
+import time
+from typing import Dict
+
+import facet_dictionary
+import sql_trace
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+CHUNK_SIZE = 5000
+CHUNK_PAUSE = 0.0
+
+RAND_COLUMN = 'rand_key'
+TRIGGER_INSERT = 'content_rand_key_after_insert'
+
+RAND_INDEXES = {
+    'idx_content_type_rand': "ON content(type, rand_key)",
+    'idx_content_type_genre_rand': "ON content(type, LOWER(genre), rand_key)",
+}
+
+# После encode_facets.py: жанр фильтруется по коду
+RAND_INDEXES_ENCODED = {
+    'idx_content_type_rand': f"ON {facet_dictionary.ITEMS_TABLE}(type, rand_key)",
+    'idx_content_type_genre_rand': f"ON {facet_dictionary.ITEMS_TABLE}(type, genre_id, rand_key)",
+}
+
+
+# ==================== УСТАНОВКА ====================
+
+def rand_indexes(cursor: sqlite3.Cursor) -> Dict[str, str]:
+    """Определения индексов под текущую схему (текстовые фасеты или коды)"""
+    return RAND_INDEXES_ENCODED if facet_dictionary.is_encoded(cursor) else RAND_INDEXES
+
+
+def has_column(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("PRAGMA table_info(content)")
+    return RAND_COLUMN in [row[1] for row in cursor.fetchall()]
+
+
+def is_installed(cursor: sqlite3.Cursor) -> bool:
+    """Колонка, триггер и индексы на месте"""
+    if not has_column(cursor):
+        return False
+    names = [TRIGGER_INSERT] + list(RAND_INDEXES)
+    cursor.execute(f"""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE name IN ({', '.join(['?'] * len(names))})
+    """, names)
+    return cursor.fetchone()[0] == len(names)
+
+
+def install(conn: sqlite3.Connection, chunk_size: int = CHUNK_SIZE) -> bool:
+    """
+    Добавить колонку, триггер и индексы, раздать ключи записям без ключа.
+    ALTER TABLE не принимает DEFAULT (random()), поэтому ключ ставит триггер.
+    """
+    cursor = conn.cursor()
+    table = facet_dictionary.content_table(cursor)
+    try:
+        if not has_column(cursor):
+            facet_dictionary.add_column(cursor, RAND_COLUMN, "INTEGER")
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TRIGGER_INSERT}
+            AFTER INSERT ON {table}
+            WHEN NEW.{RAND_COLUMN} IS NULL
+            BEGIN
+                UPDATE {table} SET {RAND_COLUMN} = random() WHERE id = NEW.id;
+            END
+        """)
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Ошибка установки {RAND_COLUMN}: {e}")
+        return False
+
+    # Ключи до индексов - иначе каждое обновление двигает записи в индексах
+    assigned = fill_missing(conn, chunk_size)
+
+    try:
+        for name, definition in rand_indexes(cursor).items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+        cursor.execute(f"ANALYZE {table}")
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Ошибка создания индексов: {e}")
+        return False
+
+    if assigned:
+        print(f"🎲 Ключи выданы: {assigned:,} записей")
+    return True
+
+
+def uninstall(conn: sqlite3.Connection):
+    """Удалить триггер и индексы (колонка остается - DROP COLUMN дорогой)"""
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_INSERT}")
+    for name in RAND_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+# ==================== ОБСЛУЖИВАНИЕ ====================
+
+def _update_chunks(conn: sqlite3.Connection, where_sql: str, chunk_size: int,
+                   pause: float, show_progress: bool) -> int:
+    """UPDATE ... SET rand_key = random() диапазонами id, коммит на каждый"""
+    cursor = conn.cursor()
+    table = facet_dictionary.content_table(cursor)
+    cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table}")
+    min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        return 0
+
+    total_chunks = (max_id - min_id) // chunk_size + 1
+    updated = 0
+    chunks = 0
+    start = min_id
+
+    while start <= max_id:
+        end = start + chunk_size - 1
+        cursor.execute(f"""
+            UPDATE {table} SET {RAND_COLUMN} = random()
+            WHERE id BETWEEN ? AND ?{where_sql}
+        """, (start, end))
+        updated += cursor.rowcount
+        conn.commit()
+
+        chunks += 1
+        if show_progress and (chunks % 50 == 0 or end >= max_id):
+            print(f"   ⏳ Диапазонов: {chunks}/{total_chunks}")
+
+        start = end + 1
+        if pause:
+            time.sleep(pause)
+
+    return updated
+
+
+def fill_missing(conn: sqlite3.Connection, chunk_size: int = CHUNK_SIZE) -> int:
+    """Выдать ключи записям без ключа (после установки или ручных вставок)"""
+    return _update_chunks(conn, f" AND {RAND_COLUMN} IS NULL", chunk_size, 0, False)
+
+
+def reshuffle(conn: sqlite3.Connection, chunk_size: int = CHUNK_SIZE,
+              pause: float = CHUNK_PAUSE, show_progress: bool = True) -> int:
+    """
+    Новые ключи всем записям. Порции короткие - API читает между ними,
+    выборка остается равномерной на протяжении всей перетасовки.
+    """
+    return _update_chunks(conn, '', chunk_size, pause, show_progress)
+
+
+def get_status(cursor: sqlite3.Cursor) -> Dict:
+    """Заполненность ключей и равномерность по 16 корзинам старших битов"""
+    cursor.execute(f"""
+        SELECT COUNT(*), SUM({RAND_COLUMN} IS NULL) FROM content
+    """)
+    total, missing = cursor.fetchone()
+
+    # rand_key в [-2^63, 2^63): корзина = старшие 4 бита со сдвигом знака
+    cursor.execute(f"""
+        SELECT ({RAND_COLUMN} >> 60) + 8 AS bucket, COUNT(*)
+        FROM content WHERE {RAND_COLUMN} IS NOT NULL
+        GROUP BY bucket ORDER BY bucket
+    """)
+    buckets = dict(cursor.fetchall())
+
+    return {
+        'total': total or 0,
+        'missing': missing or 0,
+        'buckets': [buckets.get(i, 0) for i in range(16)]
+    }
+
+
+def print_status(cursor: sqlite3.Cursor):
+    status = get_status(cursor)
+    print("\n" + "=" * 70)
+    print("🎲 RAND KEYS".center(70))
+    print("=" * 70)
+    print(f"\n📚 Записей: {status['total']:,}")
+    print(f"❓ Без ключа: {status['missing']:,}")
+    print(f"🔧 Установлено: {'да' if is_installed(cursor) else 'нет'}")
+
+    filled = status['total'] - status['missing']
+    if filled:
+        expected = filled / 16
+        worst = max(abs(count - expected) / expected for count in status['buckets'])
+        print(f"\n📊 Распределение по 16 корзинам (макс. отклонение {worst:.1%}):")
+        for i, count in enumerate(status['buckets']):
+            bar = '█' * int(40 * count / max(status['buckets']))
+            print(f"  {i:2} {count:>10,} {bar}")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🎲 Rand Keys - колонка для быстрой случайной выборки',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python rand_keys.py --install                 # Колонка, триггер, индексы, ключи
+  python rand_keys.py --reshuffle               # Перетасовать ключи (по расписанию)
+  python rand_keys.py --reshuffle --chunk-size 1000 --pause 0.05
+  python rand_keys.py                           # Состояние и распределение
+        """
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--install', action='store_true',
+                       help='Добавить rand_key, триггер и индексы')
+    group.add_argument('--reshuffle', action='store_true',
+                       help='Выдать всем записям новые ключи')
+    group.add_argument('--uninstall', action='store_true',
+                       help='Удалить триггер и индексы')
+
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Записей на транзакцию (по умолчанию: {CHUNK_SIZE})')
+    parser.add_argument('--pause', type=float, default=CHUNK_PAUSE,
+                        help='Пауза между порциями, сек')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+
+        if args.install:
+            if not install(conn, args.chunk_size):
+                sys.exit(1)
+            print(f"✅ {RAND_COLUMN} установлен")
+
+        elif args.uninstall:
+            uninstall(conn)
+            print(f"✅ Триггер и индексы {RAND_COLUMN} удалены")
+
+        elif args.reshuffle:
+            if not is_installed(cursor):
+                print(f"❌ {RAND_COLUMN} не установлен. Запустите: --install")
+                sys.exit(1)
+            # staging_db импортирует rand_keys - импорт здесь, а не в начале модуля
+            import staging_db
+            if staging_db.build_in_progress(args.db):
+                print(f"⏸️ Идет сборка каталога ({staging_db.staging_path(args.db)}) - перетасовка пропущена:")
+                print("   запись в рабочую базу отменила бы публикацию копии")
+                return
+            started = time.time()
+            updated = reshuffle(conn, args.chunk_size, args.pause)
+            print(f"✅ Перетасовано: {updated:,} записей за {time.time() - started:.1f}с")
+
+        print_status(cursor)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+🎯 RECOMMEND POOLS - Предрассчитанные пулы кандидатов для рекомендаций
+
+Назначение:
+- Для каждой комбинации фильтров (тип, жанр, эпоха, критерий, настроение),
+  достижимой через FILTER_MAPPING / VALUE_MAPPING, заранее выбирается
+  ступень fallback из recommend_db.js (AND / OR / только тип)
+- Пул хранит компактный список id (uint32 LE) - случайную выборку
+  до POOL_CAP записей из подходящих. Компромисс: пул больших фасетов -
+  фиксированная выборка, поэтому урезанные пулы каждую ночь получают новую
+  (--reshuffle, PM2 вслед за rand_keys.py --reshuffle). Без лимита пулы
+  типа весили бы десятки тысяч id каждый на каждую комбинацию эпохи
+- API берет пул одним индексированным запросом вместо ORDER BY RANDOM()
+- Инкрементальная пересборка: перестраиваются только типы, у которых
+  изменилась подпись (content_stats + max(id))
+
+Запускать после harvest_* (или по расписанию - без изменений работа
+занимает доли секунды). Фильтры берутся из backend/config/recommend_filters.json.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import struct
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import content_stats
+import sql_trace
+from content_export import TYPE_ARGS
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+FILTERS_CONFIG = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend', 'config', 'recommend_filters.json'
+)
+
+POOL_CAP = 1000         # Максимум id в одном пуле
+MIN_AND_RESULTS = 10    # Стратегия 1 в recommend_db.js: results.length >= 10
+
+POOLS_TABLE = 'recommend_pools'
+CANDIDATES_TABLE = 'recommend_candidates'
+STATE_TABLE = 'recommend_pool_state'
+
+TIER_AND = 'and'
+TIER_OR = 'or'
+TIER_TYPE = 'type'
+
+# ==================== КОНФИГУРАЦИЯ ФИЛЬТРОВ ====================
+
+def load_filter_config(path: str = FILTERS_CONFIG) -> Tuple[List[str], Dict[str, Tuple[int, int]]]:
+    """
+    Колонки фильтров по значению (кроме epoch) и диапазоны лет эпох.
+    epoch в recommend_db.js фильтрует только через EPOCH_YEAR_RANGES.
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    columns = sorted(set(config['FILTER_MAPPING'].values()) - {'epoch'})
+    year_ranges = {
+        name: (bounds['min'], bounds['max'])
+        for name, bounds in config['EPOCH_YEAR_RANGES'].items()
+    }
+    return columns, year_ranges
+
+# ==================== СХЕМА ====================
+
+def ensure_tables(cursor: sqlite3.Cursor, columns: List[str]):
+    """Таблицы пулов, комбинаций и состояния сборки"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {POOLS_TABLE} (
+            pool_key TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            tier TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            ids BLOB NOT NULL,
+            built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    combo_columns = ',\n            '.join(f"{col} TEXT NOT NULL DEFAULT ''" for col in ['epoch'] + columns)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CANDIDATES_TABLE} (
+            type TEXT NOT NULL,
+            {combo_columns},
+            tier TEXT NOT NULL,
+            pool_key TEXT NOT NULL,
+            PRIMARY KEY (type, epoch, {', '.join(columns)})
+        ) WITHOUT ROWID
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            type TEXT PRIMARY KEY,
+            signature TEXT NOT NULL,
+            combos INTEGER NOT NULL,
+            pools INTEGER NOT NULL,
+            built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def pack_ids(ids: List[int]) -> bytes:
+    """Список id -> uint32 little-endian (читается Buffer.readUInt32LE в Node)"""
+    return struct.pack(f'<{len(ids)}I', *ids)
+
+
+def unpack_ids(blob: bytes) -> List[int]:
+    return list(struct.unpack(f'<{len(blob) // 4}I', blob))
+
+# ==================== ПОДПИСЬ ТИПА ====================
+
+def get_type_signature(cursor: sqlite3.Cursor, content_type: str) -> str:
+    """
+    Подпись состояния типа: счетчики content_stats + количество и max(id).
+    harvest_* удаляет и заново вставляет тип - max(id) меняется всегда.
+    """
+    cursor.execute("SELECT COUNT(*), IFNULL(MAX(id), 0) FROM content WHERE type = ?", (content_type,))
+    count, max_id = cursor.fetchone()
+
+    cursor.execute(f"""
+        SELECT dimension, value, count FROM {content_stats.STATS_TABLE}
+        WHERE type = ? AND count != 0
+        ORDER BY dimension, value
+    """, (content_type,))
+    digest = hashlib.sha1()
+    for row in cursor.fetchall():
+        digest.update(repr(tuple(row)).encode('utf-8'))
+
+    return f"{count}:{max_id}:{digest.hexdigest()[:16]}"
+
+# ==================== СБОРКА ====================
+
+class PoolBuilder:
+    """Сборка пулов для одного типа контента"""
+
+    def __init__(self, conn: sqlite3.Connection, content_type: str, columns: List[str],
+                 year_ranges: Dict[str, Tuple[int, int]], pool_cap: int = POOL_CAP):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.content_type = content_type
+        self.columns = columns
+        self.year_ranges = year_ranges
+        self.pool_cap = pool_cap
+
+    def _year_clause(self, epoch: str) -> Tuple[str, list]:
+        if not epoch:
+            return '', []
+        low, high = self.year_ranges[epoch]
+        return " AND year >= ? AND year <= ?", [low, high]
+
+    def get_values(self) -> Dict[str, List[str]]:
+        """Значения колонок фильтров, которые есть у типа ('' - фильтр не задан)"""
+        values = {}
+        for column in self.columns:
+            self.cursor.execute(f"""
+                SELECT DISTINCT LOWER({column}) FROM content
+                WHERE type = ? AND {column} IS NOT NULL AND {column} != ''
+            """, (self.content_type,))
+            values[column] = [''] + sorted(row[0] for row in self.cursor.fetchall())
+        return values
+
+    def get_marginal_counts(self, epoch: str) -> Dict[tuple, int]:
+        """
+        Счетчики для всех частичных комбинаций колонок за один GROUP BY.
+        Ключ - кортеж значений по self.columns, '' - колонка свободна.
+        """
+        year_sql, year_params = self._year_clause(epoch)
+        select = ', '.join(f"IFNULL(LOWER({col}), '')" for col in self.columns)
+        self.cursor.execute(f"""
+            SELECT {select}, COUNT(*) FROM content
+            WHERE type = ?{year_sql}
+            GROUP BY {', '.join(str(i + 1) for i in range(len(self.columns)))}
+        """, [self.content_type] + year_params)
+
+        counts = defaultdict(int)
+        for row in self.cursor.fetchall():
+            values, count = row[:-1], row[-1]
+            # Строка попадает во все комбинации, где колонка равна ее значению или свободна
+            for mask in itertools.product((False, True), repeat=len(values)):
+                if any(keep and not value for value, keep in zip(values, mask)):
+                    continue  # Пустое значение совпадает со свободной колонкой
+                counts[tuple(v if keep else '' for v, keep in zip(values, mask))] += count
+        return counts
+
+    def or_count(self, counts: Dict[tuple, int], combo: tuple) -> int:
+        """|A ∪ B ∪ ...| по формуле включений-исключений из маргинальных счетчиков"""
+        active = [i for i, value in enumerate(combo) if value]
+        total = 0
+        for size in range(1, len(active) + 1):
+            for subset in itertools.combinations(active, size):
+                key = tuple(combo[i] if i in subset else '' for i in range(len(combo)))
+                total += (-1) ** (size + 1) * counts.get(key, 0)
+        return total
+
+    def resolve(self, epoch: str, combo: tuple, counts: Dict[tuple, int]) -> Tuple[str, str, int]:
+        """
+        Ступень fallback как в searchWithFallback:
+        1) AND всех фильтров, если найдено >= 10
+        2) OR фильтров (кроме эпохи), если фильтров > 1 и найдено > 0
+        3) только тип (+ диапазон лет эпохи)
+        """
+        applied = sum(1 for value in combo if value) + (1 if epoch else 0)
+        filters = '|'.join(f"{col}={value}" for col, value in zip(self.columns, combo) if value)
+        has_value_filters = bool(filters)
+
+        if applied > 0 and has_value_filters:
+            size = counts.get(combo, 0)
+            if size >= MIN_AND_RESULTS:
+                return TIER_AND, f"{TIER_AND}|{self.content_type}|{epoch}|{filters}", size
+
+        if applied > 1 and has_value_filters:
+            size = self.or_count(counts, combo)
+            if size > 0:
+                return TIER_OR, f"{TIER_OR}|{self.content_type}|{epoch}|{filters}", size
+
+        return TIER_TYPE, f"{TIER_TYPE}|{self.content_type}|{epoch}", counts.get(('',) * len(combo), 0)
+
+    def sample_ids(self, tier: str, epoch: str, combo: tuple) -> List[int]:
+        """Случайная выборка id пула (до pool_cap), по возрастанию id"""
+        year_sql, year_params = self._year_clause(epoch)
+        query = f"SELECT id FROM content WHERE type = ?{year_sql}"
+        params = [self.content_type] + year_params
+
+        conditions = [(f"LOWER({col}) = ?", value) for col, value in zip(self.columns, combo) if value]
+        if tier == TIER_AND:
+            for condition, value in conditions:
+                query += f" AND {condition}"
+                params.append(value)
+        elif tier == TIER_OR:
+            query += " AND (" + " OR ".join(c for c, _ in conditions) + ")"
+            params += [value for _, value in conditions]
+
+        self.cursor.execute(query + " ORDER BY RANDOM() LIMIT ?", params + [self.pool_cap])
+        return sorted(row[0] for row in self.cursor.fetchall())
+
+    def build(self, signature: str) -> Dict:
+        """Пересобрать пулы типа в одной транзакции"""
+        values = self.get_values()
+        combos = list(itertools.product(*(values[col] for col in self.columns)))
+        epochs = [''] + sorted(self.year_ranges)
+
+        candidates = []
+        pools = {}
+        for epoch in epochs:
+            counts = self.get_marginal_counts(epoch)
+            for combo in combos:
+                tier, pool_key, size = self.resolve(epoch, combo, counts)
+                candidates.append((self.content_type, epoch) + combo + (tier, pool_key))
+                if pool_key not in pools:
+                    pools[pool_key] = (tier, epoch, combo, size)
+
+        self.cursor.execute(f"DELETE FROM {CANDIDATES_TABLE} WHERE type = ?", (self.content_type,))
+        self.cursor.execute(f"DELETE FROM {POOLS_TABLE} WHERE type = ?", (self.content_type,))
+
+        for pool_key, (tier, epoch, combo, size) in pools.items():
+            ids = self.sample_ids(tier, epoch, combo)
+            self.cursor.execute(f"""
+                INSERT INTO {POOLS_TABLE} (pool_key, type, tier, size, ids)
+                VALUES (?, ?, ?, ?, ?)
+            """, (pool_key, self.content_type, tier, size, pack_ids(ids)))
+
+        placeholders = ', '.join(['?'] * (len(self.columns) + 4))
+        self.cursor.executemany(f"""
+            INSERT INTO {CANDIDATES_TABLE} (type, epoch, {', '.join(self.columns)}, tier, pool_key)
+            VALUES ({placeholders})
+        """, candidates)
+
+        self.cursor.execute(f"""
+            INSERT OR REPLACE INTO {STATE_TABLE} (type, signature, combos, pools, built_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (self.content_type, signature, len(candidates), len(pools)))
+
+        self.conn.commit()
+        return {'combos': len(candidates), 'pools': len(pools)}
+
+
+def reshuffle(conn: sqlite3.Connection, content_type: Optional[str] = None,
+              pool_cap: int = POOL_CAP, config_path: str = FILTERS_CONFIG) -> Dict[str, int]:
+    """
+    Новая случайная выборка для урезанных пулов (подходящих записей больше,
+    чем id в пуле) без пересборки комбинаций. Возвращает {тип: пулов}.
+    """
+    columns, year_ranges = load_filter_config(config_path)
+    cursor = conn.cursor()
+
+    query = f"SELECT DISTINCT type FROM {POOLS_TABLE} WHERE size > LENGTH(ids) / 4"
+    params = []
+    if content_type:
+        query += " AND type = ?"
+        params.append(content_type)
+    cursor.execute(query, params)
+    types = [row[0] for row in cursor.fetchall()]
+
+    reshuffled = {}
+    for current_type in types:
+        builder = PoolBuilder(conn, current_type, columns, year_ranges, pool_cap)
+        # Эпоха и значения фильтров пула - из любой его комбинации (один проход)
+        cursor.execute(f"""
+            SELECT pool_key, epoch, {', '.join(columns)} FROM {CANDIDATES_TABLE} WHERE type = ?
+        """, (current_type,))
+        combos = {}
+        for row in cursor.fetchall():
+            combos.setdefault(row[0], (row[1], tuple(row[2:])))
+
+        cursor.execute(f"""
+            SELECT pool_key, tier FROM {POOLS_TABLE}
+            WHERE type = ? AND size > LENGTH(ids) / 4
+        """, (current_type,))
+        pools = cursor.fetchall()
+        for pool_key, tier in pools:
+            if pool_key not in combos:
+                continue
+            epoch, combo = combos[pool_key]
+            ids = builder.sample_ids(tier, epoch, combo)
+            cursor.execute(f"""
+                UPDATE {POOLS_TABLE} SET ids = ?, built_at = CURRENT_TIMESTAMP WHERE pool_key = ?
+            """, (pack_ids(ids), pool_key))
+        conn.commit()
+        reshuffled[current_type] = len(pools)
+    return reshuffled
+
+
+def rebuild(conn: sqlite3.Connection, full: bool = False, content_type: Optional[str] = None,
+            pool_cap: int = POOL_CAP, config_path: str = FILTERS_CONFIG) -> Dict[str, Dict]:
+    """
+    Пересобрать пулы. По умолчанию - только типы с изменившейся подписью.
+    Возвращает {тип: результат} для пересобранных типов.
+    """
+    columns, year_ranges = load_filter_config(config_path)
+    cursor = conn.cursor()
+    ensure_tables(cursor, columns)
+    content_stats.ensure_stats(conn)
+
+    types = [content_type] if content_type else list(content_stats.get_by_type(cursor))
+
+    # Типы, которых больше нет в content
+    cursor.execute(f"SELECT type FROM {STATE_TABLE}")
+    for (stale_type,) in cursor.fetchall():
+        if not content_type and stale_type not in types:
+            for table in (CANDIDATES_TABLE, POOLS_TABLE, STATE_TABLE):
+                cursor.execute(f"DELETE FROM {table} WHERE type = ?", (stale_type,))
+    conn.commit()
+
+    rebuilt = {}
+    for current_type in types:
+        signature = get_type_signature(cursor, current_type)
+        cursor.execute(f"SELECT signature FROM {STATE_TABLE} WHERE type = ?", (current_type,))
+        row = cursor.fetchone()
+        if not full and row and row[0] == signature:
+            continue
+
+        started = time.time()
+        builder = PoolBuilder(conn, current_type, columns, year_ranges, pool_cap)
+        result = builder.build(signature)
+        result['seconds'] = round(time.time() - started, 2)
+        rebuilt[current_type] = result
+    return rebuilt
+
+# ==================== ОТЧЕТ ====================
+
+def print_summary(cursor: sqlite3.Cursor):
+    """Сводка по собранным пулам"""
+    print("\n" + "=" * 70)
+    print("🎯 RECOMMEND POOLS".center(70))
+    print("=" * 70)
+
+    cursor.execute(f"SELECT type, combos, pools, built_at FROM {STATE_TABLE} ORDER BY type")
+    for content_type, combos, pools, built_at in cursor.fetchall():
+        print(f"\n📦 {content_type}: комбинаций {combos:,}, пулов {pools:,} (собрано {built_at})")
+        cursor.execute(f"""
+            SELECT tier, COUNT(*) FROM {CANDIDATES_TABLE}
+            WHERE type = ? GROUP BY tier ORDER BY tier
+        """, (content_type,))
+        for tier, count in cursor.fetchall():
+            print(f"  {tier:6} {count:>8,} комбинаций")
+
+    cursor.execute(f"SELECT COUNT(*), IFNULL(SUM(LENGTH(ids)), 0) FROM {POOLS_TABLE}")
+    pools, size = cursor.fetchone()
+    print(f"\n💾 Пулов: {pools:,}, id в пулах: {size // 4:,} ({size / 1024:.1f} KB)")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🎯 Recommend Pools - пулы кандидатов для рекомендаций',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python recommend_pools.py                 # Пересобрать изменившиеся типы
+  python recommend_pools.py --full          # Пересобрать все (новая случайная выборка)
+  python recommend_pools.py --reshuffle     # Новая выборка урезанных пулов (по расписанию)
+  python recommend_pools.py --type movies   # Только фильмы
+  python recommend_pools.py --summary       # Сводка без пересборки
+        """
+    )
+
+    parser.add_argument('--full', action='store_true',
+                        help='Пересобрать все типы, даже без изменений')
+
+    parser.add_argument('--reshuffle', action='store_true',
+                        help='Новая случайная выборка для пулов, урезанных до --pool-cap')
+
+    parser.add_argument('--type',
+                        choices=['books', 'movies', 'music'],
+                        help='Пересобрать только указанный тип')
+
+    parser.add_argument('--pool-cap',
+                        type=int,
+                        default=POOL_CAP,
+                        help=f'Максимум id в пуле (по умолчанию: {POOL_CAP})')
+
+    parser.add_argument('--summary', action='store_true',
+                        help='Только показать сводку')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    content_type = TYPE_ARGS.get(args.type)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+        # staging_db импортирует recommend_pools - импорт здесь, а не в начале модуля
+        import staging_db
+        if not args.summary and staging_db.build_in_progress(args.db):
+            # Копия пересоберет пулы сама (refresh_derived)
+            print(f"⏸️ Идет сборка каталога ({staging_db.staging_path(args.db)}) - пересборка пропущена")
+        elif args.reshuffle:
+            started = time.time()
+            reshuffled = reshuffle(conn, content_type, args.pool_cap)
+            for name, count in reshuffled.items():
+                print(f"🎲 {name}: перетасовано пулов {count:,}")
+            print(f"✅ Перетасовка за {time.time() - started:.1f}с")
+        elif not args.summary:
+            rebuilt = rebuild(conn, args.full or bool(content_type), content_type, args.pool_cap)
+            if rebuilt:
+                for name, result in rebuilt.items():
+                    print(f"✅ {name}: {result['combos']:,} комбинаций, "
+                          f"{result['pools']:,} пулов за {result['seconds']}с")
+            else:
+                print("✅ Изменений нет - пулы актуальны")
+        print_summary(cursor)
+    except (sqlite3.Error, OSError, KeyError) as e:
+        print(f"❌ Ошибка сборки пулов: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
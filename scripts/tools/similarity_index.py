@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+🧲 SIMILARITY INDEX - Похожие записи ("еще как это")
+
+Назначение:
+- Вектор признаков каждой записи:
+  * hashed TF-IDF по description (HASH_DIM корзин, без словаря)
+  * one-hot genre / epoch / mood / criteria
+  * нормированные год и рейтинг
+- Top-K ближайших соседей по косинусу внутри типа, блочным умножением
+  матриц (BLOCK_SIZE строк за раз - память O(BLOCK_SIZE * n))
+- Таблица similar_items: id записи -> id соседей (uint32 LE) и сходство
+  (uint16 LE, score * 65535); API читает ее по первичному ключу
+- Инкрементально: токенизируются только записи с изменившейся подписью,
+  соседи пересчитываются только для типов, где что-то изменилось
+
+Требует numpy (pip install numpy).
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import sql_trace
+import staging_db
+from content_export import TYPE_ARGS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+CHUNK_SIZE = 5000
+
+HASH_DIM = 1024      # Корзин hashed TF-IDF
+TOP_K = 20           # Соседей на запись
+BLOCK_SIZE = 512     # Строк на одно умножение матриц
+
+TERMS_TABLE = 'similarity_terms'
+SIMILAR_TABLE = 'similar_items'
+STATE_TABLE = 'similarity_state'
+
+FACET_COLUMNS = ['genre', 'epoch', 'mood', 'criteria']
+
+# Вклад блоков признаков в косинус (каждый блок нормирован до веса)
+FEATURE_WEIGHTS = {
+    'text': 1.0,
+    'genre': 0.6,
+    'epoch': 0.3,
+    'mood': 0.4,
+    'criteria': 0.3,
+    'year': 0.3,
+    'rating': 0.2,
+}
+
+MIN_TOKEN_LENGTH = 3
+TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+STOP_WORDS = {
+    'the', 'and', 'for', 'with', 'that', 'this', 'from', 'his', 'her', 'their',
+    'are', 'was', 'who', 'has', 'have', 'into', 'its', 'but', 'not', 'one',
+    'как', 'что', 'это', 'его', 'она', 'они', 'для', 'при', 'или', 'так',
+    'все', 'был', 'была', 'уже', 'еще', 'где', 'когда', 'только',
+}
+
+# ==================== СХЕМА ====================
+
+def ensure_tables(cursor: sqlite3.Cursor):
+    """Кэш токенов, соседи и состояние сборки"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TERMS_TABLE} (
+            id INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            terms BLOB NOT NULL
+        )
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{TERMS_TABLE}_type ON {TERMS_TABLE}(type)
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SIMILAR_TABLE} (
+            item_id INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            neighbor_ids BLOB NOT NULL,
+            scores BLOB NOT NULL
+        )
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{SIMILAR_TABLE}_type ON {SIMILAR_TABLE}(type)
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            type TEXT PRIMARY KEY,
+            signature TEXT NOT NULL,
+            items INTEGER NOT NULL,
+            built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+# ==================== ТОКЕНЫ ====================
+
+def row_signature(row: tuple) -> str:
+    """Подпись колонок, из которых строится вектор (и числа корзин)"""
+    return hashlib.sha1(repr(row).encode('utf-8')).hexdigest()[:16]
+
+
+def hash_terms(text: str, dim: int = HASH_DIM) -> Tuple[List[int], List[int]]:
+    """Текст -> (корзины, частоты). crc32 стабилен между запусками, в отличие от hash()"""
+    counts = Counter()
+    for token in TOKEN_RE.findall((text or '').lower()):
+        if len(token) < MIN_TOKEN_LENGTH or token in STOP_WORDS:
+            continue
+        counts[zlib.crc32(token.encode('utf-8')) % dim] += 1
+    buckets = sorted(counts)
+    return buckets, [min(counts[b], 65535) for b in buckets]
+
+
+def pack_terms(buckets: List[int], counts: List[int]) -> bytes:
+    """n корзин uint16 + n частот uint16, little-endian"""
+    return (np.asarray(buckets, dtype='<u2').tobytes()
+            + np.asarray(counts, dtype='<u2').tobytes())
+
+
+def unpack_terms(blob: bytes) -> Tuple['np.ndarray', 'np.ndarray']:
+    values = np.frombuffer(blob, dtype='<u2')
+    half = len(values) // 2
+    return values[:half], values[half:]
+
+
+def _to_float(value) -> float:
+    """rating/year как число: SQLite не проверяет типы, текст ('', 'N/A') - пропуск"""
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+# ==================== СБОРКА ====================
+
+class SimilarityBuilder:
+    """Векторы и соседи для одного типа контента"""
+
+    def __init__(self, conn: sqlite3.Connection, content_type: str,
+                 top_k: int = TOP_K, dim: int = HASH_DIM, block_size: int = BLOCK_SIZE):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.content_type = content_type
+        self.top_k = top_k
+        self.dim = dim
+        self.block_size = block_size
+
+        self.ids: List[int] = []
+        self.terms: List[Tuple] = []
+        self.facets: Dict[str, List[str]] = {col: [] for col in FACET_COLUMNS}
+        self.years: List[Optional[float]] = []
+        self.ratings: List[Optional[float]] = []
+
+    def sync_terms(self, show_progress: bool = True) -> Dict:
+        """
+        Пройти записи типа порциями по id, перетокенизировать измененные,
+        удалить кэш для исчезнувших. Заодно собрать признаки для матрицы.
+        """
+        self.cursor.execute(f"SELECT id, signature FROM {TERMS_TABLE} WHERE type = ?",
+                            (self.content_type,))
+        cached = dict(self.cursor.fetchall())
+
+        updated = 0
+        last_id = -1
+        read_cursor = self.conn.cursor()
+        while True:
+            read_cursor.execute(f"""
+                SELECT id, description, {', '.join(FACET_COLUMNS)}, year, rating
+                FROM content WHERE type = ? AND id > ?
+                ORDER BY id LIMIT ?
+            """, (self.content_type, last_id, CHUNK_SIZE))
+            rows = read_cursor.fetchall()
+            if not rows:
+                break
+
+            changed = []
+            ids = [row[0] for row in rows]
+            placeholders = ', '.join(['?'] * len(ids))
+            self.cursor.execute(f"""
+                SELECT id, terms FROM {TERMS_TABLE} WHERE id IN ({placeholders})
+            """, ids)
+            blobs = dict(self.cursor.fetchall())
+
+            for row in rows:
+                item_id = row[0]
+                signature = row_signature((self.dim,) + row[1:])
+                if cached.pop(item_id, None) == signature and item_id in blobs:
+                    terms = unpack_terms(blobs[item_id])
+                else:
+                    buckets, counts = hash_terms(row[1], self.dim)
+                    blob = pack_terms(buckets, counts)
+                    changed.append((item_id, self.content_type, signature, blob))
+                    terms = unpack_terms(blob)
+
+                self.ids.append(item_id)
+                self.terms.append(terms)
+                for col, value in zip(FACET_COLUMNS, row[2:6]):
+                    self.facets[col].append((value or '').strip().lower())
+                self.years.append(row[6])
+                self.ratings.append(row[7])
+
+            if changed:
+                self.cursor.executemany(f"""
+                    INSERT OR REPLACE INTO {TERMS_TABLE} (id, type, signature, terms)
+                    VALUES (?, ?, ?, ?)
+                """, changed)
+                self.conn.commit()
+                updated += len(changed)
+
+            last_id = rows[-1][0]
+            if show_progress and len(self.ids) % (CHUNK_SIZE * 10) == 0:
+                print(f"   ⏳ {self.content_type}: прочитано {len(self.ids):,}")
+
+        # Оставшиеся в cached - записи, удаленные из content
+        removed = list(cached)
+        for start in range(0, len(removed), CHUNK_SIZE):
+            chunk = removed[start:start + CHUNK_SIZE]
+            placeholders = ', '.join(['?'] * len(chunk))
+            self.cursor.execute(f"DELETE FROM {TERMS_TABLE} WHERE id IN ({placeholders})", chunk)
+        self.conn.commit()
+
+        return {'items': len(self.ids), 'updated': updated, 'removed': len(removed)}
+
+    def get_signature(self) -> str:
+        """Подпись типа: параметры сборки + подписи всех записей"""
+        self.cursor.execute(f"""
+            SELECT id, signature FROM {TERMS_TABLE} WHERE type = ? ORDER BY id
+        """, (self.content_type,))
+        digest = hashlib.sha1()
+        for item_id, signature in self.cursor.fetchall():
+            digest.update(f"{item_id}:{signature};".encode('utf-8'))
+        return f"k{self.top_k}:d{self.dim}:{digest.hexdigest()[:16]}"
+
+    def _numeric_column(self, values: List[Optional[float]]) -> 'np.ndarray':
+        """Центрирование и деление на размах; пропуски и нечисла = среднее (вклад 0)"""
+        column = np.array([_to_float(v) for v in values], dtype=np.float32)
+        known = column[np.isfinite(column)]
+        if known.size == 0 or known.max() == known.min():
+            return np.zeros_like(column)
+        column = (column - known.mean()) / (known.max() - known.min())
+        column[~np.isfinite(column)] = 0.0
+        return column
+
+    def build_matrix(self) -> 'np.ndarray':
+        """Матрица n x (HASH_DIM + facets + 2), строки нормированы (косинус = скалярное)"""
+        n = len(self.ids)
+
+        # TF-IDF: сублинейная частота * сглаженный idf, строки нормированы
+        text = np.zeros((n, self.dim), dtype=np.float32)
+        for row, (buckets, counts) in enumerate(self.terms):
+            if len(buckets):
+                text[row, buckets] = 1.0 + np.log(counts.astype(np.float32))
+        df = np.count_nonzero(text, axis=0)
+        text *= (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        norms = np.linalg.norm(text, axis=1, keepdims=True)
+        np.divide(text, norms, out=text, where=norms > 0)
+        blocks = [text * FEATURE_WEIGHTS['text']]
+
+        for col in FACET_COLUMNS:
+            values = sorted(set(self.facets[col]) - {''})
+            index = {value: i for i, value in enumerate(values)}
+            one_hot = np.zeros((n, len(values)), dtype=np.float32)
+            for row, value in enumerate(self.facets[col]):
+                if value in index:
+                    one_hot[row, index[value]] = FEATURE_WEIGHTS[col]
+            blocks.append(one_hot)
+
+        blocks.append(self._numeric_column(self.years)[:, None] * FEATURE_WEIGHTS['year'])
+        blocks.append(self._numeric_column(self.ratings)[:, None] * FEATURE_WEIGHTS['rating'])
+
+        matrix = np.hstack(blocks)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def top_neighbors(self, matrix: 'np.ndarray', show_progress: bool = True):
+        """Блоки строк x вся матрица -> top-K по строке (без самой записи)"""
+        n = matrix.shape[0]
+        k = min(self.top_k, n - 1)
+        ids = np.asarray(self.ids, dtype=np.uint32)
+        total_blocks = (n + self.block_size - 1) // self.block_size
+
+        for number, start in enumerate(range(0, n, self.block_size), 1):
+            end = min(start + self.block_size, n)
+            scores = matrix[start:end] @ matrix.T
+            rows = np.arange(end - start)
+            scores[rows, rows + start] = -np.inf
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            quantized = np.round(np.clip(top_scores, 0.0, 1.0) * 65535).astype('<u2')
+            yield [
+                (int(ids[start + i]), self.content_type,
+                 ids[top[i]].astype('<u4').tobytes(), quantized[i].tobytes())
+                for i in range(end - start)
+            ]
+
+            if show_progress and (number % 20 == 0 or number == total_blocks):
+                print(f"   ⏳ {self.content_type}: блоков {number}/{total_blocks}")
+
+    def build(self, signature: str, show_progress: bool = True) -> Dict:
+        """Пересчитать соседей типа и заменить их одной транзакцией"""
+        self.cursor.execute(f"DELETE FROM {SIMILAR_TABLE} WHERE type = ?", (self.content_type,))
+
+        if len(self.ids) > 1:
+            matrix = self.build_matrix()
+            for batch in self.top_neighbors(matrix, show_progress):
+                self.cursor.executemany(f"""
+                    INSERT INTO {SIMILAR_TABLE} (item_id, type, neighbor_ids, scores)
+                    VALUES (?, ?, ?, ?)
+                """, batch)
+
+        self.cursor.execute(f"""
+            INSERT OR REPLACE INTO {STATE_TABLE} (type, signature, items, built_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, (self.content_type, signature, len(self.ids)))
+        self.conn.commit()
+        return {'items': len(self.ids)}
+
+
+def rebuild(conn: sqlite3.Connection, full: bool = False, content_type: Optional[str] = None,
+            top_k: int = TOP_K, dim: int = HASH_DIM, block_size: int = BLOCK_SIZE,
+            show_progress: bool = True) -> Dict[str, Dict]:
+    """
+    Обновить кэш токенов и пересчитать соседей измененных типов.
+    Возвращает {тип: результат} для пересчитанных типов.
+    """
+    cursor = conn.cursor()
+    ensure_tables(cursor)
+
+    cursor.execute("SELECT DISTINCT type FROM content")
+    types = [row[0] for row in cursor.fetchall()]
+    if content_type:
+        types = [content_type]
+    else:
+        # Типы, которых больше нет в content
+        for table in (TERMS_TABLE, SIMILAR_TABLE, STATE_TABLE):
+            cursor.execute(f"""
+                DELETE FROM {table} WHERE type NOT IN (SELECT DISTINCT type FROM content)
+            """)
+        conn.commit()
+
+    rebuilt = {}
+    for current_type in types:
+        started = time.time()
+        builder = SimilarityBuilder(conn, current_type, top_k, dim, block_size)
+        synced = builder.sync_terms(show_progress)
+
+        signature = builder.get_signature()
+        cursor.execute(f"SELECT signature FROM {STATE_TABLE} WHERE type = ?", (current_type,))
+        row = cursor.fetchone()
+        if not full and row and row[0] == signature:
+            continue
+
+        result = builder.build(signature, show_progress)
+        result['updated'] = synced['updated']
+        result['removed'] = synced['removed']
+        result['seconds'] = round(time.time() - started, 2)
+        rebuilt[current_type] = result
+    return rebuilt
+
+# ==================== ЧТЕНИЕ ====================
+
+def get_similar(cursor: sqlite3.Cursor, item_id: int, limit: int = TOP_K) -> List[Tuple[int, float]]:
+    """[(id соседа, сходство)] по убыванию сходства"""
+    cursor.execute(f"""
+        SELECT neighbor_ids, scores FROM {SIMILAR_TABLE} WHERE item_id = ?
+    """, (item_id,))
+    row = cursor.fetchone()
+    if not row:
+        return []
+    ids = np.frombuffer(row[0], dtype='<u4')[:limit]
+    scores = np.frombuffer(row[1], dtype='<u2')[:limit] / 65535
+    return [(int(i), round(float(s), 4)) for i, s in zip(ids, scores)]
+
+
+def print_similar(cursor: sqlite3.Cursor, item_id: int, limit: int):
+    cursor.execute("SELECT type, title, creator FROM content WHERE id = ?", (item_id,))
+    item = cursor.fetchone()
+    if not item:
+        print(f"❌ Запись {item_id} не найдена")
+        return
+
+    print(f"\n🧲 Похожие на [{item_id}] {item[0]}: {item[1]} — {item[2] or '—'}\n")
+    neighbors = get_similar(cursor, item_id, limit)
+    if not neighbors:
+        print("  Соседи не рассчитаны. Запустите без --similar")
+    for neighbor_id, score in neighbors:
+        cursor.execute("SELECT title, creator, genre, year FROM content WHERE id = ?", (neighbor_id,))
+        row = cursor.fetchone() or ('(удалена)', None, None, None)
+        print(f"  {score:.3f}  [{neighbor_id}] {row[0]} — {row[1] or '—'} "
+              f"({row[2] or '—'}, {row[3] or '—'})")
+    print()
+
+
+def print_summary(cursor: sqlite3.Cursor):
+    """Сводка по рассчитанным типам"""
+    print("\n" + "=" * 70)
+    print("🧲 SIMILARITY INDEX".center(70))
+    print("=" * 70)
+
+    cursor.execute(f"SELECT type, items, signature, built_at FROM {STATE_TABLE} ORDER BY type")
+    for content_type, items, signature, built_at in cursor.fetchall():
+        print(f"\n📦 {content_type}: {items:,} записей, {signature.split(':')[0][1:]} соседей "
+              f"(собрано {built_at})")
+
+    cursor.execute(f"""
+        SELECT COUNT(*), IFNULL(SUM(LENGTH(neighbor_ids) + LENGTH(scores)), 0) FROM {SIMILAR_TABLE}
+    """)
+    items, size = cursor.fetchone()
+    print(f"\n💾 Записей с соседями: {items:,} ({size / 1024 / 1024:.1f} MB)")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🧲 Similarity Index - похожие записи для "еще как это"',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python similarity_index.py                    # Пересчитать измененные типы
+  python similarity_index.py --full             # Пересчитать всех соседей
+  python similarity_index.py --type books --top-k 30
+  python similarity_index.py --similar 123      # Соседи записи 123
+  python similarity_index.py --summary          # Только сводка
+        """
+    )
+
+    parser.add_argument('--full', action='store_true',
+                        help='Пересчитать соседей, даже если ничего не изменилось')
+    parser.add_argument('--type',
+                        choices=['books', 'movies', 'music'],
+                        help='Только указанный тип')
+    parser.add_argument('--top-k', type=int, default=TOP_K,
+                        help=f'Соседей на запись (по умолчанию: {TOP_K})')
+    parser.add_argument('--dim', type=int, default=HASH_DIM,
+                        help=f'Корзин hashed TF-IDF (по умолчанию: {HASH_DIM})')
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE,
+                        help=f'Строк на умножение матриц (по умолчанию: {BLOCK_SIZE})')
+    parser.add_argument('--similar', type=int, metavar='ID',
+                        help='Показать соседей записи')
+    parser.add_argument('--summary', action='store_true',
+                        help='Только показать сводку')
+
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if np is None:
+        print("❌ Для similarity_index нужна библиотека numpy")
+        print("Установите: pip install numpy")
+        sys.exit(1)
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    content_type = TYPE_ARGS.get(args.type)
+
+    try:
+        conn = sql_trace.connect(args.db)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка подключения к БД: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+        ensure_tables(cursor)
+
+        if args.similar is not None:
+            print_similar(cursor, args.similar, args.top_k)
+            return
+
+        if not args.summary and staging_db.build_in_progress(args.db):
+            print(f"⏸️ Идет сборка каталога ({staging_db.staging_path(args.db)}) - пересборка пропущена:")
+            print("   запись в рабочую базу отменила бы публикацию копии")
+        elif not args.summary:
+            rebuilt = rebuild(conn, args.full, content_type, args.top_k, args.dim, args.block_size)
+            if rebuilt:
+                for name, result in rebuilt.items():
+                    print(f"✅ {name}: {result['items']:,} записей "
+                          f"(токенизировано {result['updated']:,}, удалено {result['removed']:,}) "
+                          f"за {result['seconds']}с")
+            else:
+                print("✅ Изменений нет - соседи актуальны")
+        print_summary(cursor)
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка сборки индекса: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
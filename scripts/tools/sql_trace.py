@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+🐢 SQL TRACE - Медленные запросы SQLite в Python-инструментах
+
+Назначение:
+- sql_trace.connect(...) - замена sqlite3.connect: без трассировки
+  возвращает обычное соединение (никаких накладных), с трассировкой -
+  соединение, которое замеряет каждый execute/executemany/executescript,
+  выборку строк (fetch*, итерация) и commit
+- set_trace_callback: реальный текст выполненных команд с подставленными
+  параметрами - для журнала (в том числе каждая команда executescript
+  и executemany)
+- Запросы дольше порога - в журнал вместе с EXPLAIN QUERY PLAN
+- Сводка по формам запросов (литералы -> ?, IN (?, ?, ?) -> IN (?...)):
+  вызовы, время, среднее/максимум, строки, полный скан в плане.
+  Топ-N печатается при выходе (и пишется в JSON, если задан файл)
+
+Включение - переменные окружения (работает в любом инструменте):
+    SQL_TRACE=1 SQL_TRACE_SLOW_MS=20 python scripts/tools/db_inspector.py
+или флаги --sql-trace, --sql-slow-ms, --sql-trace-log, --sql-trace-report
+у инструментов, где вызван sql_trace.add_arguments().
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import argparse
+import atexit
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# ==================== КОНСТАНТЫ ====================
+
+SLOW_MS = 50.0
+TOP_N = 15
+SHAPE_DISPLAY = 160
+# Сколько команд из trace callback показывать в журнале на один вызов
+# (executemany, executescript)
+TRACE_KEEP = 5
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# ==================== ФОРМА ЗАПРОСА ====================
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def query_shape(sql: str) -> str:
+    """SELECT ... WHERE type = 'book' LIMIT 10 -> SELECT ... WHERE type = ? LIMIT ?"""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('IN (?...)', shape)
+    return _SPACES.sub(' ', shape).strip().rstrip(';')
+
+# ==================== ТРАССИРОВЩИК ====================
+
+class SqlTracer:
+    """Сводка по формам запросов всех трассируемых соединений процесса"""
+
+    def __init__(self, slow_ms: float = SLOW_MS, top: int = TOP_N,
+                 log_path: Optional[str] = None, report_path: Optional[str] = None):
+        self.slow = slow_ms / 1000
+        self.top = top
+        self.report_path = report_path
+        self.log = open(log_path, 'a', encoding='utf-8') if log_path else sys.stderr
+        self.lock = threading.Lock()
+        self.shapes: Dict[str, Dict] = {}
+        self.plans: Dict[str, List[str]] = {}
+        self.slow_count = 0
+        self.started = time.perf_counter()
+
+    def _stats(self, shape: str) -> Dict:
+        stats = self.shapes.get(shape)
+        if stats is None:
+            stats = self.shapes[shape] = {'calls': 0, 'seconds': 0.0, 'max': 0.0,
+                                          'fetch_seconds': 0.0, 'rows': 0, 'slow': 0}
+        return stats
+
+    def record(self, shape: str, elapsed: float, conn=None, sql: Optional[str] = None,
+               parameters=(), traced: Optional[List[str]] = None):
+        """Команда выполнена: в сводку, а если медленная - в журнал с планом"""
+        slow = elapsed >= self.slow
+        with self.lock:
+            stats = self._stats(shape)
+            stats['calls'] += 1
+            stats['seconds'] += elapsed
+            if elapsed > stats['max']:
+                stats['max'] = elapsed
+            if slow:
+                stats['slow'] += 1
+                self.slow_count += 1
+        if slow:
+            plan = self.explain(conn, shape, sql, parameters) if conn is not None and sql else []
+            self.log_slow(shape, elapsed, traced or [sql or shape], plan)
+
+    def record_fetch(self, shape: str, elapsed: float, rows: int):
+        """Выборка строк уже выполненного запроса: время и число строк к его форме"""
+        with self.lock:
+            stats = self._stats(shape)
+            stats['seconds'] += elapsed
+            stats['fetch_seconds'] += elapsed
+            stats['rows'] += rows
+
+    def explain(self, conn, shape: str, sql: str, parameters) -> List[str]:
+        """EXPLAIN QUERY PLAN - один раз на форму"""
+        if shape in self.plans:
+            return self.plans[shape]
+        plan = []
+        if sql.lstrip().upper().startswith(EXPLAINABLE):
+            try:
+                cursor = sqlite3.Cursor(conn)
+                conn._explaining = True
+                try:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+                    plan = [row[-1] for row in cursor.fetchall()]
+                finally:
+                    conn._explaining = False
+                    cursor.close()
+            except sqlite3.Error as e:
+                plan = [f"(план недоступен: {e})"]
+        with self.lock:
+            self.plans[shape] = plan
+        return plan
+
+    def log_slow(self, shape: str, elapsed: float, statements: List[str], plan: List[str]):
+        lines = [f"🐢 SQL {elapsed * 1000:.1f} мс"]
+        lines += [f"   {_SPACES.sub(' ', statement).strip()}" for statement in statements]
+        lines += [f"   📋 {step}" for step in plan]
+        with self.lock:
+            self.log.write('\n'.join(lines) + '\n')
+            self.log.flush()
+
+    # ---------- отчет ----------
+
+    def report(self) -> Dict:
+        with self.lock:
+            rows = []
+            for shape, stats in self.shapes.items():
+                plan = self.plans.get(shape)
+                rows.append({
+                    'shape': shape,
+                    'calls': stats['calls'],
+                    'seconds': round(stats['seconds'], 4),
+                    'avg_ms': round(stats['seconds'] / stats['calls'] * 1000, 3) if stats['calls'] else 0,
+                    'max_ms': round(stats['max'] * 1000, 3),
+                    'fetch_seconds': round(stats['fetch_seconds'], 4),
+                    'rows': stats['rows'],
+                    'slow': stats['slow'],
+                    'full_scan': any(step.startswith('SCAN') and step != 'SCAN CONSTANT ROW'
+                                     for step in plan) if plan else None,
+                    'plan': plan,
+                })
+        rows.sort(key=lambda row: row['seconds'], reverse=True)
+        return {
+            'created_at': datetime.now().isoformat(),
+            'wall_seconds': round(time.perf_counter() - self.started, 3),
+            'slow_ms': self.slow * 1000,
+            'statements': sum(row['calls'] for row in rows),
+            'sql_seconds': round(sum(row['seconds'] for row in rows), 4),
+            'slow_statements': self.slow_count,
+            'shapes': rows,
+        }
+
+    def print_report(self):
+        result = self.report()
+        if not result['shapes']:
+            return
+        out = sys.stderr
+        print("\n" + "=" * 70, file=out)
+        print(f"🐢 SQL: {result['statements']} команд, {result['sql_seconds']:.2f}с "
+              f"из {result['wall_seconds']:.2f}с, медленных (≥{result['slow_ms']:g} мс): "
+              f"{result['slow_statements']}", file=out)
+        print("=" * 70, file=out)
+        print(f"{'#':>3} {'вызовов':>8} {'всего, мс':>10} {'сред.':>8} {'макс':>8} {'строк':>8}",
+              file=out)
+        for i, row in enumerate(result['shapes'][:self.top], 1):
+            scan = " ⚠️ SCAN" if row['full_scan'] else ""
+            print(f"{i:>3} {row['calls']:>8} {row['seconds'] * 1000:>10.1f} {row['avg_ms']:>8.2f} "
+                  f"{row['max_ms']:>8.1f} {row['rows']:>8}{scan}", file=out)
+            shape = row['shape']
+            if len(shape) > SHAPE_DISPLAY:
+                shape = shape[:SHAPE_DISPLAY] + '...'
+            print(f"    {shape}", file=out)
+        print("=" * 70, file=out)
+
+    def save_report(self):
+        if not self.report_path:
+            return
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        print(f"📄 Отчет SQL: {self.report_path}", file=sys.stderr)
+
+    def finish(self):
+        """Вызывается при выходе (atexit)"""
+        self.print_report()
+        self.save_report()
+        if self.log is not sys.stderr:
+            self.log.close()
+
+# ==================== СОЕДИНЕНИЕ ====================
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор с замером execute* и выборки строк"""
+
+    _shape = None
+
+    def execute(self, sql, parameters=()):
+        self._shape = query_shape(sql)
+        return self.connection._timed(self._shape, sql, parameters, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._shape = query_shape(sql)
+        # Для плана нужен один набор параметров - берем первый
+        seq_of_parameters = list(seq_of_parameters)
+        first = seq_of_parameters[0] if seq_of_parameters else ()
+        return self.connection._timed(self._shape, sql, first, super().executemany,
+                                      sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        self._shape = query_shape(sql_script)
+        return self.connection._timed(self._shape, None, (), super().executescript, sql_script)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        if self._shape is not None:
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+            self.connection._tracer.record_fetch(self._shape, time.perf_counter() - started, rows)
+        return result
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        if self._shape is not None:
+            self.connection._tracer.record_fetch(self._shape, time.perf_counter() - started, 1)
+        return row
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, которое отдает TracedCursor и пишет сводку в общий трассировщик"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tracer = TRACER
+        self._traced: List[str] = []
+        self._traced_count = 0
+        self._explaining = False
+        self.set_trace_callback(self._on_trace)
+
+    def _on_trace(self, statement: str):
+        # BEGIN, который sqlite3 вставляет перед DML, в журнал не нужен
+        if self._explaining or statement.startswith('BEGIN'):
+            return
+        self._traced_count += 1
+        if len(self._traced) < TRACE_KEEP:
+            self._traced.append(statement)
+
+    def _timed(self, shape, sql, parameters, method, *args):
+        self._traced = []
+        self._traced_count = 0
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            traced = self._traced
+            if self._traced_count > len(traced):
+                traced = traced + [f"... и еще {self._traced_count - len(traced)}"]
+            self._tracer.record(shape, elapsed, self, sql, parameters, traced)
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        return self._timed('COMMIT', None, (), super().commit)
+
+# ==================== ВКЛЮЧЕНИЕ ====================
+
+TRACER: Optional[SqlTracer] = None
+
+
+def enable(slow_ms: Optional[float] = None, top: Optional[int] = None,
+           log_path: Optional[str] = None, report_path: Optional[str] = None) -> SqlTracer:
+    """Включить трассировку для всех следующих sql_trace.connect (умолчания из SQL_TRACE_*)"""
+    global TRACER
+    if TRACER is None:
+        TRACER = SqlTracer(
+            slow_ms=slow_ms if slow_ms is not None else float(os.getenv('SQL_TRACE_SLOW_MS', SLOW_MS)),
+            top=top if top is not None else int(os.getenv('SQL_TRACE_TOP', TOP_N)),
+            log_path=log_path or os.getenv('SQL_TRACE_LOG') or None,
+            report_path=report_path or os.getenv('SQL_TRACE_REPORT') or None,
+        )
+        atexit.register(TRACER.finish)
+    return TRACER
+
+
+def enabled_by_env() -> bool:
+    return os.getenv('SQL_TRACE', '') not in ('', '0')
+
+
+def connect(database, **kwargs) -> sqlite3.Connection:
+    """sqlite3.connect с трассировкой, если она включена (SQL_TRACE=1 или enable())"""
+    if TRACER is None and enabled_by_env():
+        enable()
+    if TRACER is not None and 'factory' not in kwargs:
+        kwargs['factory'] = TracedConnection
+    return sqlite3.connect(database, **kwargs)
+
+# ==================== CLI ====================
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """--sql-trace, --sql-slow-ms, --sql-trace-log, --sql-trace-report (умолчания из SQL_TRACE_*)"""
+    group = parser.add_argument_group('трассировка SQL')
+    group.add_argument('--sql-trace', action='store_true', default=enabled_by_env(),
+                       help='Замерять запросы, в конце - топ форм запросов (SQL_TRACE=1)')
+    group.add_argument('--sql-slow-ms', type=float, default=None,
+                       help=f'Порог медленного запроса, мс (SQL_TRACE_SLOW_MS, по умолчанию: {SLOW_MS:g})')
+    group.add_argument('--sql-trace-log', metavar='FILE', default=None,
+                       help='Журнал медленных запросов вместо stderr (SQL_TRACE_LOG)')
+    group.add_argument('--sql-trace-report', metavar='FILE', default=None,
+                       help='Сводка по формам запросов в JSON (SQL_TRACE_REPORT)')
+
+
+def from_args(args: argparse.Namespace) -> Optional[SqlTracer]:
+    if not args.sql_trace:
+        return None
+    return enable(slow_ms=args.sql_slow_ms, log_path=args.sql_trace_log,
+                  report_path=args.sql_trace_report)
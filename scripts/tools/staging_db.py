@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+🚧 STAGING DB - Сборка каталога в отдельном файле и атомарная публикация
+
+Назначение:
+- harvest_* пишут не в рабочий content.db, а в его копию content.db.staging
+  (снимок через backup API - API продолжает читать рабочую базу)
+- Перед публикацией на копии: удаление дубликатов (fix_duplicates),
+  rand_key для новых записей, пересборка пулов, ANALYZE и проверки
+  (quick_check, число записей типа, content_stats, FTS, внешние ключи)
+- Публикация - os.replace() поверх content.db: читатели видят либо старый,
+  либо полностью собранный каталог. Node (recommend_db.js) замечает смену
+  inode и переоткрывает соединение
+- Неудачный сбор - просто удаление файла копии, рабочая база не тронута
+
+Прежний файл остается жесткой ссылкой content.db.previous (откат - --rollback).
+Публикация отменяется, если рабочую базу меняли после снимка (счетчик изменений
+в заголовке SQLite): эти записи потерялись бы. Копия при этом сохраняется -
+--publish --force или --discard. Фоновые записи по расписанию (image_cache,
+rand_keys --reshuffle, recommend_pools, similarity_index) пропускают запуск,
+пока есть копия (build_in_progress). Рабочая база должна быть в режиме
+журнала DELETE (по умолчанию) - WAL-файл нельзя подменить вместе с базой.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations'))
+import content_stats
+import facet_dictionary
+import fts_index
+import rand_keys
+import recommend_pools
+import sql_trace
+from fix_duplicates import DuplicateFixer
+
+# ==================== КОНСТАНТЫ ====================
+
+DB_PATH = 'content.db'
+
+STAGING_SUFFIX = '.staging'
+META_SUFFIX = '.staging.json'
+PREVIOUS_SUFFIX = '.previous'
+
+# Новый сбор типа должен дать не меньше этой доли прежних записей:
+# упавший API (0 записей) не должен опустошить категорию
+MIN_KEEP_RATIO = 0.5
+
+# Смещение счетчика изменений в заголовке файла SQLite (4 байта, big-endian)
+CHANGE_COUNTER_OFFSET = 24
+
+# ==================== ФАЙЛЫ ====================
+
+def staging_path(db_path: str) -> str:
+    return db_path + STAGING_SUFFIX
+
+
+def meta_path(db_path: str) -> str:
+    return db_path + META_SUFFIX
+
+
+def previous_path(db_path: str) -> str:
+    return db_path + PREVIOUS_SUFFIX
+
+
+def build_in_progress(db_path: str = DB_PATH) -> bool:
+    """Есть копия сборки: запись в рабочую базу сейчас отменит ее публикацию"""
+    return os.path.exists(staging_path(db_path))
+
+
+def read_change_counter(db_path: str) -> Optional[int]:
+    """Счетчик изменений из заголовка (растет с каждым коммитом в режиме DELETE)"""
+    try:
+        with open(db_path, 'rb') as f:
+            f.seek(CHANGE_COUNTER_OFFSET)
+            data = f.read(4)
+    except OSError:
+        return None
+    return struct.unpack('>I', data)[0] if len(data) == 4 else None
+
+
+def _remove(path: str):
+    for candidate in (path, path + '-journal'):
+        if os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def _fsync_dir(path: str):
+    """Зафиксировать переименование на диске (POSIX)"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ==================== СБОРКА ====================
+
+class StagingBuild:
+    """Сборка одного типа контента в копии рабочей базы"""
+
+    def __init__(self, db_path: str = DB_PATH, content_type: Optional[str] = None,
+                 min_keep_ratio: float = MIN_KEEP_RATIO):
+        self.db_path = db_path
+        self.staging_path = staging_path(db_path)
+        self.content_type = content_type
+        self.min_keep_ratio = min_keep_ratio
+        self.conn = None
+        self.meta = {}
+
+    def open(self) -> sqlite3.Connection:
+        """Снимок рабочей базы в файл копии; возвращает соединение с копией"""
+        _remove(self.staging_path)
+
+        live = sql_trace.connect(self.db_path)
+        try:
+            cursor = live.cursor()
+            cursor.execute("PRAGMA journal_mode")
+            if cursor.fetchone()[0].lower() == 'wal':
+                raise sqlite3.OperationalError(
+                    f"{self.db_path} в режиме WAL - публикация подменой файла невозможна"
+                )
+            # Снимок, счетчик и число записей - под одной блокировкой чтения
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT type, COUNT(*) FROM content GROUP BY type")
+            counts = dict(cursor.fetchall())
+            self.conn = sql_trace.connect(self.staging_path)
+            live.backup(self.conn)
+            self.meta = {
+                'content_type': self.content_type,
+                'change_counter': read_change_counter(self.db_path),
+                'counts': counts,
+                'created_at': datetime.now().isoformat()
+            }
+            live.rollback()
+        finally:
+            live.close()
+
+        with open(meta_path(self.db_path), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        print(f"🚧 Копия для сборки: {self.staging_path}")
+        return self.conn
+
+    def load(self) -> bool:
+        """Подхватить незавершенную копию (для CLI --validate / --publish)"""
+        if not os.path.exists(self.staging_path) or not os.path.exists(meta_path(self.db_path)):
+            return False
+        with open(meta_path(self.db_path), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.content_type = self.meta.get('content_type')
+        self.conn = sql_trace.connect(self.staging_path)
+        return True
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def discard(self):
+        """Удалить копию - рабочая база не менялась"""
+        self.close()
+        _remove(self.staging_path)
+        _remove(meta_path(self.db_path))
+
+    # ---------- обработка копии ----------
+
+    def deduplicate(self) -> int:
+        """fix_duplicates без подтверждения и backup (копию не жалко)"""
+        self.conn.commit()
+        fixer = DuplicateFixer(self.staging_path)
+        if not fixer.connect():
+            return 0
+        try:
+            if not fixer.find_duplicates():
+                return 0
+            fixer.remove_duplicates()
+            fixer.create_report()
+            return fixer.stats['records_deleted']
+        finally:
+            fixer.close()
+
+    def refresh_derived(self):
+        """rand_key, статистика, пулы и ANALYZE на копии"""
+        cursor = self.conn.cursor()
+        if rand_keys.is_installed(cursor):
+            rand_keys.fill_missing(self.conn)
+        if content_stats.is_installed(cursor) and content_stats.verify(self.conn):
+            print("ℹ️ content_stats расходится с content - пересчитываю")
+            content_stats.rebuild(self.conn)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                       (recommend_pools.STATE_TABLE,))
+        if cursor.fetchone():
+            recommend_pools.rebuild(self.conn)
+        cursor.execute("ANALYZE")
+        self.conn.commit()
+
+    def validate(self) -> List[str]:
+        """Проблемы копии (пустой список - можно публиковать)"""
+        problems = []
+        cursor = self.conn.cursor()
+
+        cursor.execute("PRAGMA quick_check")
+        result = [row[0] for row in cursor.fetchall()]
+        if result != ['ok']:
+            problems.append(f"quick_check: {'; '.join(result[:5])}")
+
+        cursor.execute("PRAGMA foreign_key_check")
+        violations = cursor.fetchall()
+        if violations:
+            problems.append(f"Нарушений внешних ключей: {len(violations)}")
+
+        if content_stats.is_installed(cursor):
+            mismatches = content_stats.verify(self.conn)
+            if mismatches:
+                problems.append(f"content_stats: расхождений {len(mismatches)}")
+
+        if fts_index.is_installed(cursor) and not fts_index.integrity_check(self.conn):
+            problems.append(f"{fts_index.FTS_TABLE}: integrity-check не пройден")
+
+        if self.content_type:
+            cursor.execute(f"SELECT COUNT(*) FROM {facet_dictionary.content_table(cursor)} WHERE type = ?",
+                           (self.content_type,))
+            count = cursor.fetchone()[0]
+            before = self.meta.get('counts', {}).get(self.content_type, 0)
+            if count == 0:
+                problems.append(f"Тип '{self.content_type}': 0 записей")
+            elif before and count < before * self.min_keep_ratio:
+                problems.append(
+                    f"Тип '{self.content_type}': {count:,} записей против {before:,} "
+                    f"(меньше {self.min_keep_ratio:.0%})"
+                )
+        return problems
+
+    # ---------- публикация ----------
+
+    def publish(self, force: bool = False) -> bool:
+        """Подменить рабочую базу копией (os.replace атомарен в пределах ФС)"""
+        current = read_change_counter(self.db_path)
+        if not force and current is not None and current != self.meta.get('change_counter'):
+            print("❌ Рабочую базу меняли после снимка (ai_describer, translate_descriptions, image_cache?).")
+            print("   Публикация потеряла бы эти изменения. Копия сохранена:")
+            print("   python staging_db.py --publish --force   # Опубликовать, потеряв эти изменения")
+            print("   python staging_db.py --discard           # Удалить копию и пересобрать")
+            return False
+
+        # Копия - одиночный файл без журнала
+        self.conn.execute("PRAGMA journal_mode = DELETE")
+        self.conn.commit()
+        self.close()
+        with open(self.staging_path, 'rb+') as f:
+            os.fsync(f.fileno())
+
+        if os.path.exists(self.db_path):
+            _remove(previous_path(self.db_path))
+            try:
+                os.link(self.db_path, previous_path(self.db_path))
+            except OSError:
+                pass
+
+        os.replace(self.staging_path, self.db_path)
+        _fsync_dir(self.db_path)
+        _remove(meta_path(self.db_path))
+        print(f"✅ Опубликовано: {self.db_path}")
+        return True
+
+    def finish(self, dedup: bool = True, force: bool = False) -> bool:
+        """Дубликаты, производные данные, проверки и публикация.
+
+        Непрошедшая проверку или сломанная копия удаляется; отказ из-за изменений
+        рабочей базы копию сохраняет (--publish --force / --discard).
+        """
+        started = time.time()
+        try:
+            if dedup:
+                removed = self.deduplicate()
+                if removed:
+                    print(f"🧹 Удалено дубликатов: {removed:,}")
+            self.refresh_derived()
+
+            problems = self.validate()
+            if problems:
+                print("❌ Проверка копии не пройдена:")
+                for problem in problems:
+                    print(f"  - {problem}")
+                self.discard()
+                return False
+
+            if not self.publish(force):
+                self.close()
+                return False
+        except (sqlite3.Error, OSError) as e:
+            print(f"❌ Ошибка сборки: {e}")
+            self.discard()
+            return False
+
+        print(f"⏱️ Обработка копии и публикация: {time.time() - started:.1f}с")
+        return True
+
+
+def rollback(db_path: str = DB_PATH) -> bool:
+    """Вернуть файл, замененный последней публикацией"""
+    previous = previous_path(db_path)
+    if not os.path.exists(previous):
+        print(f"❌ Нет предыдущей версии: {previous}")
+        return False
+    os.replace(previous, db_path)
+    _fsync_dir(db_path)
+    print(f"✅ Восстановлено из {previous}")
+    return True
+
+
+def print_status(db_path: str):
+    print("\n" + "=" * 70)
+    print("🚧 STAGING DB".center(70))
+    print("=" * 70)
+    print(f"\n📂 Рабочая база: {db_path} (счетчик изменений {read_change_counter(db_path)})")
+
+    build = StagingBuild(db_path)
+    if build.load():
+        print(f"🚧 Незавершенная копия: {build.staging_path}")
+        print(f"   Тип: {build.content_type or '—'}, создана {build.meta.get('created_at')}")
+        build.close()
+    else:
+        print("✅ Незавершенных копий нет")
+
+    previous = previous_path(db_path)
+    if os.path.exists(previous):
+        modified = datetime.fromtimestamp(os.path.getmtime(previous)).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"↩️  Предыдущая версия: {previous} ({modified})")
+    print("=" * 70 + "\n")
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🚧 Staging DB - сборка в копии и атомарная публикация content.db',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python staging_db.py                      # Состояние копии и предыдущей версии
+  python staging_db.py --validate           # Проверить незавершенную копию
+  python staging_db.py --publish            # Проверить и опубликовать копию
+  python staging_db.py --discard            # Удалить копию
+  python staging_db.py --rollback           # Вернуть версию до последней публикации
+
+Сборка копии - harvest_books.py / harvest_movies.py / harvest_music.py.
+        """
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--validate', action='store_true',
+                       help='Проверить незавершенную копию')
+    group.add_argument('--publish', action='store_true',
+                       help='Проверить и опубликовать незавершенную копию')
+    group.add_argument('--discard', action='store_true',
+                       help='Удалить незавершенную копию')
+    group.add_argument('--rollback', action='store_true',
+                       help='Вернуть предыдущую версию базы')
+
+    parser.add_argument('--force', action='store_true',
+                        help='Публиковать, даже если рабочую базу меняли после снимка')
+    parser.add_argument('--db',
+                        default=DB_PATH,
+                        help=f'Путь к базе данных (по умолчанию: {DB_PATH})')
+
+    args = parser.parse_args()
+
+    if args.rollback:
+        sys.exit(0 if rollback(args.db) else 1)
+
+    if not os.path.exists(args.db):
+        print(f"❌ База данных не найдена: {args.db}")
+        sys.exit(1)
+
+    if args.validate or args.publish or args.discard:
+        build = StagingBuild(args.db)
+        if not build.load():
+            print("❌ Незавершенной копии нет")
+            sys.exit(1)
+
+        if args.discard:
+            build.discard()
+            print("✅ Копия удалена")
+        elif args.validate:
+            problems = build.validate()
+            build.close()
+            for problem in problems:
+                print(f"  ❌ {problem}")
+            if problems:
+                sys.exit(1)
+            print("✅ Копия готова к публикации")
+        elif not build.finish(dedup=False, force=args.force):
+            sys.exit(1)
+
+    print_status(args.db)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+🧪 SYNTHETIC CATALOG - Генератор тестовых content.db и access.db
+
+Назначение:
+- content.db на 10k / 100k / 1M / 10M записей с распределениями harvest_*
+  (жанры, эпохи, настроения, критерии, доли типов и needs_ai)
+- Описания на кириллице и латинице, частично заполненные переводы
+- Подсаженные дубликаты (регистр, пробелы, пунктуация) для fix_duplicates
+- access.db: коды доступа, сессии, логи активности, администраторы
+
+Генерация детерминирована (--seed): одинаковые фикстуры на разных машинах.
+
+Автор: Coffee Books AI Team
+Версия: 1.0
+"""
+
+import sqlite3
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+import content_stats
+
+# ==================== КОНСТАНТЫ ====================
+
+BATCH_SIZE = 10000
+DEFAULT_SEED = 42
+DUPLICATE_RATIO = 0.02
+
+SIZE_PRESETS = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000
+}
+
+# Доли типов в каталоге (books : movies : music)
+TYPE_WEIGHTS = {'book': 35, 'movie': 30, 'music': 35}
+
+# Жанры - как в harvest_books.BOOK_GENRES, harvest_movies.GENRE_MAP, harvest_music.MUSIC_GENRES
+GENRES = {
+    'book': [
+        'fantasy', 'sci-fi', 'mystery', 'thriller', 'classics', 'non-fiction',
+        'romance', 'adventure', 'historical', 'philosophy', 'psychology', 'dystopian'
+    ],
+    'movie': [
+        'drama', 'comedy', 'action', 'thriller', 'horror', 'sci-fi', 'animation',
+        'crime', 'adventure', 'family', 'fantasy', 'history', 'documentary',
+        'mystery', 'romance', 'war', 'western', 'music'
+    ],
+    'music': [
+        'pop', 'rock', 'hip-hop', 'electronic', 'jazz', 'classical', 'indie',
+        'metal', 'country', 'r-n-b', 'latin', 'blues'
+    ]
+}
+
+# Веса жанров: первые в списке встречаются чаще (как в реальных выдачах API)
+GENRE_SKEW = 1.15
+
+# Критерии с весами - по логике get_*_criteria
+CRITERIA = {
+    'book': [('popular', 40), ('bestseller', 15), ('classic', 15), ('intellectual', 10),
+             ('cult', 8), ('modern', 8), ('hidden_gem', 4)],
+    'movie': [('popular', 35), ('high_rated', 20), ('blockbuster', 15), ('hidden_gem', 10),
+              ('cult', 8), ('oscar', 7), ('arthouse', 5)],
+    'music': [('popular', 35), ('rising', 25), ('hit', 20), ('underground', 20)]
+}
+
+# Настроения музыки - get_mood_from_features / get_mood_from_genre
+MOODS = [('energetic', 25), ('party', 20), ('chill', 15), ('focus', 12),
+         ('vibe', 10), ('sad', 8), ('night_drive', 6), ('workout', 4)]
+
+# Годы: (нижняя граница, верхняя граница, вес)
+YEAR_RANGES = {
+    'book': [(1900, 1949, 5), (1950, 1989, 20), (1990, 2009, 30), (2010, 2025, 45)],
+    'movie': [(1930, 1979, 10), (1980, 1999, 20), (2000, 2019, 40), (2020, 2025, 30)],
+    'music': [(1960, 1989, 15), (1990, 2009, 25), (2010, 2019, 30), (2020, 2025, 30)]
+}
+
+CREATORS_LATIN = [
+    'Stephen King', 'Agatha Christie', 'Haruki Murakami', 'Neil Gaiman',
+    'Ursula Le Guin', 'Frank Herbert', 'George Orwell', 'Paulo Coelho',
+    'Taylor Swift', 'Daft Punk', 'Miles Davis', 'Arctic Monkeys', 'The Weeknd'
+]
+CREATORS_CYRILLIC = [
+    'Лев Толстой', 'Фёдор Достоевский', 'Михаил Булгаков', 'Абай Кунанбаев',
+    'Мухтар Ауэзов', 'Виктор Пелевин', 'Земфира', 'Кино', 'Димаш Кудайберген'
+]
+
+WORDS_EN = (
+    'story journey city night love war family secret world dream memory river '
+    'light shadow road winter summer heart music time stranger house island'
+).split()
+WORDS_RU = (
+    'история путешествие город ночь любовь война семья тайна мир мечта память '
+    'река свет тень дорога зима лето сердце музыка время незнакомец дом остров'
+).split()
+WORDS_KK = (
+    'тарих саяхат қала түн махаббат соғыс отбасы құпия әлем арман жад өзен '
+    'жарық көлеңке жол қыс жаз жүрек музыка уақыт бейтаныс үй арал'
+).split()
+
+TITLE_WORDS = WORDS_EN + WORDS_RU
+
+SOURCE_PREFIXES = {'book': 'gb_', 'movie': 'tmdb_', 'music': 'spotify_'}
+
+CONTENT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS content (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        title TEXT NOT NULL,
+        creator TEXT,
+        description TEXT,
+        image_url TEXT,
+        year INTEGER,
+        rating REAL,
+        genre TEXT,
+        epoch TEXT,
+        mood TEXT,
+        criteria TEXT,
+        source_id TEXT UNIQUE,
+        needs_ai INTEGER DEFAULT 0,
+        description_ru TEXT,
+        description_en TEXT,
+        description_kk TEXT
+    )
+"""
+
+# Схемы access.db - как в server.js и admin_telegram_bot.py
+ACCESS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS access_codes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT UNIQUE NOT NULL,
+        code_type TEXT NOT NULL CHECK(code_type IN ('1day', '7days', '30days')),
+        duration_hours INTEGER NOT NULL,
+        generated_by TEXT,
+        generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_used INTEGER DEFAULT 0,
+        used_at TIMESTAMP,
+        used_by_session TEXT,
+        expires_at TIMESTAMP,
+        notes TEXT,
+        max_activations INTEGER DEFAULT 1,
+        current_activations INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_token TEXT UNIQUE NOT NULL,
+        access_code_id INTEGER,
+        ip_address TEXT,
+        user_agent TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL,
+        is_active INTEGER DEFAULT 1,
+        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        codes_generated_count INTEGER DEFAULT 0,
+        FOREIGN KEY (access_code_id) REFERENCES access_codes(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activity_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_token TEXT,
+        action TEXT NOT NULL,
+        details TEXT,
+        ip_address TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_token) REFERENCES user_sessions(session_token)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admin_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id TEXT UNIQUE NOT NULL,
+        username TEXT,
+        full_name TEXT,
+        is_active INTEGER DEFAULT 1,
+        codes_generated_total INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_seen TIMESTAMP
+    )
+    """
+]
+
+CODE_TYPES = {'1day': 24, '7days': 168, '30days': 720}
+CODE_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+
+ACTIVITY_ACTIONS = [('code_verified', 30), ('recommend', 50), ('logout', 10),
+                    ('code_verify_failed', 6), ('code_expired', 3), ('code_exhausted', 1)]
+
+# ==================== ВСПОМОГАТЕЛЬНЫЕ ====================
+
+def parse_size(value: str) -> int:
+    """'100k', '1m', '2500' -> число записей"""
+    value = value.strip().lower()
+    if value in SIZE_PRESETS:
+        return SIZE_PRESETS[value]
+    multipliers = {'k': 1_000, 'm': 1_000_000}
+    if value and value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+def _weighted(pairs: List[Tuple[str, int]]) -> Tuple[List[str], List[int]]:
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+
+def _sentence(rng: random.Random, words: List[str], length: int) -> str:
+    text = ' '.join(rng.choice(words) for _ in range(length))
+    return text[0].upper() + text[1:] + '.'
+
+
+def _description(rng: random.Random, words: List[str], sentences: int) -> str:
+    return ' '.join(_sentence(rng, words, rng.randint(6, 14)) for _ in range(sentences))
+
+
+def _epoch(content_type: str, year) -> str:
+    """Эпоха по году - get_book_epoch / get_epoch / get_track_epoch"""
+    if not year:
+        return 'unknown'
+    if content_type == 'book':
+        if year >= 2024: return 'bestsellers_2025'
+    elif year >= 2023:
+        return 'new_releases'
+    if year >= 2020: return '2020s'
+    if year >= 2010: return '2010s'
+    if year >= 2000: return '2000s'
+    if year >= 1990: return '90s'
+    if year >= 1980: return '80s'
+    if content_type == 'book' and year >= 1950:
+        return 'golden_classics'
+    return 'retro'
+
+
+def _code(number: int) -> str:
+    """Уникальный код XXXX-XXXX из порядкового номера"""
+    chars = []
+    base = len(CODE_ALPHABET)
+    for _ in range(8):
+        number, rem = divmod(number, base)
+        chars.append(CODE_ALPHABET[rem])
+    code = ''.join(reversed(chars))
+    return f"{code[:4]}-{code[4:]}"
+
+# ==================== CONTENT.DB ====================
+
+class ContentGenerator:
+    """Генератор строк content с распределениями harvest_*"""
+
+    def __init__(self, seed: int = DEFAULT_SEED, duplicate_ratio: float = DUPLICATE_RATIO):
+        self.rng = random.Random(seed)
+        self.duplicate_ratio = duplicate_ratio
+        self.type_names, self.type_weights = _weighted(list(TYPE_WEIGHTS.items()))
+        self.genre_weights = {
+            t: [GENRE_SKEW ** -i for i in range(len(g))] for t, g in GENRES.items()
+        }
+        self.criteria = {t: _weighted(c) for t, c in CRITERIA.items()}
+        self.moods = _weighted(MOODS)
+        self.recent = []  # Кандидаты для подсаженных дубликатов
+        self.stats = {'rows': 0, 'duplicates': 0}
+
+    def _year(self, content_type: str):
+        if self.rng.random() < 0.03:
+            return None
+        ranges = YEAR_RANGES[content_type]
+        low, high, _ = self.rng.choices(ranges, weights=[r[2] for r in ranges])[0]
+        return self.rng.randint(low, high)
+
+    def _creator(self, content_type: str, n: int) -> str:
+        if content_type == 'movie':
+            return 'TMDb'
+        pool = CREATORS_CYRILLIC if self.rng.random() < 0.25 else CREATORS_LATIN
+        # Длинный хвост авторов: известные имена + пронумерованные
+        if self.rng.random() < 0.3:
+            return self.rng.choice(pool)
+        return f"{self.rng.choice(pool)} {n % 50000}"
+
+    def _title(self) -> str:
+        words = self.rng.randint(1, 5)
+        return ' '.join(self.rng.choice(TITLE_WORDS) for _ in range(words)).title()
+
+    def make_row(self, n: int) -> tuple:
+        rng = self.rng
+        content_type = rng.choices(self.type_names, weights=self.type_weights)[0]
+        year = self._year(content_type)
+        genre = rng.choices(GENRES[content_type], weights=self.genre_weights[content_type])[0]
+        criteria = rng.choices(*self.criteria[content_type])[0]
+        mood = rng.choices(*self.moods)[0] if content_type == 'music' else None
+        image_url = f"https://img.example/{content_type}/{n}.jpg" if rng.random() < 0.9 else None
+
+        if content_type == 'music':
+            # harvest_music пишет в description длительность трека
+            description = f"{rng.randint(1, 7)}:{rng.randint(0, 59):02d}"
+            rating = round(rng.randint(0, 100) / 10, 1)
+            needs_ai = 0
+        else:
+            roll = rng.random()
+            if roll < 0.15:
+                description = ''
+            elif roll < 0.55:
+                description = _description(rng, WORDS_RU, rng.randint(2, 4))
+            else:
+                description = _description(rng, WORDS_EN, rng.randint(2, 5))[:500]
+            rating = round(rng.uniform(4.0, 9.3), 1) if content_type == 'movie' else None
+            needs_ai = 1 if len(description) < 50 or rng.random() < 0.2 else 0
+
+        translations = [None, None, None]
+        if description and content_type != 'music':
+            if rng.random() < 0.6:
+                translations[0] = _description(rng, WORDS_RU, 2)
+            if rng.random() < 0.5:
+                translations[1] = _description(rng, WORDS_EN, 2)
+            if rng.random() < 0.4:
+                translations[2] = _description(rng, WORDS_KK, 2)
+
+        return (
+            content_type, self._title(), self._creator(content_type, n), description,
+            image_url, year, rating, genre, _epoch(content_type, year), mood, criteria,
+            f"{SOURCE_PREFIXES[content_type]}{n}", needs_ai, *translations
+        )
+
+    def make_duplicate(self, original: tuple, n: int) -> tuple:
+        """Копия записи с шумом в title/creator - ловится fix_duplicates"""
+        rng = self.rng
+        title, creator = original[1], original[2]
+        variant = rng.randint(0, 3)
+        if variant == 0:
+            title = title.upper()
+        elif variant == 1:
+            title = f"  {title} "
+        elif variant == 2:
+            creator = creator.lower()
+        else:
+            title = title.lower()
+        row = list(original)
+        row[1], row[2] = title, creator
+        row[11] = f"{original[11]}_dup{n}"
+        # Копия хуже оригинала - без картинки и переводов
+        row[4] = None
+        row[13:16] = [None, None, None]
+        return tuple(row)
+
+    def rows(self, count: int) -> Iterator[tuple]:
+        for n in range(count):
+            if self.recent and self.rng.random() < self.duplicate_ratio:
+                row = self.make_duplicate(self.rng.choice(self.recent), n)
+                self.stats['duplicates'] += 1
+            else:
+                row = self.make_row(n)
+                if len(self.recent) < 5000:
+                    self.recent.append(row)
+                else:
+                    self.recent[self.rng.randrange(5000)] = row
+            self.stats['rows'] += 1
+            yield row
+
+
+def populate_content(conn: sqlite3.Connection, rows: int, seed: int = DEFAULT_SEED,
+                     duplicate_ratio: float = DUPLICATE_RATIO,
+                     show_progress: bool = False) -> Dict:
+    """Создать таблицу content и заполнить rows синтетическими записями"""
+    cursor = conn.cursor()
+    cursor.execute(CONTENT_SCHEMA)
+
+    generator = ContentGenerator(seed, duplicate_ratio)
+    insert_sql = """
+        INSERT INTO content
+        (type, title, creator, description, image_url, year, rating, genre, epoch,
+         mood, criteria, source_id, needs_ai, description_ru, description_en, description_kk)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    batch = []
+    for row in generator.rows(rows):
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(insert_sql, batch)
+            conn.commit()
+            batch = []
+            # Последняя строка прогресса - после цикла, один раз
+            if show_progress and generator.stats['rows'] < rows:
+                print(f"\r  📝 {generator.stats['rows']:,} / {rows:,}", end='', flush=True)
+    if batch:
+        cursor.executemany(insert_sql, batch)
+        conn.commit()
+    if show_progress:
+        print(f"\r  📝 {generator.stats['rows']:,} / {rows:,}")
+
+    return generator.stats
+
+
+def build_content_db(path: str, rows: int, seed: int = DEFAULT_SEED,
+                     duplicate_ratio: float = DUPLICATE_RATIO,
+                     with_stats: bool = True, show_progress: bool = True) -> Dict:
+    """Новый content.db по пути path (существующий файл перезаписывается)"""
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        # Фикстура одноразовая - журнал не нужен
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        stats = populate_content(conn, rows, seed, duplicate_ratio, show_progress)
+        if with_stats:
+            content_stats.install(conn)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        return stats
+    finally:
+        conn.close()
+
+# ==================== ACCESS.DB ====================
+
+def build_access_db(path: str, codes: int, seed: int = DEFAULT_SEED,
+                    admins: int = 5, show_progress: bool = True) -> Dict:
+    """
+    Новый access.db: codes кодов, сессии для активированных кодов,
+    логи активности (~10 на сессию) и admins администраторов
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = random.Random(seed)
+    # UTC, как CURRENT_TIMESTAMP и datetime('now') в SQLite
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    actions, action_weights = _weighted(ACTIVITY_ACTIONS)
+    stats = {'codes': 0, 'sessions': 0, 'logs': 0, 'admins': admins}
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        cursor = conn.cursor()
+        for statement in ACCESS_SCHEMA:
+            cursor.execute(statement)
+        # Логи копятся во временной таблице и переносятся по времени:
+        # id activity_logs растет вместе с timestamp, как у живого сервера
+        cursor.execute("""
+            CREATE TEMP TABLE pending_logs (
+                session_token TEXT, action TEXT, details TEXT, ip_address TEXT, timestamp TIMESTAMP
+            )
+        """)
+
+        admin_ids = [str(100000000 + i) for i in range(admins)]
+        cursor.executemany("""
+            INSERT INTO admin_users (telegram_id, username, full_name, codes_generated_total, last_seen)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (tid, f"admin{i}", f"Admin {i}", codes // max(admins, 1),
+             (now - timedelta(hours=rng.randint(0, 500))).strftime('%Y-%m-%d %H:%M:%S'))
+            for i, tid in enumerate(admin_ids)
+        ])
+
+        code_batch, session_batch, log_batch = [], [], []
+        session_no = 0
+
+        def flush():
+            cursor.executemany("""
+                INSERT INTO access_codes
+                (code, code_type, duration_hours, generated_by, generated_at, is_used,
+                 used_at, used_by_session, expires_at, max_activations, current_activations)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, code_batch)
+            cursor.executemany("""
+                INSERT INTO user_sessions
+                (session_token, access_code_id, ip_address, user_agent, created_at,
+                 expires_at, is_active, last_activity)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, session_batch)
+            cursor.executemany("""
+                INSERT INTO pending_logs (session_token, action, details, ip_address, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, log_batch)
+            conn.commit()
+            code_batch.clear()
+            session_batch.clear()
+            log_batch.clear()
+
+        for code_id in range(1, codes + 1):
+            code_type = rng.choices(list(CODE_TYPES), weights=[50, 35, 15])[0]
+            hours = CODE_TYPES[code_type]
+            generated_at = now - timedelta(days=rng.uniform(0, 365))
+            max_activations = 1 if rng.random() < 0.8 else rng.choice([5, 10, 50])
+            activations = min(max_activations, rng.choice([0, 0, 1, 1, 1, 2, 3]))
+            code = _code(code_id * 7919 + seed)
+
+            last_token = None
+            for _ in range(activations):
+                session_no += 1
+                token = f"{rng.getrandbits(128):032x}"
+                # Сессии и логи - не позже now
+                created = generated_at + (min(generated_at + timedelta(hours=hours), now) - generated_at) * rng.random()
+                expires = created + timedelta(hours=hours)
+                active_until = min(expires, now)
+                session_batch.append((
+                    token, code_id, f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                    'Mozilla/5.0', created.strftime('%Y-%m-%d %H:%M:%S'),
+                    # server.js пишет toISOString()
+                    expires.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                    1 if expires > now and rng.random() < 0.9 else 0,
+                    min(created + timedelta(minutes=rng.randint(0, 600)), now).strftime('%Y-%m-%d %H:%M:%S')
+                ))
+                for _ in range(rng.randint(3, 17)):
+                    log_batch.append((
+                        token, rng.choices(actions, weights=action_weights)[0], code, None,
+                        (created + (active_until - created) * rng.random()).strftime('%Y-%m-%d %H:%M:%S')
+                    ))
+                last_token = token
+
+            code_batch.append((
+                code, code_type, hours, rng.choice(admin_ids) if admin_ids else None,
+                generated_at.strftime('%Y-%m-%d %H:%M:%S'),
+                1 if activations >= max_activations else 0,
+                generated_at.strftime('%Y-%m-%d %H:%M:%S') if activations else None,
+                last_token,
+                # admin_telegram_bot пишет datetime как есть
+                str(generated_at + timedelta(hours=hours)),
+                max_activations, activations
+            ))
+
+            if len(code_batch) >= BATCH_SIZE:
+                stats['sessions'] = session_no
+                stats['logs'] += len(log_batch)
+                flush()
+                if show_progress and code_id < codes:
+                    print(f"\r  🔑 {code_id:,} / {codes:,}", end='', flush=True)
+
+        stats['sessions'] = session_no
+        stats['logs'] += len(log_batch)
+        flush()
+        if show_progress:
+            print(f"\r  🔑 {codes:,} / {codes:,}")
+
+        cursor.execute("""
+            INSERT INTO activity_logs (session_token, action, details, ip_address, timestamp)
+            SELECT session_token, action, details, ip_address, timestamp
+            FROM pending_logs ORDER BY timestamp
+        """)
+        cursor.execute("DROP TABLE pending_logs")
+        conn.commit()
+
+        stats['codes'] = codes
+        conn.execute("PRAGMA journal_mode = DELETE")
+        return stats
+    finally:
+        conn.close()
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='🧪 Synthetic Catalog - генератор тестовых БД',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python synthetic_catalog.py --rows 100k                  # fixtures/content_100k.db
+  python synthetic_catalog.py --rows 1m --access           # + fixtures/access_1m.db
+  python synthetic_catalog.py --rows 10k --content test.db --seed 7
+  python synthetic_catalog.py --rows 100k --duplicates 0.05
+        """
+    )
+
+    parser.add_argument('--rows',
+                        default='10k',
+                        help='Размер каталога: 10k, 100k, 1m, 10m или число (по умолчанию: 10k)')
+
+    parser.add_argument('--content',
+                        help='Путь к content.db (по умолчанию: fixtures/content_<rows>.db)')
+
+    parser.add_argument('--access', nargs='?', const='', default=None,
+                        help='Создать access.db (по умолчанию: fixtures/access_<rows>.db)')
+
+    parser.add_argument('--codes',
+                        help='Количество кодов доступа (по умолчанию: rows / 10)')
+
+    parser.add_argument('--duplicates',
+                        type=float,
+                        default=DUPLICATE_RATIO,
+                        help=f'Доля подсаженных дубликатов (по умолчанию: {DUPLICATE_RATIO})')
+
+    parser.add_argument('--seed',
+                        type=int,
+                        default=DEFAULT_SEED,
+                        help=f'Seed генератора (по умолчанию: {DEFAULT_SEED})')
+
+    parser.add_argument('--no-stats', action='store_true',
+                        help='Не устанавливать content_stats')
+
+    args = parser.parse_args()
+
+    try:
+        rows = parse_size(args.rows)
+        codes = parse_size(args.codes) if args.codes else max(rows // 10, 1)
+    except ValueError:
+        print(f"❌ Неверный размер: {args.rows}")
+        sys.exit(1)
+
+    label = args.rows.lower()
+    content_path = args.content or os.path.join('fixtures', f"content_{label}.db")
+    os.makedirs(os.path.dirname(content_path) or '.', exist_ok=True)
+
+    print(f"🧪 content.db: {content_path} ({rows:,} записей)")
+    stats = build_content_db(content_path, rows, args.seed, args.duplicates,
+                             with_stats=not args.no_stats)
+    print(f"✅ Записей: {stats['rows']:,}, подсажено дубликатов: {stats['duplicates']:,}")
+
+    if args.access is not None:
+        access_path = args.access or os.path.join('fixtures', f"access_{label}.db")
+        os.makedirs(os.path.dirname(access_path) or '.', exist_ok=True)
+        print(f"\n🧪 access.db: {access_path} ({codes:,} кодов)")
+        access = build_access_db(access_path, codes, args.seed)
+        print(f"✅ Кодов: {access['codes']:,}, сессий: {access['sessions']:,}, "
+              f"логов: {access['logs']:,}, админов: {access['admins']}")
+
+if __name__ == "__main__":
+    main()
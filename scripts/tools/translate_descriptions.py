@@ -18,6 +18,10 @@ import time
 import re
 import argparse
 from typing import Dict, Optional, List
+
+import batch_metrics
+import facet_dictionary
+import sql_trace
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -59,6 +63,8 @@ class UniversalTranslator:
         self.client = None
         self.conn = None
         self.cursor = None
+        # batch_metrics.BatchMetrics на время process_all
+        self.metrics = None
         self.stats = {
             'total': 0,
             'russian_original': 0,
@@ -73,7 +79,7 @@ class UniversalTranslator:
     def connect_db(self) -> bool:
         """Подключение к базе данных"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sql_trace.connect(self.db_path)
             self.conn.row_factory = sqlite3.Row
             self.cursor = self.conn.cursor()
             return True
@@ -142,7 +148,7 @@ class UniversalTranslator:
             if columns_to_add:
                 print(f"\n📋 Добавляем колонки: {', '.join(columns_to_add)}")
                 for col in columns_to_add:
-                    self.cursor.execute(f"ALTER TABLE content ADD COLUMN {col} TEXT")
+                    facet_dictionary.add_column(self.cursor, col, "TEXT")
                 self.conn.commit()
                 print(f"✅ Колонки добавлены")
             else:
@@ -173,17 +179,18 @@ class UniversalTranslator:
         
         for attempt in range(MAX_RETRIES):
             try:
-                completion = self.client.chat.completions.create(
-                    model=MODEL_TRANSLATE,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    temperature=TEMPERATURE,
-                    max_tokens=MAX_TOKENS
-                )
+                with batch_metrics.timed(self.metrics, 'groq_api'):
+                    completion = self.client.chat.completions.create(
+                        model=MODEL_TRANSLATE,
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        temperature=TEMPERATURE,
+                        max_tokens=MAX_TOKENS
+                    )
                 
                 if completion.choices and len(completion.choices) > 0:
                     translation = completion.choices[0].message.content.strip()
@@ -200,6 +207,8 @@ class UniversalTranslator:
             
             except Exception as e:
                 if attempt < MAX_RETRIES - 1:
+                    if self.metrics:
+                        self.metrics.count('api_retries')
                     time.sleep(RETRY_DELAY)
                     continue
                 else:
@@ -223,10 +232,12 @@ class UniversalTranslator:
             FROM content
         """
         
+        params = ()
         if limit:
-            query += f" LIMIT {limit}"
+            query += " LIMIT ?"
+            params = (limit,)
         
-        self.cursor.execute(query)
+        self.cursor.execute(query, params)
         
         items = []
         for row in self.cursor.fetchall():
@@ -259,8 +270,9 @@ class UniversalTranslator:
             values.append(item_id)
             query = f"UPDATE content SET {', '.join(set_clauses)} WHERE id = ?"
             
-            self.cursor.execute(query, values)
-            self.conn.commit()
+            with batch_metrics.timed(self.metrics, 'db'):
+                self.cursor.execute(query, values)
+                self.conn.commit()
             
             return True
         
@@ -362,8 +374,8 @@ class UniversalTranslator:
             self.stats['failed'] += 1
             return False
     
-    def process_all(self, limit: int = None):
-        """Обработать все элементы"""
+    def process_all(self, limit: int = None, metrics: Optional[batch_metrics.BatchMetrics] = None):
+        """Обработать все элементы (metrics - прогресс, этапы, JSON-события)"""
         
         print(f"\n🌍 УНИВЕРСАЛЬНЫЙ ПЕРЕВОДЧИК")
         print("=" * 70)
@@ -404,16 +416,31 @@ class UniversalTranslator:
         
         start_time = time.time()
         
-        for i, item in enumerate(items, 1):
-            emoji = {'book': '📖', 'movie': '🎬', 'music': '🎵'}[item['type']]
-            
-            print(f"\n[{i}/{total}] {emoji} {item['title']}")
-            
-            self.process_item(item, show_progress=True)
+        if metrics is None:
+            metrics = batch_metrics.BatchMetrics('translate_descriptions')
+        metrics.total = total
+        self.metrics = metrics
+        
+        try:
+            for i, item in enumerate(items, 1):
+                emoji = {'book': '📖', 'movie': '🎬', 'music': '🎵'}[item['type']]
+                
+                metrics.log(f"\n[{i}/{total}] {emoji} {item['title']}")
+                
+                failed_before = self.stats['failed']
+                if self.process_item(item, show_progress=not metrics.quiet):
+                    metrics.item('translated')
+                elif self.stats['failed'] > failed_before:
+                    metrics.item('failed')
+                else:
+                    metrics.item('skipped')
+        finally:
+            self.metrics = None
         
         elapsed_time = time.time() - start_time
         
         print("\n" + "=" * 70)
+        metrics.close(translations=self.stats['translations'], total_tokens=self.stats['total_tokens'])
         
         # Статистика
         self.show_summary(elapsed_time)
@@ -444,7 +471,7 @@ class UniversalTranslator:
         print(f"⏱️ Время выполнения: {elapsed_time:.1f} секунд")
         print("=" * 70)
     
-    def run(self, limit: int = None):
+    def run(self, limit: int = None, metrics: Optional[batch_metrics.BatchMetrics] = None):
         """Запуск процесса перевода"""
         
         print("\n" + "=" * 70)
@@ -470,7 +497,7 @@ class UniversalTranslator:
             return False
         
         try:
-            self.process_all(limit)
+            self.process_all(limit, metrics)
             
             print(f"\n✅ ПЕРЕВОД ЗАВЕРШЕН!")
             print("=" * 70 + "\n")
@@ -490,6 +517,8 @@ def main():
 Примеры использования:
   python translate_descriptions.py --limit=10    # Тест на 10 элементах
   python translate_descriptions.py               # Все элементы
+  python translate_descriptions.py --quiet --metrics translate.jsonl
+  python translate_descriptions.py --limit=10 --sql-trace
         """
     )
     
@@ -506,11 +535,15 @@ def main():
         help=f'Путь к базе данных (по умолчанию: {DB_PATH})'
     )
     
+    batch_metrics.add_arguments(parser)
+    sql_trace.add_arguments(parser)
+    
     args = parser.parse_args()
+    sql_trace.from_args(args)
     
     translator = UniversalTranslator(db_path=args.db)
     
-    translator.run(limit=args.limit)
+    translator.run(limit=args.limit, metrics=batch_metrics.from_args('translate_descriptions', args))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file